@@ -0,0 +1,510 @@
+"""
+Motor de agregação financeira (clientes e colaboradores).
+
+Custo/Hora, Tesouraria, Resultado Atual, Proveitos, Despesas e Orçamento
+somam as receitas dos clientes e os custos dos colaboradores, cada página com
+as suas regras de campos (conversão de números, campos alternativos, o que é
+"com fatura", ordem das somas). Aqui essas contas são feitas numa única
+passagem por estado["clientes"], estado["colaboradores"] e pelas linhas de
+clientes do orçamento: cada medida tem um nome e um acumulador com as regras
+da página que a usa, e o custo mensal de cada colaborador é calculado uma só
+vez para todas as medidas que dele dependem.
+
+O resultado fica em memória enquanto dados.versao_dados() for a mesma e as
+listas de clientes/colaboradores/linhas do orçamento forem os mesmos objetos
+com o mesmo tamanho. Os valores são partilhados (tuplos/dicionários: não
+alterar).
+
+Uma medida cujas regras rebentariam com os dados (ex.: float() de um texto
+que a página original não aceitava) guarda o erro e volta a lançá-lo a quem a
+pedir, sem afetar as outras medidas.
+"""
+
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from dados import estado, versao_dados
+
+MESES = 12
+
+
+# ========= CONVERSÕES (as de cada página) =========
+
+def _float_simples(v: Any) -> float:
+    """float(v), 0.0 se não converter (Custo/Hora, Resultado Atual)."""
+    try:
+        return float(v)
+    except Exception:
+        return 0.0
+
+
+def _int_simples(v: Any, default: int = 0) -> int:
+    try:
+        return int(v)
+    except Exception:
+        return default
+
+
+def _float_pt(valor: Any) -> float:
+    """Número em formato PT ("1.234,56 €"), 0.0 se vazio/inválido (Tesouraria)."""
+    if valor is None:
+        return 0.0
+    try:
+        if isinstance(valor, (int, float)):
+            return float(valor)
+        texto = str(valor).strip().replace("€", "").replace(" ", "")
+        texto = texto.replace(".", "").replace(",", ".")
+        return float(texto) if texto else 0.0
+    except Exception:
+        return 0.0
+
+
+def _verdadeiro(v: Any) -> bool:
+    if v is True:
+        return True
+    if isinstance(v, str):
+        return v.strip().lower() in ("1", "true", "sim", "yes", "y")
+    if isinstance(v, (int, float)):
+        return v == 1
+    return False
+
+
+# ========= CUSTO MENSAL DE UM COLABORADOR =========
+
+def _obter_custo_mensal_colaborador(col: dict) -> float:
+    """
+    Calcula o custo mensal do colaborador com base nos campos que já existem no dicionário:
+
+    - vencimento_base / vencimento_mensal
+    - subsidio_alimentacao_diario
+    - ajudas_custo / ajudas_custo_mensal
+    - tsu_taxa (percentagem, se existir)
+    - seguro_acidentes_trabalho (se não tiver valor, assume 1% do vencimento)
+    - medicina_trabalho (se existir)
+    - modo_subsidios / subsidio_ferias_modo / subsidio_natal_modo
+
+    Regra para subsídios:
+      - Se o subsídio for "Completo" OU "Duodécimos", conta SEMPRE vencimento/12 por mês
+        (custo médio anual), quer seja pago numa vez ou em duodécimos.
+      - Se for "Nenhum" ou vazio, não conta nada.
+    """
+
+    # Vencimento base (compatível com o que vem de colaboradores.py)
+    venc_base = float(
+        col.get("vencimento_base")
+        or col.get("vencimento_mensal")
+        or 0.0
+    )
+
+    sa_diario = float(col.get("subsidio_alimentacao_diario") or 0.0)
+    ajudas = float(
+        col.get("ajudas_custo")
+        or col.get("ajudas_custo_mensal")
+        or 0.0
+    )
+    med_trabalho = float(col.get("medicina_trabalho") or 0.0)
+
+    # Seguro AT: se não tiver valor gravado, usamos 1% do vencimento como fallback
+    seguro_at = col.get("seguro_acidentes_trabalho")
+    if seguro_at is None or seguro_at == "":
+        seguro_at = round(venc_base * 0.01, 2)
+    seguro_at = float(seguro_at or 0.0)
+
+    # TSU (entidade): percentagem sobre o vencimento_base
+    tsu_taxa = float(col.get("tsu_taxa") or 0.0)  # ex: 23.75
+    tsu_valor = venc_base * tsu_taxa / 100.0
+
+    # Subsídio de alimentação mensal: assumimos 22 dias
+    sa_mensal = sa_diario * 22
+
+    # --- Subsídios de férias e Natal ------------------------------------
+    # Tentamos ler campos específicos; se não existirem, caímos em modo_subsidios.
+    modo_ferias = str(
+        col.get("subsidio_ferias_modo")
+        or col.get("subsidio_ferias")
+        or col.get("modo_subsidios")
+        or ""
+    ).strip().lower()
+
+    modo_natal = str(
+        col.get("subsidio_natal_modo")
+        or col.get("subsidio_natal")
+        or col.get("modo_subsidios")
+        or ""
+    ).strip().lower()
+
+    def tem_subsidio(modo: str) -> bool:
+        # Consideramos que "completo" e "duodecimos" têm sempre custo médio mensal
+        return modo in ("completo", "duodecimos")
+
+    sub_ferias_mensal = venc_base / 12.0 if tem_subsidio(modo_ferias) else 0.0
+    sub_natal_mensal = venc_base / 12.0 if tem_subsidio(modo_natal) else 0.0
+
+    # --------------------------------------------------------------------
+
+    custo = (
+        venc_base
+        + sa_mensal
+        + ajudas
+        + med_trabalho
+        + seguro_at
+        + tsu_valor
+        + sub_ferias_mensal
+        + sub_natal_mensal
+    )
+
+    return round(custo, 2)
+
+
+# ========= MEDIDAS SOBRE CLIENTES =========
+# Cada medida: (iniciar() -> acumulador, acumular(acc, item), concluir(acc) -> valor)
+
+def _acumular_receita_custo_hora(acc: Dict[str, float], cli: Any) -> None:
+    # Custo/Hora: mensalidade + valor_grh + valor_toconline; legal = com_fatura verdadeiro
+    if not isinstance(cli, dict):
+        return
+    v = (
+        _float_simples(cli.get("mensalidade"))
+        + _float_simples(cli.get("valor_grh"))
+        + _float_simples(cli.get("valor_toconline"))
+    )
+    acc["total"] += v
+    if _verdadeiro(cli.get("com_fatura")):
+        acc["legal"] += v
+
+
+def _acumular_receita_tesouraria(acc: Dict[str, float], cli: Any) -> None:
+    # Tesouraria: mensalidade, valor_grh e valor_gestao_comercial em formato PT
+    acc["total"] += _float_pt(cli.get("mensalidade"))
+    acc["total"] += _float_pt(cli.get("valor_grh"))
+    acc["total"] += _float_pt(cli.get("valor_gestao_comercial"))
+
+
+def _acumular_receita_resultado_atual(acc: Dict[str, float], cli: Any) -> None:
+    # Resultado Atual: aceita também os campos 'grh' e 'gestao_comercial'
+    mensal = _float_simples(cli.get("mensalidade"))
+    grh = _float_simples(cli.get("valor_grh") or cli.get("grh") or 0)
+    gc = _float_simples(cli.get("valor_gestao_comercial") or cli.get("gestao_comercial") or 0)
+    acc["total"] += (mensal + grh + gc)
+
+
+def _acumular_proveitos_automaticos(acc: Dict[str, float], cli: Any) -> None:
+    # Proveitos: float() estrito; com_fatura por truthiness; Toconline -> Gestão Comercial
+    mensalidade = float(cli.get("mensalidade") or 0)
+    valor_grh = float(cli.get("valor_grh") or 0)
+    valor_toconline = float(cli.get("valor_toconline") or 0)
+
+    if cli.get("com_fatura"):
+        acc["mensalidades_com_fatura"] += mensalidade
+    else:
+        acc["mensalidades_sem_fatura"] += mensalidade
+    acc["gestao_rh"] += valor_grh
+    acc["gestao_comercial"] += valor_toconline
+
+
+_MEDIDAS_CLIENTES: Dict[str, Tuple[Callable[[], Any], Callable[[Any, Any], None], Callable[[Any], Any]]] = {
+    # (total, legal) mensais
+    "receita_custo_hora": (
+        lambda: {"total": 0.0, "legal": 0.0},
+        _acumular_receita_custo_hora,
+        lambda acc: (acc["total"], acc["legal"]),
+    ),
+    # receita mensal dos clientes (sem os proveitos configurados)
+    "receita_tesouraria": (
+        lambda: {"total": 0.0},
+        _acumular_receita_tesouraria,
+        lambda acc: acc["total"],
+    ),
+    # receita mensal
+    "receita_resultado_atual": (
+        lambda: {"total": 0.0},
+        _acumular_receita_resultado_atual,
+        lambda acc: acc["total"],
+    ),
+    # {categoria: valor mensal}
+    "proveitos_automaticos": (
+        lambda: {
+            "mensalidades_com_fatura": 0.0,
+            "mensalidades_sem_fatura": 0.0,
+            "gestao_rh": 0.0,
+            "gestao_comercial": 0.0,
+        },
+        _acumular_proveitos_automaticos,
+        lambda acc: acc,
+    ),
+}
+
+
+# ========= MEDIDAS SOBRE COLABORADORES =========
+# O item é (colaborador, custo mensal ou a exceção que o cálculo lançou)
+
+def _custo(custo: Any) -> float:
+    if isinstance(custo, Exception):
+        raise custo
+    return custo
+
+
+def _acumular_lista_dicts(acc: List[Tuple[dict, float]], item: Tuple[Any, Any]) -> None:
+    col, custo = item
+    if isinstance(col, dict):
+        acc.append((col, _custo(custo)))
+
+
+def _concluir_colaboradores_despesa(acc: List[Tuple[dict, float]]) -> Dict[str, Any]:
+    # Despesas: por ordem alfabética do nome; linhas (nome, custo mensal) e totais
+    ordenados = sorted(acc, key=lambda par: str(par[0].get("nome", "")).lower())
+    linhas = []
+    totais_mensais = [0.0] * MESES
+    total_ano = 0.0
+    for idx, (col, custo_mensal) in enumerate(ordenados):
+        for mes_idx in range(MESES):
+            totais_mensais[mes_idx] += custo_mensal
+        total_ano += custo_mensal * 12
+        linhas.append((col.get("nome") or f"Colaborador {idx + 1}", custo_mensal))
+    return {"linhas": tuple(linhas), "totais_mensais": tuple(totais_mensais), "total_ano": total_ano}
+
+
+def _acumular_custo_tesouraria(acc: Dict[str, float], item: Tuple[Any, Any]) -> None:
+    # Tesouraria: soma pela ordem da lista (entradas que não são dict rebentam)
+    acc["total"] += _custo(item[1])
+
+
+def _acumular_colaboradores_resultado_atual(acc: Dict[str, Any], item: Tuple[Any, Any]) -> None:
+    # Resultado Atual: vencimento + S.A. x dias + ajudas de custo (sem TSU nem subsídios)
+    c = item[0]
+    nome = c.get("nome") or ""
+    vencimento = _float_simples(
+        c.get("vencimento_mensal")
+        or c.get("salario_base")
+        or c.get("remuneracao_base")
+        or 0
+    )
+    sa_diario = _float_simples(
+        c.get("subsidio_alimentacao_diario")
+        or c.get("subsidio_alimentacao")
+        or 0
+    )
+    ajudas = _float_simples(c.get("ajudas_custo_mensal") or 0)
+    dias = _int_simples(c.get("dias_trabalho_mes") or 22, default=22)
+
+    custo_mensal = vencimento + sa_diario * dias + ajudas
+    custo_anual = custo_mensal * 12
+    acc["total_anual"] += custo_anual
+    acc["linhas"].append((nome, custo_mensal, custo_anual))
+
+
+def _acumular_colaboradores_custo_hora(acc: Dict[str, Any], item: Tuple[Any, Any]) -> None:
+    # Custo/Hora: linha por colaborador com horas do mês
+    c, custo = item
+    if not isinstance(c, dict):
+        return
+    nome = c.get("nome") or ""
+    vencimento = _float_simples(c.get("vencimento_mensal") or c.get("salario_base") or c.get("remuneracao_base") or 0)
+    sa_diario = _float_simples(c.get("subsidio_alimentacao_diario") or c.get("subsidio_alimentacao") or 0)
+    ajudas = _float_simples(c.get("ajudas_custo_mensal") or c.get("ajudas_custo") or 0)
+
+    dias = _int_simples(c.get("dias_trabalho_mes") or 22, default=22)
+    horas_dia = _float_simples(c.get("horas_dia") or 8)
+
+    custo_mensal = _custo(custo)
+    horas_mes = horas_dia * dias if horas_dia > 0 and dias > 0 else 0.0
+    custo_hora = (custo_mensal / horas_mes) if horas_mes > 0 else 0.0
+
+    acc["total_horas_mes"] += horas_mes
+    acc["linhas"].append(
+        {
+            "nome": nome,
+            "vencimento": vencimento,
+            "sa_diario": sa_diario,
+            "ajudas": ajudas,
+            "dias": dias,
+            "horas_dia": horas_dia,
+            "custo_mensal": custo_mensal,
+            "horas_mes": horas_mes,
+            "custo_hora": custo_hora,
+        }
+    )
+
+
+_MEDIDAS_COLABORADORES: Dict[str, Tuple[Callable[[], Any], Callable[[Any, Any], None], Callable[[Any], Any]]] = {
+    # {"linhas": ((nome, custo mensal), ...), "totais_mensais": (12), "total_ano"}
+    "colaboradores_despesa": (list, _acumular_lista_dicts, _concluir_colaboradores_despesa),
+    # custo mensal total
+    "custo_colaboradores_tesouraria": (
+        lambda: {"total": 0.0},
+        _acumular_custo_tesouraria,
+        lambda acc: acc["total"],
+    ),
+    # {"total_anual", "linhas": ((nome, custo mensal, custo anual), ...)}
+    "colaboradores_resultado_atual": (
+        lambda: {"total_anual": 0.0, "linhas": []},
+        _acumular_colaboradores_resultado_atual,
+        lambda acc: {"total_anual": acc["total_anual"], "linhas": tuple(acc["linhas"])},
+    ),
+    # {"total_horas_mes", "linhas": ({nome, vencimento, ..., custo_hora}, ...)} (valores por formatar)
+    "colaboradores_custo_hora": (
+        lambda: {"total_horas_mes": 0.0, "linhas": []},
+        _acumular_colaboradores_custo_hora,
+        lambda acc: {"total_horas_mes": acc["total_horas_mes"], "linhas": tuple(acc["linhas"])},
+    ),
+}
+
+
+# ========= MEDIDAS SOBRE AS LINHAS DE CLIENTES DO ORÇAMENTO =========
+
+def _valor_estimado(ln: dict, campo_atual: str, campo_estimativa: str) -> float:
+    atual = float(ln.get(campo_atual, 0) or 0)
+    estimado = ln.get(campo_estimativa, None)
+    if estimado is None:
+        return atual
+    return float(estimado or 0)
+
+
+def _acumular_proveitos_orcamento(acc: Dict[str, float], ln: Any) -> None:
+    # Orçamento: estimativa (ou valor atual se não houver) por linha
+    mens_est = _valor_estimado(ln, "mensalidade_atual", "mensalidade_estimativa")
+    if bool(ln.get("com_fatura", False)):
+        acc["mensalidades_com_fatura"] += mens_est
+    else:
+        acc["mensalidades_sem_fatura"] += mens_est
+    acc["gestao_rh"] += _valor_estimado(ln, "grh_atual", "grh_estimativa")
+    acc["gestao_comercial"] += _valor_estimado(ln, "comercial_atual", "comercial_estimativa")
+
+
+_MEDIDAS_LINHAS_ORCAMENTO: Dict[str, Tuple[Callable[[], Any], Callable[[Any, Any], None], Callable[[Any], Any]]] = {
+    # {categoria: valor mensal}
+    "proveitos_orcamento": (
+        lambda: {
+            "mensalidades_com_fatura": 0.0,
+            "mensalidades_sem_fatura": 0.0,
+            "gestao_rh": 0.0,
+            "gestao_comercial": 0.0,
+        },
+        _acumular_proveitos_orcamento,
+        lambda acc: acc,
+    ),
+}
+
+MEDIDAS = tuple(_MEDIDAS_CLIENTES) + tuple(_MEDIDAS_COLABORADORES) + tuple(_MEDIDAS_LINHAS_ORCAMENTO)
+
+
+# ========= PASSAGEM ÚNICA =========
+
+def _passagem(itens: List[Any], medidas: Dict[str, Tuple[Callable, Callable, Callable]], valores: Dict[str, Any], erros: Dict[str, Exception]) -> None:
+    """Uma volta pelos itens a alimentar todas as medidas; uma medida que falha para aí."""
+    ativas = []
+    for nome, (iniciar, acumular, concluir) in medidas.items():
+        ativas.append([nome, iniciar(), acumular, concluir])
+
+    for item in itens:
+        for entrada in ativas:
+            if entrada[1] is None:
+                continue
+            try:
+                entrada[2](entrada[1], item)
+            except Exception as exc:
+                erros[entrada[0]] = exc
+                entrada[1] = None
+
+    for nome, acc, _, concluir in ativas:
+        if acc is None:
+            continue
+        try:
+            valores[nome] = concluir(acc)
+        except Exception as exc:
+            erros[nome] = exc
+
+
+def _lista(valor: Any) -> List[Any]:
+    return valor if isinstance(valor, list) else []
+
+
+def _linhas_orcamento(dados: Dict[str, Any]) -> Any:
+    orc = dados.get("orcamento")
+    return orc.get("clientes_linhas") if isinstance(orc, dict) else None
+
+
+def calcular(dados: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Exception]]:
+    """Todas as medidas para 'dados' (estrutura de 'estado'): ({nome: valor}, {nome: erro})."""
+    valores: Dict[str, Any] = {}
+    erros: Dict[str, Exception] = {}
+
+    _passagem(_lista(dados.get("clientes", [])), _MEDIDAS_CLIENTES, valores, erros)
+
+    colaboradores = []
+    for col in _lista(dados.get("colaboradores", [])):
+        try:
+            custo: Any = _obter_custo_mensal_colaborador(col)
+        except Exception as exc:
+            custo = exc
+        colaboradores.append((col, custo))
+    _passagem(colaboradores, _MEDIDAS_COLABORADORES, valores, erros)
+
+    _passagem(_lista(_linhas_orcamento(dados)), _MEDIDAS_LINHAS_ORCAMENTO, valores, erros)
+    return valores, erros
+
+
+# ========= CACHE POR VERSÃO DOS DADOS =========
+
+_lock = threading.Lock()
+# (versão dos dados, ((lista, tamanho), ...), valores, erros)
+_cache: Optional[Tuple[int, Tuple[Tuple[Any, int], ...], Dict[str, Any], Dict[str, Exception]]] = None
+_estatisticas = {"hits": 0, "calculos": 0}
+
+
+def _dependencias() -> Tuple[Tuple[Any, int], ...]:
+    listas = (estado.get("clientes"), estado.get("colaboradores"), _linhas_orcamento(estado))
+    return tuple((lista, len(lista) if isinstance(lista, list) else -1) for lista in listas)
+
+
+def _mesmas(a: Tuple[Tuple[Any, int], ...], b: Tuple[Tuple[Any, int], ...]) -> bool:
+    return all(x[0] is y[0] and x[1] == y[1] for x, y in zip(a, b))
+
+
+def _medidas_estado() -> Tuple[Dict[str, Any], Dict[str, Exception]]:
+    global _cache
+    versao = versao_dados()
+    dependencias = _dependencias()
+    with _lock:
+        if _cache is not None and _cache[0] == versao and _mesmas(_cache[1], dependencias):
+            _estatisticas["hits"] += 1
+            return _cache[2], _cache[3]
+
+    valores, erros = calcular(estado)
+
+    with _lock:
+        _cache = (versao, dependencias, valores, erros)
+        _estatisticas["calculos"] += 1
+    return valores, erros
+
+
+def medida(nome: str, dados: Optional[Dict[str, Any]] = None) -> Any:
+    """
+    Valor da medida 'nome' (ver MEDIDAS). Sem 'dados' (ou com o próprio
+    'estado') vem da cache; outro dicionário é calculado na hora.
+    """
+    if nome not in MEDIDAS:
+        raise KeyError(f"Medida desconhecida: {nome}")
+    if dados is None or dados is estado:
+        valores, erros = _medidas_estado()
+    else:
+        valores, erros = calcular(dados)
+    if nome in erros:
+        raise erros[nome]
+    return valores[nome]
+
+
+def invalidar() -> None:
+    global _cache
+    with _lock:
+        _cache = None
+
+
+def estatisticas() -> Dict[str, Any]:
+    with _lock:
+        return {
+            **_estatisticas,
+            "versao_dados": _cache[0] if _cache is not None else None,
+            "medidas": list(MEDIDAS),
+            "erros": {nome: repr(erro) for nome, erro in (_cache[3] if _cache is not None else {}).items()},
+        }
@@ -1,22 +1,82 @@
+import importlib
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Dict, Optional
+
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import HTMLResponse, RedirectResponse
 
-from clientes import router as clientes_router
-from proveitos import router as proveitos_router
-from despesa import router as despesas_router
-from orcamento import router as orcamento_router
-from colaboradores import router as colaboradores_router
-from custo_hora import router as custo_hora_router
-from resultado_atual import router as resultado_atual_router
-from listas import router as listas_router
-from timings import router as timings_router
-from sugestao_mensalidade import router as sugestao_mensalidade_router
-from tesouraria import router as tesouraria_router
-from relacao_tecnicos import router as relacao_tecnicos_router
-from comissoes import router as comissoes_router
-
-app = FastAPI(title="PACACCOUNTING API")
+# Tempo de importação de cada módulo (ms), para diagnosticar o arranque.
+# Cada valor inclui o que o módulo importa pela primeira vez.
+_TEMPOS_IMPORTACAO: Dict[str, float] = {}
+_ARRANQUE: Dict[str, Any] = {}
+
+_inicio = time.perf_counter()
+
+
+def _importar(nome_modulo: str):
+    inicio = time.perf_counter()
+    modulo = importlib.import_module(nome_modulo)
+    _TEMPOS_IMPORTACAO[nome_modulo] = round((time.perf_counter() - inicio) * 1000, 1)
+    return modulo
+
+
+def _importar_router(nome_modulo: str):
+    return _importar(nome_modulo).router
+
+
+dados = _importar("dados")
+agregacao = _importar("agregacao")
+comissoes_motor = _importar("comissoes_motor")
+cache_paginas = _importar("cache_paginas")
+correspondencias = _importar("correspondencias")
+exportacao = _importar("exportacao")
+recursos_exportacao = _importar("recursos_exportacao")
+normalizacao = _importar("normalizacao")
+
+clientes_router = _importar_router("clientes")
+proveitos_router = _importar_router("proveitos")
+despesas_router = _importar_router("despesa")
+orcamento_router = _importar_router("orcamento")
+colaboradores_router = _importar_router("colaboradores")
+custo_hora_router = _importar_router("custo_hora")
+resultado_atual_router = _importar_router("resultado_atual")
+listas_router = _importar_router("listas")
+timings_router = _importar_router("timings")
+sugestao_mensalidade_router = _importar_router("sugestao_mensalidade")
+tesouraria_router = _importar_router("tesouraria")
+relacao_tecnicos_router = _importar_router("relacao_tecnicos")
+comissoes_router = _importar_router("comissoes")
+
+if dados.ARRANQUE_DIFERIDO:
+    for _modulo, _ms in sorted(_TEMPOS_IMPORTACAO.items(), key=lambda item: -item[1]):
+        print(f"[API] import {_modulo}: {_ms:.1f} ms")
+    print(f"[API] import total: {(time.perf_counter() - _inicio) * 1000:.1f} ms")
+
+
+@asynccontextmanager
+async def ciclo_de_vida(app: FastAPI):
+    if dados.ARRANQUE_DIFERIDO:
+        # Leitura única dos dados (os módulos não o fizeram ao ser importados)
+        inicio = time.perf_counter()
+        dados.carregar_dados()
+        importlib.import_module("timings")._carregar_timings_de_ficheiro()
+        _ARRANQUE["carregamento_ms"] = round((time.perf_counter() - inicio) * 1000, 1)
+        print(f"[API] Dados carregados no arranque: {_ARRANQUE['carregamento_ms']:.1f} ms")
+
+    # Fontes e estilos das exportações PDF/PNG, carregados sem atrasar o arranque
+    threading.Thread(target=recursos_exportacao.aquecer, name="aquecer-exportacao", daemon=True).start()
+
+    yield
+
+    # As gravações são feitas por uma thread em segundo plano; nada fica na fila ao sair
+    if not dados.flush_escritas():
+        print("[API] ERRO: ficaram escritas por gravar no encerramento.")
+
+
+app = FastAPI(title="PACACCOUNTING API", lifespan=ciclo_de_vida)
 
 # Ficheiros estáticos (CSS, imagens, JS, etc.)
 app.mount("/static", StaticFiles(directory="static"), name="static")
@@ -142,6 +202,57 @@ async def raiz():
     return RedirectResponse(url="/dashboard")
 
 
+@app.get("/sistema/escritas-pendentes")
+async def ver_escritas_pendentes():
+    # Diagnóstico da escrita diferida (secções/ficheiros ainda por gravar)
+    return dados.estado_escritas()
+
+
+@app.get("/sistema/normalizacao")
+async def ver_normalizacao():
+    # Hits/misses das caches dos normalizadores de nomes
+    return normalizacao.estatisticas()
+
+
+@app.get("/sistema/correspondencias")
+async def ver_correspondencias(ano: Optional[str] = None):
+    # Tabela cliente (NIF) -> empresa dos timings, por página; sem ano, só o resumo
+    if ano:
+        return correspondencias.tabela_por_nif(ano)
+    return correspondencias.estatisticas()
+
+
+@app.get("/sistema/cache-paginas")
+async def ver_cache_paginas():
+    # Hits/misses por rota da cache de páginas renderizadas
+    return cache_paginas.estatisticas()
+
+
+@app.get("/sistema/agregacao")
+async def ver_agregacao():
+    # Medidas do motor de agregação financeira e do motor de comissões (hits/recálculos)
+    return {**agregacao.estatisticas(), "comissoes": comissoes_motor.estatisticas()}
+
+
+@app.get("/sistema/exportacao")
+async def ver_exportacao():
+    # Lotes de exportação (ZIP) e recursos partilhados (fontes/estilos)
+    return {
+        **exportacao.estatisticas(),
+        "recursos": recursos_exportacao.estatisticas(),
+    }
+
+
+@app.get("/sistema/arranque")
+async def ver_arranque():
+    # Diagnóstico do arranque: tempos de importação por módulo e leitura dos dados
+    return {
+        "arranque_diferido": dados.ARRANQUE_DIFERIDO,
+        "importacao_ms": _TEMPOS_IMPORTACAO,
+        **_ARRANQUE,
+    }
+
+
 # ========= INCLUSÃO DOS MÓDULOS =========
 
 app.include_router(clientes_router)
@@ -0,0 +1,116 @@
+"""
+Cache das páginas de leitura já renderizadas.
+
+Resultado Atual, Custo/Hora, Tesouraria, Orçamento, Proveitos, Despesas e
+Relação Técnicos recalculam tudo a partir de 'estado' e dos JSON em cada GET,
+mas os dados só mudam nos POSTs. Cada rota decorada com @pagina_em_cache
+guarda a resposta HTML por (rota, URL com query, versão dos dados, dia): a
+versão é dados.versao_dados(), que muda em guardar_dados()/carregar_dados()
+e em registar_alteracao() (despesas, proveitos, tesouraria, comissões e
+timings chamam-na ao gravar). O dia entra na chave porque várias páginas usam
+o ano/mês corrente por omissão.
+
+Só respostas 200 com corpo (não streaming) vão para a cache; PAC_CACHE_PAGINAS=0
+desliga-a. Ver estatisticas() para hits/misses por rota.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from datetime import date
+from functools import wraps
+from typing import Any, Callable, Dict, Tuple
+
+from fastapi import Request
+from fastapi.responses import Response, StreamingResponse
+
+from dados import versao_dados
+
+CACHE_PAGINAS_ATIVA = os.environ.get("PAC_CACHE_PAGINAS", "1") != "0"
+MAXIMO_ENTRADAS = 128
+
+_lock = threading.Lock()
+# chave -> (corpo, media_type, cabeçalhos)
+_respostas: "OrderedDict[Tuple[Any, ...], Tuple[bytes, str, Dict[str, str]]]" = OrderedDict()
+_versao_em_cache = -1
+_estatisticas: Dict[str, Dict[str, int]] = {}
+
+
+def _contar(nome: str, campo: str) -> None:
+    contadores = _estatisticas.setdefault(nome, {"hits": 0, "misses": 0})
+    contadores[campo] += 1
+
+
+def pagina_em_cache(nome: str) -> Callable:
+    """Decorador para rotas GET (async) que recebem 'request: Request'."""
+
+    def decorador(funcao: Callable) -> Callable:
+        @wraps(funcao)
+        async def rota(*args, **kwargs):
+            request = kwargs.get("request")
+            if not isinstance(request, Request):
+                request = next((a for a in args if isinstance(a, Request)), None)
+            if not CACHE_PAGINAS_ATIVA or request is None:
+                return await funcao(*args, **kwargs)
+
+            global _versao_em_cache
+            versao = versao_dados()
+            chave = (nome, str(request.url), versao, date.today().toordinal())
+            with _lock:
+                em_cache = _respostas.get(chave)
+                if em_cache is not None:
+                    _respostas.move_to_end(chave)
+                    _contar(nome, "hits")
+            if em_cache is not None:
+                corpo, media_type, cabecalhos = em_cache
+                return Response(content=corpo, media_type=media_type, headers=cabecalhos)
+
+            resposta = await funcao(*args, **kwargs)
+            with _lock:
+                _contar(nome, "misses")
+                corpo = getattr(resposta, "body", None)
+                if (
+                    isinstance(resposta, Response)
+                    and not isinstance(resposta, StreamingResponse)
+                    and resposta.status_code == 200
+                    and isinstance(corpo, bytes)
+                    # os dados mudaram durante a renderização: não guardar
+                    and versao_dados() == versao
+                ):
+                    if versao != _versao_em_cache:
+                        # Respostas de versões anteriores já não voltam a servir
+                        _respostas.clear()
+                        _versao_em_cache = versao
+                    cabecalhos = {
+                        k: v for k, v in resposta.headers.items() if k.lower() not in ("content-length", "content-type")
+                    }
+                    _respostas[chave] = (corpo, resposta.media_type or "text/html", cabecalhos)
+                    while len(_respostas) > MAXIMO_ENTRADAS:
+                        _respostas.popitem(last=False)
+            return resposta
+
+        return rota
+
+    return decorador
+
+
+def limpar() -> None:
+    with _lock:
+        _respostas.clear()
+
+
+def estatisticas() -> Dict[str, Any]:
+    """{rota: {hits, misses, taxa_hits, entradas}} e o total de entradas em cache."""
+    with _lock:
+        entradas: Dict[str, int] = {}
+        for chave in _respostas:
+            entradas[chave[0]] = entradas.get(chave[0], 0) + 1
+        rotas = {}
+        for nome, contadores in sorted(_estatisticas.items()):
+            pedidos = contadores["hits"] + contadores["misses"]
+            rotas[nome] = {
+                **contadores,
+                "taxa_hits": round(contadores["hits"] / pedidos, 4) if pedidos else 0.0,
+                "entradas": entradas.get(nome, 0),
+            }
+        return {"ativa": CACHE_PAGINAS_ATIVA, "versao_dados": versao_dados(), "entradas": len(_respostas), "rotas": rotas}
@@ -5,7 +5,6 @@ from fastapi import APIRouter, Form, Request, UploadFile, File, HTTPException, B
 from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse
 from fastapi.templating import Jinja2Templates
 from io import BytesIO
-from openpyxl import load_workbook
 
 from dados import estado, guardar_dados
 
@@ -247,7 +246,7 @@ async def adicionar_cliente(
             "com_fatura": (com_fatura == "sim"),
         }
     )
-    guardar_dados()
+    guardar_dados("clientes")
     # Depois de gravar, volta à lista e faz scroll ao cliente pelo NIF
     return RedirectResponse(url=f"/clientes#cliente-{nif_limpo}", status_code=303)
 
@@ -307,7 +306,7 @@ async def atualizar_cliente(
             "regime_iva": regime_iva.strip() or None,
             "com_fatura": (com_fatura == "sim"),
         }
-        guardar_dados()
+        guardar_dados("clientes")
         # Depois de gravar, volta à lista e faz scroll ao cliente pelo NIF
         return RedirectResponse(url=f"/clientes#cliente-{nif_limpo}", status_code=303)
 
@@ -328,6 +327,8 @@ async def importar_clientes_excel(ficheiro: UploadFile = File(...)):
         raise HTTPException(status_code=400, detail="Ficheiro inválido. Use um Excel (.xlsx/.xls).")
 
     dados_bytes = await ficheiro.read()
+    from openpyxl import load_workbook  # importado só aqui: o openpyxl pesa no arranque
+
     wb = load_workbook(filename=BytesIO(dados_bytes), data_only=True)
     ws = wb.active
 
@@ -354,6 +355,13 @@ async def importar_clientes_excel(ficheiro: UploadFile = File(...)):
     dados_local = estado if isinstance(estado, dict) else {}
     lista = dados_local.setdefault("clientes", [])
 
+    # NIF -> posição do primeiro cliente com esse NIF (evita percorrer a lista por linha)
+    pos_por_nif: Dict[str, int] = {}
+    for i, c in enumerate(lista):
+        nif_existente = (c.get("nif") or "").strip()
+        if nif_existente:
+            pos_por_nif.setdefault(nif_existente, i)
+
     def to_float(v):
         try:
             return float(v)
@@ -408,18 +416,15 @@ async def importar_clientes_excel(ficheiro: UploadFile = File(...)):
         }
 
         # Se já existir cliente com o mesmo NIF, atualiza; senão adiciona
-        atualizado = False
-        if nif:
-            for i, c in enumerate(lista):
-                if (c.get("nif") or "").strip() == nif:
-                    lista[i] = cliente_novo
-                    atualizado = True
-                    break
-
-        if not atualizado:
+        pos = pos_por_nif.get(nif) if nif else None
+        if pos is not None:
+            lista[pos] = cliente_novo
+        else:
             lista.append(cliente_novo)
+            if nif:
+                pos_por_nif[nif] = len(lista) - 1
 
-    guardar_dados()
+    guardar_dados("clientes")
     return RedirectResponse(url="/clientes", status_code=303)
 
 
@@ -641,7 +646,7 @@ async def sincronizar_clientes_api(payload: Any = Body(...)):
         },
     )
 
-    guardar_dados()
+    guardar_dados("clientes", "timings_dados")
 
     return {
         "ok": True,
@@ -659,7 +664,7 @@ async def remover_cliente(idx: int):
     clientes = estado.get("clientes", [])
     if 0 <= idx < len(clientes):
         clientes.pop(idx)
-        guardar_dados()
+        guardar_dados("clientes")
     return RedirectResponse(url="/clientes", status_code=303)
 
 
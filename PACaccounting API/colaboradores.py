@@ -210,7 +210,7 @@ async def criar_colaborador(
         outras_despesas,
     )
     colaboradores.append(novo)
-    guardar_dados()
+    guardar_dados("colaboradores")
     return RedirectResponse(url="/colaboradores", status_code=303)
 
 
@@ -283,7 +283,7 @@ async def atualizar_colaborador_detalhe(
             seguro_calc,
             outras_despesas,
         )
-        guardar_dados()
+        guardar_dados("colaboradores")
 
     return RedirectResponse(url="/colaboradores", status_code=303)
 
@@ -297,7 +297,7 @@ async def excluir_colaborador(idx: int):
     colaboradores = _obter_lista_colaboradores()
     if 0 <= idx < len(colaboradores):
         colaboradores.pop(idx)
-        guardar_dados()
+        guardar_dados("colaboradores")
     return RedirectResponse(url="/colaboradores", status_code=303)
 
 
@@ -344,7 +344,7 @@ async def adicionar_colaborador(
         outras_despesas=0.0,
     )
     colaboradores.append(novo)
-    guardar_dados()
+    guardar_dados("colaboradores")
     return RedirectResponse(url="/colaboradores", status_code=303)
 
 
@@ -390,7 +390,7 @@ async def atualizar_colaborador(
             seguro=seguro_calc,
             outras_despesas=outras_existente,
         )
-        guardar_dados()
+        guardar_dados("colaboradores")
     return RedirectResponse(url="/colaboradores", status_code=303)
 
 
@@ -402,5 +402,5 @@ async def remover_colaborador(idx: int):
     colaboradores = _obter_lista_colaboradores()
     if 0 <= idx < len(colaboradores):
         colaboradores.pop(idx)
-        guardar_dados()
+        guardar_dados("colaboradores")
     return RedirectResponse(url="/colaboradores", status_code=303)
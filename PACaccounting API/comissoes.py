@@ -13,19 +13,32 @@ from io import BytesIO
 from pathlib import Path
 from typing import Dict, List, Tuple
 import unicodedata
-import json
+import re
+import shutil
+import threading
 
-from fastapi import APIRouter, HTTPException, Request
+from fastapi import APIRouter, Form, HTTPException, Request
 from fastapi.responses import HTMLResponse, RedirectResponse, StreamingResponse
 from fastapi.templating import Jinja2Templates
 
-from dados import estado
+import comissoes_motor
+import exportacao
+import exportacao_excel
+import recursos_exportacao
+from dados import agendar_escrita_ficheiro, checkpoint, estado, ficheiro_pendente, ler_json_cache, registar_alteracao
+from normalizacao import memoizar, tabela_alterada
 
 router = APIRouter()
 templates = Jinja2Templates(directory="templates")
 
 BASE_DIR = Path(__file__).resolve().parent
+# Ficheiro antigo (todos os meses num só JSON); só é lido até correr a migração
 DATA_FILE = BASE_DIR / "comissoes_dados.json"
+# Um ficheiro por mês (AAAA-MM.json) + manifesto com os totais de cada mês
+MESES_DIR = BASE_DIR / "comissoes_meses"
+MANIFESTO_FILE = MESES_DIR / "manifesto.json"
+MANIFESTO_VERSION = 1
+_MES_RE = re.compile(r"\d{4}-(0[1-9]|1[0-2])")
 
 ALBERTINA_CARTEIRA = "M Albertina Alves"
 ALBERTINA_TARGET_NIFS = {"233884025", "207258120", "208392793", "184169968"}
@@ -110,29 +123,75 @@ _PIL_FONT_PATHS = {
 }
 
 
-def _load_pillow_font(size: int, bold: bool = False):
-    paths = _PIL_FONT_PATHS[bool(bold)]
-    for path in paths:
-        try:
-            from PIL import ImageFont  # imported lazily to avoid module cost if unused
+# PNG por carteira: Arial e, sem ela, DejaVu
+_PNG_CARTEIRA_FONTES = ("arial.ttf", "DejaVuSans.ttf")
 
-            return ImageFont.truetype(path, size)
-        except Exception:
-            continue
-    try:
-        from PIL import ImageFont
 
-        return ImageFont.load_default()
+def _load_pillow_font(size: int, bold: bool = False):
+    # Ficheiro resolvido e fonte lida uma vez por processo (recursos_exportacao)
+    try:
+        return recursos_exportacao.fonte_pillow(_PIL_FONT_PATHS[bool(bold)], size)
     except Exception:
         return None
 
 
+def _estilo_titulo_pdf(nome: str):
+    from reportlab.lib.colors import HexColor
+    from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+
+    styles = getSampleStyleSheet()
+    return ParagraphStyle(
+        name=nome,
+        parent=styles["Heading1"],
+        fontName="Helvetica-Bold",
+        fontSize=16,
+        textColor=HexColor(GOLD_HEX),
+        leading=20,
+        spaceAfter=14,
+    )
+
+
+def _estilo_tabela_pdf():
+    from reportlab.lib.colors import HexColor
+    from reportlab.platypus import TableStyle
+
+    return TableStyle([
+        ("BACKGROUND", (0, 0), (-1, 0), HexColor(GOLD_HEX)),
+        ("TEXTCOLOR", (0, 0), (-1, 0), HexColor(DARK_HEX)),
+        ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
+        ("FONTSIZE", (0, 0), (-1, 0), 11),
+        ("ALIGN", (1, 0), (-1, 0), "CENTER"),
+        ("BACKGROUND", (0, -1), (-1, -1), HexColor(GOLD_HEX)),
+        ("TEXTCOLOR", (0, -1), (-1, -1), HexColor(DARK_HEX)),
+        ("FONTNAME", (0, -1), (-1, -1), "Helvetica-Bold"),
+        ("ALIGN", (1, -1), (-1, -1), "CENTER"),
+        ("ALIGN", (0, 0), (0, -1), "LEFT"),
+        ("ALIGN", (1, 1), (-1, -2), "CENTER"),
+        ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
+        ("GRID", (0, 0), (-1, -1), 0.5, HexColor(GRID_HEX)),
+        ("LEFTPADDING", (0, 0), (-1, -1), 10),
+        ("RIGHTPADDING", (0, 0), (-1, -1), 10),
+        ("TOPPADDING", (0, 0), (-1, -1), 8),
+        ("BOTTOMPADDING", (0, 0), (-1, -1), 8),
+    ])
+
+
+# Fontes e estilos das exportações, carregados no arranque (recursos_exportacao.aquecer)
+recursos_exportacao.registar_fonte_pillow(_PIL_FONT_PATHS[True], 36, 22, 18)
+recursos_exportacao.registar_fonte_pillow(_PIL_FONT_PATHS[False], 18)
+recursos_exportacao.registar_fonte_pillow(_PNG_CARTEIRA_FONTES, 28, 18, 16)
+recursos_exportacao.registar_estilo("comissoes.titulo_carteira", lambda: _estilo_titulo_pdf("CarteiraTitle"))
+recursos_exportacao.registar_estilo("comissoes.titulo_resumo", lambda: _estilo_titulo_pdf("ResumoTitle"))
+recursos_exportacao.registar_estilo("comissoes.tabela", _estilo_tabela_pdf)
+
+
 def _normalize_spaces(text: str) -> str:
     if text is None:
         return ""
     return " ".join(str(text).replace("\xa0", " ").split())
 
 
+@memoizar("comissoes._carteira_alias_key")
 def _carteira_alias_key(valor: str) -> str:
     base = _normalize_spaces(valor)
     if not base:
@@ -150,8 +209,10 @@ for canonical, aliases in CARTEIRA_ALIASES.items():
         key = _carteira_alias_key(alias)
         if key:
             CARTEIRA_ALIAS_MAP[key] = canonical
+tabela_alterada("CARTEIRA_ALIASES")
 
 
+@memoizar("comissoes._canonical_carteira", tabelas=("CARTEIRA_ALIASES",))
 def _canonical_carteira(valor: str) -> str:
     base = _normalize_spaces(valor)
     if not base:
@@ -224,17 +285,265 @@ def _fmt_euro(valor: Decimal) -> str:
     return f"{inteiro_fmt},{decimal} €"
 
 
-def _load_store() -> dict:
-    if not DATA_FILE.exists():
-        return {}
+def _mes_valido(mes: str) -> bool:
+    # Também dá nome aos ficheiros dos meses: só AAAA-MM com mês 01-12
+    return bool(_MES_RE.fullmatch(mes or ""))
+
+
+def _ficheiro_mes(mes: str) -> Path:
+    return MESES_DIR / f"{mes}.json"
+
+
+def _ler_json(caminho: Path):
+    # Uma gravação ainda na fila da thread de escrita é mais recente que o ficheiro
+    pendente = ficheiro_pendente(caminho)
+    if pendente is not None:
+        return pendente
+    return ler_json_cache(caminho)
+
+
+def _load_legacy_store() -> dict:
+    """Meses do ficheiro antigo comissoes_dados.json (partilhado: não alterar)."""
+    store = _ler_json(DATA_FILE)
+    return store if isinstance(store, dict) else {}
+
+
+def _ler_manifesto() -> dict:
+    manifesto = _ler_json(MANIFESTO_FILE)
+    if not isinstance(manifesto, dict) or not isinstance(manifesto.get("meses"), dict):
+        return {"versao": MANIFESTO_VERSION, "meses": {}}
+    return manifesto
+
+
+def _ler_mes(mes: str) -> dict | None:
+    """
+    Registo guardado do mês (partilhado: não alterar) ou None. Sem ficheiro
+    do mês, recorre ao ficheiro antigo enquanto a migração não correr.
+    """
+    if not _mes_valido(mes):
+        return None
+    registo = _ler_json(_ficheiro_mes(mes))
+    if isinstance(registo, dict):
+        return registo
+    registo = _load_legacy_store().get(mes)
+    return registo if isinstance(registo, dict) else None
+
+
+def _meses_guardados() -> List[str]:
+    meses = set(_ler_manifesto()["meses"]) | set(_load_legacy_store())
+    return sorted(mes for mes in meses if _mes_valido(mes))
+
+
+def _resumo_manifesto(registo: dict) -> dict:
+    return {
+        "schema_version": registo.get("schema_version", 1),
+        "updated_at": registo.get("updated_at"),
+        "clientes": len(registo.get("rows") or {}),
+        "totais": registo.get("totais") or {},
+    }
+
+
+def _gravar_meses(registos: Dict[str, dict]) -> None:
+    """Grava os ficheiros dos meses (escrita atómica) e atualiza o manifesto de uma vez."""
+    MESES_DIR.mkdir(parents=True, exist_ok=True)
+    manifesto = _ler_manifesto()
+    meses = dict(manifesto["meses"])
+    for mes, registo in registos.items():
+        agendar_escrita_ficheiro(_ficheiro_mes(mes), registo, indent=2)
+        meses[mes] = _resumo_manifesto(registo)
+        _atualizar_rollup(mes, registo)
+    agendar_escrita_ficheiro(
+        MANIFESTO_FILE,
+        {"versao": MANIFESTO_VERSION, "meses": dict(sorted(meses.items()))},
+        indent=2,
+    )
+    registar_alteracao()
+
+
+def _migrar_store_para_meses() -> Tuple[bool, str]:
+    """
+    Migração manual: passa os meses do ficheiro antigo para um ficheiro por
+    mês e atualiza os registos guardados com um schema anterior (o que a
+    página fazia ao abrir o mês). O ficheiro antigo fica como backup.
+    """
+    legacy = _load_legacy_store()
+    meses = _meses_guardados()
+    invalidos = sorted(mes for mes in legacy if not _mes_valido(mes))
+
+    registos: Dict[str, dict] = {}
+    for mes in meses:
+        atual = _ler_json(_ficheiro_mes(mes))
+        atualizado = _compor_mes(mes)[4]
+        if atualizado is not None:
+            registos[mes] = atualizado
+        elif not isinstance(atual, dict):
+            registos[mes] = _ler_mes(mes)
+
+    if registos:
+        _gravar_meses(registos)
+
+    backup_path = None
+    if DATA_FILE.exists():
+        # O ficheiro antigo só sai quando os meses já estão em disco
+        checkpoint()
+        timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        backup_path = f"{DATA_FILE}.bak.{timestamp}"
+        try:
+            shutil.move(str(DATA_FILE), backup_path)
+        except Exception as exc:
+            return False, f"meses gravados, mas não foi possível mover {DATA_FILE.name}: {exc}"
+
+    mensagem = f"meses={len(meses)}, gravados={len(registos)}, backup={backup_path}"
+    if invalidos:
+        mensagem += f", ignorados (mês inválido)={invalidos}"
+    return True, mensagem
+
+
+# ========= ROLLUPS POR CARTEIRA E MÊS =========
+#
+# {mes: {carteira: {"mensalidades", "recebido", "comissao"}}} com os totais
+# gravados de cada mês (os do manifesto, ou do ficheiro antigo antes da
+# migração). Montado uma vez e atualizado por _gravar_meses, por isso as
+# análises de vários meses nunca voltam a ler os registos nem os clientes.
+# Os totais são os do momento em que o mês foi guardado.
+
+_rollup_lock = threading.Lock()
+_ROLLUP: Dict[str, Dict[str, Dict[str, Decimal | int]]] | None = None
+
+
+def _totais_vazios() -> Dict[str, Decimal | int]:
+    return {"mensalidades": 0, "recebido": Decimal("0"), "comissao": Decimal("0")}
+
+
+def _decimal(valor) -> Decimal:
     try:
-        return json.loads(DATA_FILE.read_text(encoding="utf-8"))
-    except Exception:
-        return {}
+        return Decimal(str(valor or "0"))
+    except (InvalidOperation, ValueError):
+        return Decimal("0")
+
+
+def _totais_do_registo(registo: dict) -> Dict[str, Dict[str, Decimal | int]]:
+    """Totais por carteira de um registo gravado (dos 'totais' ou, sem eles, das linhas)."""
+    totais: Dict[str, Dict[str, Decimal | int]] = {}
+    por_carteira = (registo.get("totais") or {}).get("por_carteira")
+    if isinstance(por_carteira, dict):
+        for carteira, valores in por_carteira.items():
+            totais[carteira] = {
+                "mensalidades": _safe_int((valores or {}).get("mensalidades"), 0),
+                "recebido": _decimal((valores or {}).get("recebido")),
+                "comissao": _decimal((valores or {}).get("comissao")),
+            }
+        return totais
+
+    for linha in (registo.get("rows") or {}).values():
+        if not isinstance(linha, dict):
+            continue
+        valores = totais.setdefault(str(linha.get("carteira") or ""), _totais_vazios())
+        valores["mensalidades"] += _safe_int(linha.get("num_mensalidades"), 0)
+        valores["recebido"] += _decimal(linha.get("valor_recebido"))
+        valores["comissao"] += _decimal(linha.get("comissao"))
+    return totais
+
+
+def _rollup() -> Dict[str, Dict[str, Dict[str, Decimal | int]]]:
+    global _ROLLUP
+    with _rollup_lock:
+        if _ROLLUP is not None:
+            return _ROLLUP
+
+    manifesto = _ler_manifesto()["meses"]
+    rollup = {}
+    for mes in _meses_guardados():
+        entrada = manifesto.get(mes)
+        registo = {"totais": entrada.get("totais")} if isinstance(entrada, dict) and entrada.get("totais") else _ler_mes(mes)
+        rollup[mes] = _totais_do_registo(registo or {})
+
+    with _rollup_lock:
+        if _ROLLUP is None:
+            _ROLLUP = rollup
+        return _ROLLUP
+
+
+def _atualizar_rollup(mes: str, registo: dict) -> None:
+    totais = _totais_do_registo(registo)
+    with _rollup_lock:
+        if _ROLLUP is not None:
+            _ROLLUP[mes] = totais
+
+
+def _janela_meses(periodo: str, mes: str) -> List[str]:
+    """Meses do período que termina em 'mes': 'ytd' (desde janeiro) ou '12-meses'."""
+    ano, numero = int(mes[:4]), int(mes[5:7])
+    if not 1 <= numero <= 12:
+        raise ValueError(f"Mês inválido: {mes}")
+    if periodo == "ytd":
+        return [f"{ano:04d}-{m:02d}" for m in range(1, numero + 1)]
+    indice = ano * 12 + numero - 1
+    return [f"{i // 12:04d}-{i % 12 + 1:02d}" for i in range(indice - 11, indice + 1)]
+
+
+def _analise_periodo(periodo: str, mes: str) -> dict:
+    """Totais por carteira, por mês e gerais do período (no máximo 12 consultas ao rollup)."""
+    janela = _janela_meses(periodo, mes)
+    rollup = _rollup()
+
+    totais_por_carteira = {carteira: _totais_vazios() for carteira in sorted(ALLOWED_CARTEIRAS)}
+    total_geral = _totais_vazios()
+    por_mes: Dict[str, Dict[str, Decimal | int]] = {}
+    meses_com_dados: List[str] = []
+
+    for mes_janela in janela:
+        totais_mes = rollup.get(mes_janela)
+        total_mes = _totais_vazios()
+        if totais_mes is not None:
+            meses_com_dados.append(mes_janela)
+            for carteira, valores in totais_mes.items():
+                acumulado = totais_por_carteira.setdefault(carteira, _totais_vazios())
+                for campo in ("mensalidades", "recebido", "comissao"):
+                    acumulado[campo] += valores[campo]
+                    total_mes[campo] += valores[campo]
+        por_mes[mes_janela] = total_mes
+        for campo in ("mensalidades", "recebido", "comissao"):
+            total_geral[campo] += total_mes[campo]
+
+    return {
+        "periodo": periodo,
+        "inicio": janela[0],
+        "fim": janela[-1],
+        "meses_com_dados": meses_com_dados,
+        "totais_por_carteira": totais_por_carteira,
+        "total_geral": total_geral,
+        "por_mes": por_mes,
+    }
 
 
-def _save_store(store: dict) -> None:
-    DATA_FILE.write_text(json.dumps(store, ensure_ascii=False, indent=2), encoding="utf-8")
+def _mes_analise(mes: str | None) -> str:
+    """Mês final da análise (por omissão o atual); 400 se não for um AAAA-MM real."""
+    mes = mes or date.today().strftime("%Y-%m")
+    try:
+        if not _mes_valido(mes):
+            raise ValueError(mes)
+        datetime.strptime(mes, "%Y-%m")
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Mês inválido (formato AAAA-MM).")
+    return mes
+
+
+def _analise_json(periodo: str, mes: str | None) -> dict:
+    mes = _mes_analise(mes)
+    analise = _analise_periodo(periodo, mes)
+    serializado = _serialize_totals(analise["totais_por_carteira"], analise["total_geral"])
+    return {
+        "periodo": periodo,
+        "inicio": analise["inicio"],
+        "fim": analise["fim"],
+        "meses_com_dados": analise["meses_com_dados"],
+        **serializado,
+        "por_mes": {
+            mes_janela: _serialize_totals({}, total)["total_geral"]
+            for mes_janela, total in analise["por_mes"].items()
+        },
+    }
 
 
 def _get_field(dados: dict, *chaves, default=None):
@@ -269,43 +578,55 @@ def _clamp_mensalidades(valor: int) -> int:
     return valor
 
 
-def _get_clientes_filtrados() -> List[dict]:
-    clientes = estado.get("clientes", []) or []
-    linhas: List[dict] = []
+def _chave_carteira_cliente(cliente: dict) -> str:
+    return _canonical_carteira(_extract_carteira_raw(cliente))
 
-    for cliente in clientes:
-        nif = str(_get_field(cliente, "nif", "NIF", "vat", default="")).strip()
-        nome = str(_get_field(cliente, "nome", "Nome", "cliente", default="")).strip()
 
-        carteira_raw = _extract_carteira_raw(cliente)
-        carteira = _canonical_carteira(carteira_raw)
+def _cliente_carteira(cliente) -> comissoes_motor.ResultadoCliente:
+    """Regra "carteiras" do motor de comissões: só clientes das carteiras permitidas."""
+    if not isinstance(cliente, dict):
+        return None
 
-        if carteira not in ALLOWED_CARTEIRAS:
-            continue
+    carteira = _chave_carteira_cliente(cliente)
+    if carteira not in ALLOWED_CARTEIRAS:
+        return None
 
-        tecnico_raw = _get_field(cliente, *TECNICO_FIELD_CANDIDATES, default="")
-        tecnico_canonical = _canonical_carteira(tecnico_raw)
-        tecnico = tecnico_canonical if tecnico_canonical else _norm_nome(tecnico_raw)
+    nif = str(_get_field(cliente, "nif", "NIF", "vat", default="")).strip()
+    nome = str(_get_field(cliente, "nome", "Nome", "cliente", default="")).strip()
 
-        mensalidade = _parse_euro(_get_field(cliente, "mensalidade", "Mensalidade", default=0))
-        grh = _parse_euro(_get_field(cliente, "grh", "GRH", default=0))
+    tecnico_raw = _get_field(cliente, *TECNICO_FIELD_CANDIDATES, default="")
+    tecnico_canonical = _canonical_carteira(tecnico_raw)
+    tecnico = tecnico_canonical if tecnico_canonical else _norm_nome(tecnico_raw)
 
-        taxa = Decimal("0.30") if carteira and tecnico_canonical == carteira else Decimal("0.20")
+    mensalidade = _parse_euro(_get_field(cliente, "mensalidade", "Mensalidade", default=0))
+    grh = _parse_euro(_get_field(cliente, "grh", "GRH", default=0))
 
-        linhas.append(
-            {
-                "nif": nif,
-                "nome": nome,
-                "carteira": carteira,
-                "tecnico": tecnico,
-                "mensalidade": mensalidade,
-                "grh": grh,
-                "taxa": taxa,
-            }
-        )
+    taxa = Decimal("0.30") if carteira and tecnico_canonical == carteira else Decimal("0.20")
+
+    linha = {
+        "nif": nif,
+        "nome": nome,
+        "carteira": carteira,
+        "tecnico": tecnico,
+        "mensalidade": mensalidade,
+        "grh": grh,
+        "taxa": taxa,
+    }
+    # Comissão de referência: uma mensalidade recebida no mês
+    return linha, [(carteira, mensalidade * taxa)]
 
-    linhas.sort(key=_cliente_sort_key)
-    return linhas
+
+comissoes_motor.registar_regra(
+    "carteiras",
+    _cliente_carteira,
+    ordenar=lambda linhas: linhas.sort(key=_cliente_sort_key),
+    zero=Decimal("0"),
+)
+
+
+def _get_clientes_filtrados() -> List[dict]:
+    # Linhas partilhadas com a cache do motor: quem as usa copia antes de alterar
+    return list(comissoes_motor.resultado("carteiras")["clientes"])
 
 
 def _compose_row(cliente: dict, guardado: dict | None, force_reset: bool = False) -> Tuple[dict, dict, bool]:
@@ -466,8 +787,23 @@ def _looks_like_auto_prefill(guardados: Dict[str, dict], clientes: List[dict]) -
 def _get_month_rows(
     mes: str,
 ) -> Tuple[List[dict], Dict[str, Dict[str, Decimal | int]], Dict[str, Decimal | int], str | None]:
-    store = _load_store()
-    registo = store.get(mes, {}) or {}
+    # Guardado até os dados mudarem (clientes, comissoes_dados.json, ...); não alterar o resultado
+    return comissoes_motor.resultado_mes("carteiras", mes, lambda: _calcular_mes(mes))
+
+
+def _calcular_mes(
+    mes: str,
+) -> Tuple[List[dict], Dict[str, Dict[str, Decimal | int]], Dict[str, Decimal | int], str | None]:
+    # Só leitura: os registos desatualizados só são regravados pela migração
+    return _compor_mes(mes)[:4]
+
+
+def _compor_mes(
+    mes: str,
+) -> Tuple[List[dict], Dict[str, Dict[str, Decimal | int]], Dict[str, Decimal | int], str | None, dict | None]:
+    """Linhas e totais do mês e, se o registo guardado precisa de ser atualizado, o registo novo."""
+    guardado_mes = _ler_mes(mes)
+    registo = guardado_mes or {}
     guardados_original = registo.get("rows") or {}
     schema_version = registo.get("schema_version", 1)
 
@@ -489,17 +825,20 @@ def _get_month_rows(
 
     totais_por_carteira, total_geral = _calc_totais(linhas)
 
-    schema_upgrade_needed = (mes in store) and schema_version < SCHEMA_VERSION
+    schema_upgrade_needed = (guardado_mes is not None) and schema_version < SCHEMA_VERSION
 
+    atualizado = None
     if needs_save or schema_upgrade_needed:
-        registo["rows"] = guardados
-        registo["totais"] = _serialize_totals(totais_por_carteira, total_geral)
-        registo["schema_version"] = SCHEMA_VERSION
-        store[mes] = registo
-        _save_store(store)
+        atualizado = {
+            **registo,
+            "rows": guardados,
+            "totais": _serialize_totals(totais_por_carteira, total_geral),
+            "schema_version": SCHEMA_VERSION,
+        }
+        registo = atualizado
 
     updated_at = registo.get("updated_at") if registo else None
-    return linhas, totais_por_carteira, total_geral, updated_at
+    return linhas, totais_por_carteira, total_geral, updated_at, atualizado
 
 
 def _get_resumo_por_carteira(mes: str) -> Tuple[List[dict], Dict[str, Decimal | int], str | None]:
@@ -574,6 +913,7 @@ def comissoes_view(request: Request, mes: str | None = None):
             "totais_por_carteira": totais_por_carteira,
             "total_geral": total_geral,
             "updated_at": updated_at,
+            "migracao_pendente": DATA_FILE.exists(),
             "fmt_euro": _fmt_euro,
             "max_mensalidades": MAX_MENSALIDADES,
         },
@@ -584,6 +924,8 @@ def comissoes_view(request: Request, mes: str | None = None):
 async def comissoes_guardar(request: Request):
     form = await request.form()
     mes = (form.get("mes") or "").strip() or date.today().strftime("%Y-%m")
+    if not _mes_valido(mes):
+        raise HTTPException(status_code=400, detail="Mês inválido (formato AAAA-MM).")
 
     clientes = _get_clientes_filtrados()
     linhas_store: Dict[str, dict] = {}
@@ -623,19 +965,29 @@ async def comissoes_guardar(request: Request):
 
     totais_por_carteira, total_geral = _calc_totais(linhas_view)
 
-    store = _load_store()
-    store[mes] = {
+    registo = {
         "schema_version": SCHEMA_VERSION,
         "updated_at": datetime.now().isoformat(timespec="seconds"),
         "module_version": VERSION_TAG,
         "rows": linhas_store,
         "totais": _serialize_totals(totais_por_carteira, total_geral),
     }
-    _save_store(store)
+    _gravar_meses({mes: registo})
 
     return RedirectResponse(url=f"/comissoes?mes={mes}", status_code=303)
 
 
+@router.post("/comissoes/migrar-meses")
+async def comissoes_migrar_meses(mes: str | None = Form(None)):
+    """Executa a migração manual para um ficheiro por mês e volta à página."""
+    sucesso, mensagem = _migrar_store_para_meses()
+    prefixo = "concluída" if sucesso else "falhou"
+    print(f"[COMISSOES] Migração manual {prefixo}: {mensagem}")
+
+    sufixo = f"?mes={mes}" if mes and _mes_valido(mes) else ""
+    return RedirectResponse(url=f"/comissoes{sufixo}", status_code=303)
+
+
 @router.get("/comissoes/exportar-excel")
 def comissoes_exportar_excel(mes: str | None = None):
     if not mes:
@@ -661,17 +1013,22 @@ def comissoes_exportar_excel(mes: str | None = None):
         )
 
     try:
-        from openpyxl import Workbook
-        from openpyxl.utils import get_column_letter
+        import openpyxl  # noqa: F401
     except Exception:
         return HTMLResponse(
             "openpyxl não está instalado. Instala com: pip install openpyxl",
             status_code=500,
         )
 
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Comissões"
+    return exportacao_excel.resposta_xlsx(
+        lambda: _livro_comissoes_excel(mes, linhas, updated_at, export_rows),
+        f"comissoes_{mes}.xlsx",
+    )
+
+
+def _livro_comissoes_excel(mes: str, linhas: List[dict], updated_at: str | None, export_rows: List[dict]):
+    wb = exportacao_excel.novo_livro({})
+    ws = wb.create_sheet("Comissões")
 
     headers = list(export_rows[0].keys()) if export_rows else [
         "Carteira",
@@ -685,17 +1042,12 @@ def comissoes_exportar_excel(mes: str | None = None):
         "Taxa %",
         "Comissão (€)",
     ]
-    ws.append(headers)
+    valores = [[row[col] for col in headers] for row in export_rows]
 
-    for row in export_rows:
-        ws.append([row[col] for col in headers])
-
-    for idx, header in enumerate(headers, start=1):
-        max_len = max(
-            [len(str(header))]
-            + [len(str(ws.cell(row=i, column=idx).value or "")) for i in range(2, ws.max_row + 1)]
-        )
-        ws.column_dimensions[get_column_letter(idx)].width = min(max(12, max_len + 2), 40)
+    exportacao_excel.definir_larguras(ws, [headers] + valores, [12] * len(headers), 40)
+    ws.append(headers)
+    for row in valores:
+        ws.append(row)
 
     ws_totais = wb.create_sheet("Sumário")
     ws_totais.append(["Mês", mes])
@@ -723,17 +1075,7 @@ def comissoes_exportar_excel(mes: str | None = None):
         float(total_geral["recebido"]),
         float(total_geral["comissao"]),
     ])
-
-    buffer = BytesIO()
-    wb.save(buffer)
-    buffer.seek(0)
-
-    filename = f"comissoes_{mes}.xlsx"
-    return StreamingResponse(
-        buffer,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
-    )
+    return wb
 
 
 @router.get("/comissoes/exportar-excel-carteira")
@@ -747,55 +1089,51 @@ def comissoes_exportar_excel_carteira(mes: str | None = None, carteira: str | No
     carteira_norm, linhas_carteira = _filtrar_por_carteira(linhas, carteira)
 
     try:
-        from openpyxl import Workbook
-        from openpyxl.utils import get_column_letter
+        import openpyxl  # noqa: F401
     except Exception:
         return HTMLResponse(
             "openpyxl não está instalado. Instala com: pip install openpyxl",
             status_code=500,
         )
 
-    wb = Workbook()
-    ws = wb.active
-    ws.title = carteira_norm
+    return exportacao_excel.resposta_xlsx(
+        lambda: _livro_carteira_excel(mes, carteira_norm, linhas_carteira),
+        f"comissoes_{mes}_{_slugify_filename(carteira_norm)}.xlsx",
+    )
+
+
+def _render_carteira_excel(mes: str, carteira_norm: str, linhas_carteira: List[dict]) -> BytesIO:
+    return exportacao_excel.para_bytes(_livro_carteira_excel(mes, carteira_norm, linhas_carteira))
+
 
-    ws.append(["Cliente", "Valor recebido (€)", "Comissão (€)"])
+def _livro_carteira_excel(mes: str, carteira_norm: str, linhas_carteira: List[dict]):
+    wb = exportacao_excel.novo_livro({})
+    ws = wb.create_sheet(carteira_norm)
 
     total_recebido = Decimal("0")
     total_comissao = Decimal("0")
 
+    valores = [["Cliente", "Valor recebido (€)", "Comissão (€)"]]
     for linha in linhas_carteira:
         total_recebido += linha["valor_recebido"]
         total_comissao += linha["comissao"]
-        ws.append([
+        valores.append([
             linha["nome"],
             float(linha["valor_recebido"]),
             float(linha["comissao"]),
         ])
 
-    ws.append([])
-    ws.append([
+    valores.append([])
+    valores.append([
         "Total",
         float(total_recebido),
         float(total_comissao),
     ])
 
-    for idx in range(1, 4):
-        max_len = max(
-            [len(str(ws.cell(row=i, column=idx).value or "")) for i in range(1, ws.max_row + 1)]
-        )
-        ws.column_dimensions[get_column_letter(idx)].width = min(max(18 if idx == 1 else 14, max_len + 2), 60)
-
-    buffer = BytesIO()
-    wb.save(buffer)
-    buffer.seek(0)
-
-    filename = f"comissoes_{mes}_{_slugify_filename(carteira_norm)}.xlsx"
-    return StreamingResponse(
-        buffer,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
-    )
+    exportacao_excel.definir_larguras(ws, valores, [18, 14, 14], 60)
+    for row in valores:
+        ws.append(row)
+    return wb
 
 
 @router.get("/comissoes/exportar-pdf")
@@ -809,17 +1147,28 @@ def comissoes_exportar_pdf(mes: str | None = None, carteira: str | None = None):
     carteira_norm, linhas_carteira = _filtrar_por_carteira(linhas, carteira)
 
     try:
-        from reportlab.lib.pagesizes import A4
-        from reportlab.lib.units import cm
-        from reportlab.lib.colors import HexColor
-        from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-        from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+        import reportlab  # noqa: F401
     except Exception:
         return HTMLResponse(
             "reportlab não está instalado. Instala com: pip install reportlab",
             status_code=500,
         )
 
+    buffer = _render_carteira_pdf(mes, carteira_norm, linhas_carteira)
+
+    filename = f"comissoes_{mes}_{_slugify_filename(carteira_norm)}.pdf"
+    return StreamingResponse(
+        buffer,
+        media_type="application/pdf",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+def _render_carteira_pdf(mes: str, carteira_norm: str, linhas_carteira: List[dict]) -> BytesIO:
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.units import cm
+    from reportlab.platypus import SimpleDocTemplate, Table, Paragraph, Spacer
+
     buffer = BytesIO()
     doc = SimpleDocTemplate(
         buffer,
@@ -830,16 +1179,7 @@ def comissoes_exportar_pdf(mes: str | None = None, carteira: str | None = None):
         bottomMargin=2 * cm,
     )
 
-    styles = getSampleStyleSheet()
-    title_style = ParagraphStyle(
-        name="CarteiraTitle",
-        parent=styles["Heading1"],
-        fontName="Helvetica-Bold",
-        fontSize=16,
-        textColor=HexColor(GOLD_HEX),
-        leading=20,
-        spaceAfter=14,
-    )
+    title_style = recursos_exportacao.estilo("comissoes.titulo_carteira")
 
     title = Paragraph(f"Comissões {mes} — {carteira_norm}", title_style)
 
@@ -865,38 +1205,14 @@ def comissoes_exportar_pdf(mes: str | None = None, carteira: str | None = None):
     col_widths = [doc.width * 0.5, doc.width * 0.25, doc.width * 0.25]
 
     tabela = Table(data, colWidths=col_widths, hAlign="LEFT")
-    tabela_style = TableStyle([
-        ("BACKGROUND", (0, 0), (-1, 0), HexColor(GOLD_HEX)),
-        ("TEXTCOLOR", (0, 0), (-1, 0), HexColor(DARK_HEX)),
-        ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
-        ("FONTSIZE", (0, 0), (-1, 0), 11),
-        ("ALIGN", (1, 0), (-1, 0), "CENTER"),
-        ("BACKGROUND", (0, -1), (-1, -1), HexColor(GOLD_HEX)),
-        ("TEXTCOLOR", (0, -1), (-1, -1), HexColor(DARK_HEX)),
-        ("FONTNAME", (0, -1), (-1, -1), "Helvetica-Bold"),
-        ("ALIGN", (1, -1), (-1, -1), "CENTER"),
-        ("ALIGN", (0, 0), (0, -1), "LEFT"),
-        ("ALIGN", (1, 1), (-1, -2), "CENTER"),
-        ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
-        ("GRID", (0, 0), (-1, -1), 0.5, HexColor(GRID_HEX)),
-        ("LEFTPADDING", (0, 0), (-1, -1), 10),
-        ("RIGHTPADDING", (0, 0), (-1, -1), 10),
-        ("TOPPADDING", (0, 0), (-1, -1), 8),
-        ("BOTTOMPADDING", (0, 0), (-1, -1), 8),
-    ])
+    tabela_style = recursos_exportacao.estilo("comissoes.tabela")
 
     tabela.setStyle(tabela_style)
 
     story = [title, Spacer(1, 12), tabela]
     doc.build(story)
     buffer.seek(0)
-
-    filename = f"comissoes_{mes}_{_slugify_filename(carteira_norm)}.pdf"
-    return StreamingResponse(
-        buffer,
-        media_type="application/pdf",
-        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
-    )
+    return buffer
 
 
 @router.get("/comissoes/exportar-png")
@@ -910,13 +1226,26 @@ def comissoes_exportar_png(mes: str | None = None, carteira: str | None = None):
     carteira_norm, linhas_carteira = _filtrar_por_carteira(linhas, carteira)
 
     try:
-        from PIL import Image, ImageDraw, ImageFont
+        import PIL  # noqa: F401
     except Exception:
         return HTMLResponse(
             "Pillow não está instalado. Instala com: pip install pillow",
             status_code=500,
         )
 
+    buffer = _render_carteira_png(mes, carteira_norm, linhas_carteira)
+
+    filename = f"comissoes_{mes}_{_slugify_filename(carteira_norm)}.png"
+    return StreamingResponse(
+        buffer,
+        media_type="image/png",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+def _render_carteira_png(mes: str, carteira_norm: str, linhas_carteira: List[dict]) -> BytesIO:
+    from PIL import Image, ImageDraw
+
     linhas_count = max(len(linhas_carteira), 1)
     linha_altura = 46
     largura = 900
@@ -927,18 +1256,9 @@ def comissoes_exportar_png(mes: str | None = None, carteira: str | None = None):
     imagem = Image.new("RGB", (largura, altura), "#020b1f")
     draw = ImageDraw.Draw(imagem)
 
-    def carregar_fonte(tamanho: int) -> ImageFont.FreeTypeFont | ImageFont.ImageFont:
-        try:
-            return ImageFont.truetype("arial.ttf", tamanho)
-        except Exception:
-            try:
-                return ImageFont.truetype("DejaVuSans.ttf", tamanho)
-            except Exception:
-                return ImageFont.load_default()
-
-    fonte_titulo = carregar_fonte(28)
-    fonte_cabecalho = carregar_fonte(18)
-    fonte_texto = carregar_fonte(16)
+    fonte_titulo = recursos_exportacao.fonte_pillow(_PNG_CARTEIRA_FONTES, 28)
+    fonte_cabecalho = recursos_exportacao.fonte_pillow(_PNG_CARTEIRA_FONTES, 18)
+    fonte_texto = recursos_exportacao.fonte_pillow(_PNG_CARTEIRA_FONTES, 16)
 
     draw.text((margem_esquerda, 20), f"Comissões {mes} - {carteira_norm}", fill="#fbbf24", font=fonte_titulo)
 
@@ -970,15 +1290,106 @@ def comissoes_exportar_png(mes: str | None = None, carteira: str | None = None):
     buffer = BytesIO()
     imagem.save(buffer, format="PNG")
     buffer.seek(0)
+    return buffer
 
-    filename = f"comissoes_{mes}_{_slugify_filename(carteira_norm)}.png"
+
+# Formatos do lote: extensão e função de render (por carteira)
+FORMATOS_LOTE = {
+    "pdf": ("pdf", "_render_carteira_pdf"),
+    "png": ("png", "_render_carteira_png"),
+    "excel": ("xlsx", "_render_carteira_excel"),
+}
+
+
+@router.get("/comissoes/exportar-lote")
+async def comissoes_exportar_lote(mes: str | None = None, formatos: str | None = None):
+    """
+    ZIP com os documentos de todas as carteiras do mês (PDF, PNG e Excel, ou
+    só os pedidos em 'formatos', separados por vírgulas). As linhas do mês
+    são calculadas uma vez; os documentos são gerados em paralelo.
+    """
+    if not mes:
+        mes = date.today().strftime("%Y-%m")
+
+    pedidos = [f.strip().lower() for f in (formatos or "pdf,png,excel").split(",") if f.strip()]
+    desconhecidos = [f for f in pedidos if f not in FORMATOS_LOTE]
+    if desconhecidos or not pedidos:
+        raise HTTPException(status_code=400, detail=f"Formatos inválidos: {', '.join(desconhecidos) or '—'} (pdf, png, excel)")
+
+    linhas, _, _, _ = _get_month_rows(mes)
+    por_carteira: Dict[str, List[dict]] = {carteira: [] for carteira in sorted(ALLOWED_CARTEIRAS)}
+    for linha in linhas:
+        if linha["carteira"] in por_carteira:
+            por_carteira[linha["carteira"]].append(linha)
+
+    tarefas = []
+    for carteira, linhas_carteira in por_carteira.items():
+        for formato in dict.fromkeys(pedidos):
+            extensao, funcao = FORMATOS_LOTE[formato]
+            nome = f"comissoes_{mes}_{_slugify_filename(carteira)}.{extensao}"
+            tarefas.append((nome, __name__, funcao, (mes, carteira, linhas_carteira)))
+
+    buffer = await exportacao.gerar_zip(tarefas)
+
+    filename = f"comissoes_{mes}_carteiras.zip"
     return StreamingResponse(
         buffer,
-        media_type="image/png",
+        media_type="application/zip",
         headers={"Content-Disposition": f'attachment; filename="{filename}"'},
     )
 
 
+def _estilos_resumo() -> Dict[str, dict]:
+    """Estilos nomeados das folhas de resumo: cabeçalho e total a azul escuro, carteiras a negrito."""
+    from openpyxl.styles import Alignment, Font, PatternFill
+
+    header_font = Font(bold=True, color="FFFFFF")
+    header_fill = PatternFill(start_color="10233F", end_color="10233F", fill_type="solid")
+    center_alignment = Alignment(horizontal="center", vertical="center")
+    left_alignment = Alignment(horizontal="left", vertical="center")
+
+    return {
+        "resumo_cabecalho_esq": {"font": header_font, "fill": header_fill, "alignment": left_alignment},
+        "resumo_cabecalho": {"font": header_font, "fill": header_fill, "alignment": center_alignment},
+        "resumo_nome": {"font": Font(bold=True), "alignment": left_alignment},
+        "resumo_valor": {"font": Font(bold=False), "alignment": center_alignment},
+        "resumo_total_esq": {"font": header_font, "fill": header_fill, "alignment": left_alignment},
+        "resumo_total": {"font": header_font, "fill": header_fill, "alignment": center_alignment},
+    }
+
+
+_FORMATOS_RESUMO = (None, "#,##0", '#,##0.00 "€"', '#,##0.00 "€"')
+
+
+def _folha_resumo(wb, titulo: str, cabecalho: List[str], linhas: List[list], total: list) -> None:
+    """
+    Folha de resumo (4 colunas): cabeçalho, uma linha por carteira/mês, linha
+    em branco e 'Total geral', com os estilos de _estilos_resumo().
+    """
+    ws = wb.create_sheet(titulo)
+    exportacao_excel.definir_larguras(ws, [cabecalho] + linhas + [total], [18, 14, 14, 14], 60)
+
+    def _linha(valores: list, estilo_nome: str, estilo_valor: str) -> list:
+        return [
+            exportacao_excel.celula(
+                ws,
+                valor,
+                estilo_nome if idx == 0 else estilo_valor,
+                _FORMATOS_RESUMO[idx] if valor is not None else None,
+            )
+            for idx, valor in enumerate(valores)
+        ]
+
+    ws.append([
+        exportacao_excel.celula(ws, valor, "resumo_cabecalho_esq" if idx == 0 else "resumo_cabecalho")
+        for idx, valor in enumerate(cabecalho)
+    ])
+    for linha in linhas:
+        ws.append(_linha(linha, "resumo_nome", "resumo_valor"))
+    ws.append([])
+    ws.append(_linha(total, "resumo_total_esq", "resumo_total"))
+
+
 @router.get("/comissoes/exportar-resumo-excel")
 def comissoes_exportar_resumo_excel(mes: str | None = None):
     if not mes:
@@ -987,91 +1398,42 @@ def comissoes_exportar_resumo_excel(mes: str | None = None):
     resumo, total_geral, updated_at = _get_resumo_por_carteira(mes)
 
     try:
-        from openpyxl import Workbook
-        from openpyxl.utils import get_column_letter
-        from openpyxl.styles import Alignment, Font, PatternFill
+        import openpyxl  # noqa: F401
     except Exception:
         return HTMLResponse(
             "openpyxl não está instalado. Instala com: pip install openpyxl",
             status_code=500,
         )
 
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Resumo"
-
-    ws.append(["Carteira", "Mensalidades", "Valor recebido", "Comissão"])
-    for linha in resumo:
-        ws.append([
-            linha["carteira"],
-            int(linha.get("mensalidades", 0)),
-            float(linha["recebido"]),
-            float(linha["comissao"]),
-        ])
-
-    ws.append([])
-    ws.append([
-        "Total geral",
-        int(total_geral.get("mensalidades", 0)),
-        float(total_geral["recebido"]),
-        float(total_geral["comissao"]),
-    ])
-
-    for idx in range(1, 5):
-        max_len = max(
-            [len(str(ws.cell(row=i, column=idx).value or "")) for i in range(1, ws.max_row + 1)]
+    def _construir():
+        wb = exportacao_excel.novo_livro(_estilos_resumo())
+        _folha_resumo(
+            wb,
+            "Resumo",
+            ["Carteira", "Mensalidades", "Valor recebido", "Comissão"],
+            [
+                [
+                    linha["carteira"],
+                    int(linha.get("mensalidades", 0)),
+                    float(linha["recebido"]),
+                    float(linha["comissao"]),
+                ]
+                for linha in resumo
+            ],
+            [
+                "Total geral",
+                int(total_geral.get("mensalidades", 0)),
+                float(total_geral["recebido"]),
+                float(total_geral["comissao"]),
+            ],
         )
-        ws.column_dimensions[get_column_letter(idx)].width = min(max(18 if idx == 1 else 14, max_len + 2), 60)
 
-    header_font = Font(bold=True, color="FFFFFF")
-    header_fill = PatternFill(start_color="10233F", end_color="10233F", fill_type="solid")
-    bold_font = Font(bold=True)
-    footer_fill = PatternFill(start_color="10233F", end_color="10233F", fill_type="solid")
-    center_alignment = Alignment(horizontal="center", vertical="center")
-    left_alignment = Alignment(horizontal="left", vertical="center")
+        ws_meta = wb.create_sheet("Metadados")
+        ws_meta.append(["Mês", mes])
+        ws_meta.append(["Atualizado em", updated_at or "—"])
+        return wb
 
-    for idx, cell in enumerate(ws[1], start=1):
-        cell.font = header_font
-        cell.fill = header_fill
-        cell.alignment = left_alignment if idx == 1 else center_alignment
-
-    for row in ws.iter_rows(min_row=2, max_row=ws.max_row):
-        if row[0].value is None:
-            continue
-        is_total = str(row[0].value).strip().lower() == "total geral"
-        if is_total:
-            for cell in row:
-                cell.font = header_font
-                cell.fill = footer_fill
-                cell.alignment = center_alignment
-            row[0].alignment = left_alignment
-        else:
-            row[0].font = bold_font
-            row[0].alignment = left_alignment
-            for cell in row[1:]:
-                cell.font = Font(bold=False)
-                cell.alignment = center_alignment
-        if row[1].value is not None:
-            row[1].number_format = "#,##0"
-        if row[2].value is not None:
-            row[2].number_format = '#,##0.00 "€"'
-        if row[3].value is not None:
-            row[3].number_format = '#,##0.00 "€"'
-
-    ws_meta = wb.create_sheet("Metadados")
-    ws_meta.append(["Mês", mes])
-    ws_meta.append(["Atualizado em", updated_at or "—"])
-
-    buffer = BytesIO()
-    wb.save(buffer)
-    buffer.seek(0)
-
-    filename = f"resumo_comissoes_{mes}.xlsx"
-    return StreamingResponse(
-        buffer,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
-    )
+    return exportacao_excel.resposta_xlsx(_construir, f"resumo_comissoes_{mes}.xlsx")
 
 
 @router.get("/comissoes/exportar-resumo-pdf")
@@ -1084,9 +1446,7 @@ def comissoes_exportar_resumo_pdf(mes: str | None = None):
     try:
         from reportlab.lib.pagesizes import A4
         from reportlab.lib.units import cm
-        from reportlab.lib.colors import HexColor
-        from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-        from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+        from reportlab.platypus import SimpleDocTemplate, Table, Paragraph, Spacer
     except Exception:
         return HTMLResponse(
             "reportlab não está instalado. Instala com: pip install reportlab",
@@ -1103,16 +1463,7 @@ def comissoes_exportar_resumo_pdf(mes: str | None = None):
         bottomMargin=2 * cm,
     )
 
-    styles = getSampleStyleSheet()
-    title_style = ParagraphStyle(
-        name="ResumoTitle",
-        parent=styles["Heading1"],
-        fontName="Helvetica-Bold",
-        fontSize=16,
-        textColor=HexColor(GOLD_HEX),
-        leading=20,
-        spaceAfter=14,
-    )
+    title_style = recursos_exportacao.estilo("comissoes.titulo_resumo")
 
     title = Paragraph(f"Resumo Comissões {mes}", title_style)
 
@@ -1135,25 +1486,7 @@ def comissoes_exportar_resumo_pdf(mes: str | None = None):
     col_widths = [doc.width * 0.34, doc.width * 0.18, doc.width * 0.24, doc.width * 0.24]
 
     tabela = Table(data, colWidths=col_widths, hAlign="LEFT")
-    tabela_style = TableStyle([
-        ("BACKGROUND", (0, 0), (-1, 0), HexColor(GOLD_HEX)),
-        ("TEXTCOLOR", (0, 0), (-1, 0), HexColor(DARK_HEX)),
-        ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
-        ("FONTSIZE", (0, 0), (-1, 0), 11),
-        ("ALIGN", (1, 0), (-1, 0), "CENTER"),
-        ("BACKGROUND", (0, -1), (-1, -1), HexColor(GOLD_HEX)),
-        ("TEXTCOLOR", (0, -1), (-1, -1), HexColor(DARK_HEX)),
-        ("FONTNAME", (0, -1), (-1, -1), "Helvetica-Bold"),
-        ("ALIGN", (1, -1), (-1, -1), "CENTER"),
-        ("ALIGN", (0, 0), (0, -1), "LEFT"),
-        ("ALIGN", (1, 1), (-1, -2), "CENTER"),
-        ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
-        ("GRID", (0, 0), (-1, -1), 0.5, HexColor(GRID_HEX)),
-        ("LEFTPADDING", (0, 0), (-1, -1), 10),
-        ("RIGHTPADDING", (0, 0), (-1, -1), 10),
-        ("TOPPADDING", (0, 0), (-1, -1), 8),
-        ("BOTTOMPADDING", (0, 0), (-1, -1), 8),
-    ])
+    tabela_style = recursos_exportacao.estilo("comissoes.tabela")
 
     tabela.setStyle(tabela_style)
 
@@ -1279,3 +1612,62 @@ def comissoes_exportar_resumo_png(mes: str | None = None):
         media_type="image/png",
         headers={"Content-Disposition": f'attachment; filename="{filename}"'},
     )
+
+
+@router.get("/comissoes/analise/ytd")
+def comissoes_analise_ytd(mes: str | None = None):
+    """Totais de janeiro até 'mes' (inclusive), por carteira e por mês."""
+    return _analise_json("ytd", mes)
+
+
+@router.get("/comissoes/analise/12-meses")
+def comissoes_analise_12_meses(mes: str | None = None):
+    """Totais dos 12 meses que terminam em 'mes', por carteira e por mês."""
+    return _analise_json("12-meses", mes)
+
+
+@router.get("/comissoes/exportar-analise-excel")
+def comissoes_exportar_analise_excel(mes: str | None = None, periodo: str = "ytd"):
+    mes = _mes_analise(mes)
+    if periodo not in ("ytd", "12-meses"):
+        raise HTTPException(status_code=400, detail="Período inválido (ytd ou 12-meses).")
+
+    analise = _analise_periodo(periodo, mes)
+
+    try:
+        import openpyxl  # noqa: F401
+    except Exception:
+        return HTMLResponse(
+            "openpyxl não está instalado. Instala com: pip install openpyxl",
+            status_code=500,
+        )
+
+    def _linha(rotulo: str, valores: Dict[str, Decimal | int]) -> list:
+        return [rotulo, int(valores["mensalidades"]), float(valores["recebido"]), float(valores["comissao"])]
+
+    def _construir():
+        wb = exportacao_excel.novo_livro(_estilos_resumo())
+        total = _linha("Total geral", analise["total_geral"])
+        _folha_resumo(
+            wb,
+            "Resumo",
+            ["Carteira", "Mensalidades", "Valor recebido", "Comissão"],
+            [_linha(carteira, valores) for carteira, valores in analise["totais_por_carteira"].items()],
+            total,
+        )
+        _folha_resumo(
+            wb,
+            "Por mês",
+            ["Mês", "Mensalidades", "Valor recebido", "Comissão"],
+            [_linha(mes_janela, valores) for mes_janela, valores in analise["por_mes"].items()],
+            total,
+        )
+
+        ws_meta = wb.create_sheet("Metadados")
+        ws_meta.append(["Período", "Ano até à data" if periodo == "ytd" else "Últimos 12 meses"])
+        ws_meta.append(["Início", analise["inicio"]])
+        ws_meta.append(["Fim", analise["fim"]])
+        ws_meta.append(["Meses com dados", ", ".join(analise["meses_com_dados"]) or "—"])
+        return wb
+
+    return exportacao_excel.resposta_xlsx(_construir, f"analise_comissoes_{periodo}_{mes}.xlsx")
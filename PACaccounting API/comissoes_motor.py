@@ -0,0 +1,324 @@
+"""
+Motor de comissões sobre estado["clientes"].
+
+Há três cálculos de comissões, cada um com as suas regras:
+
+  - "despesa":   Despesas/Custo-Hora/Sugestão (float; carteira = técnico se
+                 faltar; NIFS_REPARTIDOS repartidos 15% + 15% entre Pedro
+                 Fernandes e Ana Rodrigues; 30% se carteira == técnico, senão 20%);
+  - "orcamento": Orçamento (float estrito; 20% só com carteira e técnico
+                 preenchidos e diferentes; detentor = carteira, técnico ou
+                 "Sem carteira");
+  - "carteiras": página Comissões (Decimal, carteiras canónicas permitidas;
+                 registada por comissoes.py, que tem as tabelas de aliases).
+
+Cada regra diz, para um cliente, o registo desse cliente (ou None se não
+entra) e as alocações (detentor, comissão mensal). Numa única passagem pelos
+clientes todas as regras são aplicadas e ficam, por regra:
+
+    clientes       registos por cliente, pela ordem da regra
+    por_detentor   {detentor: comissão mensal}, pela ordem de aparecimento
+    total_mensal   soma das alocações pela ordem dos clientes
+    mensal         linhas (detentor, valor mensal) por ordem alfabética,
+                   totais dos 12 meses e total do ano
+
+O resultado fica em memória enquanto dados.versao_dados() e a lista de
+clientes (objeto e tamanho) forem os mesmos. Os meses da página Comissões
+dependem também dos registos gravados do mês: resultado_mes() guarda-os até
+os dados mudarem (gravar o ficheiro de comissões muda a versão).
+
+Uma regra que rebenta num cliente guarda o erro e volta a lançá-lo a quem
+pedir o seu resultado, como fazia o cálculo original; as outras regras não
+são afetadas. tests/test_paridade_comissoes.py compara o motor com os cálculos antigos.
+"""
+
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from dados import estado, versao_dados
+
+MESES = 12
+
+# NIFs com comissões repartidas 50/50 entre Pedro e Ana (sobre 30% da mensalidade)
+NIFS_REPARTIDOS = {"505123185", "516253980"}
+DETENTORES_REPARTIDOS = ("Pedro Fernandes", "Ana Rodrigues")
+
+# registo do cliente e [(detentor, comissão mensal), ...]
+ResultadoCliente = Optional[Tuple[Dict[str, Any], List[Tuple[str, Any]]]]
+
+
+class Regra:
+    def __init__(
+        self,
+        nome: str,
+        cliente: Callable[[Any], ResultadoCliente],
+        ordenar: Optional[Callable[[List[Dict[str, Any]]], None]] = None,
+        zero: Any = 0.0,
+    ):
+        self.nome = nome
+        self.cliente = cliente
+        self.ordenar = ordenar
+        self.zero = zero
+
+
+_REGRAS: Dict[str, Regra] = {}
+
+
+def registar_regra(
+    nome: str,
+    cliente: Callable[[Any], ResultadoCliente],
+    ordenar: Optional[Callable[[List[Dict[str, Any]]], None]] = None,
+    zero: Any = 0.0,
+) -> Regra:
+    """Acrescenta (ou substitui) uma regra; a cache é refeita no pedido seguinte."""
+    regra = Regra(nome, cliente, ordenar=ordenar, zero=zero)
+    _REGRAS[nome] = regra
+    invalidar()
+    return regra
+
+
+# ========= REGRA "despesa" =========
+
+def _ler_mensalidade(cli: dict) -> float:
+    """Lê o campo 'mensalidade' do cliente, aceitando float ou string com vírgulas/€."""
+    raw = cli.get("mensalidade") or 0.0
+    if isinstance(raw, (int, float)):
+        return float(raw)
+    s = str(raw)
+    s = s.replace("€", "").replace(" ", "")
+    s = s.replace(".", "").replace(",", ".")
+    try:
+        return float(s)
+    except ValueError:
+        return 0.0
+
+
+def _cliente_despesa(cli: Any) -> ResultadoCliente:
+    if not isinstance(cli, dict):
+        return None
+
+    mensalidade = _ler_mensalidade(cli)
+    if mensalidade <= 0:
+        return None
+
+    nif = str(cli.get("nif") or cli.get("nif_cliente") or "").strip()
+    carteira = str(cli.get("carteira") or "").strip()
+    tecnico = str(cli.get("tecnico") or "").strip()
+
+    # Se não houver carteira mas houver técnico, assumimos carteira = técnico
+    if not carteira and tecnico:
+        carteira = tecnico
+
+    # Sem carteira, não há comissões
+    if not carteira:
+        return None
+
+    if nif in NIFS_REPARTIDOS:
+        base = mensalidade * 0.30  # 30% da mensalidade
+        metade = base * 0.5        # 50% de 30% = 15% cada
+        perc = 0.30
+        alocacoes = [(detentor, metade) for detentor in DETENTORES_REPARTIDOS]
+    else:
+        # carteira é também técnico → 30%; carteira diferente do técnico → 20%
+        perc = 0.30 if carteira == tecnico else 0.20
+        alocacoes = [(carteira, mensalidade * perc)]
+
+    registo = {
+        "nif": nif,
+        "carteira": carteira,
+        "tecnico": tecnico,
+        "mensalidade": mensalidade,
+        "percentagem": perc * 100,
+    }
+    return registo, alocacoes
+
+
+# ========= REGRA "orcamento" =========
+
+def _cliente_orcamento(cli: Any) -> ResultadoCliente:
+    base = float(cli.get("mensalidade", 0) or 0)
+    if base <= 0:
+        return None
+
+    nif = str(cli.get("nif", "")).strip()
+    nome = (cli.get("nome") or "").strip()
+    carteira = (cli.get("carteira") or "").strip()
+    tecnico = (cli.get("tecnico") or "").strip()
+
+    # Exceções dos NIFs com 15% + 15% (total 30%)
+    if nif in NIFS_REPARTIDOS:
+        perc = 0.30
+    elif carteira and tecnico and carteira != tecnico:
+        # Se houver carteira e técnico diferentes -> 20%
+        perc = 0.20
+    else:
+        # Caso "normal" (carteira = técnico ou só um preenchido) -> 30%
+        perc = 0.30
+
+    comissao_mensal = base * perc
+    registo = {
+        "nome": nome,
+        "nif": nif,
+        "mensalidade": base,
+        "percentagem": perc * 100,  # em %
+        "comissao_mensal": comissao_mensal,
+        "comissao_anual": comissao_mensal * 12,
+    }
+    return registo, [(carteira or tecnico or "Sem carteira", comissao_mensal)]
+
+
+# ========= PASSAGEM ÚNICA =========
+
+def _mensal(por_detentor: Dict[str, Any], zero: Any) -> Dict[str, Any]:
+    """Linhas por detentor (ordem alfabética) com o mesmo valor nos 12 meses."""
+    linhas = []
+    totais_mensais = [zero] * MESES
+    total_ano = zero
+    for detentor in sorted(por_detentor.keys(), key=lambda s: s.lower()):
+        valor_mensal = por_detentor[detentor]
+        for i in range(MESES):
+            totais_mensais[i] += valor_mensal
+        total_ano += valor_mensal * 12
+        linhas.append((detentor, valor_mensal))
+    return {"linhas": tuple(linhas), "totais_mensais": tuple(totais_mensais), "total_ano": total_ano}
+
+
+def calcular(clientes: List[Any]) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, Exception]]:
+    """Resultados de todas as regras numa volta pelos clientes: ({regra: resultado}, {regra: erro})."""
+    resultados: Dict[str, Dict[str, Any]] = {}
+    erros: Dict[str, Exception] = {}
+
+    ativas = []
+    for regra in _REGRAS.values():
+        ativas.append([regra, [], {}, regra.zero])
+
+    for cli in clientes:
+        for entrada in ativas:
+            regra, registos, por_detentor, total = entrada
+            if registos is None:
+                continue
+            try:
+                obtido = regra.cliente(cli)
+            except Exception as exc:
+                erros[regra.nome] = exc
+                entrada[1] = None
+                continue
+            if obtido is None:
+                continue
+            registo, alocacoes = obtido
+            registos.append(registo)
+            for detentor, valor in alocacoes:
+                por_detentor[detentor] = por_detentor.get(detentor, regra.zero) + valor
+                total += valor
+            entrada[3] = total
+
+    for regra, registos, por_detentor, total in ativas:
+        if registos is None:
+            continue
+        try:
+            if regra.ordenar is not None:
+                regra.ordenar(registos)
+            resultados[regra.nome] = {
+                "clientes": tuple(registos),
+                "por_detentor": por_detentor,
+                "total_mensal": total,
+                "mensal": _mensal(por_detentor, regra.zero),
+            }
+        except Exception as exc:
+            erros[regra.nome] = exc
+    return resultados, erros
+
+
+# ========= CACHE POR VERSÃO DOS DADOS =========
+
+_lock = threading.Lock()
+# (versão dos dados, lista de clientes, tamanho, resultados, erros)
+_cache: Optional[Tuple[int, Any, int, Dict[str, Dict[str, Any]], Dict[str, Exception]]] = None
+# (regra, mês) -> (versão dos dados, lista de clientes, resultado)
+_cache_meses: Dict[Tuple[str, str], Tuple[int, Any, Any]] = {}
+_estatisticas = {"hits": 0, "calculos": 0, "meses_hits": 0, "meses_calculos": 0}
+
+
+def _clientes() -> Any:
+    return estado.get("clientes")
+
+
+def _chave() -> Tuple[int, Any, int]:
+    clientes = _clientes()
+    return versao_dados(), clientes, len(clientes) if isinstance(clientes, list) else -1
+
+
+def resultado(nome: str) -> Dict[str, Any]:
+    """{clientes, por_detentor, total_mensal, mensal} da regra 'nome' (partilhado: não alterar)."""
+    global _cache
+    if nome not in _REGRAS:
+        raise KeyError(f"Regra de comissões desconhecida: {nome}")
+
+    versao, clientes, tamanho = _chave()
+    with _lock:
+        em_cache = _cache
+        if em_cache is not None and em_cache[0] == versao and em_cache[1] is clientes and em_cache[2] == tamanho:
+            _estatisticas["hits"] += 1
+        else:
+            em_cache = None
+
+    if em_cache is None:
+        resultados, erros = calcular(clientes if isinstance(clientes, list) else [])
+        em_cache = (versao, clientes, tamanho, resultados, erros)
+        with _lock:
+            _cache = em_cache
+            _estatisticas["calculos"] += 1
+
+    if nome in em_cache[4]:
+        raise em_cache[4][nome]
+    if nome not in em_cache[3]:
+        # regra registada depois do cálculo em cache
+        invalidar()
+        return resultado(nome)
+    return em_cache[3][nome]
+
+
+def resultado_mes(nome: str, mes: str, calcular_mes: Callable[[], Any]) -> Any:
+    """
+    Resultado de 'calcular_mes()' para a regra e o mês, guardado até os dados
+    mudarem. A versão é lida depois do cálculo, que pode gravar o mês.
+    """
+    chave = (nome, mes)
+    versao, clientes, _ = _chave()
+    with _lock:
+        em_cache = _cache_meses.get(chave)
+        if em_cache is not None and em_cache[0] == versao and em_cache[1] is clientes:
+            _estatisticas["meses_hits"] += 1
+            return em_cache[2]
+
+    valor = calcular_mes()
+
+    versao, clientes, _ = _chave()
+    with _lock:
+        # Entradas de versões anteriores já não voltam a servir
+        for antiga in [k for k, v in _cache_meses.items() if v[0] != versao]:
+            del _cache_meses[antiga]
+        _cache_meses[chave] = (versao, clientes, valor)
+        _estatisticas["meses_calculos"] += 1
+    return valor
+
+
+def invalidar() -> None:
+    global _cache
+    with _lock:
+        _cache = None
+        _cache_meses.clear()
+
+
+def estatisticas() -> Dict[str, Any]:
+    with _lock:
+        return {
+            **_estatisticas,
+            "regras": list(_REGRAS),
+            "meses_em_cache": sorted(mes for _, mes in _cache_meses),
+            "erros": {nome: repr(erro) for nome, erro in (_cache[4] if _cache is not None else {}).items()},
+        }
+
+
+registar_regra("despesa", _cliente_despesa)
+registar_regra("orcamento", _cliente_orcamento)
@@ -0,0 +1,183 @@
+"""
+Tabela materializada cliente <-> empresa dos timings.
+
+Relação Técnicos, Sugestão de Mensalidade e os mapas por técnico dos Timings
+cruzam os nomes de estado["clientes"] com as empresas de timings_dados, cada
+página com o seu critério (normalizador, inclusão de tokens, fuzzy, prefixo).
+Em vez de refazer esse cruzamento em cada pedido, cada página pede aqui a sua
+coluna da tabela do ano; a coluna só é recalculada quando os clientes ou as
+empresas desse ano mudam (impressão digital SHA-1 dos nomes/NIF dos clientes
+e das empresas ativas do ano).
+
+A tabela fica em correspondencias_timings.json, junto aos dados, e é gravada
+pela thread de escrita de dados.py:
+
+    {
+      "versao": 1,
+      "anos": {
+        "2025": {
+          "impressao": "<sha1>",
+          "colunas": {
+            "relacao":  [ {nif, cliente, empresa, metodo, score, ...} | null, ... ],
+            "sugestao": [ ... ],
+            "mapas":    { empresa: {indice, nif, cliente, metodo, score} }
+          }
+        }
+      }
+    }
+
+As colunas por cliente estão pela ordem de estado["clientes"] (posição = índice
+do cliente); a coluna "mapas" vai da empresa para o cliente. Cada página
+continua a usar o seu próprio critério, por isso os resultados são os mesmos
+de antes; tabela_por_nif() junta as colunas por NIF para comparar páginas.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+from dados import agendar_escrita_ficheiro, estado, ficheiro_pendente
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CORRESPONDENCIAS_FILE = os.path.join(BASE_DIR, "correspondencias_timings.json")
+VERSAO = 1
+
+# Campos de cliente que entram em algum critério de cruzamento
+_CAMPOS_CLIENTE = ("nome", "nif", "cliente", "empresa", "designacao")
+
+_lock = threading.Lock()
+_tabela: Optional[Dict[str, Any]] = None
+_estatisticas = {"hits": 0, "recalculos": 0}
+
+
+def _carregar() -> Dict[str, Any]:
+    """Tabela em memória (lida do ficheiro na primeira utilização)."""
+    global _tabela
+    if _tabela is not None:
+        return _tabela
+
+    data = ficheiro_pendente(CORRESPONDENCIAS_FILE)
+    if data is None and os.path.exists(CORRESPONDENCIAS_FILE):
+        try:
+            with open(CORRESPONDENCIAS_FILE, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except Exception as e:
+            print(f"[CORRESPONDENCIAS] WARNING: ficheiro ilegível, a recalcular: {e}")
+            data = None
+    if not isinstance(data, dict) or data.get("versao") != VERSAO or not isinstance(data.get("anos"), dict):
+        data = {"versao": VERSAO, "anos": {}}
+    _tabela = data
+    return _tabela
+
+
+def _clientes() -> List[Any]:
+    clientes = estado.get("clientes", [])
+    return clientes if isinstance(clientes, list) else []
+
+
+def empresas_ativas(ano_dict: Dict[str, Any]) -> List[str]:
+    """Empresas do ano com registo válido e não apagado, pela ordem do dicionário."""
+    if not isinstance(ano_dict, dict):
+        return []
+    return [k for k, rec in ano_dict.items() if isinstance(rec, dict) and not rec.get("apagado")]
+
+
+def impressao_digital(clientes: List[Any], ano_dict: Dict[str, Any]) -> str:
+    """SHA-1 dos campos de nome/NIF dos clientes (por ordem) e das empresas ativas do ano."""
+    partes: List[Any] = []
+    for cli in clientes:
+        if isinstance(cli, dict):
+            partes.append([str(cli.get(campo) or "") for campo in _CAMPOS_CLIENTE])
+        else:
+            partes.append(None)
+    texto = json.dumps([partes, empresas_ativas(ano_dict)], ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha1(texto.encode("utf-8")).hexdigest()
+
+
+def linha_cliente(cli: Any, empresa: Optional[str], metodo: str, score: float, **extra: Any) -> Optional[Dict[str, Any]]:
+    """Linha de uma coluna por cliente (None para entradas que não são clientes)."""
+    if not isinstance(cli, dict):
+        return None
+    linha = {
+        "nif": str(cli.get("nif") or "").strip(),
+        "cliente": str(cli.get("nome") or "").strip(),
+        "empresa": empresa,
+        "metodo": metodo,
+        "score": round(float(score), 4),
+    }
+    linha.update(extra)
+    return linha
+
+
+def obter_coluna(
+    ano: Any,
+    coluna: str,
+    ano_dict: Dict[str, Any],
+    calcular: Callable[[List[Any], Dict[str, Any]], Any],
+) -> Any:
+    """
+    Coluna 'coluna' da tabela do ano. 'calcular(clientes, ano_dict)' é o
+    critério da página e só é chamado quando a coluna falta ou os dados mudaram.
+    O resultado é partilhado (não alterar).
+    """
+    clientes = _clientes()
+    impressao = impressao_digital(clientes, ano_dict)
+    chave_ano = str(ano)
+
+    with _lock:
+        tabela = _carregar()
+        entrada = tabela["anos"].get(chave_ano)
+        if isinstance(entrada, dict) and entrada.get("impressao") == impressao:
+            valor = entrada.get("colunas", {}).get(coluna)
+            if valor is not None:
+                _estatisticas["hits"] += 1
+                return valor
+
+    valor = calcular(clientes, ano_dict)
+
+    with _lock:
+        tabela = _carregar()
+        entrada = tabela["anos"].get(chave_ano)
+        if not isinstance(entrada, dict) or entrada.get("impressao") != impressao:
+            entrada = {"impressao": impressao, "colunas": {}}
+            tabela["anos"][chave_ano] = entrada
+        entrada["colunas"][coluna] = valor
+        _estatisticas["recalculos"] += 1
+        agendar_escrita_ficheiro(CORRESPONDENCIAS_FILE, tabela, indent=None)
+    print(f"[CORRESPONDENCIAS] Coluna '{coluna}' de {chave_ano} recalculada.")
+    return valor
+
+
+def tabela_por_nif(ano: Any) -> Dict[str, Dict[str, Any]]:
+    """{nif: {cliente, relacao, sugestao, mapas}} com as colunas já calculadas do ano."""
+    with _lock:
+        entrada = _carregar()["anos"].get(str(ano))
+        colunas = dict(entrada.get("colunas", {})) if isinstance(entrada, dict) else {}
+
+    resultado: Dict[str, Dict[str, Any]] = {}
+    for nome_coluna in ("relacao", "sugestao"):
+        for linha in colunas.get(nome_coluna) or []:
+            if not linha:
+                continue
+            chave = linha.get("nif") or linha.get("cliente") or ""
+            item = resultado.setdefault(chave, {"cliente": linha.get("cliente")})
+            item[nome_coluna] = {k: linha.get(k) for k in ("empresa", "metodo", "score")}
+    for empresa, linha in (colunas.get("mapas") or {}).items():
+        if not linha or linha.get("indice") is None:
+            continue
+        chave = linha.get("nif") or linha.get("cliente") or ""
+        item = resultado.setdefault(chave, {"cliente": linha.get("cliente")})
+        item.setdefault("mapas", []).append({"empresa": empresa, "metodo": linha.get("metodo"), "score": linha.get("score")})
+    return resultado
+
+
+def estatisticas() -> Dict[str, Any]:
+    with _lock:
+        anos = {
+            ano: sorted((entrada.get("colunas") or {}).keys())
+            for ano, entrada in _carregar()["anos"].items()
+            if isinstance(entrada, dict)
+        }
+        return {**_estatisticas, "anos": anos}
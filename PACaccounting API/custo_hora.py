@@ -5,9 +5,9 @@ from fastapi import APIRouter, Request
 from fastapi.responses import HTMLResponse
 from fastapi.templating import Jinja2Templates
 
-from dados import estado
+from agregacao import medida
+from cache_paginas import pagina_em_cache
 from despesa import (
-    _obter_custo_mensal_colaborador,
     carregar_despesas,
     calcular_custos_colaboradores,
     calcular_comissoes,
@@ -27,13 +27,6 @@ def _to_float(v: Any) -> float:
         return 0.0
 
 
-def _to_int(v: Any, default: int = 0) -> int:
-    try:
-        return int(v)
-    except Exception:
-        return default
-
-
 def _fmt_eur(v: float) -> str:
     s = f"{(v or 0.0):,.2f}"
     s = s.replace(",", "X").replace(".", ",").replace("X", ".")
@@ -77,16 +70,6 @@ def _calcular_despesas_totais_mensais(ano: int) -> Tuple[List[float], float]:
     return totais_mensais, total_ano
 
 
-def _is_true(v: Any) -> bool:
-    if v is True:
-        return True
-    if isinstance(v, str):
-        return v.strip().lower() in ("1", "true", "sim", "yes", "y")
-    if isinstance(v, (int, float)):
-        return v == 1
-    return False
-
-
 def _calcular_proveitos_mensais_total_e_legal() -> Tuple[float, float]:
     """
     Proveito mensal geral e proveito mensal legal (com fatura),
@@ -94,73 +77,34 @@ def _calcular_proveitos_mensais_total_e_legal() -> Tuple[float, float]:
       total = mensalidade + valor_grh + valor_toconline (todos)
       legal = idem mas apenas clientes com com_fatura=True
     """
-    dados = estado if isinstance(estado, dict) else {}
-    clientes = dados.get("clientes", []) or []
-
-    total = 0.0
-    legal = 0.0
-
-    for cli in clientes:
-        if not isinstance(cli, dict):
-            continue
-
-        v = (
-            _to_float(cli.get("mensalidade"))
-            + _to_float(cli.get("valor_grh"))
-            + _to_float(cli.get("valor_toconline"))
-        )
-        total += v
-
-        if _is_true(cli.get("com_fatura")):
-            legal += v
-
-    return total, legal
+    return medida("receita_custo_hora")
 
 
 @router.get("/custo-hora", response_class=HTMLResponse)
+@pagina_em_cache("custo-hora")
 async def pagina_custo_hora(request: Request, ano: int | None = None):
     if ano is None:
         ano = date.today().year
 
-    dados = estado if isinstance(estado, dict) else {}
-    colaboradores_base = dados.get("colaboradores", []) or []
-
     # -------------------------
     # 1) Tabela por colaborador
     # -------------------------
-    linhas_colab: List[Dict[str, Any]] = []
-    total_horas_mes = 0.0
-
-    for c in colaboradores_base:
-        if not isinstance(c, dict):
-            continue
-
-        nome = c.get("nome") or ""
-
-        vencimento = _to_float(c.get("vencimento_mensal") or c.get("salario_base") or c.get("remuneracao_base") or 0)
-        sa_diario = _to_float(c.get("subsidio_alimentacao_diario") or c.get("subsidio_alimentacao") or 0)
-        ajudas = _to_float(c.get("ajudas_custo_mensal") or c.get("ajudas_custo") or 0)
-
-        dias = _to_int(c.get("dias_trabalho_mes") or 22, default=22)
-        horas_dia = _to_float(c.get("horas_dia") or 8)
-
-        custo_mensal = _obter_custo_mensal_colaborador(c)
-        horas_mes = horas_dia * dias if horas_dia > 0 and dias > 0 else 0.0
-        custo_hora = (custo_mensal / horas_mes) if horas_mes > 0 else 0.0
-
-        total_horas_mes += horas_mes
+    colaboradores = medida("colaboradores_custo_hora")
+    total_horas_mes = colaboradores["total_horas_mes"]
 
+    linhas_colab: List[Dict[str, Any]] = []
+    for c in colaboradores["linhas"]:
         linhas_colab.append(
             {
-                "nome": nome,
-                "vencimento": _fmt_eur(vencimento),
-                "sa_diario": _fmt_eur(sa_diario),
-                "ajudas": _fmt_eur(ajudas),
-                "dias": dias,
-                "horas_dia": _fmt_num(horas_dia, 1),
-                "custo_mensal": _fmt_eur(custo_mensal),
-                "horas_mes": _fmt_num(horas_mes, 1),
-                "custo_hora": _fmt_eur(custo_hora),
+                "nome": c["nome"],
+                "vencimento": _fmt_eur(c["vencimento"]),
+                "sa_diario": _fmt_eur(c["sa_diario"]),
+                "ajudas": _fmt_eur(c["ajudas"]),
+                "dias": c["dias"],
+                "horas_dia": _fmt_num(c["horas_dia"], 1),
+                "custo_mensal": _fmt_eur(c["custo_mensal"]),
+                "horas_mes": _fmt_num(c["horas_mes"], 1),
+                "custo_hora": _fmt_eur(c["custo_hora"]),
             }
         )
 
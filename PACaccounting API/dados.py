@@ -1,94 +1,1085 @@
+import atexit
 import json
 import os
-from typing import Any, Dict
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Backend de persistência: "json" (dados.json + journal, por defeito) ou
+# "sqlite" (ficheiro DB_FILE, ver dados_sqlite.py).
+BACKEND = (os.environ.get("PAC_DADOS_BACKEND") or "json").strip().lower()
+
+# Escrita diferida: guardar_dados() só marca as secções e devolve logo; uma
+# thread de escrita grava-as fora do pedido (debounce). PAC_ESCRITA_DIFERIDA=0
+# volta à escrita síncrona dentro do pedido.
+ESCRITA_DIFERIDA = (os.environ.get("PAC_ESCRITA_DIFERIDA") or "1").strip() != "0"
+DEBOUNCE_S = 0.5      # espera por mais alterações antes de gravar
+ESPERA_MAX_S = 3.0    # nunca adia uma alteração mais do que isto
+
+# Arranque diferido: com PAC_ARRANQUE_DIFERIDO=1 os módulos não leem dados ao
+# serem importados; a leitura é feita uma vez no lifespan da app (api.py).
+ARRANQUE_DIFERIDO = (os.environ.get("PAC_ARRANQUE_DIFERIDO") or "").strip() == "1"
 
 # Ficheiro onde todos os dados da app ficam guardados
 DATA_FILE = "dados.json"
+DB_FILE = "dados.sqlite3"
+
+# Journal de secções (write-ahead): cada gravação acrescenta apenas as secções
+# de topo alteradas (ex.: "clientes", "orcamento", "timings_dados"), uma por
+# linha, seguidas de um marcador de commit; só grupos com commit são
+# reaplicados por cima de DATA_FILE na leitura. As secções de REGISTOS_SECAO
+# levam só os registos que mudaram.
+JOURNAL_FILE = DATA_FILE + ".journal"
+
+# Secções gravadas no journal registo a registo: "clientes" por posição na
+# lista, "timings_dados" por (ano, empresa). Valor = níveis até ao registo.
+REGISTOS_SECAO = {"clientes": 1, "timings_dados": 2}
+
+# Compacta (reescreve DATA_FILE completo e esvazia o journal) quando o journal
+# passa este tamanho ou o dobro do tamanho de DATA_FILE, o que for maior.
+COMPACTAR_MIN_BYTES = 1024 * 1024
+
+# Secções com ficheiro próprio (ex.: timings_dados -> timings_dados.json) são
+# reescritas em checkpoint, no máximo uma vez por este intervalo, e sempre na
+# compactação. Até lá, o journal é a fonte de verdade.
+CHECKPOINT_INTERVALO_S = 300
 
 # Estado global em memória (um ÚNICO dicionário permanente)
 estado: Dict[str, Any] = {}
 
+# Última versão persistida de cada secção (JSON compacto). Serve para detetar
+# secções alteradas sem reescrever tudo e para compactar sem reserializar.
+_persistido: Dict[str, str] = {}
+_seq: int = 0
 
-def carregar_dados() -> None:
+# Texto de cada registo das secções de REGISTOS_SECAO na última versão
+# persistida: lista de textos ou {ano: {empresa: texto}}
+_persistido_registos: Dict[str, Any] = {}
+
+# seq da última gravação persistida de cada secção
+_seq_secao: Dict[str, int] = {}
+
+# Versão em memória de cada secção: muda logo que guardar_dados() é chamado
+# (antes de a escrita chegar ao disco). É o que as caches devem usar.
+_versoes: Dict[str, int] = {}
+_contador_versoes = 0
+
+# Versão de cada secção na última gravação: uma secção cuja versão não mudou
+# desde então não é serializada para ver se mudou
+_versoes_gravadas: Dict[str, int] = {}
+
+# Índices em memória sobre estado["clientes"]: {nome: (assinatura, índice)}
+_indices_clientes: Dict[str, Tuple[Tuple[int, int, int], Dict[Any, List[int]]]] = {}
+
+# Cache de leitura de ficheiros JSON: {caminho: ((mtime_ns, tamanho), valor)}
+_cache_json: Dict[str, Tuple[Tuple[int, int], Any]] = {}
+
+# Ficheiros próprios de secções ({secao: caminho}) e o seq que cada um reflete
+_espelhos: Dict[str, str] = {}
+_checkpoints: Dict[str, int] = {}
+_ultimo_checkpoint: float = 0.0
+
+# Transação em curso (ver transacao())
+_profundidade_transacao = 0
+_pendentes: List[str] = []
+_pendentes_todas = False
+
+# Escrita diferida: fila (protegida por _cond_fila) e gravação em curso
+# (_lock_escrita serializa todas as escritas em disco)
+_lock_escrita = threading.RLock()
+_cond_fila = threading.Condition()
+_fila_secoes: List[str] = []
+_fila_todas = False
+_fila_ficheiros: Dict[str, Tuple[Any, Optional[int]]] = {}
+_primeira_marca = 0.0
+_ultima_marca = 0.0
+_em_escrita_secoes: List[str] = []
+_em_escrita_ficheiros: Dict[str, Tuple[Any, Optional[int]]] = {}
+_thread_escrita: Optional[threading.Thread] = None
+_ultima_escrita: Optional[str] = None
+_ultimo_erro: Optional[str] = None
+
+# Avisos depois de cada tentativa de gravar uma secção: {secao: [funcao(ok)]}
+_ao_gravar: Dict[str, List[Callable[[bool], None]]] = {}
+
+
+def _serializar_secao(secao: str, valor: Any) -> str:
+    # json.dumps sem indent corre todo no encoder em C, sem largar o GIL: é
+    # uma fotografia consistente mesmo feita na thread de escrita enquanto os
+    # pedidos continuam a alterar 'estado'.
+    texto = json.dumps(valor, ensure_ascii=False, separators=(",", ":"))
+    if secao == "clientes" and '"_idx"' in texto:
+        # _idx é só para a página de clientes; nunca é persistido
+        lista = json.loads(texto)
+        for cli in lista if isinstance(lista, list) else []:
+            if isinstance(cli, dict):
+                cli.pop("_idx", None)
+        texto = json.dumps(lista, ensure_ascii=False, separators=(",", ":"))
+    return texto
+
+
+def _json_compacto(valor: Any) -> str:
+    return json.dumps(valor, ensure_ascii=False, separators=(",", ":"))
+
+
+def _textos_registos(secao: str, valor: Any) -> Any:
     """
-    Carrega o conteúdo de DATA_FILE para o dicionário 'estado'.
-    IMPORTANTE: não troca o objeto 'estado', apenas faz clear() + update(),
-    para que todos os módulos que importaram 'estado' continuem a ver o mesmo
-    dicionário em memória.
+    Texto de cada registo de uma secção de REGISTOS_SECAO (lista de textos ou
+    {ano: {empresa: texto}}). None se a secção não tiver essa forma; nesse
+    caso é gravada inteira.
     """
-    caminho = os.path.abspath(DATA_FILE)
-    print(f"[DADOS] carregar_dados() -> DATA_FILE = {caminho}")
+    niveis = REGISTOS_SECAO.get(secao)
+    # list(...) e dict(...) são cópias feitas em C (sem largar o GIL), como o
+    # json.dumps de _serializar_secao: os pedidos podem continuar a alterar
+    # 'estado' sem estragar a iteração
+    if niveis == 1 and isinstance(valor, list):
+        textos = []
+        for registo in list(valor):
+            if isinstance(registo, dict) and "_idx" in registo:
+                registo = dict(registo)
+                registo.pop("_idx", None)
+            textos.append(_json_compacto(registo))
+        return textos
+    if niveis == 2 and isinstance(valor, dict):
+        grupos: Dict[str, Dict[str, str]] = {}
+        for chave, grupo in list(valor.items()):
+            if not isinstance(chave, str) or not isinstance(grupo, dict):
+                return None
+            itens = list(grupo.items())
+            if not all(isinstance(k, str) for k, _ in itens):
+                return None
+            grupos[chave] = {k: _json_compacto(v) for k, v in itens}
+        return grupos
+    return None
+
+
+def _texto_grupo(grupo: Dict[str, str]) -> str:
+    return "{" + ",".join(f"{_json_compacto(k)}:{t}" for k, t in grupo.items()) + "}"
 
-    # NUNCA fazemos "estado = ..." aqui
+
+def _texto_de_registos(textos: Any) -> str:
+    """JSON compacto da secção inteira a partir dos textos dos registos."""
+    if isinstance(textos, list):
+        return "[" + ",".join(textos) + "]"
+    return "{" + ",".join(f"{_json_compacto(k)}:{_texto_grupo(g)}" for k, g in textos.items()) + "}"
+
+
+def _registos_alterados(antigos: Any, novos: Any) -> Optional[Tuple[List[Tuple[list, str]], Optional[int]]]:
+    """
+    ([(caminho, texto)] dos registos que mudaram, novo tamanho se a lista
+    encolheu). None se a mudança não se descreve assim (forma diferente,
+    anos/empresas removidos ou reordenados): a secção é gravada inteira.
+    """
+    if isinstance(antigos, list) and isinstance(novos, list):
+        mudados = [([i], t) for i, t in enumerate(novos) if i >= len(antigos) or antigos[i] != t]
+        return mudados, (len(novos) if len(novos) < len(antigos) else None)
+
+    if isinstance(antigos, dict) and isinstance(novos, dict):
+        # Anos novos só no fim (a ordem das chaves também é persistida)
+        if list(novos)[: len(antigos)] != list(antigos):
+            return None
+        mudados = []
+        for ano, grupo in novos.items():
+            anterior = antigos.get(ano)
+            if anterior is None or list(grupo)[: len(anterior)] != list(anterior):
+                mudados.append(([ano], _texto_grupo(grupo)))
+                continue
+            mudados.extend(([ano, k], t) for k, t in grupo.items() if anterior.get(k) != t)
+        return mudados, None
+
+    return None
+
+
+def _ler_journal(base: Dict[str, Any], seq_secao: Dict[str, int]) -> int:
+    """
+    Reaplica o journal sobre 'base' (in-place) e preenche 'seq_secao' e
+    _checkpoints. Devolve o último seq lido.
+
+    Os registos de um grupo ("tx") só são aplicados quando aparece o marcador
+    {"commit": tx}. Um grupo sem commit ou uma linha truncada no fim (queda a
+    meio de uma escrita) são descartados.
+    """
+    seq = 0
+    if not os.path.exists(JOURNAL_FILE):
+        return seq
+
+    aplicadas = 0
+    offset_valido = 0
+    offset_lido = 0
+    grupo: List[Dict[str, Any]] = []
+    grupo_tx: Any = None
+    with open(JOURNAL_FILE, "rb") as f:
+        for linha_bytes in f:
+            offset_lido += len(linha_bytes)
+            linha = linha_bytes.decode("utf-8", errors="replace").strip()
+            if not linha:
+                if grupo_tx is None:
+                    offset_valido = offset_lido
+                continue
+            try:
+                registo = json.loads(linha)
+            except Exception:
+                break
+            if not isinstance(registo, dict):
+                continue
+
+            if "base_seq" in registo:
+                seq = max(seq, int(registo.get("base_seq") or 0))
+                for secao in base:
+                    seq_secao[secao] = seq
+                checkpoints = registo.get("checkpoints")
+                if isinstance(checkpoints, dict):
+                    _checkpoints.update({k: int(v or 0) for k, v in checkpoints.items()})
+                offset_valido = offset_lido
+                continue
+
+            if "checkpoint" in registo:
+                _checkpoints[str(registo["checkpoint"])] = int(registo.get("seq") or 0)
+                offset_valido = offset_lido
+                continue
+
+            if "commit" in registo:
+                if registo["commit"] == grupo_tx:
+                    for reg in grupo:
+                        seq = max(seq, _aplicar_registo(base, seq_secao, reg))
+                        aplicadas += 1
+                grupo = []
+                grupo_tx = None
+                offset_valido = offset_lido
+                continue
+
+            if "tx" in registo:
+                if registo["tx"] != grupo_tx:
+                    grupo = []
+                    grupo_tx = registo["tx"]
+                grupo.append(registo)
+                continue
+
+            # Registo sem grupo (formato anterior): aplica logo
+            seq = max(seq, _aplicar_registo(base, seq_secao, registo))
+            aplicadas += 1
+            offset_valido = offset_lido
+
+    if offset_valido < offset_lido:
+        # Corta o grupo incompleto para que as próximas gravações não fiquem
+        # coladas a ele.
+        print("[DADOS] Journal com gravação incompleta no fim; a descartar o resto.")
+        with open(JOURNAL_FILE, "r+b") as f:
+            f.truncate(offset_valido)
+    if aplicadas:
+        print(f"[DADOS] Journal reaplicado: {aplicadas} registo(s).")
+    return seq
+
+
+def _aplicar_registo(base: Dict[str, Any], seq_secao: Dict[str, int], registo: Dict[str, Any]) -> int:
+    seq = int(registo.get("seq") or 0)
+    secao = registo.get("secao")
+    if not isinstance(secao, str):
+        return seq
+    if registo.get("removida"):
+        base.pop(secao, None)
+        seq_secao.pop(secao, None)
+    elif "registos" in registo:
+        try:
+            _aplicar_registos(base[secao], registo["registos"], registo.get("tamanho"))
+        except Exception as e:
+            print(f"[DADOS] ERRO a reaplicar registos de '{secao}' (seq {seq}): {e}")
+            return seq
+        seq_secao[secao] = seq
+    else:
+        base[secao] = registo.get("valor")
+        seq_secao[secao] = seq
+    return seq
+
+
+def _aplicar_registos(atual: Any, registos: List[Any], tamanho: Optional[int]) -> None:
+    # Posições novas de uma lista vêm por ordem, logo a seguir ao fim
+    for caminho, valor in registos:
+        alvo = atual
+        for chave in caminho[:-1]:
+            alvo = alvo[chave]
+        if isinstance(alvo, list) and caminho[-1] == len(alvo):
+            alvo.append(valor)
+        else:
+            alvo[caminho[-1]] = valor
+    if tamanho is not None:
+        del atual[tamanho:]
+
+
+def _ler_ficheiro_json() -> Dict[str, Any]:
+    data: Dict[str, Any] = {}
     if os.path.exists(DATA_FILE):
         try:
             with open(DATA_FILE, "r", encoding="utf-8") as f:
-                data = json.load(f)
-
-            if isinstance(data, dict):
-                estado.clear()
-                estado.update(data)
-            else:
-                estado.clear()
-
-            clientes = len(estado.get("clientes", [])) if isinstance(estado.get("clientes"), list) else 0
-            colaboradores = len(estado.get("colaboradores", [])) if isinstance(estado.get("colaboradores"), list) else 0
-            orc = estado.get("orcamento", {})
-            orc_keys = list(orc.keys()) if isinstance(orc, dict) else []
-            print(
-                f"[DADOS] Leitura OK. Chaves: {list(estado.keys())} "
-                f"(clientes: {clientes}, colaboradores: {colaboradores}, orcamento: {len(orc_keys)})"
-            )
+                lido = json.load(f)
+            if isinstance(lido, dict):
+                data = lido
         except Exception as e:
             print(f"[DADOS] ERRO a ler ficheiro: {e}")
-            estado.clear()
+            data = {}
     else:
         print("[DADOS] Ficheiro não existe, a iniciar estado vazio.")
-        estado.clear()
+    return data
+
+
+def _carregar_json() -> Tuple[Dict[str, Any], int, Dict[str, int]]:
+    data = _ler_ficheiro_json()
+    seq_secao: Dict[str, int] = {secao: 0 for secao in data}
+    try:
+        seq = _ler_journal(data, seq_secao)
+    except Exception as e:
+        print(f"[DADOS] ERRO a ler journal: {e}")
+        seq = 0
+    return data, seq, seq_secao
 
 
-def guardar_dados() -> None:
+def _carregar_sqlite() -> Tuple[Dict[str, Any], int, Dict[str, int]]:
+    import dados_sqlite
+
+    if dados_sqlite.esta_vazia(DB_FILE):
+        data, _, _ = _carregar_json()
+        if data:
+            seq = dados_sqlite.migrar_de_estado(DB_FILE, data)
+            print(f"[DADOS] Migração dados.json -> {os.path.abspath(DB_FILE)} concluída ({len(data)} secções).")
+            return data, seq, {secao: seq for secao in data}
+
+    data, seq_secao = dados_sqlite.carregar(DB_FILE)
+    return data, max(seq_secao.values(), default=0), seq_secao
+
+
+def carregar_dados() -> None:
     """
-    Guarda o dicionário 'estado' inteiro no ficheiro DATA_FILE.
-    Usa ficheiro temporário + os.replace para reduzir risco de ficheiro corrompido.
+    Carrega o estado persistido (DATA_FILE + journal, ou DB_FILE no backend
+    SQLite) para o dicionário 'estado'.
+    IMPORTANTE: não troca o objeto 'estado', apenas faz clear() + update(),
+    para que todos os módulos que importaram 'estado' continuem a ver o mesmo
+    dicionário em memória.
     """
-    tmp_file = DATA_FILE + ".tmp"
-    caminho = os.path.abspath(DATA_FILE)
+    global _seq, _ultimo_checkpoint
 
-    clientes = estado.get("clientes")
-    if isinstance(clientes, list):
-        for cli in clientes:
-            if isinstance(cli, dict):
-                cli.pop("_idx", None)
+    # Gravações pendentes chegam ao disco antes de o estado ser relido
+    flush_escritas()
+
+    caminho = os.path.abspath(DB_FILE if BACKEND == "sqlite" else DATA_FILE)
+    print(f"[DADOS] carregar_dados() -> {'DB_FILE' if BACKEND == 'sqlite' else 'DATA_FILE'} = {caminho}")
+
+    with _lock_escrita:
+        _checkpoints.clear()
+        _ultimo_checkpoint = time.monotonic()
+        if BACKEND == "sqlite":
+            try:
+                data, _seq, seq_secao = _carregar_sqlite()
+            except Exception as e:
+                print(f"[DADOS] ERRO a ler base de dados: {e}")
+                data, _seq, seq_secao = {}, 0, {}
+        else:
+            data, _seq, seq_secao = _carregar_json()
+
+        # NUNCA fazemos "estado = ..." aqui
+        estado.clear()
+        estado.update(data)
+
+        _persistido.clear()
+        _persistido_registos.clear()
+        for chave, valor in estado.items():
+            textos = _textos_registos(chave, valor)
+            if textos is not None:
+                _persistido_registos[chave] = textos
+                _persistido[chave] = _texto_de_registos(textos)
+            else:
+                _persistido[chave] = _serializar_secao(chave, valor)
+        _seq_secao.clear()
+        _seq_secao.update(seq_secao)
+        _marcar_versoes(estado.keys())
+        _versoes_gravadas.clear()
+        _versoes_gravadas.update((chave, _versoes[chave]) for chave in estado)
+        _indices_clientes.clear()
 
-    try:
         clientes = len(estado.get("clientes", [])) if isinstance(estado.get("clientes"), list) else 0
         colaboradores = len(estado.get("colaboradores", [])) if isinstance(estado.get("colaboradores"), list) else 0
         orc = estado.get("orcamento", {})
         orc_keys = list(orc.keys()) if isinstance(orc, dict) else []
         print(
-            f"[DADOS] guardar_dados() -> a escrever em {caminho} "
+            f"[DADOS] Leitura OK. Chaves: {list(estado.keys())} "
             f"(clientes: {clientes}, colaboradores: {colaboradores}, orcamento: {len(orc_keys)})"
         )
-    except Exception:
-        print(f"[DADOS] guardar_dados() -> a escrever em {caminho}")
 
+        if _journal_excede_limite():
+            _compactar()
+
+
+def _marcar_versoes(secoes: Iterable[str]) -> None:
+    global _contador_versoes
+    _contador_versoes += 1
+    for secao in secoes:
+        _versoes[secao] = _contador_versoes
+
+
+class _Alteracoes:
+    """Resultado de _secoes_alteradas()."""
+
+    def __init__(self) -> None:
+        # {secao: json_compacto}; None = secção removida do estado
+        self.secoes: Dict[str, Optional[str]] = {}
+        # {secao: ([(caminho, texto)], tamanho)} das secções gravadas por registo
+        self.registos: Dict[str, Tuple[List[Tuple[list, str]], Optional[int]]] = {}
+        # Textos dos registos a guardar em _persistido_registos depois de gravar
+        self.textos: Dict[str, Any] = {}
+
+
+def _secoes_alteradas(secoes: Iterable[str]) -> _Alteracoes:
+    """
+    Secções cujo conteúdo difere do que está persistido. Só são serializadas
+    as que guardar_dados() marcou desde a última gravação; nas secções de
+    REGISTOS_SECAO a comparação é feita registo a registo.
+    """
+    alteracoes = _Alteracoes()
+    for secao in secoes:
+        valor = estado.get(secao, _AUSENTE)
+        if valor is _AUSENTE:
+            if secao in _persistido:
+                alteracoes.secoes[secao] = None
+            continue
+        if secao in _persistido and _versoes.get(secao) == _versoes_gravadas.get(secao):
+            continue
+
+        textos = _textos_registos(secao, valor)
+        if textos is None:
+            texto = _serializar_secao(secao, valor)
+            if _persistido.get(secao) != texto:
+                alteracoes.secoes[secao] = texto
+            continue
+
+        antigos = _persistido_registos.get(secao)
+        mudanca = _registos_alterados(antigos, textos) if antigos is not None else None
+        if mudanca is not None and not mudanca[0] and mudanca[1] is None:
+            continue
+        alteracoes.secoes[secao] = _texto_de_registos(textos)
+        alteracoes.textos[secao] = textos
+        # Uma mudança que toca metade da secção (ex.: cliente apagado no início
+        # da lista) vai inteira
+        if mudanca is not None and sum(len(t) for _, t in mudanca[0]) * 2 < len(alteracoes.secoes[secao]):
+            alteracoes.registos[secao] = mudanca
+    return alteracoes
+
+
+_AUSENTE = object()
+
+
+def _journal_excede_limite() -> bool:
+    if BACKEND == "sqlite":
+        return False
     try:
-        with open(tmp_file, "w", encoding="utf-8") as f:
-            json.dump(estado, f, ensure_ascii=False, indent=2)
+        tamanho_journal = os.path.getsize(JOURNAL_FILE)
+    except OSError:
+        return False
+    try:
+        tamanho_base = os.path.getsize(DATA_FILE)
+    except OSError:
+        tamanho_base = 0
+    return tamanho_journal > max(COMPACTAR_MIN_BYTES, 2 * tamanho_base)
 
-        # Substitui o ficheiro antigo pelo novo de forma atómica (quando possível)
-        os.replace(tmp_file, DATA_FILE)
-        print("[DADOS] Guardado com sucesso.")
+
+def guardar_dados(*secoes: str) -> bool:
+    """
+    Persiste as secções de topo de 'estado' que mudaram desde a última gravação.
+
+    - guardar_dados("clientes") grava apenas as secções indicadas (se mudaram);
+    - guardar_dados() sem argumentos compara todas as secções com a última
+      versão persistida e grava só as diferentes (mais caro: indicar as
+      secções sempre que se sabe quais foram).
+
+    Só as secções marcadas por guardar_dados() desde a última gravação são
+    serializadas e comparadas; em "clientes" e "timings_dados" o journal leva
+    só os registos alterados (ver REGISTOS_SECAO).
+
+    As secções alteradas são acrescentadas ao JOURNAL_FILE como um único grupo
+    (um commit, um fsync) ou gravadas em DB_FILE, numa transação, no backend
+    SQLite; o ficheiro completo DATA_FILE só é reescrito na compactação (ver
+    compactar_dados). Dentro de transacao() a gravação é adiada para o fim.
+
+    Com ESCRITA_DIFERIDA a gravação fica para a thread de escrita (várias
+    chamadas seguidas dão uma só gravação) e a função devolve logo True; sem
+    ela, devolve False se a escrita falhou. Quem precisa de saber quando (e
+    se) a secção chegou ao disco regista-se com ao_gravar().
+    """
+    global _pendentes_todas
+
+    clientes = estado.get("clientes")
+    if isinstance(clientes, list):
+        for cli in clientes:
+            if isinstance(cli, dict):
+                cli.pop("_idx", None)
+
+    _marcar_versoes(secoes if secoes else list(estado.keys()))
+
+    if _profundidade_transacao > 0:
+        if secoes:
+            _pendentes.extend(s for s in secoes if s not in _pendentes)
+        else:
+            _pendentes_todas = True
+        return True
+
+    if ESCRITA_DIFERIDA:
+        _agendar(secoes=secoes, todas=not secoes)
+        return True
+
+    with _lock_escrita:
+        return _gravar_secoes(secoes)
+
+
+def _gravar_secoes(secoes: Iterable[str]) -> bool:
+    """Grava já as secções indicadas (todas, se nenhuma). Chamar com _lock_escrita."""
+    global _seq
+
+    secoes = list(secoes)
+    candidatas: List[str] = secoes if secoes else list(dict.fromkeys([*estado.keys(), *_persistido.keys()]))
+    versoes = {secao: _versoes.get(secao, 0) for secao in candidatas}
+    alteracoes = _secoes_alteradas(candidatas)
+    alteradas = alteracoes.secoes
+    if not alteradas:
+        print(f"[DADOS] guardar_dados() -> sem alterações ({', '.join(candidatas) or 'nenhuma secção'}).")
+        _versoes_gravadas.update(versoes)
+        _avisar_gravacao(candidatas, True)
+        return True
+
+    if BACKEND == "sqlite":
+        destino = os.path.abspath(DB_FILE)
+        print(f"[DADOS] guardar_dados() -> secções alteradas: {list(alteradas.keys())} (em {destino})")
+        try:
+            import dados_sqlite
+
+            seq = dados_sqlite.guardar_secoes(DB_FILE, alteradas, _seq)
+        except Exception as e:
+            print(f"[DADOS] ERRO a guardar base de dados: {e}")
+            _avisar_gravacao(alteradas, False)
+            return False
+    else:
+        try:
+            seq = _escrever_journal(alteradas, alteracoes.registos)
+        except Exception as e:
+            print(f"[DADOS] ERRO a guardar journal: {e}")
+            _avisar_gravacao(alteradas, False)
+            return False
+
+    # Os seq são atribuídos pela ordem de 'alteradas' (igual nos dois backends)
+    _seq = seq
+    for i, (secao, texto) in enumerate(alteradas.items()):
+        if texto is None:
+            _persistido.pop(secao, None)
+            _persistido_registos.pop(secao, None)
+            _seq_secao.pop(secao, None)
+        else:
+            _persistido[secao] = texto
+            if secao in alteracoes.textos:
+                _persistido_registos[secao] = alteracoes.textos[secao]
+            else:
+                _persistido_registos.pop(secao, None)
+            _seq_secao[secao] = seq - len(alteradas) + 1 + i
+    _versoes_gravadas.update(versoes)
+    print("[DADOS] Guardado com sucesso.")
+    _avisar_gravacao(candidatas, True)
+
+    if _journal_excede_limite():
+        _compactar()
+    elif time.monotonic() - _ultimo_checkpoint >= CHECKPOINT_INTERVALO_S:
+        _checkpoint()
+    return True
+
+
+@contextmanager
+def transacao() -> Iterator[None]:
+    """
+    Agrupa as chamadas a guardar_dados() feitas dentro do bloco numa única
+    gravação (group commit) no fim do bloco exterior:
+
+        with transacao():
+            ...
+            guardar_dados("clientes")
+            ...
+            guardar_dados("timings_dados")
+    """
+    global _profundidade_transacao, _pendentes_todas
+
+    _profundidade_transacao += 1
+    try:
+        yield
+    finally:
+        _profundidade_transacao -= 1
+        if _profundidade_transacao == 0:
+            secoes = [] if _pendentes_todas else list(_pendentes)
+            havia_pendentes = _pendentes_todas or bool(_pendentes)
+            _pendentes.clear()
+            _pendentes_todas = False
+            if havia_pendentes:
+                guardar_dados(*secoes)
+
+
+# ========= ESCRITA DIFERIDA =========
+
+def _agendar(
+    secoes: Iterable[str] = (),
+    todas: bool = False,
+    ficheiro: Optional[Tuple[str, Any, Optional[int]]] = None,
+) -> None:
+    global _fila_todas, _primeira_marca, _ultima_marca
+
+    with _cond_fila:
+        agora = time.monotonic()
+        if not _ha_pendentes():
+            _primeira_marca = agora
+        _ultima_marca = agora
+        if todas:
+            _fila_todas = True
+        for secao in secoes:
+            if secao not in _fila_secoes:
+                _fila_secoes.append(secao)
+        if ficheiro is not None:
+            caminho, conteudo, indent = ficheiro
+            _fila_ficheiros[caminho] = (conteudo, indent)
+        _garantir_thread()
+        _cond_fila.notify()
+
+
+def _ha_pendentes() -> bool:
+    return _fila_todas or bool(_fila_secoes) or bool(_fila_ficheiros)
+
+
+def _garantir_thread() -> None:
+    global _thread_escrita
+    if _thread_escrita is None or not _thread_escrita.is_alive():
+        _thread_escrita = threading.Thread(target=_ciclo_escrita, name="dados-escrita", daemon=True)
+        _thread_escrita.start()
+
+
+def _ciclo_escrita() -> None:
+    while True:
+        with _cond_fila:
+            while not _ha_pendentes():
+                _cond_fila.wait()
+            # Debounce: espera que as alterações acalmem (com limite máximo)
+            while _ha_pendentes():
+                agora = time.monotonic()
+                limite = min(_ultima_marca + DEBOUNCE_S, _primeira_marca + ESPERA_MAX_S)
+                if agora >= limite:
+                    break
+                _cond_fila.wait(limite - agora)
+
+        if not flush_escritas():
+            # Falhou (ex.: disco cheio): o que falhou voltou à fila
+            time.sleep(ESPERA_MAX_S)
+
+
+def flush_escritas() -> bool:
+    """
+    Grava já tudo o que está pendente (secções e ficheiros agendados). Usado
+    pela thread de escrita, no encerramento da app e antes de operações que
+    precisam do disco atualizado. Devolve False se alguma escrita falhou (o
+    que falhou volta para a fila).
+    """
+    global _fila_todas, _ultima_escrita, _ultimo_erro
+
+    with _lock_escrita:
+        with _cond_fila:
+            secoes = list(_fila_secoes)
+            todas = _fila_todas
+            ficheiros = dict(_fila_ficheiros)
+            _fila_secoes.clear()
+            _fila_ficheiros.clear()
+            _fila_todas = False
+            _em_escrita_secoes[:] = list(estado.keys()) if todas else secoes
+            _em_escrita_ficheiros.clear()
+            _em_escrita_ficheiros.update(ficheiros)
+
+        if not secoes and not todas and not ficheiros:
+            return True
+
+        ok = True
+        try:
+            if (secoes or todas) and not _gravar_secoes([] if todas else secoes):
+                ok = False
+                _agendar(secoes=secoes, todas=todas)
+            for caminho, (conteudo, indent) in ficheiros.items():
+                if not _escrever_ficheiro(caminho, conteudo, indent):
+                    ok = False
+                    with _cond_fila:
+                        _fila_ficheiros.setdefault(caminho, (conteudo, indent))
+        finally:
+            with _cond_fila:
+                _em_escrita_secoes.clear()
+                _em_escrita_ficheiros.clear()
+
+        agora = datetime.now().isoformat(timespec="seconds")
+        if ok:
+            _ultima_escrita = agora
+            _ultimo_erro = None
+        else:
+            _ultimo_erro = f"{agora}: falha na escrita (ver log)"
+        return ok
+
+
+def _escrever_ficheiro(caminho: str, conteudo: Any, indent: Optional[int]) -> bool:
+    tmp = caminho + ".tmp"
+    try:
+        # Fotografia atómica (encoder em C) antes de formatar com indent
+        texto = json.dumps(conteudo, ensure_ascii=False)
+        if indent is not None:
+            texto = json.dumps(json.loads(texto), ensure_ascii=False, indent=indent)
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(texto)
+            _fsync(f)
+        os.replace(tmp, caminho)
+        print(f"[DADOS] Ficheiro gravado: {os.path.abspath(caminho)}")
+        return True
+    except Exception as e:
+        print(f"[DADOS] ERRO a gravar {caminho}: {e}")
+        if os.path.exists(tmp):
+            try:
+                os.remove(tmp)
+            except Exception:
+                pass
+        return False
+
+
+def agendar_escrita_ficheiro(caminho: Any, conteudo: Any, indent: Optional[int] = 2) -> None:
+    """
+    Grava 'conteudo' (JSON) em 'caminho' de forma atómica, pela thread de
+    escrita (ou já, sem ESCRITA_DIFERIDA). Enquanto não chega ao disco,
+    ficheiro_pendente(caminho) devolve uma cópia do conteúdo.
+    """
+    caminho = str(caminho)
+    if ESCRITA_DIFERIDA:
+        _agendar(ficheiro=(caminho, conteudo, indent))
+    else:
+        with _lock_escrita:
+            _escrever_ficheiro(caminho, conteudo, indent)
+
+
+def ficheiro_pendente(caminho: Any) -> Optional[Any]:
+    """Cópia do conteúdo agendado para 'caminho' que ainda não chegou ao disco (ou None)."""
+    caminho = str(caminho)
+    with _cond_fila:
+        pendente = _fila_ficheiros.get(caminho) or _em_escrita_ficheiros.get(caminho)
+    if pendente is None:
+        return None
+    return json.loads(json.dumps(pendente[0], ensure_ascii=False))
+
+
+def secao_pendente(secao: str) -> bool:
+    """True se a secção tem uma gravação agendada que ainda não chegou ao disco."""
+    with _cond_fila:
+        return _fila_todas or secao in _fila_secoes or secao in _em_escrita_secoes
+
+
+def estado_escritas() -> Dict[str, Any]:
+    """Resumo das escritas pendentes (para diagnóstico)."""
+    with _cond_fila:
+        return {
+            "modo": "diferida" if ESCRITA_DIFERIDA else "sincrona",
+            "backend": BACKEND,
+            "secoes_pendentes": list(estado.keys()) if _fila_todas else list(_fila_secoes),
+            "ficheiros_pendentes": list(_fila_ficheiros.keys()),
+            "em_escrita": list(_em_escrita_secoes) + list(_em_escrita_ficheiros.keys()),
+            "pendente_ha_s": round(time.monotonic() - _primeira_marca, 3) if _ha_pendentes() else 0,
+            "ultima_escrita": _ultima_escrita,
+            "ultimo_erro": _ultimo_erro,
+            "seq": _seq,
+        }
+
+
+# ========= JOURNAL, CHECKPOINTS E COMPACTAÇÃO =========
+
+def _fsync(f) -> None:
+    f.flush()
+    try:
+        os.fsync(f.fileno())
+    except OSError:
+        pass
+
+
+def _escrever_journal(
+    alteradas: Dict[str, Optional[str]],
+    registos: Dict[str, Tuple[List[Tuple[list, str]], Optional[int]]],
+) -> int:
+    """
+    Acrescenta as secções alteradas ao JOURNAL_FILE como um grupo terminado
+    por {"commit": tx}, com um único fsync. Devolve o último seq. Secções em
+    'registos' levam só os registos alterados:
+    {"secao": "clientes", "registos": [[[5], {...}], ...], "tamanho": 240}.
+    """
+    linhas: List[str] = []
+    seq = _seq
+    tx = seq + 1
+    for secao, texto in alteradas.items():
+        seq += 1
+        if texto is None:
+            linhas.append(json.dumps({"tx": tx, "seq": seq, "secao": secao, "removida": True}, ensure_ascii=False))
+        elif secao in registos:
+            mudados, tamanho = registos[secao]
+            corpo = ",".join(f"[{_json_compacto(caminho)},{t}]" for caminho, t in mudados)
+            fim = f',"tamanho":{tamanho}' if tamanho is not None else ""
+            linhas.append(
+                f'{{"tx":{tx},"seq":{seq},"secao":{json.dumps(secao, ensure_ascii=False)},"registos":[{corpo}]{fim}}}'
+            )
+        else:
+            linhas.append(f'{{"tx":{tx},"seq":{seq},"secao":{json.dumps(secao, ensure_ascii=False)},"valor":{texto}}}')
+    linhas.append(json.dumps({"commit": tx}))
+
+    bloco = "\n".join(linhas) + "\n"
+    print(
+        f"[DADOS] guardar_dados() -> secções alteradas: {list(alteradas.keys())} "
+        f"({len(bloco.encode('utf-8')) / 1024:.1f} KB em {os.path.abspath(JOURNAL_FILE)})"
+    )
+
+    with open(JOURNAL_FILE, "a", encoding="utf-8") as f:
+        f.write(bloco)
+        _fsync(f)
+    return seq
+
+
+def ao_gravar(secao: str, funcao: Callable[[bool], None]) -> None:
+    """
+    Regista funcao(ok), chamada depois de cada tentativa de gravar a secção:
+    True quando a secção em memória está no disco, False se a escrita falhou
+    (a secção volta à fila). Com ESCRITA_DIFERIDA corre na thread de escrita.
+    """
+    _ao_gravar.setdefault(secao, []).append(funcao)
+
+
+def _avisar_gravacao(secoes: Iterable[str], ok: bool) -> None:
+    for secao in secoes:
+        for funcao in _ao_gravar.get(secao, ()):
+            try:
+                funcao(ok)
+            except Exception as e:
+                print(f"[DADOS] WARNING: aviso de gravação de '{secao}' falhou: {e}")
+
+
+def registar_espelho(secao: str, caminho: str) -> None:
+    """
+    Regista um ficheiro próprio para a secção (ex.: timings_dados.json). O
+    ficheiro passa a ser reescrito apenas em checkpoint; entre checkpoints a
+    versão mais recente está no journal (ver espelho_desatualizado).
+    """
+    _espelhos[secao] = caminho
+
+
+def espelho_desatualizado(secao: str) -> bool:
+    """True se a secção foi gravada (ou tem gravação pendente) depois do último checkpoint do seu ficheiro."""
+    return secao_pendente(secao) or _seq_secao.get(secao, 0) > _checkpoints.get(secao, 0)
+
+
+def texto_secao_persistida(secao: str) -> Optional[str]:
+    """
+    JSON compacto da última versão gravada da secção (None se não existir).
+    Com uma gravação pendente, a versão que conta é a que está em 'estado'.
+    """
+    if secao_pendente(secao):
+        valor = estado.get(secao)
+        return _serializar_secao(secao, valor) if valor is not None else None
+    return _persistido.get(secao)
+
+
+def ler_secao_persistida(secao: str) -> Any:
+    """Cópia nova da última versão gravada da secção (None se não existir)."""
+    texto = texto_secao_persistida(secao)
+    return json.loads(texto) if texto is not None else None
+
+
+def _escrever_espelho(secao: str, caminho: str) -> bool:
+    texto = _persistido.get(secao)
+    if texto is None:
+        return False
+    tmp = caminho + ".tmp"
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(json.loads(texto), f, ensure_ascii=False, indent=2)
+            _fsync(f)
+        os.replace(tmp, caminho)
+        print(f"[DADOS] Checkpoint de '{secao}' em {os.path.abspath(caminho)}")
+        return True
     except Exception as e:
-        print(f"[DADOS] ERRO a guardar ficheiro: {e}")
-        # Em caso de erro a escrever, tenta pelo menos remover o temporário
-        if os.path.exists(tmp_file):
+        print(f"[DADOS] ERRO no checkpoint de '{secao}': {e}")
+        if os.path.exists(tmp):
             try:
-                os.remove(tmp_file)
+                os.remove(tmp)
             except Exception:
                 pass
+        return False
+
+
+def checkpoint() -> None:
+    """Grava o que está pendente, reescreve os ficheiros próprios desatualizados e regista-o no journal."""
+    flush_escritas()
+    with _lock_escrita:
+        _checkpoint()
+
+
+def _checkpoint() -> None:
+    global _ultimo_checkpoint
+
+    _ultimo_checkpoint = time.monotonic()
+    registos: List[str] = []
+    for secao, caminho in _espelhos.items():
+        if _seq_secao.get(secao, 0) <= _checkpoints.get(secao, 0):
+            continue
+        if _escrever_espelho(secao, caminho):
+            _checkpoints[secao] = _seq_secao.get(secao, 0)
+            registos.append(json.dumps({"checkpoint": secao, "seq": _checkpoints[secao]}, ensure_ascii=False))
+
+    if registos and BACKEND != "sqlite":
+        try:
+            with open(JOURNAL_FILE, "a", encoding="utf-8") as f:
+                f.write("\n".join(registos) + "\n")
+                _fsync(f)
+        except Exception as e:
+            print(f"[DADOS] ERRO a registar checkpoint: {e}")
+
+
+def compactar_dados() -> None:
+    """
+    Reescreve DATA_FILE completo a partir da última versão persistida de cada
+    secção e esvazia o journal. Usa ficheiro temporário + os.replace para
+    reduzir risco de ficheiro corrompido.
+
+    Se o processo cair entre os dois passos, o journal antigo volta a ser
+    reaplicado na leitura, o que é inofensivo: contém os mesmos valores.
+    """
+    flush_escritas()
+    with _lock_escrita:
+        _compactar()
+
+
+def _compactar() -> None:
+    if BACKEND == "sqlite":
+        return
+
+    # Os ficheiros próprios têm de estar atualizados antes de esvaziar o journal
+    _checkpoint()
+    if any(_seq_secao.get(secao, 0) > _checkpoints.get(secao, 0) for secao in _espelhos):
+        print("[DADOS] Compactação adiada: há ficheiros próprios por atualizar.")
+        return
+
+    tmp_file = DATA_FILE + ".tmp"
+    tmp_journal = JOURNAL_FILE + ".tmp"
+    caminho = os.path.abspath(DATA_FILE)
+
+    ordem = list(dict.fromkeys([*estado.keys(), *_persistido.keys()]))
+    snapshot = {secao: json.loads(_persistido[secao]) for secao in ordem if secao in _persistido}
+
+    print(f"[DADOS] compactar_dados() -> a reescrever {caminho}")
+    try:
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            json.dump(snapshot, f, ensure_ascii=False, indent=2)
+            _fsync(f)
+        # Substitui o ficheiro antigo pelo novo de forma atómica (quando possível)
+        os.replace(tmp_file, DATA_FILE)
+
+        with open(tmp_journal, "w", encoding="utf-8") as f:
+            # Ficheiros próprios registados acabaram de ser atualizados (checkpoint acima)
+            checkpoints = {k: (_seq if k in _espelhos else v) for k, v in _checkpoints.items()}
+            checkpoints.update({k: _seq for k in _espelhos})
+            f.write(json.dumps({"base_seq": _seq, "checkpoints": checkpoints}, ensure_ascii=False) + "\n")
+            _fsync(f)
+        os.replace(tmp_journal, JOURNAL_FILE)
+        _checkpoints.update(checkpoints)
+        print("[DADOS] Compactação concluída.")
+    except Exception as e:
+        print(f"[DADOS] ERRO a compactar: {e}")
+        # Em caso de erro a escrever, tenta pelo menos remover os temporários
+        for tmp in (tmp_file, tmp_journal):
+            if os.path.exists(tmp):
+                try:
+                    os.remove(tmp)
+                except Exception:
+                    pass
+
+
+# ========= LEITURA EM CACHE =========
+
+def ler_json_cache(caminho: Any) -> Any:
+    """
+    Conteúdo JSON de 'caminho', partilhado entre pedidos (não alterar). O
+    ficheiro só é relido quando o mtime ou o tamanho mudam. None se não
+    existir ou não for JSON válido.
+    """
+    caminho = str(caminho)
+    try:
+        st = os.stat(caminho)
+    except OSError:
+        _cache_json.pop(caminho, None)
+        return None
+
+    assinatura = (st.st_mtime_ns, st.st_size)
+    em_cache = _cache_json.get(caminho)
+    if em_cache is not None and em_cache[0] == assinatura:
+        return em_cache[1]
+
+    try:
+        with open(caminho, "r", encoding="utf-8") as f:
+            valor = json.load(f)
+    except Exception:
+        return None
+    _cache_json[caminho] = (assinatura, valor)
+    return valor
+
+
+# ========= VERSÕES E ÍNDICES =========
+
+def revisao(secao: str) -> int:
+    """
+    Versão em memória da secção: muda a cada guardar_dados() que a inclua
+    (mesmo antes de a escrita chegar ao disco) e a cada carregar_dados().
+    """
+    return _versoes.get(secao, 0)
+
+
+def versao_dados() -> int:
+    """
+    Versão global dos dados: muda a cada guardar_dados()/carregar_dados() e a
+    cada registar_alteracao() (gravações de ficheiros próprios dos módulos).
+    """
+    return _contador_versoes
+
+
+def registar_alteracao() -> None:
+    """Dados fora de 'estado' mudaram (despesas, proveitos, tesouraria, comissões, ...)."""
+    global _contador_versoes
+    _contador_versoes += 1
+
+
+def indice_clientes(nome: str, chave: Callable[[Dict[str, Any]], Any]) -> Dict[Any, List[int]]:
+    """
+    Índice em memória {chave(cliente): [posições em estado["clientes"]]},
+    por ordem original. É reconstruído quando a secção "clientes" é gravada,
+    substituída por outra lista ou muda de tamanho. Clientes cuja chave seja
+    vazia/None ficam de fora.
+    """
+    clientes = estado.get("clientes")
+    if not isinstance(clientes, list):
+        return {}
+
+    assinatura = (revisao("clientes"), id(clientes), len(clientes))
+    em_cache = _indices_clientes.get(nome)
+    if em_cache is not None and em_cache[0] == assinatura:
+        return em_cache[1]
+
+    indice: Dict[Any, List[int]] = {}
+    for pos, cli in enumerate(clientes):
+        if not isinstance(cli, dict):
+            continue
+        k = chave(cli)
+        if k:
+            indice.setdefault(k, []).append(pos)
+    _indices_clientes[nome] = (assinatura, indice)
+    return indice
+
 
+# Nada fica por gravar quando o processo termina
+atexit.register(flush_escritas)
 
-# Carrega os dados logo à importação do módulo
-carregar_dados()
+# Carrega os dados logo à importação do módulo (salvo no arranque diferido)
+if not ARRANQUE_DIFERIDO:
+    carregar_dados()
@@ -0,0 +1,329 @@
+"""
+Backend SQLite (opcional) para o 'estado' de dados.py.
+
+Ativa-se com a variável de ambiente PAC_DADOS_BACKEND=sqlite. O estado em
+memória continua a ser o mesmo dicionário; este módulo só trata de o ler e
+gravar, secção a secção, num ficheiro SQLite local. É só armazenamento: as
+pesquisas da app continuam a ser feitas em memória (dados.indice_clientes).
+
+Tabelas:
+- secoes: uma linha por secção de topo (ordem, seq da última gravação e o
+  JSON da secção; as partes guardadas em tabelas próprias ficam como marcador);
+- clientes / colaboradores: uma linha por registo, com o registo completo em
+  JSON e algumas colunas (NIF, nome, técnico, carteira) só para quem abre o
+  ficheiro à mão;
+- orcamento_linhas: listas do orçamento (clientes_linhas, colaboradores_linhas,
+  despesas, ...), uma linha por entrada;
+- timings: uma linha por (ano, empresa).
+
+As linhas são gravadas por posição (upsert): numa gravação só são escritas
+as linhas cujo JSON mudou e apagadas as que passaram do fim da lista; uma
+alteração a um cliente escreve uma linha, não a tabela toda.
+"""
+
+import json
+import os
+import re
+import sqlite3
+import unicodedata
+from typing import Any, Dict, List, Optional, Tuple
+
+# Listas do orçamento que vão para orcamento_linhas
+ORCAMENTO_LISTAS = (
+    "proveitos",
+    "colaboradores",
+    "despesas",
+    "clientes_linhas",
+    "colaboradores_linhas",
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS secoes (
+    nome TEXT PRIMARY KEY,
+    seq INTEGER NOT NULL,
+    valor TEXT
+);
+CREATE TABLE IF NOT EXISTS clientes (
+    pos INTEGER PRIMARY KEY,
+    nif TEXT,
+    nome TEXT,
+    nome_norm TEXT,
+    tecnico TEXT,
+    carteira TEXT,
+    dados TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS colaboradores (
+    pos INTEGER PRIMARY KEY,
+    nome TEXT,
+    nome_norm TEXT,
+    dados TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS orcamento_linhas (
+    tipo TEXT NOT NULL,
+    pos INTEGER NOT NULL,
+    nif TEXT,
+    nome_norm TEXT,
+    dados TEXT NOT NULL,
+    PRIMARY KEY (tipo, pos)
+);
+CREATE TABLE IF NOT EXISTS timings (
+    ano TEXT NOT NULL,
+    pos INTEGER NOT NULL,
+    empresa TEXT NOT NULL,
+    empresa_norm TEXT,
+    dados TEXT NOT NULL,
+    PRIMARY KEY (ano, pos)
+);
+-- Índices de versões anteriores (nenhuma consulta os usava)
+DROP INDEX IF EXISTS idx_clientes_nif;
+DROP INDEX IF EXISTS idx_clientes_nome_norm;
+DROP INDEX IF EXISTS idx_clientes_tecnico;
+DROP INDEX IF EXISTS idx_clientes_carteira;
+DROP INDEX IF EXISTS idx_colaboradores_nome_norm;
+DROP INDEX IF EXISTS idx_orcamento_linhas_nif;
+DROP INDEX IF EXISTS idx_orcamento_linhas_nome_norm;
+DROP INDEX IF EXISTS idx_timings_empresa_norm;
+"""
+
+
+def normalizar_chave(texto: Any) -> str:
+    """Maiúsculas, sem acentos e só com letras/dígitos separados por um espaço."""
+    if texto is None:
+        return ""
+    s = unicodedata.normalize("NFKD", str(texto))
+    s = "".join(ch for ch in s if not unicodedata.combining(ch))
+    s = re.sub(r"[^0-9A-Za-z]+", " ", s)
+    return " ".join(s.upper().split())
+
+
+def _json(valor: Any) -> str:
+    return json.dumps(valor, ensure_ascii=False, separators=(",", ":"))
+
+
+def _texto(valor: Any) -> Optional[str]:
+    if valor is None:
+        return None
+    s = str(valor).strip()
+    return s or None
+
+
+def abrir(db_path: str) -> sqlite3.Connection:
+    """Abre a base de dados (modo WAL, para leitores concorrentes) e cria o esquema."""
+    con = sqlite3.connect(db_path)
+    con.execute("PRAGMA journal_mode=WAL")
+    con.execute("PRAGMA synchronous=NORMAL")
+    con.executescript(_SCHEMA)
+    return con
+
+
+def _apagar_linhas_secao(con: sqlite3.Connection, nome: str) -> None:
+    if nome == "clientes":
+        con.execute("DELETE FROM clientes")
+    elif nome == "colaboradores":
+        con.execute("DELETE FROM colaboradores")
+    elif nome == "orcamento":
+        con.execute("DELETE FROM orcamento_linhas")
+    elif nome == "timings_dados":
+        con.execute("DELETE FROM timings")
+
+
+def _gravar_linhas(
+    con: sqlite3.Connection,
+    tabela: str,
+    chave: Tuple[str, ...],
+    colunas: Tuple[str, ...],
+    linhas: List[Tuple[Any, ...]],
+) -> None:
+    """Upsert por 'chave'; uma linha igual à que está gravada não é reescrita."""
+    todas = chave + colunas
+    con.executemany(
+        f"INSERT INTO {tabela} ({', '.join(todas)}) VALUES ({', '.join('?' * len(todas))}) "
+        f"ON CONFLICT({', '.join(chave)}) DO UPDATE SET {', '.join(f'{c} = excluded.{c}' for c in colunas)} "
+        f"WHERE {' OR '.join(f'{tabela}.{c} IS NOT excluded.{c}' for c in colunas)}",
+        linhas,
+    )
+
+
+def _apagar_grupos_fora(con: sqlite3.Connection, tabela: str, coluna: str, grupos: List[str]) -> None:
+    """Apaga as linhas de grupos (tipos do orçamento, anos) que já não existem."""
+    if grupos:
+        con.execute(f"DELETE FROM {tabela} WHERE {coluna} NOT IN ({', '.join('?' * len(grupos))})", grupos)
+    else:
+        con.execute(f"DELETE FROM {tabela}")
+
+
+def _escrever_secao(con: sqlite3.Connection, nome: str, valor: Any, seq: int) -> None:
+    marcador: Any = valor
+
+    if nome == "clientes" and isinstance(valor, list):
+        _gravar_linhas(
+            con,
+            "clientes",
+            ("pos",),
+            ("nif", "nome", "nome_norm", "tecnico", "carteira", "dados"),
+            [
+                (
+                    pos,
+                    _texto(cli.get("nif")) if isinstance(cli, dict) else None,
+                    _texto(cli.get("nome")) if isinstance(cli, dict) else None,
+                    normalizar_chave(cli.get("nome")) if isinstance(cli, dict) else None,
+                    _texto(cli.get("tecnico")) if isinstance(cli, dict) else None,
+                    _texto(cli.get("carteira")) if isinstance(cli, dict) else None,
+                    _json(cli),
+                )
+                for pos, cli in enumerate(valor)
+            ],
+        )
+        con.execute("DELETE FROM clientes WHERE pos >= ?", (len(valor),))
+        marcador = {"__tabela__": "clientes"}
+
+    elif nome == "colaboradores" and isinstance(valor, list):
+        _gravar_linhas(
+            con,
+            "colaboradores",
+            ("pos",),
+            ("nome", "nome_norm", "dados"),
+            [
+                (
+                    pos,
+                    _texto(col.get("nome")) if isinstance(col, dict) else None,
+                    normalizar_chave(col.get("nome")) if isinstance(col, dict) else None,
+                    _json(col),
+                )
+                for pos, col in enumerate(valor)
+            ],
+        )
+        con.execute("DELETE FROM colaboradores WHERE pos >= ?", (len(valor),))
+        marcador = {"__tabela__": "colaboradores"}
+
+    elif nome == "orcamento" and isinstance(valor, dict):
+        marcador = {}
+        linhas: List[Tuple[Any, ...]] = []
+        tamanhos: Dict[str, int] = {}
+        for chave, sub in valor.items():
+            if chave in ORCAMENTO_LISTAS and isinstance(sub, list):
+                marcador[chave] = {"__linhas__": chave}
+                tamanhos[chave] = len(sub)
+                for pos, linha in enumerate(sub):
+                    nome_linha = None
+                    nif_linha = None
+                    if isinstance(linha, dict):
+                        nome_linha = linha.get("nome") or linha.get("cliente") or linha.get("descricao")
+                        nif_linha = _texto(linha.get("nif"))
+                    linhas.append((chave, pos, nif_linha, normalizar_chave(nome_linha), _json(linha)))
+            else:
+                marcador[chave] = sub
+        _gravar_linhas(con, "orcamento_linhas", ("tipo", "pos"), ("nif", "nome_norm", "dados"), linhas)
+        _apagar_grupos_fora(con, "orcamento_linhas", "tipo", list(tamanhos))
+        con.executemany("DELETE FROM orcamento_linhas WHERE tipo = ? AND pos >= ?", list(tamanhos.items()))
+
+    elif nome == "timings_dados" and isinstance(valor, dict):
+        marcador = {}
+        linhas = []
+        tamanhos = {}
+        for ano, empresas in valor.items():
+            if isinstance(empresas, dict):
+                marcador[ano] = {"__timings__": ano}
+                tamanhos[str(ano)] = len(empresas)
+                for pos, (empresa, reg) in enumerate(empresas.items()):
+                    linhas.append((str(ano), pos, str(empresa), normalizar_chave(empresa), _json(reg)))
+            else:
+                marcador[ano] = empresas
+        _gravar_linhas(con, "timings", ("ano", "pos"), ("empresa", "empresa_norm", "dados"), linhas)
+        _apagar_grupos_fora(con, "timings", "ano", list(tamanhos))
+        con.executemany("DELETE FROM timings WHERE ano = ? AND pos >= ?", list(tamanhos.items()))
+
+    else:
+        _apagar_linhas_secao(con, nome)
+
+    con.execute(
+        "INSERT INTO secoes (nome, seq, valor) VALUES (?, ?, ?) "
+        "ON CONFLICT(nome) DO UPDATE SET seq = excluded.seq, valor = excluded.valor",
+        (nome, seq, _json(marcador)),
+    )
+
+
+def guardar_secoes(db_path: str, alteradas: Dict[str, Optional[str]], seq_inicial: int) -> int:
+    """
+    Grava numa única transação as secções alteradas ({secao: json_compacto},
+    None = secção removida). Devolve o último seq atribuído.
+    """
+    seq = seq_inicial
+    con = abrir(db_path)
+    try:
+        with con:
+            for nome, texto in alteradas.items():
+                seq += 1
+                if texto is None:
+                    _apagar_linhas_secao(con, nome)
+                    con.execute("DELETE FROM secoes WHERE nome = ?", (nome,))
+                else:
+                    _escrever_secao(con, nome, json.loads(texto), seq)
+    finally:
+        con.close()
+    return seq
+
+
+def carregar(db_path: str) -> Tuple[Dict[str, Any], Dict[str, int]]:
+    """Reconstrói o estado a partir da base de dados. Devolve (estado, {secao: seq})."""
+    data: Dict[str, Any] = {}
+    revisoes: Dict[str, int] = {}
+    con = abrir(db_path)
+    try:
+        for nome, seq, valor in con.execute("SELECT nome, seq, valor FROM secoes ORDER BY rowid"):
+            revisoes[nome] = int(seq or 0)
+            marcador = json.loads(valor) if valor is not None else None
+
+            if isinstance(marcador, dict) and marcador.get("__tabela__") in ("clientes", "colaboradores"):
+                tabela = marcador["__tabela__"]
+                data[nome] = [json.loads(d) for (d,) in con.execute(f"SELECT dados FROM {tabela} ORDER BY pos")]
+
+            elif nome == "orcamento" and isinstance(marcador, dict):
+                orc: Dict[str, Any] = {}
+                for chave, sub in marcador.items():
+                    if isinstance(sub, dict) and sub.get("__linhas__") == chave:
+                        orc[chave] = [
+                            json.loads(d)
+                            for (d,) in con.execute(
+                                "SELECT dados FROM orcamento_linhas WHERE tipo = ? ORDER BY pos", (chave,)
+                            )
+                        ]
+                    else:
+                        orc[chave] = sub
+                data[nome] = orc
+
+            elif nome == "timings_dados" and isinstance(marcador, dict):
+                td: Dict[str, Any] = {}
+                for ano, sub in marcador.items():
+                    if isinstance(sub, dict) and sub.get("__timings__") == ano:
+                        td[ano] = {
+                            empresa: json.loads(d)
+                            for empresa, d in con.execute(
+                                "SELECT empresa, dados FROM timings WHERE ano = ? ORDER BY pos", (ano,)
+                            )
+                        }
+                    else:
+                        td[ano] = sub
+                data[nome] = td
+
+            else:
+                data[nome] = marcador
+    finally:
+        con.close()
+    return data, revisoes
+
+
+def esta_vazia(db_path: str) -> bool:
+    if not os.path.exists(db_path):
+        return True
+    con = abrir(db_path)
+    try:
+        return con.execute("SELECT COUNT(*) FROM secoes").fetchone()[0] == 0
+    finally:
+        con.close()
+
+
+def migrar_de_estado(db_path: str, data: Dict[str, Any]) -> int:
+    """Migração única: grava todas as secções de 'data' (lido de dados.json). Devolve o seq final."""
+    alteradas: Dict[str, Optional[str]] = {nome: _json(valor) for nome, valor in data.items()}
+    return guardar_secoes(db_path, alteradas, 0)
@@ -6,7 +6,10 @@ from fastapi import APIRouter, Request, Form
 from fastapi.responses import HTMLResponse
 from fastapi.templating import Jinja2Templates
 
-from dados import estado  # já usas no api.py
+from dados import estado, registar_alteracao  # já usas no api.py
+from agregacao import _obter_custo_mensal_colaborador, medida
+from comissoes_motor import resultado as resultado_comissoes
+from cache_paginas import pagina_em_cache
 
 # === ROUTER PRINCIPAL DAS DESPESAS ===
 router = APIRouter()
@@ -92,166 +95,34 @@ def guardar_despesas(data: dict) -> None:
     """Guarda no ficheiro JSON os valores MANUAIS de despesas."""
     with open(DESPESAS_FILE, "w", encoding="utf-8") as f:
         json.dump(data, f, ensure_ascii=False, indent=2)
-
-
-def _obter_custo_mensal_colaborador(col: dict) -> float:
-    """
-    Calcula o custo mensal do colaborador com base nos campos que já existem no dicionário:
-
-    - vencimento_base / vencimento_mensal
-    - subsidio_alimentacao_diario
-    - ajudas_custo / ajudas_custo_mensal
-    - tsu_taxa (percentagem, se existir)
-    - seguro_acidentes_trabalho (se não tiver valor, assume 1% do vencimento)
-    - medicina_trabalho (se existir)
-    - modo_subsidios / subsidio_ferias_modo / subsidio_natal_modo
-
-    Regra para subsídios:
-      - Se o subsídio for "Completo" OU "Duodécimos", conta SEMPRE vencimento/12 por mês
-        (custo médio anual), quer seja pago numa vez ou em duodécimos.
-      - Se for "Nenhum" ou vazio, não conta nada.
-    """
-
-    # Vencimento base (compatível com o que vem de colaboradores.py)
-    venc_base = float(
-        col.get("vencimento_base")
-        or col.get("vencimento_mensal")
-        or 0.0
-    )
-
-    sa_diario = float(col.get("subsidio_alimentacao_diario") or 0.0)
-    ajudas = float(
-        col.get("ajudas_custo")
-        or col.get("ajudas_custo_mensal")
-        or 0.0
-    )
-    med_trabalho = float(col.get("medicina_trabalho") or 0.0)
-
-    # Seguro AT: se não tiver valor gravado, usamos 1% do vencimento como fallback
-    seguro_at = col.get("seguro_acidentes_trabalho")
-    if seguro_at is None or seguro_at == "":
-        seguro_at = round(venc_base * 0.01, 2)
-    seguro_at = float(seguro_at or 0.0)
-
-    # TSU (entidade): percentagem sobre o vencimento_base
-    tsu_taxa = float(col.get("tsu_taxa") or 0.0)  # ex: 23.75
-    tsu_valor = venc_base * tsu_taxa / 100.0
-
-    # Subsídio de alimentação mensal: assumimos 22 dias
-    sa_mensal = sa_diario * 22
-
-    # --- Subsídios de férias e Natal ------------------------------------
-    # Tentamos ler campos específicos; se não existirem, caímos em modo_subsidios.
-    modo_ferias = str(
-        col.get("subsidio_ferias_modo")
-        or col.get("subsidio_ferias")
-        or col.get("modo_subsidios")
-        or ""
-    ).strip().lower()
-
-    modo_natal = str(
-        col.get("subsidio_natal_modo")
-        or col.get("subsidio_natal")
-        or col.get("modo_subsidios")
-        or ""
-    ).strip().lower()
-
-    def tem_subsidio(modo: str) -> bool:
-        # Consideramos que "completo" e "duodecimos" têm sempre custo médio mensal
-        return modo in ("completo", "duodecimos")
-
-    sub_ferias_mensal = venc_base / 12.0 if tem_subsidio(modo_ferias) else 0.0
-    sub_natal_mensal = venc_base / 12.0 if tem_subsidio(modo_natal) else 0.0
-
-    # --------------------------------------------------------------------
-
-    custo = (
-        venc_base
-        + sa_mensal
-        + ajudas
-        + med_trabalho
-        + seguro_at
-        + tsu_valor
-        + sub_ferias_mensal
-        + sub_natal_mensal
-    )
-
-    return round(custo, 2)
+    registar_alteracao()
 
 
 def calcular_custos_colaboradores() -> tuple[list, list, float]:
     """
     Calcula os custos mensais por colaborador com base no módulo de colaboradores.
-    Usa o campo calculado em _obter_custo_mensal_colaborador.
+    Usa o campo calculado em _obter_custo_mensal_colaborador; os custos e os
+    totais (por ordem alfabética do nome) vêm do motor de agregação.
     """
-    colaboradores = estado.get("colaboradores", []) or []
-    colaboradores = [c for c in colaboradores if isinstance(c, dict)]
-
-    # ordenar alfabeticamente pelo nome
-    colaboradores = sorted(
-        colaboradores,
-        key=lambda c: str(c.get("nome", "")).lower()
-    )
+    agregado = medida("colaboradores_despesa")
 
     linhas = []
-    totais_mensais = [0.0] * 12
-    total_ano_geral = 0.0
-
-    for idx, col in enumerate(colaboradores):
-        nome = col.get("nome") or f"Colaborador {idx + 1}"
-        custo_mensal = _obter_custo_mensal_colaborador(col)
-
-        valores_meses = []
-        for mes_idx in range(12):
-            valores_meses.append(custo_mensal)
-            totais_mensais[mes_idx] += custo_mensal
-
-        total_linha = custo_mensal * 12
-        total_ano_geral += total_linha
-
+    for idx, (nome, custo_mensal) in enumerate(agregado["linhas"]):
         linhas.append(
             {
                 "codigo": f"col_{idx + 1}",
                 "nome": nome,
                 "auto": True,
-                "meses": valores_meses,
-                "total_ano": total_linha,
+                "meses": [custo_mensal] * 12,
+                "total_ano": custo_mensal * 12,
             }
         )
 
-    return linhas, totais_mensais, total_ano_geral
+    return linhas, list(agregado["totais_mensais"]), agregado["total_ano"]
 
 
 # ========= COMISSÕES AUTOMÁTICAS (BASE CLIENTES) =========
 
-# NIFs com comissões repartidas 50/50 entre Pedro e Ana (sobre 30% da mensalidade)
-NIFS_REPARTIDOS = {"505123185", "516253980"}
-
-
-def _adicionar_comissao(map_per_colab: dict, nome: str, valor: float) -> None:
-    """Soma 'valor' à comissão mensal do colaborador 'nome'."""
-    if not nome:
-        return
-    nome = str(nome).strip()
-    if not nome:
-        return
-    map_per_colab[nome] = map_per_colab.get(nome, 0.0) + float(valor or 0.0)
-
-
-def _ler_mensalidade(cli: dict) -> float:
-    """Lê o campo 'mensalidade' do cliente, aceitando float ou string com vírgulas/€."""
-    raw = cli.get("mensalidade") or 0.0
-    if isinstance(raw, (int, float)):
-        return float(raw)
-    s = str(raw)
-    s = s.replace("€", "").replace(" ", "")
-    s = s.replace(".", "").replace(",", ".")
-    try:
-        return float(s)
-    except ValueError:
-        return 0.0
-
-
 def calcular_comissoes() -> tuple[list, list, float]:
     """
     Calcula as comissões mensais por colaborador com base nos CLIENTES:
@@ -261,74 +132,25 @@ def calcular_comissoes() -> tuple[list, list, float]:
     - EXCEÇÕES: NIF 505123185 e 516253980
         → 30% da mensalidade, repartidos:
            15% para Pedro Fernandes + 15% para Ana Rodrigues.
-    """
-    clientes = estado.get("clientes", []) or []
-    comissoes_mensais: dict[str, float] = {}
-
-    for cli in clientes:
-        if not isinstance(cli, dict):
-            continue
-
-        mensalidade = _ler_mensalidade(cli)
-        if mensalidade <= 0:
-            continue
-
-        nif = str(cli.get("nif") or cli.get("nif_cliente") or "").strip()
-        carteira = str(cli.get("carteira") or "").strip()
-        tecnico = str(cli.get("tecnico") or "").strip()
-
-        # Se não houver carteira mas houver técnico, assumimos carteira = técnico
-        if not carteira and tecnico:
-            carteira = tecnico
-
-        # Sem carteira, não há comissões
-        if not carteira:
-            continue
-
-        # Casos especiais: NIFs repartidos 50/50 entre Pedro e Ana
-        if nif in NIFS_REPARTIDOS:
-            base = mensalidade * 0.30  # 30% da mensalidade
-            metade = base * 0.5        # 50% de 30% = 15% cada
-            _adicionar_comissao(comissoes_mensais, "Pedro Fernandes", metade)
-            _adicionar_comissao(comissoes_mensais, "Ana Rodrigues", metade)
-            continue
 
-        # Regra normal:
-        if carteira == tecnico:
-            perc = 0.30   # carteira é também técnico → 30%
-        else:
-            perc = 0.20   # carteira diferente do técnico → 20%
-
-        valor_comissao = mensalidade * perc
-        _adicionar_comissao(comissoes_mensais, carteira, valor_comissao)
-
-    # Transformar dicionário em linhas para a tabela, por ordem alfabética
-    nomes = sorted(comissoes_mensais.keys(), key=lambda s: s.lower())
+    As regras estão no motor de comissões (regra "despesa").
+    """
+    mensal = resultado_comissoes("despesa")["mensal"]
 
+    # Linhas para a tabela, por ordem alfabética
     linhas = []
-    totais_mensais = [0.0] * 12
-    total_ano_geral = 0.0
-
-    for idx, nome in enumerate(nomes):
-        valor_mensal = float(comissoes_mensais.get(nome, 0.0))
-        meses = [valor_mensal] * 12
-        total_linha = valor_mensal * 12
-
-        for i in range(12):
-            totais_mensais[i] += valor_mensal
-        total_ano_geral += total_linha
-
+    for idx, (nome, valor_mensal) in enumerate(mensal["linhas"]):
         linhas.append(
             {
                 "codigo": f"com_{idx + 1}",
                 "nome": nome,
                 "auto": True,          # tabela automática (só leitura)
-                "meses": meses,
-                "total_ano": total_linha,
+                "meses": [valor_mensal] * 12,
+                "total_ano": valor_mensal * 12,
             }
         )
 
-    return linhas, totais_mensais, total_ano_geral
+    return linhas, list(mensal["totais_mensais"]), mensal["total_ano"]
 
 
 def montar_grupo_manual(grupo_codigo: str, categorias: list, dados_grupo_ano: dict):
@@ -375,6 +197,7 @@ def montar_grupo_manual(grupo_codigo: str, categorias: list, dados_grupo_ano: di
 # ========= ROTAS DESPESAS =========
 
 @router.get("/despesas", response_class=HTMLResponse)
+@pagina_em_cache("despesas")
 async def pagina_despesas(request: Request, ano: int | None = None):
     if ano is None:
         ano = date.today().year
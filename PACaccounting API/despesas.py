@@ -216,6 +216,6 @@ async def adicionar_despesa(
     }
 
     lista.append(nova)
-    guardar_dados()
+    guardar_dados("despesas")
 
     return RedirectResponse(url="/despesas", status_code=303)
@@ -0,0 +1,182 @@
+"""
+Exportação em lote: vários documentos gerados em paralelo e devolvidos num ZIP.
+
+Cada documento é uma tarefa (nome no ZIP, módulo, função, argumentos). A
+função é chamada num processo do pool (importada pelo nome, por isso tem de
+estar ao nível do módulo e os argumentos têm de ser picklable) e devolve um
+BytesIO ou bytes. Os processos ficam vivos entre pedidos: reportlab, Pillow
+e openpyxl só são importados uma vez por processo.
+
+Os processos são criados com "spawn" (também em Linux): um fork copiaria
+locks que outra thread da app (escritor de dados, aquecimento de fontes,
+exportações) tivesse nesse momento, e o processo filho bloquearia para
+sempre. Arrancam com PAC_ARRANQUE_DIFERIDO=1, para que importar os módulos
+das rotas (timings, ...) não volte a ler os ficheiros de dados; as funções
+de render só usam os argumentos que recebem.
+
+Se o pool falhar ou não responder em PAC_EXPORT_TIMEOUT segundos (ou
+PAC_EXPORT_PROCESSOS <= 1) os documentos são gerados em threads. Depois de
+uma falha o pool fica desligado durante PAC_EXPORT_PAUSA segundos (o dobro a
+cada falha seguida, até 16x) em vez de ser recriado logo no lote seguinte.
+Um documento que rebenta não estraga o lote: fica de fora e o erro é
+descrito em ERROS.txt dentro do ZIP.
+"""
+
+import asyncio
+import importlib
+import multiprocessing
+import os
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+from typing import Any, Dict, List, Optional, Tuple
+
+# Processos para gerar documentos em paralelo (0/1 = sem pool, gera em threads)
+PROCESSOS_EXPORTACAO = int(os.environ.get("PAC_EXPORT_PROCESSOS") or min(4, os.cpu_count() or 1))
+# Tempo máximo (s) à espera do pool por um lote; depois o pool é descartado
+TEMPO_MAXIMO_POOL = float(os.environ.get("PAC_EXPORT_TIMEOUT") or 120)
+# Pausa (s) sem pool depois de uma falha; duplica a cada falha seguida
+PAUSA_POOL = float(os.environ.get("PAC_EXPORT_PAUSA") or 60)
+PAUSA_POOL_MAX = 16 * PAUSA_POOL
+
+# (nome no ZIP, módulo, função, argumentos)
+Tarefa = Tuple[str, str, str, tuple]
+
+_pool: Optional[ProcessPoolExecutor] = None
+# Falhas seguidas do pool e até quando (time.monotonic()) fica desligado
+_falhas_pool = 0
+_pool_desligado_ate = 0.0
+_estatisticas = {"lotes": 0, "documentos": 0, "erros": 0, "em_threads": 0, "pool_expirado": 0, "pool_desligado": 0}
+
+
+def _iniciar_processo() -> None:
+    # Os módulos das rotas não carregam dados ao serem importados no processo
+    os.environ["PAC_ARRANQUE_DIFERIDO"] = "1"
+
+
+def _obter_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(
+            max_workers=PROCESSOS_EXPORTACAO,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_iniciar_processo,
+        )
+    return _pool
+
+
+def gerar_documento(modulo: str, funcao: str, argumentos: tuple) -> bytes:
+    """Chama modulo.funcao(*argumentos) e devolve os bytes do documento."""
+    resultado = getattr(importlib.import_module(modulo), funcao)(*argumentos)
+    if isinstance(resultado, BytesIO):
+        return resultado.getvalue()
+    return bytes(resultado)
+
+
+def _descartar_pool() -> None:
+    """
+    Fecha o pool depois de uma falha e desliga-o durante a pausa. Um processo
+    preso num documento só sai quando o acabar; a pausa evita que cada lote
+    crie mais um pool ao lado dos que ainda estão presos.
+    """
+    global _pool, _falhas_pool, _pool_desligado_ate
+    _falhas_pool += 1
+    pausa = min(PAUSA_POOL * 2 ** (_falhas_pool - 1), PAUSA_POOL_MAX)
+    _pool_desligado_ate = time.monotonic() + pausa
+    print(f"[EXPORTACAO] WARNING: pool desligado durante {pausa:.0f} s ({_falhas_pool} falha(s) seguida(s))")
+    if _pool is None:
+        return
+    pool, _pool = _pool, None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _pool_disponivel() -> bool:
+    if PROCESSOS_EXPORTACAO <= 1:
+        return False
+    if time.monotonic() < _pool_desligado_ate:
+        _estatisticas["pool_desligado"] += 1
+        return False
+    return True
+
+
+async def _gerar_em(executor: Any, tarefas: List[Tarefa]) -> List[Any]:
+    loop = asyncio.get_running_loop()
+    return list(
+        await asyncio.gather(
+            *(loop.run_in_executor(executor, gerar_documento, modulo, funcao, argumentos) for _, modulo, funcao, argumentos in tarefas),
+            return_exceptions=True,
+        )
+    )
+
+
+async def _gerar(tarefas: List[Tarefa]) -> List[Any]:
+    """Bytes (ou a exceção) de cada tarefa, pela ordem de 'tarefas'."""
+    global _falhas_pool
+    if len(tarefas) > 1 and _pool_disponivel():
+        try:
+            resultados = await asyncio.wait_for(_gerar_em(_obter_pool(), tarefas), TEMPO_MAXIMO_POOL)
+            # Um processo que morre parte o pool: repete tudo em threads
+            partido = next((r for r in resultados if isinstance(r, BrokenProcessPool)), None)
+            if partido is None:
+                _falhas_pool = 0
+                return resultados
+            raise partido
+        except asyncio.TimeoutError:
+            _estatisticas["pool_expirado"] += 1
+            print(f"[EXPORTACAO] WARNING: pool de exportação sem resposta em {TEMPO_MAXIMO_POOL:.0f} s, a gerar em threads")
+            _descartar_pool()
+        except Exception as e:
+            print(f"[EXPORTACAO] WARNING: pool de exportação indisponível, a gerar em threads: {e}")
+            _descartar_pool()
+
+    _estatisticas["em_threads"] += 1
+    return await _gerar_em(None, tarefas)
+
+
+def _nome_unico(nome: str, usados: set) -> str:
+    if nome not in usados:
+        return nome
+    base, ext = os.path.splitext(nome)
+    i = 2
+    while f"{base}_{i}{ext}" in usados:
+        i += 1
+    return f"{base}_{i}{ext}"
+
+
+async def gerar_zip(tarefas: List[Tarefa]) -> BytesIO:
+    """ZIP com um ficheiro por tarefa (documentos gerados em paralelo)."""
+    resultados = await _gerar(tarefas)
+
+    buffer = BytesIO()
+    usados: set = set()
+    erros: List[str] = []
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for (nome, modulo, funcao, _), resultado in zip(tarefas, resultados):
+            if isinstance(resultado, BaseException):
+                erros.append(f"{nome}: {type(resultado).__name__}: {resultado}")
+                print(f"[EXPORTACAO] WARNING: falha a gerar {nome} ({modulo}.{funcao}): {resultado!r}")
+                continue
+            nome = _nome_unico(nome, usados)
+            usados.add(nome)
+            zf.writestr(nome, resultado)
+        if erros:
+            zf.writestr("ERROS.txt", "\n".join(erros) + "\n")
+
+    _estatisticas["lotes"] += 1
+    _estatisticas["documentos"] += len(usados)
+    _estatisticas["erros"] += len(erros)
+    buffer.seek(0)
+    return buffer
+
+
+def estatisticas() -> Dict[str, Any]:
+    return {
+        **_estatisticas,
+        "processos": PROCESSOS_EXPORTACAO,
+        "tempo_maximo_pool_s": TEMPO_MAXIMO_POOL,
+        "pool_ativo": _pool is not None,
+        "falhas_pool": _falhas_pool,
+        "pool_desligado_s": round(max(0.0, _pool_desligado_ate - time.monotonic()), 1),
+    }
@@ -0,0 +1,109 @@
+"""
+Exportações Excel (XLSX) em modo write-only do openpyxl.
+
+Um Workbook normal guarda em memória um objeto por célula (e os estilos de
+cada uma) até ao save; com os timings de vários anos de todos os clientes
+isso pesa. Aqui:
+
+  - novo_livro() cria um Workbook write-only com os estilos nomeados do
+    export, registados uma vez por livro; as células recebem o nome do
+    estilo (celula()) em vez de objetos Font/Fill/Border próprios;
+  - as linhas são escritas por ordem com ws.append() e o openpyxl passa-as
+    logo para XML num ficheiro temporário, por isso a memória não cresce com
+    o número de linhas. Larguras, painéis fixos e alturas têm de ser
+    definidos antes da primeira linha (definir_larguras() calcula as
+    larguras a partir dos valores, como os exports faziam depois);
+  - resposta_xlsx() constrói e grava o livro e devolve o ficheiro pronto.
+    O openpyxl só monta o ZIP no save(), depois de todas as linhas, por
+    isso não há nada para enviar antes disso. Rotas async usam
+    resposta_xlsx_async(), que faz o trabalho numa thread em vez de parar
+    o event loop.
+
+para_bytes() grava o livro num BytesIO (também nos lotes ZIP e no pool).
+"""
+
+from io import BytesIO
+from typing import Any, Callable, Dict, Optional, Sequence
+
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+
+def novo_livro(estilos: Dict[str, Dict[str, Any]]) -> Any:
+    """
+    Workbook write-only com um NamedStyle por entrada de 'estilos'
+    ({nome: {"font": ..., "fill": ..., "border": ..., "alignment": ...,
+    "number_format": ...}}).
+    """
+    from openpyxl import Workbook
+    from openpyxl.styles import NamedStyle
+
+    wb = Workbook(write_only=True)
+    for nome, atributos in estilos.items():
+        wb.add_named_style(NamedStyle(name=nome, **atributos))
+    return wb
+
+
+def celula(ws: Any, valor: Any, estilo: Optional[str] = None, number_format: Optional[str] = None) -> Any:
+    """Célula write-only com o estilo nomeado (e formato numérico) indicado."""
+    from openpyxl.cell import WriteOnlyCell
+
+    c = WriteOnlyCell(ws, value=valor)
+    if estilo:
+        c.style = estilo
+    if number_format:
+        c.number_format = number_format
+    return c
+
+
+def definir_larguras(ws: Any, linhas: Sequence[Sequence[Any]], minimos: Sequence[int], maximo: int) -> None:
+    """
+    Largura de cada coluna = maior texto da coluna + 2, entre minimos[i] e
+    'maximo'. Tem de ser chamada antes da primeira linha.
+    """
+    from openpyxl.utils import get_column_letter
+
+    for idx, minimo in enumerate(minimos, start=1):
+        max_len = max(
+            [len(str(_valor(linha, idx - 1) or "")) for linha in linhas] or [0]
+        )
+        ws.column_dimensions[get_column_letter(idx)].width = min(max(minimo, max_len + 2), maximo)
+
+
+def _valor(linha: Sequence[Any], indice: int) -> Any:
+    if indice >= len(linha):
+        return None
+    valor = linha[indice]
+    return getattr(valor, "value", valor)
+
+
+def para_bytes(wb: Any) -> BytesIO:
+    buffer = BytesIO()
+    wb.save(buffer)
+    buffer.seek(0)
+    return buffer
+
+
+def resposta_xlsx(construir: Callable[[], Any], filename: str) -> StreamingResponse:
+    """
+    Resposta com o XLSX de construir() (um Workbook write-only por gravar).
+    Um erro a construir o livro chega ao chamador como exceção. Para rotas
+    def (correm numa thread); rotas async usam resposta_xlsx_async().
+    """
+    return _resposta(para_bytes(construir()), filename)
+
+
+async def resposta_xlsx_async(construir: Callable[[], Any], filename: str) -> StreamingResponse:
+    """Como resposta_xlsx(), mas o livro é construído e gravado numa thread."""
+    buffer = await run_in_threadpool(lambda: para_bytes(construir()))
+    return _resposta(buffer, filename)
+
+
+def _resposta(buffer: BytesIO, filename: str) -> StreamingResponse:
+    return StreamingResponse(
+        buffer,
+        media_type=XLSX_MEDIA_TYPE,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
@@ -115,7 +115,7 @@ async def guardar_listas(request: Request):
         listas[grupo] = valores
 
     estado["listas"] = listas
-    guardar_dados()
+    guardar_dados("listas")
 
     return RedirectResponse(url="/listas", status_code=303)
 
@@ -149,7 +149,7 @@ async def listas_adicionar(
         if item not in listas[chave]:
             listas[chave].append(item)
             estado["listas"] = listas
-            guardar_dados()
+            guardar_dados("listas")
 
     return RedirectResponse(url="/listas", status_code=303)
 
@@ -172,6 +172,6 @@ async def listas_remover(lista: str, valor: str):
     if chave in listas and isinstance(listas[chave], list) and item in listas[chave]:
         listas[chave].remove(item)
         estado["listas"] = listas
-        guardar_dados()
+        guardar_dados("listas")
 
     return RedirectResponse(url="/listas", status_code=303)
@@ -0,0 +1,83 @@
+"""
+Caches partilhadas das funções de normalização de nomes.
+
+Os normalizadores (empresas, técnicos, carteiras) fazem NFD + regex e são
+chamados milhares de vezes por página com as mesmas poucas centenas de
+strings. Cada normalizador decorado com @memoizar fica com uma cache LRU
+própria e limitada, com contadores de hits/misses (ver estatisticas()).
+
+Normalizadores que dependem de tabelas de aliases (ALIASES_CANONICOS,
+CARTEIRA_ALIASES) declaram-nas em 'tabelas'; quem altera uma tabela chama
+tabela_alterada(nome) e as caches dependentes são esvaziadas.
+"""
+
+from functools import lru_cache, wraps
+from typing import Any, Callable, Dict, Iterable, List, Tuple
+
+TAMANHO_CACHE = 4096
+
+# {nome: (função em cache, tabelas de que depende)}
+_CACHES: Dict[str, Tuple[Any, Tuple[str, ...]]] = {}
+_NAO_CACHEAVEIS: Dict[str, int] = {}
+
+
+def memoizar(nome: str, tabelas: Iterable[str] = (), tamanho: int = TAMANHO_CACHE) -> Callable:
+    """
+    Decorador: cache LRU (tipada, para 1 e "1" não partilharem entrada) com
+    'tamanho' entradas. Argumentos não hashable passam direto à função.
+    """
+
+    def decorador(funcao: Callable) -> Callable:
+        em_cache = lru_cache(maxsize=tamanho, typed=True)(funcao)
+        _CACHES[nome] = (em_cache, tuple(tabelas))
+
+        @wraps(funcao)
+        def normalizar(*args, **kwargs):
+            # Só a verificação de hashable fica no try: um TypeError da própria
+            # função não a pode fazer correr outra vez fora da cache
+            try:
+                hash((args, tuple(kwargs.items())))
+            except TypeError:
+                _NAO_CACHEAVEIS[nome] = _NAO_CACHEAVEIS.get(nome, 0) + 1
+                return funcao(*args, **kwargs)
+            return em_cache(*args, **kwargs)
+
+        normalizar.cache_clear = em_cache.cache_clear  # type: ignore[attr-defined]
+        normalizar.cache_info = em_cache.cache_info  # type: ignore[attr-defined]
+        return normalizar
+
+    return decorador
+
+
+def tabela_alterada(tabela: str) -> List[str]:
+    """Esvazia as caches que dependem da tabela de aliases indicada. Devolve os nomes afetados."""
+    afetadas = [nome for nome, (_, tabelas) in _CACHES.items() if tabela in tabelas]
+    for nome in afetadas:
+        _CACHES[nome][0].cache_clear()
+    if afetadas:
+        print(f"[NORMALIZACAO] Tabela '{tabela}' alterada: caches limpas ({', '.join(afetadas)}).")
+    return afetadas
+
+
+def limpar_caches() -> None:
+    for em_cache, _ in _CACHES.values():
+        em_cache.cache_clear()
+    _NAO_CACHEAVEIS.clear()
+
+
+def estatisticas() -> Dict[str, Dict[str, Any]]:
+    """{normalizador: {hits, misses, taxa_hits, tamanho, maximo, nao_cacheaveis, tabelas}}."""
+    resultado: Dict[str, Dict[str, Any]] = {}
+    for nome, (em_cache, tabelas) in sorted(_CACHES.items()):
+        info = em_cache.cache_info()
+        chamadas = info.hits + info.misses
+        resultado[nome] = {
+            "hits": info.hits,
+            "misses": info.misses,
+            "taxa_hits": round(info.hits / chamadas, 4) if chamadas else 0.0,
+            "tamanho": info.currsize,
+            "maximo": info.maxsize,
+            "nao_cacheaveis": _NAO_CACHEAVEIS.get(nome, 0),
+            "tabelas": list(tabelas),
+        }
+    return resultado
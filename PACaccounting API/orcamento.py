@@ -3,6 +3,9 @@ from fastapi.responses import HTMLResponse, RedirectResponse
 from fastapi.templating import Jinja2Templates
 
 from dados import estado, guardar_dados  # ajusta se o módulo tiver outro nome
+from agregacao import medida
+from comissoes_motor import resultado as resultado_comissoes
+from cache_paginas import pagina_em_cache
 
 # tentar importar função de custo mensal de colaborador do módulo despesa, se existir
 try:
@@ -96,55 +99,15 @@ def _calcular_comissoes_clientes():
     """
     Calcula o TOTAL de comissões mensais/anual, o detalhe por cliente
     e o resumo por detentor da carteira, com base na tabela de clientes.
+    As regras estão no motor de comissões (regra "orcamento").
     """
-    clientes = estado.get("clientes", []) or []
-    detalhes = []
-    total_mensal = 0.0
-    comissoes_por_carteira = {}
-
-    for cli in clientes:
-        base = float(cli.get("mensalidade", 0) or 0)
-        if base <= 0:
-            continue
-
-        nif = str(cli.get("nif", "")).strip()
-        nome = (cli.get("nome") or "").strip()
-        carteira = (cli.get("carteira") or "").strip()
-        tecnico = (cli.get("tecnico") or "").strip()
-
-        # Exceções dos NIFs com 15% + 15% (total 30%)
-        if nif in ("505123185", "516253980"):
-            perc = 0.30
-        else:
-            # Se houver carteira e técnico diferentes -> 20%
-            if carteira and tecnico and carteira != tecnico:
-                perc = 0.20
-            else:
-                # Caso "normal" (carteira = técnico ou só um preenchido) -> 30%
-                perc = 0.30
-
-        comissao_mensal = base * perc
-        comissao_anual = comissao_mensal * 12
-        total_mensal += comissao_mensal
-
-        detalhes.append(
-            {
-                "nome": nome,
-                "nif": nif,
-                "mensalidade": base,
-                "percentagem": perc * 100,  # em %
-                "comissao_mensal": comissao_mensal,
-                "comissao_anual": comissao_anual,
-            }
-        )
+    comissoes = resultado_comissoes("orcamento")
 
-        # Resumo por detentor da carteira
-        detentor = carteira or tecnico or "Sem carteira"
-        comissoes_por_carteira.setdefault(detentor, 0.0)
-        comissoes_por_carteira[detentor] += comissao_mensal
+    detalhes = [dict(registo) for registo in comissoes["clientes"]]
 
+    total_mensal = comissoes["total_mensal"]
     total_anual = total_mensal * 12
-    return total_mensal, total_anual, detalhes, comissoes_por_carteira
+    return total_mensal, total_anual, detalhes, dict(comissoes["por_detentor"])
 
 
 def _importar_despesas_modulo_para_orcamento() -> None:
@@ -196,7 +159,7 @@ def _importar_despesas_modulo_para_orcamento() -> None:
         }
         for desc in rubricas_base
     ]
-    guardar_dados()
+    guardar_dados("orcamento")
 
 
 def _recalcular_proveitos(orc: dict) -> None:
@@ -211,44 +174,16 @@ def _recalcular_proveitos(orc: dict) -> None:
     E guarda também totais específicos para KPI:
       - proveitos_mensalidades_fatura_mensal / anual
       - proveitos_mensalidades_sem_fatura_mensal / anual
-    """
-    linhas = orc.get("clientes_linhas", []) or []
-
-    total_mens_fatura = 0.0
-    total_mens_sem_fatura = 0.0
-    total_mensal_grh = 0.0
-    total_mensal_com = 0.0
-
-    for ln in linhas:
-        com_fatura = bool(ln.get("com_fatura", False))
-
-        mens_atual = float(ln.get("mensalidade_atual", 0) or 0)
-        mens_est = ln.get("mensalidade_estimativa", None)
-        if mens_est is None:
-            mens_est = mens_atual
-        else:
-            mens_est = float(mens_est or 0)
 
-        if com_fatura:
-            total_mens_fatura += mens_est
-        else:
-            total_mens_sem_fatura += mens_est
-
-        grh_atual = float(ln.get("grh_atual", 0) or 0)
-        grh_est = ln.get("grh_estimativa", None)
-        if grh_est is None:
-            grh_est = grh_atual
-        else:
-            grh_est = float(grh_est or 0)
-        total_mensal_grh += grh_est
+    Os totais (estimativa, ou valor atual se não houver) vêm do motor de
+    agregação; para o orçamento de 'estado' ficam em cache até os dados mudarem.
+    """
+    totais = medida("proveitos_orcamento", None if orc is estado.get("orcamento") else {"orcamento": orc})
 
-        com_atual = float(ln.get("comercial_atual", 0) or 0)
-        com_est = ln.get("comercial_estimativa", None)
-        if com_est is None:
-            com_est = com_atual
-        else:
-            com_est = float(com_est or 0)
-        total_mensal_com += com_est
+    total_mens_fatura = totais["mensalidades_com_fatura"]
+    total_mens_sem_fatura = totais["mensalidades_sem_fatura"]
+    total_mensal_grh = totais["gestao_rh"]
+    total_mensal_com = totais["gestao_comercial"]
 
     orc["proveitos"] = [
         {
@@ -605,6 +540,7 @@ def _build_orcamento_context(request: Request) -> dict:
 # ========= ROTAS PRINCIPAIS =========
 
 @router.get("/orcamento", response_class=HTMLResponse)
+@pagina_em_cache("orcamento")
 async def ver_orcamento(request: Request):
     contexto = _build_orcamento_context(request)
     return templates.TemplateResponse("orcamento.html", contexto)
@@ -685,7 +621,7 @@ async def adicionar_orcamento_despesa(request: Request):
             "valor_anual": 0.0,
         }
     )
-    guardar_dados()
+    guardar_dados("orcamento")
     return RedirectResponse(url="/orcamento/despesas", status_code=303)
 
 
@@ -699,7 +635,7 @@ async def excluir_orcamento_despesa(indice: int):
     despesas = orcamento.get("despesas", [])
     if 0 <= indice < len(despesas):
         del despesas[indice]
-        guardar_dados()
+        guardar_dados("orcamento")
     return RedirectResponse(url="/orcamento/despesas", status_code=303)
 
 
@@ -724,7 +660,7 @@ async def guardar_orcamento_despesas(request: Request):
             despesas[i]["valor_mensal"] = valor_mensal
             despesas[i]["valor_anual"] = valor_mensal * 12
 
-    guardar_dados()
+    guardar_dados("orcamento")
     return RedirectResponse(url="/orcamento/despesas", status_code=303)
 
 
@@ -836,7 +772,7 @@ async def importar_orcamento_clientes(request: Request):
 
     orcamento["clientes_linhas"] = novas_linhas
     _recalcular_proveitos(orcamento)
-    guardar_dados()
+    guardar_dados("orcamento")
     return RedirectResponse(url="/orcamento/clientes", status_code=303)
 
 
@@ -864,7 +800,7 @@ async def adicionar_orcamento_cliente(request: Request):
     )
     orcamento["clientes_linhas"] = linhas
     _recalcular_proveitos(orcamento)
-    guardar_dados()
+    guardar_dados("orcamento")
     return RedirectResponse(url="/orcamento/clientes", status_code=303)
 
 
@@ -931,7 +867,7 @@ async def guardar_orcamento_clientes(request: Request):
 
     orcamento["clientes_linhas"] = novas_linhas
     _recalcular_proveitos(orcamento)
-    guardar_dados()
+    guardar_dados("orcamento")
     return RedirectResponse(url="/orcamento/clientes", status_code=303)
 
 
@@ -945,7 +881,7 @@ async def excluir_orcamento_cliente(id: str):
     linhas = [l for l in linhas if str(l.get("id")) != id]
     orcamento["clientes_linhas"] = linhas
     _recalcular_proveitos(orcamento)
-    guardar_dados()
+    guardar_dados("orcamento")
     return RedirectResponse(url="/orcamento/clientes", status_code=303)
 
 
@@ -1047,7 +983,7 @@ async def importar_orcamento_colaboradores(request: Request):
 
     orcamento["colaboradores_linhas"] = novas_linhas
     _recalcular_colaboradores(orcamento)
-    guardar_dados()
+    guardar_dados("orcamento")
     return RedirectResponse(url="/orcamento/colaboradores", status_code=303)
 
 
@@ -1079,7 +1015,7 @@ async def adicionar_orcamento_colaborador(request: Request):
     )
     orcamento["colaboradores_linhas"] = linhas
     _recalcular_colaboradores(orcamento)
-    guardar_dados()
+    guardar_dados("orcamento")
     return RedirectResponse(url="/orcamento/colaboradores", status_code=303)
 
 
@@ -1170,7 +1106,7 @@ async def guardar_orcamento_colaboradores(request: Request):
 
     orcamento["colaboradores_linhas"] = novas_linhas
     _recalcular_colaboradores(orcamento)
-    guardar_dados()
+    guardar_dados("orcamento")
     return RedirectResponse(url="/orcamento/colaboradores", status_code=303)
 
 
@@ -1184,5 +1120,5 @@ async def excluir_orcamento_colaborador(id: str):
     linhas = [l for l in linhas if str(l.get("id")) != id]
     orcamento["colaboradores_linhas"] = linhas
     _recalcular_colaboradores(orcamento)
-    guardar_dados()
+    guardar_dados("orcamento")
     return RedirectResponse(url="/orcamento/colaboradores", status_code=303)
@@ -6,7 +6,9 @@ from fastapi import APIRouter, Request, Form
 from fastapi.responses import HTMLResponse
 from fastapi.templating import Jinja2Templates
 
-from dados import estado  # já usas no api.py
+from dados import registar_alteracao
+from agregacao import medida
+from cache_paginas import pagina_em_cache
 
 router = APIRouter()
 
@@ -59,6 +61,7 @@ def guardar_proveitos(data: dict) -> None:
     """Guarda no ficheiro JSON os valores MANUAIS de proveitos."""
     with open(PROVEITOS_FILE, "w", encoding="utf-8") as f:
         json.dump(data, f, ensure_ascii=False, indent=2)
+    registar_alteracao()
 
 
 def calcular_proveitos_automaticos_por_categoria() -> dict:
@@ -70,37 +73,14 @@ def calcular_proveitos_automaticos_por_categoria() -> dict:
     - Gestão Comercial (antes estava em Arquivo Digital Toconline)
     Devolve um dicionário com valores MENSAIS (um valor que se aplica a todos os meses).
     """
-    auto = {
-        "mensalidades_com_fatura": 0.0,
-        "mensalidades_sem_fatura": 0.0,
-        "gestao_rh": 0.0,
-        "gestao_comercial": 0.0,
-    }
-
-    clientes = estado.get("clientes", [])
-
-    for cli in clientes:
-        mensalidade = float(cli.get("mensalidade") or 0)
-        valor_grh = float(cli.get("valor_grh") or 0)
-        valor_toconline = float(cli.get("valor_toconline") or 0)
-
-        com_fatura = cli.get("com_fatura")
-        if com_fatura:
-            auto["mensalidades_com_fatura"] += mensalidade
-        else:
-            auto["mensalidades_sem_fatura"] += mensalidade
-
-        auto["gestao_rh"] += valor_grh
-
-        # O que antes caía em Arquivo Digital Toconline passa a cair em Gestão Comercial
-        auto["gestao_comercial"] += valor_toconline
-
-    return auto
+    # O que antes caía em Arquivo Digital Toconline passa a cair em Gestão Comercial
+    return dict(medida("proveitos_automaticos"))
 
 
 # ========= ROTAS PROVEITOS =========
 
 @router.get("/proveitos", response_class=HTMLResponse)
+@pagina_em_cache("proveitos")
 async def pagina_proveitos(request: Request, ano: int | None = None):
     if ano is None:
         ano = date.today().year
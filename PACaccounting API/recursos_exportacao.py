@@ -0,0 +1,195 @@
+"""
+Recursos partilhados pelas exportações PDF/PNG, por processo.
+
+  - fontes Pillow: o primeiro ficheiro de cada lista de candidatos que abre
+    ("arial.ttf", depois DejaVu, ...) é procurado uma vez; cada fonte
+    (ficheiro, tamanho) é lida uma vez e reutilizada. As fontes têm tamanho
+    fixo e o Pillow desenha com o GIL, por isso são partilhadas entre threads;
+  - fontes reportlab: DejaVu registada uma vez (ou Helvetica, se não houver);
+  - estilos reportlab (ParagraphStyle, TableStyle, ...): cada módulo regista
+    uma fábrica com registar_estilo() e estilo(nome) constrói-o uma vez. Os
+    estilos são só lidos pelos documentos: não alterar.
+
+Os módulos declaram ao serem importados as fontes e os estilos que usam;
+aquecer() (chamado no arranque da app, numa thread) carrega-os todos, para a
+primeira exportação não pagar as importações nem a leitura das fontes.
+"""
+
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Optional, Set, Tuple
+
+_lock = threading.Lock()
+
+# candidatos -> ficheiro que abriu (None = fonte por omissão do Pillow)
+_caminhos: Dict[Tuple[str, ...], Optional[str]] = {}
+# (ficheiro, tamanho) -> fonte Pillow
+_fontes: Dict[Tuple[Optional[str], int], Any] = {}
+_fontes_a_aquecer: Dict[Tuple[str, ...], Set[int]] = {}
+
+_fontes_reportlab: Optional[Tuple[str, str]] = None
+
+_fabricas: Dict[str, Callable[[], Any]] = {}
+_estilos: Dict[str, Any] = {}
+
+_estatisticas = {
+    "caminhos_resolvidos": 0,
+    "fontes_carregadas": 0,
+    "fontes_reutilizadas": 0,
+    "estilos_construidos": 0,
+    "estilos_reutilizados": 0,
+    "aquecimento_ms": None,
+}
+
+
+# ========= FONTES PILLOW =========
+
+def registar_fonte_pillow(candidatos: Iterable[str], *tamanhos: int) -> None:
+    """Declara uma fonte (lista de candidatos) e os tamanhos a carregar em aquecer()."""
+    with _lock:
+        _fontes_a_aquecer.setdefault(tuple(candidatos), set()).update(tamanhos)
+
+
+def _resolver_caminho(candidatos: Tuple[str, ...]) -> Optional[str]:
+    with _lock:
+        if candidatos in _caminhos:
+            return _caminhos[candidatos]
+
+    from PIL import ImageFont
+
+    caminho = None
+    for candidato in candidatos:
+        try:
+            ImageFont.truetype(candidato, 10)
+        except Exception:
+            continue
+        caminho = candidato
+        break
+
+    with _lock:
+        _caminhos[candidatos] = caminho
+        _estatisticas["caminhos_resolvidos"] += 1
+    return caminho
+
+
+def fonte_pillow(candidatos: Iterable[str], tamanho: int) -> Any:
+    """
+    ImageFont do primeiro candidato que abre, no tamanho pedido (ou a fonte
+    por omissão do Pillow). Partilhada: não alterar.
+    """
+    caminho = _resolver_caminho(tuple(candidatos))
+    chave = (caminho, tamanho)
+    with _lock:
+        fonte = _fontes.get(chave)
+        if fonte is not None:
+            _estatisticas["fontes_reutilizadas"] += 1
+            return fonte
+
+    from PIL import ImageFont
+
+    try:
+        fonte = ImageFont.truetype(caminho, tamanho) if caminho else ImageFont.load_default()
+    except Exception:
+        fonte = ImageFont.load_default()
+
+    with _lock:
+        fonte = _fontes.setdefault(chave, fonte)
+        _estatisticas["fontes_carregadas"] += 1
+    return fonte
+
+
+# ========= FONTES REPORTLAB =========
+
+def _registar_fontes_reportlab() -> Tuple[str, str]:
+    base_font = "Helvetica"
+    bold_font = "Helvetica-Bold"
+    try:
+        from reportlab.pdfbase import pdfmetrics
+        from reportlab.pdfbase.ttfonts import TTFont
+
+        regular = "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf"
+        bold = "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf"
+        if os.path.exists(regular) and os.path.exists(bold):
+            pdfmetrics.registerFont(TTFont("DejaVu", regular))
+            pdfmetrics.registerFont(TTFont("DejaVuBold", bold))
+            base_font = "DejaVu"
+            bold_font = "DejaVuBold"
+    except Exception:
+        pass
+    return base_font, bold_font
+
+
+def fontes_reportlab() -> Tuple[str, str]:
+    """(fonte normal, fonte negrito) para os PDFs; regista as TTF na primeira chamada."""
+    global _fontes_reportlab
+    if _fontes_reportlab is None:
+        with _lock:
+            if _fontes_reportlab is None:
+                _fontes_reportlab = _registar_fontes_reportlab()
+    return _fontes_reportlab
+
+
+# ========= ESTILOS =========
+
+def registar_estilo(nome: str, fabrica: Callable[[], Any]) -> None:
+    """Regista a fábrica de um estilo; é construído no primeiro estilo(nome) (ou em aquecer())."""
+    with _lock:
+        _fabricas[nome] = fabrica
+        _estilos.pop(nome, None)
+
+
+def estilo(nome: str) -> Any:
+    """Estilo construído pela fábrica registada com 'nome' (partilhado: não alterar)."""
+    with _lock:
+        if nome in _estilos:
+            _estatisticas["estilos_reutilizados"] += 1
+            return _estilos[nome]
+        fabrica = _fabricas[nome]
+
+    construido = fabrica()
+    with _lock:
+        construido = _estilos.setdefault(nome, construido)
+        _estatisticas["estilos_construidos"] += 1
+    return construido
+
+
+# ========= ARRANQUE =========
+
+def aquecer() -> None:
+    """Carrega as fontes e os estilos declarados. Falhas (ex.: Pillow em falta) são ignoradas."""
+    inicio = time.perf_counter()
+    fontes_reportlab()
+
+    with _lock:
+        fontes = [(candidatos, sorted(tamanhos)) for candidatos, tamanhos in _fontes_a_aquecer.items()]
+        nomes = list(_fabricas)
+
+    for candidatos, tamanhos in fontes:
+        for tamanho in tamanhos:
+            try:
+                fonte_pillow(candidatos, tamanho)
+            except Exception as e:
+                print(f"[EXPORTACAO] WARNING: fonte {candidatos[0]} ({tamanho}) não carregada: {e}")
+                break
+
+    for nome in nomes:
+        try:
+            estilo(nome)
+        except Exception as e:
+            print(f"[EXPORTACAO] WARNING: estilo {nome} não construído: {e}")
+
+    _estatisticas["aquecimento_ms"] = round((time.perf_counter() - inicio) * 1000, 1)
+
+
+def estatisticas() -> Dict[str, Any]:
+    with _lock:
+        return {
+            **_estatisticas,
+            "fontes_pillow": {
+                ", ".join(candidatos): caminho for candidatos, caminho in _caminhos.items()
+            },
+            "fontes_em_cache": len(_fontes),
+            "fontes_reportlab": _fontes_reportlab,
+            "estilos": sorted(_estilos),
+        }
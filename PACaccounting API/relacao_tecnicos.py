@@ -2,10 +2,11 @@
 from __future__ import annotations
 
 import difflib
-import json
 import os
 import re
 import unicodedata
+import warnings
+from bisect import bisect_left, bisect_right
 from dataclasses import dataclass
 from datetime import date, datetime
 from io import BytesIO
@@ -15,18 +16,21 @@ from urllib.parse import urlencode
 from fastapi import APIRouter, HTTPException, Request
 from fastapi.responses import HTMLResponse, StreamingResponse
 from fastapi.templating import Jinja2Templates
-from openpyxl import Workbook
-from openpyxl.styles import Alignment, Border, Font, PatternFill, Side
-from openpyxl.utils import get_column_letter
-from openpyxl.worksheet.table import Table as XLTable, TableStyleInfo
 
-from dados import estado
+import correspondencias
+import exportacao
+import exportacao_excel
+import recursos_exportacao
+import timings_matriz
+from cache_paginas import pagina_em_cache
+from dados import estado, revisao
+from normalizacao import memoizar
+from timings import timings_para_leitura
 
 router = APIRouter()
 templates = Jinja2Templates(directory="templates")
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-TIMINGS_FILE = os.path.join(BASE_DIR, "timings_dados.json")
 
 # ===== Configuração =====
 VALOR_HORA_EUR_DEFAULT = 40.0
@@ -66,6 +70,7 @@ STOP_TOKENS = {
 }
 
 
+@memoizar("relacao_tecnicos.normalizar_nome")
 def normalizar_nome(valor: Optional[str]) -> str:
     if valor is None:
         return ""
@@ -124,14 +129,8 @@ def _parse_minutos(v: Any) -> int:
 
 
 def _load_timings() -> Dict[str, Any]:
-    if not os.path.exists(TIMINGS_FILE):
-        return {}
-    try:
-        with open(TIMINGS_FILE, "r", encoding="utf-8") as f:
-            data = json.load(f)
-        return data if isinstance(data, dict) else {}
-    except Exception:
-        return {}
+    # Partilhado com o módulo de timings (não alterar); sem I/O por pedido
+    return timings_para_leitura()
 
 
 @dataclass
@@ -156,14 +155,61 @@ class ClienteRow:
     sem_timings_tooltip: str
 
 
-# Cache de índice por id(ano_dict)
-_MATCH_CACHE: Dict[int, Tuple[Any, Dict[str, List[str]], Dict[str, Dict[str, Any]], List[str], Dict[str, List[str]]]] = {}
-# tuple: (ref, map_norm, original_map, norm_keys, tokens_por_norm)
+# Limite do fuzzy (mesmo cutoff de difflib.get_close_matches)
+FUZZY_CUTOFF = 0.80
+
+
+@dataclass
+class _IndiceMatch:
+    """
+    Índice das chaves normalizadas de um ano de timings para match_timings.
+
+    Além dos mapas de sempre, guarda índices para gerar candidatos sem
+    percorrer todas as chaves:
+      - chaves_por_token: token relevante -> posições (em norm_keys) das chaves
+        que o contêm (inclusão por tokens);
+      - comprimentos/pos_por_comprimento: chaves ordenadas por comprimento
+        (limite de difflib.real_quick_ratio);
+      - contagem_chars: contagem de caracteres por chave (limite de
+        difflib.quick_ratio, majorante exato do ratio).
+    """
+
+    map_norm: Dict[str, List[str]]
+    original_map: Dict[str, Dict[str, Any]]
+    norm_keys: List[str]
+    tokens_por_norm: Dict[str, List[str]]
+    chaves_por_token: Dict[str, List[int]]
+    n_tokens: List[int]
+    comprimentos: List[int]
+    pos_por_comprimento: List[int]
+    contagem_chars: List[Dict[str, int]]
+    assinatura: Tuple[int, int]
+
+
+# Cache de índice por id(ano_dict): {id: (ano_dict, índice)}. O ano_dict pode
+# ser o dicionário vivo do módulo de timings, por isso o índice também guarda
+# (tamanho do ano, revisão de timings_dados) e é refeito quando mudam.
+_MATCH_CACHE: Dict[int, Tuple[Any, _IndiceMatch]] = {}
+
+
+def _contar_chars(texto: str) -> Dict[str, int]:
+    contagem: Dict[str, int] = {}
+    for ch in texto:
+        contagem[ch] = contagem.get(ch, 0) + 1
+    return contagem
 
 
-def _construir_indice_timings(
-    ano_dict: Dict[str, Any]
-) -> Tuple[Dict[str, List[str]], Dict[str, Dict[str, Any]], List[str], Dict[str, List[str]]]:
+def _limite_ratio(contagem_a: Dict[str, int], contagem_b: Dict[str, int], total: int) -> float:
+    """Majorante do SequenceMatcher.ratio (igual a quick_ratio): caracteres comuns, com repetição."""
+    comuns = 0
+    for ch, n in contagem_a.items():
+        m = contagem_b.get(ch)
+        if m:
+            comuns += n if n < m else m
+    return 2.0 * comuns / total if total else 1.0
+
+
+def _construir_indice_timings(ano_dict: Dict[str, Any]) -> _IndiceMatch:
     map_norm_to_originals: Dict[str, List[str]] = {}
     original_para_registo: Dict[str, Dict[str, Any]] = {}
     tokens_por_norm: Dict[str, List[str]] = {}
@@ -183,22 +229,40 @@ def _construir_indice_timings(
             tokens_por_norm[chave_norm] = tokens_relevantes(chave_norm)
 
     norm_keys = list(map_norm_to_originals.keys())
-    return map_norm_to_originals, original_para_registo, norm_keys, tokens_por_norm
+
+    chaves_por_token: Dict[str, List[int]] = {}
+    n_tokens: List[int] = []
+    for pos, chave_norm in enumerate(norm_keys):
+        toks = set(tokens_por_norm.get(chave_norm, []))
+        n_tokens.append(len(toks))
+        for tok in toks:
+            chaves_por_token.setdefault(tok, []).append(pos)
+
+    por_comprimento = sorted(range(len(norm_keys)), key=lambda pos: len(norm_keys[pos]))
+    return _IndiceMatch(
+        map_norm=map_norm_to_originals,
+        original_map=original_para_registo,
+        norm_keys=norm_keys,
+        tokens_por_norm=tokens_por_norm,
+        chaves_por_token=chaves_por_token,
+        n_tokens=n_tokens,
+        comprimentos=[len(norm_keys[pos]) for pos in por_comprimento],
+        pos_por_comprimento=por_comprimento,
+        contagem_chars=[_contar_chars(k) for k in norm_keys],
+        assinatura=(len(ano_dict), revisao("timings_dados")),
+    )
 
 
-def _obter_match_cache(
-    ano_dict: Dict[str, Any]
-) -> Tuple[Dict[str, List[str]], Dict[str, Dict[str, Any]], List[str], Dict[str, List[str]]]:
+def _obter_match_cache(ano_dict: Dict[str, Any]) -> _IndiceMatch:
     key = id(ano_dict)
     cached = _MATCH_CACHE.get(key)
-    if cached and cached[0] is ano_dict:
-        return cached[1], cached[2], cached[3], cached[4]
+    if cached and cached[0] is ano_dict and cached[1].assinatura == (len(ano_dict), revisao("timings_dados")):
+        return cached[1]
 
-    map_norm, original_map, norm_keys, tokens_por_norm = _construir_indice_timings(ano_dict)
+    indice = _construir_indice_timings(ano_dict)
     _MATCH_CACHE.clear()
-    _MATCH_CACHE[key] = (ano_dict, map_norm, original_map, norm_keys, tokens_por_norm)
-    return map_norm, original_map, norm_keys, tokens_por_norm
-
+    _MATCH_CACHE[key] = (ano_dict, indice)
+    return indice
 
 def _escolher_original(nome_cliente: str, candidatos: List[str]) -> Optional[str]:
     if not candidatos:
@@ -223,6 +287,75 @@ def _format_debug_tooltip(cands: List[Tuple[str, float]]) -> str:
     return "Sugestões: " + "; ".join(parts) if parts else ""
 
 
+def _candidatos_inclusao(indice: _IndiceMatch, nome_tokens: set) -> List[Tuple[int, int]]:
+    """
+    Posições das chaves cujos tokens contêm ou estão contidos em nome_tokens,
+    com a sobreposição, por ordem de norm_keys. Só olha para as chaves que
+    partilham pelo menos um token (índice invertido).
+    """
+    comuns: Dict[int, int] = {}
+    for tok in nome_tokens:
+        for pos in indice.chaves_por_token.get(tok, ()):
+            comuns[pos] = comuns.get(pos, 0) + 1
+    n_nome = len(nome_tokens)
+    return [
+        (pos, n)
+        for pos, n in sorted(comuns.items())
+        if n == n_nome or n == indice.n_tokens[pos]
+    ]
+
+
+def _close_matches(nome_norm: str, indice: _IndiceMatch) -> List[str]:
+    """
+    difflib.get_close_matches(nome_norm, norm_keys, n=20, cutoff=FUZZY_CUTOFF),
+    mas só sobre as chaves que passam os mesmos limites rápidos que o difflib
+    aplica (comprimento e caracteres comuns). O resultado é o mesmo: o difflib
+    descarta essas chaves antes do ratio e ordena por (score, chave).
+    """
+    lb = len(nome_norm)
+    # real_quick_ratio >= cutoff exige 2/3 <= la/lb <= 3/2 (margem de 1 por arredondamento)
+    inicio = bisect_left(indice.comprimentos, (2 * lb) // 3 - 1)
+    fim = bisect_right(indice.comprimentos, (3 * lb) // 2 + 1)
+    contagem_nome = _contar_chars(nome_norm)
+
+    possiveis: List[str] = []
+    for i in range(inicio, fim):
+        pos = indice.pos_por_comprimento[i]
+        la = indice.comprimentos[i]
+        total = la + lb
+        if 2.0 * min(la, lb) / total < FUZZY_CUTOFF:
+            continue
+        if _limite_ratio(contagem_nome, indice.contagem_chars[pos], total) < FUZZY_CUTOFF:
+            continue
+        possiveis.append(indice.norm_keys[pos])
+    return difflib.get_close_matches(nome_norm, possiveis, n=20, cutoff=FUZZY_CUTOFF)
+
+
+def _top_ratios(nome_norm: str, indice: _IndiceMatch, posicoes: List[int], n: int = 3) -> List[Tuple[str, float]]:
+    """
+    Os n melhores (chave, ratio) entre as posições dadas, como
+    sorted(..., key=ratio, reverse=True)[:n] (empates pela ordem original),
+    calculando o ratio só quando o majorante ainda pode entrar no top.
+    """
+    contagem_nome = _contar_chars(nome_norm)
+    lb = len(nome_norm)
+    limites = [
+        (_limite_ratio(contagem_nome, indice.contagem_chars[pos], len(indice.norm_keys[pos]) + lb), pos)
+        for pos in posicoes
+    ]
+    limites.sort(key=lambda x: (-x[0], x[1]))
+
+    top: List[Tuple[float, int]] = []
+    for limite, pos in limites:
+        if len(top) >= n and limite < top[-1][0]:
+            break
+        ratio = difflib.SequenceMatcher(None, nome_norm, indice.norm_keys[pos]).ratio()
+        top.append((ratio, pos))
+        top.sort(key=lambda x: (-x[0], x[1]))
+        del top[n:]
+    return [(indice.norm_keys[pos], ratio) for ratio, pos in top]
+
+
 def match_timings(
     nome_cliente: str,
     ano_dict: Dict[str, Any],
@@ -239,51 +372,48 @@ def match_timings(
     if not nome_norm:
         return None, "none", None, []
 
-    map_norm, original_map, norm_keys, tokens_por_norm = _obter_match_cache(ano_dict)
+    indice = _obter_match_cache(ano_dict)
+    map_norm, original_map, norm_keys = indice.map_norm, indice.original_map, indice.norm_keys
 
     # 1) Exato
     bucket = map_norm.get(nome_norm)
     if bucket:
         chosen = _escolher_original(nome_original, bucket)
         if chosen and chosen in original_map:
-            return original_map[chosen], "exact", chosen, []
+            return ano_dict[chosen], "exact", chosen, []
 
     # 2) Inclusão por tokens relevantes
     nome_tokens = set(tokens_relevantes(nome_norm))
     candidatos_inclusao: List[Tuple[str, float, int]] = []
     if nome_tokens:
-        for chave_norm in norm_keys:
-            toks = tokens_por_norm.get(chave_norm, [])
-            if not toks:
-                continue
-            chave_tokens = set(toks)
-            if nome_tokens.issubset(chave_tokens) or chave_tokens.issubset(nome_tokens):
-                overlap = len(nome_tokens & chave_tokens)
-                # ratio só para desempate
-                ratio = difflib.SequenceMatcher(None, nome_norm, chave_norm).ratio()
-                candidatos_inclusao.append((chave_norm, ratio, overlap))
+        for pos, overlap in _candidatos_inclusao(indice, nome_tokens):
+            chave_norm = norm_keys[pos]
+            # ratio só para desempate
+            ratio = difflib.SequenceMatcher(None, nome_norm, chave_norm).ratio()
+            candidatos_inclusao.append((chave_norm, ratio, overlap))
     if candidatos_inclusao:
         chave_escolhida = max(candidatos_inclusao, key=lambda x: (x[2], x[1], len(x[0])))[0]
         chosen = _escolher_original(nome_original, map_norm[chave_escolhida])
         if chosen and chosen in original_map:
-            return original_map[chosen], "inclusao", chosen, []
+            return ano_dict[chosen], "inclusao", chosen, []
 
     # 3) Fuzzy limitado (para evitar “pendurar” em datasets grandes)
     # calcula ratios só para um subconjunto plausível:
     # - primeiro tenta get_close_matches com cutoff
     debug_top3: List[Tuple[str, float]] = []
     try:
-        close = difflib.get_close_matches(nome_norm, norm_keys, n=20, cutoff=0.80)
+        close = _close_matches(nome_norm, indice)
     except Exception:
         close = []
 
     # se não houver close, limita a 200 primeiros para debug (não mais)
-    candidatos_fuzzy = close if close else norm_keys[:200]
-
-    ratios: List[Tuple[str, float]] = []
-    for k in candidatos_fuzzy:
-        ratios.append((k, difflib.SequenceMatcher(None, nome_norm, k).ratio()))
-    ratios.sort(key=lambda x: x[1], reverse=True)
+    if close:
+        n_candidatos = len(close)
+        ratios = [(k, difflib.SequenceMatcher(None, nome_norm, k).ratio()) for k in close]
+        ratios.sort(key=lambda x: x[1], reverse=True)
+    else:
+        n_candidatos = min(len(norm_keys), 200)
+        ratios = _top_ratios(nome_norm, indice, list(range(n_candidatos)))
 
     for k, sc in ratios[:3]:
         bucket_k = map_norm.get(k, [])
@@ -293,10 +423,10 @@ def match_timings(
     if ratios:
         best_k, best_sc = ratios[0]
         second_sc = ratios[1][1] if len(ratios) > 1 else 0.0
-        if best_sc >= 0.92 and (len(ratios) == 1 or (best_sc - second_sc) >= 0.03):
+        if best_sc >= 0.92 and (n_candidatos == 1 or (best_sc - second_sc) >= 0.03):
             chosen = _escolher_original(nome_original, map_norm.get(best_k, []))
             if chosen and chosen in original_map:
-                return original_map[chosen], "fuzzy", chosen, []
+                return ano_dict[chosen], "fuzzy", chosen, []
 
     return None, "none", None, debug_top3
 
@@ -330,7 +460,35 @@ def _coletar_clientes() -> List[Dict[str, Any]]:
     return out
 
 
-def _build_rows(clientes: Iterable[Dict[str, Any]], ano_dict: Dict[str, Any]) -> List[ClienteRow]:
+def _calcular_correspondencias(clientes: List[Any], ano_dict: Dict[str, Any]) -> List[Optional[Dict[str, Any]]]:
+    """Coluna "relacao" da tabela de correspondências: match_timings para cada cliente."""
+    # Os dados mudaram (é por isso que a coluna é recalculada): índice novo
+    _MATCH_CACHE.clear()
+    coluna: List[Optional[Dict[str, Any]]] = []
+    for cli in clientes:
+        if not isinstance(cli, dict):
+            coluna.append(None)
+            continue
+        nome = str(cli.get("nome") or "").strip()
+        rec, origem, chave, debug = match_timings(nome, ano_dict)
+        score = 0.0
+        if rec is not None and chave:
+            score = difflib.SequenceMatcher(None, normalizar_nome(nome), normalizar_nome(chave)).ratio()
+        coluna.append(correspondencias.linha_cliente(cli, chave, origem, score, debug=[list(d) for d in debug]))
+    return coluna
+
+
+def _build_rows(
+    clientes: Iterable[Dict[str, Any]],
+    ano_dict: Dict[str, Any],
+    ano: Optional[Any] = None,
+) -> List[ClienteRow]:
+    """
+    Com 'ano', os matches vêm da tabela de correspondências (clientes com
+    "_idx", ver _coletar_clientes); sem 'ano', match_timings é chamado aqui.
+    """
+    coluna = correspondencias.obter_coluna(ano, "relacao", ano_dict, _calcular_correspondencias) if ano else None
+    matriz = timings_matriz.obter(ano, ano_dict) if ano else None
     rows: List[ClienteRow] = []
     for c in clientes:
         nome = str(c.get("nome") or "").strip()
@@ -353,8 +511,20 @@ def _build_rows(clientes: Iterable[Dict[str, Any]], ano_dict: Dict[str, Any]) ->
         periodicidade_iva = str(c.get("periodicidade_iva") or "").strip()
         regime_iva = str(c.get("regime_iva") or "").strip()
 
-        rec, origem, chave, debug = match_timings(nome, ano_dict)
-        media_min = _calcular_media_mensal(rec) if rec else 0
+        idx = c.get("_idx")
+        linha = coluna[idx] if coluna is not None and isinstance(idx, int) and idx < len(coluna) else None
+        if linha is not None and linha.get("cliente") == nome:
+            chave = linha.get("empresa")
+            rec = ano_dict.get(chave) if chave else None
+            origem = linha.get("metodo") or "none"
+            debug = [tuple(d) for d in linha.get("debug") or []]
+        else:
+            rec, origem, chave, debug = match_timings(nome, ano_dict)
+        i = matriz.linha(chave) if matriz is not None and rec else None
+        if i is not None:
+            media_min = matriz.media_mensal(i)
+        else:
+            media_min = _calcular_media_mensal(rec) if rec else 0
         media_str = _format_minutos(media_min)
         tooltip = _format_debug_tooltip(debug) if rec is None else ""
 
@@ -371,7 +541,6 @@ def _build_rows(clientes: Iterable[Dict[str, Any]], ano_dict: Dict[str, Any]) ->
             qualidade.append(QUALITY_FLAGS["sem_timings"])
 
         detalhe_href = None
-        idx = c.get("_idx")
         if isinstance(idx, int):
             detalhe_href = f"/clientes/editar/{idx}"
 
@@ -475,7 +644,7 @@ def _dataset(request: Request) -> Dict[str, Any]:
         ano_dict = {}
 
     clientes = _coletar_clientes()
-    rows_base = _build_rows(clientes, ano_dict)
+    rows_base = _build_rows(clientes, ano_dict, ano_sel)
     opcoes = _filter_options(rows_base)
 
     search = (q.get("search") or "").strip()
@@ -610,7 +779,15 @@ def _prepare_tecnico_export(
     linhas_tecnico = [
         r for r in rows_visiveis if (r.tecnico or "").strip().casefold() == alvo_cf
     ]
+    return _dados_export_tecnico(dados, tecnico_clean, linhas_tecnico, valor_hora)
+
 
+def _dados_export_tecnico(
+    dados: Dict[str, Any],
+    tecnico_clean: str,
+    linhas_tecnico: List[ClienteRow],
+    valor_hora: float,
+) -> Tuple[List[ClienteRow], str, Dict[str, str], Optional[int], str]:
     tecnico_display = linhas_tecnico[0].tecnico if linhas_tecnico else tecnico_clean
     total_min = sum(r.timing_media_minutos for r in linhas_tecnico)
     total_str = _format_minutos(total_min)
@@ -650,9 +827,13 @@ def _calcular_tempo_limites(row: ClienteRow, valor_hora: float) -> Tuple[int, in
 
 
 def _render_excel_pretty(rows: List[ClienteRow], total_str: str, ano_sel: Optional[int], filtros: Dict[str, str], valor_hora: float = VALOR_HORA_EUR_DEFAULT) -> BytesIO:
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Relacao Tecnicos"
+    return exportacao_excel.para_bytes(_livro_excel_pretty(rows, total_str, ano_sel, filtros, valor_hora))
+
+
+def _estilos_excel_pretty() -> Dict[str, Dict[str, Any]]:
+    """Estilos nomeados do Excel da relação (um por combinação de fundo/alinhamento usada)."""
+    from openpyxl.styles import Alignment, Border, Font, PatternFill, Side
+    from openpyxl.styles.fonts import DEFAULT_FONT
 
     thin = Side(style="thin", color="D1D5DB")
     border = Border(left=thin, right=thin, top=thin, bottom=thin)
@@ -668,29 +849,52 @@ def _render_excel_pretty(rows: List[ClienteRow], total_str: str, ano_sel: Option
     font_header = Font(bold=True, color="111827", size=11)
     font_total = Font(bold=True, color="111827", size=11)
 
-    align_left = Alignment(horizontal="left", vertical="center", wrap_text=True)
-    align_center = Alignment(horizontal="center", vertical="center", wrap_text=True)
-    align_right = Alignment(horizontal="right", vertical="center", wrap_text=True)
+    align_title = Alignment(horizontal="center", vertical="center")
+    alinhamentos = {
+        "esq": Alignment(horizontal="left", vertical="center", wrap_text=True),
+        "centro": Alignment(horizontal="center", vertical="center", wrap_text=True),
+        "dir": Alignment(horizontal="right", vertical="center", wrap_text=True),
+    }
 
-    # Título
-    ws.merge_cells("A1:J1")
-    ws["A1"] = "Relação Técnicos"
-    ws["A1"].fill = fill_title
-    ws["A1"].font = font_title
-    ws["A1"].alignment = Alignment(horizontal="center", vertical="center")
+    estilos: Dict[str, Dict[str, Any]] = {
+        "rt_titulo": {"fill": fill_title, "font": font_title, "alignment": align_title},
+        "rt_subtitulo": {"fill": fill_title, "font": font_sub, "alignment": align_title},
+        "rt_cabecalho": {"fill": fill_header, "font": font_header, "border": border, "alignment": alinhamentos["centro"]},
+        "rt_total": {"fill": fill_header, "font": font_total, "border": border, "alignment": alinhamentos["dir"]},
+        "rt_total_vazio": {"fill": fill_header, "font": DEFAULT_FONT, "border": border},
+    }
+    for nome, alinhamento in alinhamentos.items():
+        estilos[f"rt_{nome}"] = {"font": DEFAULT_FONT, "border": border, "alignment": alinhamento}
+        estilos[f"rt_{nome}_alt"] = {"font": DEFAULT_FONT, "border": border, "alignment": alinhamento, "fill": fill_alt}
+    # Destaques: sem timings (timing médio) e campos em falta
+    estilos["rt_dir_alerta"] = {"font": DEFAULT_FONT, "border": border, "alignment": alinhamentos["dir"], "fill": fill_alert}
+    estilos["rt_centro_aviso"] = {"font": DEFAULT_FONT, "border": border, "alignment": alinhamentos["centro"], "fill": fill_warn}
+    return estilos
+
+
+def _livro_excel_pretty(rows: List[ClienteRow], total_str: str, ano_sel: Optional[int], filtros: Dict[str, str], valor_hora: float = VALOR_HORA_EUR_DEFAULT):
+    # openpyxl só é importado na exportação (pesa no arranque da app)
+    from openpyxl.utils import get_column_letter
+    from openpyxl.worksheet.filters import AutoFilter
+    from openpyxl.worksheet.table import Table as XLTable, TableColumn, TableStyleInfo
+
+    wb = exportacao_excel.novo_livro(_estilos_excel_pretty())
+    ws = wb.create_sheet("Relacao Tecnicos")
+    celula = exportacao_excel.celula
+
+    # Em write-only, larguras, painéis e alturas vêm antes da primeira linha
+    widths = [40, 14, 18, 18, 20, 18, 18, 18, 18, 18]
+    for col, w in enumerate(widths, start=1):
+        ws.column_dimensions[get_column_letter(col)].width = w
+    ws.freeze_panes = "A6"
     ws.row_dimensions[1].height = 28
 
-    ws.merge_cells("A2:J2")
-    ws["A2"] = f"PACACCOUNTING | Gerado em {datetime.now().strftime('%d/%m/%Y %H:%M')}" + (f" | Ano: {ano_sel}" if ano_sel else "")
-    ws["A2"].fill = fill_title
-    ws["A2"].font = font_sub
-    ws["A2"].alignment = Alignment(horizontal="center", vertical="center")
-
-    ws.merge_cells("A3:J3")
-    ws["A3"] = "Filtros: " + " | ".join([f"{k}={v}" for k, v in filtros.items() if v]) if any(filtros.values()) else "Filtros: (nenhum)"
-    ws["A3"].fill = fill_title
-    ws["A3"].font = font_sub
-    ws["A3"].alignment = Alignment(horizontal="center", vertical="center")
+    # Título
+    for linha in range(1, 4):
+        ws.merged_cells.add(f"A{linha}:J{linha}")
+    ws.append([celula(ws, "Relação Técnicos", "rt_titulo")])
+    ws.append([celula(ws, f"PACACCOUNTING | Gerado em {datetime.now().strftime('%d/%m/%Y %H:%M')}" + (f" | Ano: {ano_sel}" if ano_sel else ""), "rt_subtitulo")])
+    ws.append([celula(ws, "Filtros: " + " | ".join([f"{k}={v}" for k, v in filtros.items() if v]) if any(filtros.values()) else "Filtros: (nenhum)", "rt_subtitulo")])
 
     ws.append([])
 
@@ -707,78 +911,55 @@ def _render_excel_pretty(rows: List[ClienteRow], total_str: str, ano_sel: Option
         "Tempo a cortar",
     ]
     header_row = 5
-    ws.append(headers)
-
-    for col in range(1, 11):
-        c = ws.cell(row=header_row, column=col)
-        c.fill = fill_header
-        c.font = font_header
-        c.border = border
-        c.alignment = align_center
+    ws.append([celula(ws, h, "rt_cabecalho") for h in headers])
 
-    start_row = header_row + 1
+    total_tempo_maximo = 0
+    total_tempo_cortar = 0
     for i, r in enumerate(rows):
-        rr = start_row + i
-        ws.cell(rr, 1, r.nome).alignment = align_left
-        ws.cell(rr, 2, r.nif).alignment = align_center
-        ws.cell(rr, 3, r.tecnico).alignment = align_center
-        ws.cell(rr, 4, r.tecnico_grh).alignment = align_center
-        ws.cell(rr, 5, r.tipo_contabilidade).alignment = align_center
-        ws.cell(rr, 6, r.periodicidade_iva).alignment = align_center
-        ws.cell(rr, 7, r.regime_iva).alignment = align_center
         tempo_maximo_min, tempo_a_cortar_min, tempo_maximo_str, tempo_cortar_str = _calcular_tempo_limites(r, valor_hora)
+        total_tempo_maximo += tempo_maximo_min
+        total_tempo_cortar += tempo_a_cortar_min
 
-        ws.cell(rr, 8, r.timing_media_str).alignment = align_right
-        ws.cell(rr, 9, tempo_maximo_str).alignment = align_right
-        ws.cell(rr, 10, tempo_cortar_str).alignment = align_right
-
-        for ccol in range(1, 11):
-            cell = ws.cell(rr, ccol)
-            cell.border = border
-            if i % 2 == 1:
-                cell.fill = fill_alt
+        alt = "_alt" if i % 2 == 1 else ""
+        esq, centro, dir_ = f"rt_esq{alt}", f"rt_centro{alt}", f"rt_dir{alt}"
+        aviso = "rt_centro_aviso"
 
         # Destaques
-        if "Sem timings" in r.qualidade:
-            ws.cell(rr, 8).fill = fill_alert
-        if not r.tecnico:
-            ws.cell(rr, 3).fill = fill_warn
-        if not r.tipo_contabilidade:
-            ws.cell(rr, 5).fill = fill_warn
-        if not r.periodicidade_iva:
-            ws.cell(rr, 6).fill = fill_warn
-        if not r.regime_iva:
-            ws.cell(rr, 7).fill = fill_warn
-
-    total_row = start_row + len(rows)
-    ws.merge_cells(start_row=total_row, start_column=1, end_row=total_row, end_column=7)
-    ws.cell(total_row, 1, "TOTAL").font = font_total
-    ws.cell(total_row, 1).alignment = align_right
-
-    total_tempo_maximo = sum(_calcular_tempo_limites(r, valor_hora)[0] for r in rows)
-    total_tempo_cortar = sum(_calcular_tempo_limites(r, valor_hora)[1] for r in rows)
-
-    ws.cell(total_row, 8, total_str).font = font_total
-    ws.cell(total_row, 8).alignment = align_right
-    ws.cell(total_row, 9, _format_horas_minutos(total_tempo_maximo)).font = font_total
-    ws.cell(total_row, 9).alignment = align_right
-    ws.cell(total_row, 10, _format_horas_minutos(total_tempo_cortar)).font = font_total
-    ws.cell(total_row, 10).alignment = align_right
-
-    for col in range(1, 11):
-        cell = ws.cell(total_row, col)
-        cell.border = border
-        cell.fill = fill_header
+        ws.append([
+            celula(ws, r.nome, esq),
+            celula(ws, r.nif, centro),
+            celula(ws, r.tecnico, centro if r.tecnico else aviso),
+            celula(ws, r.tecnico_grh, centro),
+            celula(ws, r.tipo_contabilidade, centro if r.tipo_contabilidade else aviso),
+            celula(ws, r.periodicidade_iva, centro if r.periodicidade_iva else aviso),
+            celula(ws, r.regime_iva, centro if r.regime_iva else aviso),
+            celula(ws, r.timing_media_str, "rt_dir_alerta" if "Sem timings" in r.qualidade else dir_),
+            celula(ws, tempo_maximo_str, dir_),
+            celula(ws, tempo_cortar_str, dir_),
+        ])
 
-    widths = [40, 14, 18, 18, 20, 18, 18, 18, 18, 18]
-    for col, w in enumerate(widths, start=1):
-        ws.column_dimensions[get_column_letter(col)].width = w
+    total_row = header_row + 1 + len(rows)
+    ws.merged_cells.add(f"A{total_row}:G{total_row}")
+    ws.append(
+        [celula(ws, "TOTAL", "rt_total")]
+        + [celula(ws, None, "rt_total_vazio") for _ in range(6)]
+        + [
+            celula(ws, total_str, "rt_total"),
+            celula(ws, _format_horas_minutos(total_tempo_maximo), "rt_total"),
+            celula(ws, _format_horas_minutos(total_tempo_cortar), "rt_total"),
+        ]
+    )
 
-    ws.freeze_panes = ws["A6"]
     ws.auto_filter.ref = f"A{header_row}:J{total_row}"
 
     try:
-        tab = XLTable(displayName="RelacaoTecnicos", ref=f"A{header_row}:J{total_row}")
+        # Sem acesso às células já escritas: as colunas da tabela vêm dos cabeçalhos
+        tab = XLTable(
+            displayName="RelacaoTecnicos",
+            ref=f"A{header_row}:J{total_row}",
+            autoFilter=AutoFilter(ref=f"A{header_row}:J{total_row}"),
+            tableColumns=[TableColumn(id=idx, name=h) for idx, h in enumerate(headers, start=1)],
+        )
         style = TableStyleInfo(
             name="TableStyleMedium9",
             showFirstColumn=False,
@@ -787,14 +968,14 @@ def _render_excel_pretty(rows: List[ClienteRow], total_str: str, ano_sel: Option
             showColumnStripes=False,
         )
         tab.tableStyleInfo = style
-        ws.add_table(tab)
+        with warnings.catch_warnings():
+            # Aviso do modo write-only; as colunas já vão definidas acima
+            warnings.simplefilter("ignore")
+            ws.add_table(tab)
     except Exception:
         pass
 
-    out = BytesIO()
-    wb.save(out)
-    out.seek(0)
-    return out
+    return wb
 
 
 # =========================
@@ -802,22 +983,62 @@ def _render_excel_pretty(rows: List[ClienteRow], total_str: str, ano_sel: Option
 # =========================
 
 def _pdf_register_fonts() -> Tuple[str, str]:
-    base_font = "Helvetica"
-    bold_font = "Helvetica-Bold"
-    try:
-        from reportlab.pdfbase import pdfmetrics
-        from reportlab.pdfbase.ttfonts import TTFont
-
-        regular = "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf"
-        bold = "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf"
-        if os.path.exists(regular) and os.path.exists(bold):
-            pdfmetrics.registerFont(TTFont("DejaVu", regular))
-            pdfmetrics.registerFont(TTFont("DejaVuBold", bold))
-            base_font = "DejaVu"
-            bold_font = "DejaVuBold"
-    except Exception:
-        pass
-    return base_font, bold_font
+    # DejaVu (ou Helvetica) registada uma vez por processo
+    return recursos_exportacao.fontes_reportlab()
+
+
+def _pdf_estilos_paragrafo() -> Dict[str, Any]:
+    from reportlab.lib import colors
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+
+    base_font, bold_font = _pdf_register_fonts()
+    styles = getSampleStyleSheet()
+    return {
+        "TitlePAC": ParagraphStyle(
+            name="TitlePAC",
+            parent=styles["Title"],
+            fontName=bold_font,
+            fontSize=18,
+            textColor=colors.HexColor("#061A44"),
+        ),
+        "MetaPAC": ParagraphStyle(
+            name="MetaPAC",
+            parent=styles["Normal"],
+            fontName=base_font,
+            fontSize=9,
+            textColor=colors.HexColor("#111827"),
+            spaceAfter=2,
+        ),
+    }
+
+
+def _pdf_estilo_tabela_base() -> Tuple[Tuple, ...]:
+    """Comandos fixos da tabela do PDF (as cores por linha são acrescentadas em cada export)."""
+    from reportlab.lib import colors
+
+    base_font, bold_font = _pdf_register_fonts()
+    header_bg = colors.HexColor("#D4AF37")
+    return (
+        ("FONTNAME", (0, 0), (-1, 0), bold_font),
+        ("FONTSIZE", (0, 0), (-1, 0), 9),
+        ("TEXTCOLOR", (0, 0), (-1, 0), colors.HexColor("#111827")),
+        ("BACKGROUND", (0, 0), (-1, 0), header_bg),
+        ("ALIGN", (0, 0), (0, -1), "LEFT"),
+        ("ALIGN", (1, 1), (6, -2), "CENTER"),
+        ("ALIGN", (7, 1), (-1, -2), "RIGHT"),
+        ("FONTNAME", (0, 1), (-1, -2), base_font),
+        ("FONTSIZE", (0, 1), (-1, -2), 8),
+        ("GRID", (0, 0), (-1, -1), 0.25, colors.HexColor("#9CA3AF")),
+        ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
+        ("FONTNAME", (0, -1), (-1, -1), bold_font),
+        ("BACKGROUND", (0, -1), (-1, -1), header_bg),
+        ("ALIGN", (6, -1), (6, -1), "RIGHT"),
+        ("ALIGN", (7, -1), (-1, -1), "RIGHT"),
+    )
+
+
+recursos_exportacao.registar_estilo("relacao_tecnicos.paragrafos", _pdf_estilos_paragrafo)
+recursos_exportacao.registar_estilo("relacao_tecnicos.tabela", _pdf_estilo_tabela_base)
 
 
 def _render_pdf_pretty(
@@ -832,7 +1053,6 @@ def _render_pdf_pretty(
         from reportlab.lib.pagesizes import A4, landscape
         from reportlab.lib.units import mm
         from reportlab.platypus import SimpleDocTemplate, Spacer, Paragraph, Table, TableStyle
-        from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -850,29 +1070,8 @@ def _render_pdf_pretty(
         title="Relação Técnicos",
     )
 
-    base_font, bold_font = _pdf_register_fonts()
-    styles = getSampleStyleSheet()
-    styles.add(
-        ParagraphStyle(
-            name="TitlePAC",
-            parent=styles["Title"],
-            fontName=bold_font,
-            fontSize=18,
-            textColor=colors.HexColor("#061A44"),
-        )
-    )
-    styles.add(
-        ParagraphStyle(
-            name="MetaPAC",
-            parent=styles["Normal"],
-            fontName=base_font,
-            fontSize=9,
-            textColor=colors.HexColor("#111827"),
-            spaceAfter=2,
-        )
-    )
-
-    header_bg = colors.HexColor("#D4AF37")
+    base_font, _ = _pdf_register_fonts()
+    styles = recursos_exportacao.estilo("relacao_tecnicos.paragrafos")
 
     def _footer(canvas, doc_):
         canvas.saveState()
@@ -951,23 +1150,7 @@ def _render_pdf_pretty(
     table = Table(data, colWidths=col_widths, repeatRows=1)
     alt_bg = colors.HexColor("#F3F4F6")
 
-    style_cmds: List[Tuple] = [
-        ("FONTNAME", (0, 0), (-1, 0), bold_font),
-        ("FONTSIZE", (0, 0), (-1, 0), 9),
-        ("TEXTCOLOR", (0, 0), (-1, 0), colors.HexColor("#111827")),
-        ("BACKGROUND", (0, 0), (-1, 0), header_bg),
-        ("ALIGN", (0, 0), (0, -1), "LEFT"),
-        ("ALIGN", (1, 1), (6, -2), "CENTER"),
-        ("ALIGN", (7, 1), (-1, -2), "RIGHT"),
-        ("FONTNAME", (0, 1), (-1, -2), base_font),
-        ("FONTSIZE", (0, 1), (-1, -2), 8),
-        ("GRID", (0, 0), (-1, -1), 0.25, colors.HexColor("#9CA3AF")),
-        ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
-        ("FONTNAME", (0, -1), (-1, -1), bold_font),
-        ("BACKGROUND", (0, -1), (-1, -1), header_bg),
-        ("ALIGN", (6, -1), (6, -1), "RIGHT"),
-        ("ALIGN", (7, -1), (-1, -1), "RIGHT"),
-    ]
+    style_cmds: List[Tuple] = list(recursos_exportacao.estilo("relacao_tecnicos.tabela"))
 
     for i in range(1, len(data) - 1):
         if i % 2 == 0:
@@ -992,6 +1175,7 @@ def _render_pdf_pretty(
 # =========================
 
 @router.get("/relacao-tecnicos", response_class=HTMLResponse)
+@pagina_em_cache("relacao-tecnicos")
 async def pagina_relacao_tecnicos(request: Request):
     dados = _dataset(request)
     # Estes nomes estão alinhados com o teu relacao_tecnicos.html
@@ -1034,13 +1218,11 @@ def _resolver_valor_hora(request: Request, valor_query: str | None) -> float:
 async def exportar_excel_relacao_tecnico(request: Request, tecnico: str | None = None, valor_hora: str | None = None):
     valor_hora_eur = _resolver_valor_hora(request, valor_hora)
     linhas, total_str, filtros_export, ano_sel, tecnico_display = _prepare_tecnico_export(request, tecnico, valor_hora_eur)
-    buffer = _render_excel_pretty(linhas, total_str, ano_sel, filtros_export, valor_hora_eur)
     data_stamp = datetime.now().strftime("%Y-%m-%d")
     filename = f"relacao_tecnicos_{_slugify_tecnico_filename(tecnico_display)}_{data_stamp}.xlsx"
-    return StreamingResponse(
-        buffer,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    return await exportacao_excel.resposta_xlsx_async(
+        lambda: _livro_excel_pretty(linhas, total_str, ano_sel, filtros_export, valor_hora_eur),
+        filename,
     )
 
 
@@ -1058,18 +1240,67 @@ async def exportar_pdf_relacao_tecnico(request: Request, tecnico: str | None = N
     )
 
 
+# Formatos do lote: extensão e função de render (por técnico)
+FORMATOS_LOTE = {
+    "excel": ("xlsx", "_render_excel_pretty"),
+    "pdf": ("pdf", "_render_pdf_pretty"),
+}
+
+
+@router.get("/relacao-tecnicos/download/lote")
+async def exportar_lote_relacao_tecnicos(request: Request, formatos: str | None = None, valor_hora: str | None = None):
+    """
+    ZIP com o Excel e o PDF (ou só os 'formatos' pedidos) de cada técnico da
+    lista, com os filtros atuais. O dataset é calculado uma vez e os
+    documentos são gerados em paralelo.
+    """
+    pedidos = [f.strip().lower() for f in (formatos or "excel,pdf").split(",") if f.strip()]
+    desconhecidos = [f for f in pedidos if f not in FORMATOS_LOTE]
+    if desconhecidos or not pedidos:
+        raise HTTPException(status_code=400, detail=f"Formatos inválidos: {', '.join(desconhecidos) or '—'} (excel, pdf)")
+
+    valor_hora_eur = _resolver_valor_hora(request, valor_hora)
+    dados = _dataset(request)
+
+    # Mesmo critério de /download/excel: técnico comparado sem maiúsculas
+    por_tecnico: Dict[str, List[ClienteRow]] = {}
+    for r in dados.get("rows", []) or []:
+        por_tecnico.setdefault((r.tecnico or "").strip().casefold(), []).append(r)
+
+    data_stamp = datetime.now().strftime("%Y-%m-%d")
+    tarefas = []
+    for item in dados["tecnicos_lista"]:
+        tecnico_clean = (item["nome"] or "").strip()
+        linhas, total_str, filtros_export, ano_sel, tecnico_display = _dados_export_tecnico(
+            dados, tecnico_clean, por_tecnico.get(tecnico_clean.casefold(), []), valor_hora_eur
+        )
+        for formato in dict.fromkeys(pedidos):
+            extensao, funcao = FORMATOS_LOTE[formato]
+            nome = f"relacao_tecnicos_{_slugify_tecnico_filename(tecnico_display)}_{data_stamp}.{extensao}"
+            tarefas.append((nome, __name__, funcao, (linhas, total_str, ano_sel, filtros_export, valor_hora_eur)))
+
+    if not tarefas:
+        raise HTTPException(status_code=404, detail="Sem técnicos para exportar")
+
+    buffer = await exportacao.gerar_zip(tarefas)
+
+    filename = f"relacao_tecnicos_{data_stamp}.zip"
+    return StreamingResponse(
+        buffer,
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
 @router.get("/relacao-tecnicos/export/excel")
 async def exportar_excel_relacao_tecnicos(request: Request):
     dados = _dataset(request)
     valor_hora_eur = _resolver_valor_hora(request, None)
     filtros_export = dict(dados["filtros"])
     filtros_export["valor_hora"] = f"{valor_hora_eur:.2f}"
-    buffer = _render_excel_pretty(dados["rows"], dados["total_str"], dados["ano_sel"], filtros_export, valor_hora_eur)
-    filename = "relacao_tecnicos.xlsx"
-    return StreamingResponse(
-        buffer,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    return await exportacao_excel.resposta_xlsx_async(
+        lambda: _livro_excel_pretty(dados["rows"], dados["total_str"], dados["ano_sel"], filtros_export, valor_hora_eur),
+        "relacao_tecnicos.xlsx",
     )
 
 
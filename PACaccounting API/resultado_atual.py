@@ -3,6 +3,8 @@ from fastapi.responses import HTMLResponse
 from fastapi.templating import Jinja2Templates
 
 from dados import estado
+from agregacao import medida
+from cache_paginas import pagina_em_cache
 
 router = APIRouter()
 templates = Jinja2Templates(directory="templates")
@@ -15,13 +17,6 @@ def _to_float(v):
         return 0.0
 
 
-def _to_int(v, default=0):
-    try:
-        return int(v)
-    except Exception:
-        return default
-
-
 def _dados_seguro() -> dict:
     if isinstance(estado, dict):
         return estado
@@ -33,14 +28,7 @@ def calcular_receitas_anuais(dados: dict) -> dict:
     Calcula as receitas anuais baseadas nos clientes reais:
     mensalidade + valor_grh + valor_gestao_comercial.
     """
-    clientes = dados.get("clientes", [])
-    total_mensal = 0.0
-
-    for c in clientes:
-        mensal = _to_float(c.get("mensalidade"))
-        grh = _to_float(c.get("valor_grh") or c.get("grh") or 0)
-        gc = _to_float(c.get("valor_gestao_comercial") or c.get("gestao_comercial") or 0)
-        total_mensal += (mensal + grh + gc)
+    total_mensal = medida("receita_resultado_atual", dados)
 
     return {
         "total_mensal": total_mensal,
@@ -52,41 +40,19 @@ def calcular_custo_colaboradores_anuais(dados: dict) -> dict:
     """
     Calcula custo anual com colaboradores: vencimento + S.A. + ajudas custo, * 12.
     """
-    colabs = dados.get("colaboradores", [])
-    total_anual = 0.0
-
-    linhas = []
-
-    for c in colabs:
-        nome = c.get("nome") or ""
-        vencimento = _to_float(
-            c.get("vencimento_mensal")
-            or c.get("salario_base")
-            or c.get("remuneracao_base")
-            or 0
-        )
-        sa_diario = _to_float(
-            c.get("subsidio_alimentacao_diario")
-            or c.get("subsidio_alimentacao")
-            or 0
-        )
-        ajudas = _to_float(c.get("ajudas_custo_mensal") or 0)
-        dias = _to_int(c.get("dias_trabalho_mes") or 22, default=22)
-
-        custo_mensal = vencimento + sa_diario * dias + ajudas
-        custo_anual = custo_mensal * 12
-        total_anual += custo_anual
-
-        linhas.append(
-            {
-                "nome": nome,
-                "custo_mensal": custo_mensal,
-                "custo_anual": custo_anual,
-            }
-        )
+    agregado = medida("colaboradores_resultado_atual", dados)
+
+    linhas = [
+        {
+            "nome": nome,
+            "custo_mensal": custo_mensal,
+            "custo_anual": custo_anual,
+        }
+        for nome, custo_mensal, custo_anual in agregado["linhas"]
+    ]
 
     return {
-        "total_anual": total_anual,
+        "total_anual": agregado["total_anual"],
         "linhas": linhas,
     }
 
@@ -120,6 +86,7 @@ def calcular_outras_despesas_anuais(dados: dict) -> float:
 
 
 @router.get("/resultado-atual", response_class=HTMLResponse)
+@pagina_em_cache("resultado-atual")
 async def pagina_resultado_atual(request: Request):
     """
     Resultado atual simples:
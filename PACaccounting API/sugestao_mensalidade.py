@@ -5,14 +5,16 @@ from fastapi.templating import Jinja2Templates
 from datetime import date
 
 import os
-import json
 import re
 import csv
 from io import StringIO
 from typing import Dict, Any, List, Optional, Set
 
+import correspondencias
 from dados import estado
 from timings import _normalize_nome  # normalização já usada no módulo de timings
+from timings import timings_para_leitura  # leitura partilhada, sem reler o ficheiro
+from normalizacao import memoizar
 
 from despesa import (
     carregar_despesas,
@@ -26,7 +28,6 @@ router = APIRouter()
 templates = Jinja2Templates(directory="templates")
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-TIMINGS_FILE = os.path.join(BASE_DIR, "timings_dados.json")
 SUGESTAO_VERSION = "estado-v2-2025-12-13"
 
 
@@ -72,6 +73,7 @@ def _safe_key_from_nome(nome: str) -> str:
     return key or "CLIENTE"
 
 
+@memoizar("sugestao_mensalidade._nome_match_key")
 def _nome_match_key(s: str) -> str:
     """
     Chave robusta para cruzar nomes entre módulos.
@@ -134,14 +136,8 @@ def _similaridade_prefixo(a: str, b: str) -> float:
 
 
 def _ler_timings_file() -> Dict[str, Any]:
-    """Lê timings_dados.json guardado junto ao módulo."""
-    path = TIMINGS_FILE
-    try:
-        with open(path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-        return data if isinstance(data, dict) else {}
-    except Exception:
-        return {}
+    """timings_dados (formato por ano), partilhado com o módulo de timings: não alterar."""
+    return timings_para_leitura()
 
 
 def carregar_timings_brutos() -> Dict[str, Any]:
@@ -310,6 +306,48 @@ def _obter_horas_medias_daniela_por_cliente() -> Dict[str, float]:
     return {}
 
 
+def _casar_clientes_timings(clientes: List[Any], ano_dict: Dict[str, Any]) -> List[Optional[Dict[str, Any]]]:
+    """
+    Coluna "sugestao" da tabela de correspondências: para cada cliente, o nome
+    no timings por _nome_match_key (exato) ou, em alternativa, por prefixo >= 0.6.
+    """
+    # mapa de match_key -> nome real do timings (para casar)
+    mapa_timings_nome_por_key: Dict[str, str] = {}
+    for nome_t in correspondencias.empresas_ativas(ano_dict):
+        mk = _nome_match_key(nome_t)
+        mapa_timings_nome_por_key[mk] = nome_t
+
+    coluna: List[Optional[Dict[str, Any]]] = []
+    for cli in clientes:
+        nome = str(cli.get("nome") or "").strip() if isinstance(cli, dict) else ""
+        if not nome:
+            coluna.append(None)
+            continue
+
+        match_key = _nome_match_key(nome)
+
+        # match exato
+        nome_timings = mapa_timings_nome_por_key.get(match_key)
+        metodo, score = ("exact", 1.0) if nome_timings else ("none", 0.0)
+
+        # fallback por aproximação (prefixo >= 0.6)
+        if not nome_timings:
+            melhor_nome = None
+            melhor_score = 0.0
+            for k, n_real in mapa_timings_nome_por_key.items():
+                score = _similaridade_prefixo(match_key, k)
+                if score > melhor_score:
+                    melhor_score = score
+                    melhor_nome = n_real
+            if melhor_score >= 0.6 and melhor_nome:
+                nome_timings = melhor_nome
+                metodo = "prefixo"
+            score = melhor_score
+
+        coluna.append(correspondencias.linha_cliente(cli, nome_timings, metodo, score, match_key=match_key))
+    return coluna
+
+
 def _get_clientes_lista() -> List[Dict[str, Any]]:
     clientes = estado.get("clientes", [])
     if isinstance(clientes, list):
@@ -420,11 +458,13 @@ def _build_context(
         for key, nome in sorted(clientes_opcoes_dict.items(), key=lambda item: item[1].lower())
     ]
 
-    # mapa de match_key -> nome real do timings (para casar)
-    mapa_timings_nome_por_key: Dict[str, str] = {}
-    for nome_t in horas_medias_clientes.keys():
-        mk = _nome_match_key(nome_t)
-        mapa_timings_nome_por_key[mk] = nome_t
+    # cliente -> nome no timings (ano mais recente), pela tabela de correspondências
+    por_ano = _obter_ano_mais_recente(bruto_timings)
+    if isinstance(clientes_estado, list):
+        ano_label = _obter_ano_mais_recente_numero(bruto_timings) or ""
+        correspondencia = correspondencias.obter_coluna(ano_label, "sugestao", por_ano, _casar_clientes_timings)
+    else:
+        correspondencia = _casar_clientes_timings(clientes_lista, por_ano)
 
     clientes_rows: List[Dict[str, Any]] = []
     grh_rows: List[Dict[str, Any]] = []
@@ -441,7 +481,7 @@ def _build_context(
     total_preco_custo_margem = 0.0
     total_dif_total = 0.0
 
-    for cli in clientes_lista:
+    for pos, cli in enumerate(clientes_lista):
         if not isinstance(cli, dict):
             continue
 
@@ -451,22 +491,11 @@ def _build_context(
 
         mensalidade_atual = _to_float(cli.get("mensalidade") or cli.get("mensalidade_atual") or 0.0)
 
-        match_key = _nome_match_key(nome)
-
-        # match exato
-        nome_timings = mapa_timings_nome_por_key.get(match_key)
-
-        # fallback por aproximação (prefixo >= 0.6)
-        if not nome_timings:
-            melhor_nome = None
-            melhor_score = 0.0
-            for k, n_real in mapa_timings_nome_por_key.items():
-                score = _similaridade_prefixo(match_key, k)
-                if score > melhor_score:
-                    melhor_score = score
-                    melhor_nome = n_real
-            if melhor_score >= 0.6 and melhor_nome:
-                nome_timings = melhor_nome
+        linha = correspondencia[pos] if pos < len(correspondencia) else None
+        if linha is None or linha.get("cliente") != nome:
+            linha = _casar_clientes_timings([cli], por_ano)[0]
+        match_key = linha["match_key"]
+        nome_timings = linha["empresa"]
 
         horas_base = _to_float(horas_medias_clientes.get(nome_timings or "", 0.0))
         horas_daniela = _to_float(horas_medias_daniela.get(nome_timings or "", 0.0))
@@ -2,8 +2,9 @@ from fastapi import APIRouter, Request
 from fastapi.responses import HTMLResponse, RedirectResponse
 from fastapi.templating import Jinja2Templates
 
-from dados import estado
-from despesa import _obter_custo_mensal_colaborador
+from dados import estado, registar_alteracao
+from agregacao import medida
+from cache_paginas import pagina_em_cache
 
 import os
 import json
@@ -88,6 +89,7 @@ def guardar_tesouraria(dados: Dict[str, Any]) -> None:
     except Exception:
         # não rebenta a app se houver erro, só não grava
         pass
+    registar_alteracao()
 
 
 # ===================== CÁLCULOS BASE =====================
@@ -100,13 +102,8 @@ def calcular_receita_mensal_prevista() -> float:
     - valor_gestao_comercial (se existir)
     - e, se houver, valores mensais configurados no estado["proveitos"].
     """
-    total = 0.0
-
-    # 1) Clientes
-    for cliente in estado.get("clientes", []):
-        total += _to_float(cliente.get("mensalidade"))
-        total += _to_float(cliente.get("valor_grh"))
-        total += _to_float(cliente.get("valor_gestao_comercial"))
+    # 1) Clientes (motor de agregação)
+    total = medida("receita_tesouraria")
 
     # 2) Outros proveitos (módulo Proveitos, se estiverem em estado)
     proveitos_cfg = estado.get("proveitos", {})
@@ -128,10 +125,7 @@ def calcular_custos_mensais_colaboradores() -> float:
     Usa a MESMA função do módulo Despesas/Custo-Hora
     para garantir consistência do custo mensal dos colaboradores.
     """
-    total = 0.0
-    for col in estado.get("colaboradores", []):
-        total += _obter_custo_mensal_colaborador(col)
-    return total
+    return medida("custo_colaboradores_tesouraria")
 
 
 def calcular_mapa_tesouraria(config: Dict[str, Any]):
@@ -231,6 +225,7 @@ def calcular_mapa_tesouraria(config: Dict[str, Any]):
 # ===================== ROTAS =====================
 
 @router.get("/tesouraria", response_class=HTMLResponse)
+@pagina_em_cache("tesouraria")
 async def ver_tesouraria(request: Request):
     config = carregar_tesouraria()
     mapa = calcular_mapa_tesouraria(config)
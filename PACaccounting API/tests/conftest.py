@@ -0,0 +1,12 @@
+"""
+Os testes importam os módulos da app pelo nome e dados.py lê dados.json a
+partir da pasta atual: corre-os a partir da pasta da app.
+"""
+
+import os
+import sys
+
+PASTA_APP = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+sys.path.insert(0, PASTA_APP)
+os.chdir(PASTA_APP)
@@ -0,0 +1,329 @@
+"""
+Paridade do motor de comissões (comissoes_motor) com os cálculos anteriores.
+
+Os três cálculos antigos estão copiados abaixo tal como estavam:
+despesa.calcular_comissoes, orcamento._calcular_comissoes_clientes e
+comissoes._get_clientes_filtrados (sem o índice por carteira, que só evitava
+percorrer clientes de outras carteiras). Para cada regra, com os clientes de
+dados.json, com casos pequenos de cada regra e com um conjunto sintético
+maior (cópias com valores alterados, textos "1.234,50 €", campos vazios,
+NIFs repartidos), o motor tem de devolver exatamente o mesmo (incluindo a
+ordem das somas em float e o erro lançado quando o cálculo antigo
+rebentava); as linhas de cada mês guardado também.
+
+Não grava nada: estado["clientes"] é trocado em memória e reposto no fim.
+"""
+
+import random
+from decimal import Decimal
+from typing import Any, Dict, List, Tuple
+
+import pytest
+
+import comissoes
+import comissoes_motor
+import despesa
+import orcamento
+from dados import estado, registar_alteracao
+
+
+# ===== Implementações anteriores (referência) =====
+
+def _adicionar_comissao_original(map_per_colab: dict, nome: str, valor: float) -> None:
+    if not nome:
+        return
+    nome = str(nome).strip()
+    if not nome:
+        return
+    map_per_colab[nome] = map_per_colab.get(nome, 0.0) + float(valor or 0.0)
+
+
+def calcular_comissoes_original() -> tuple:
+    clientes = estado.get("clientes", []) or []
+    comissoes_mensais: dict = {}
+
+    for cli in clientes:
+        if not isinstance(cli, dict):
+            continue
+
+        mensalidade = comissoes_motor._ler_mensalidade(cli)
+        if mensalidade <= 0:
+            continue
+
+        nif = str(cli.get("nif") or cli.get("nif_cliente") or "").strip()
+        carteira = str(cli.get("carteira") or "").strip()
+        tecnico = str(cli.get("tecnico") or "").strip()
+
+        if not carteira and tecnico:
+            carteira = tecnico
+        if not carteira:
+            continue
+
+        if nif in {"505123185", "516253980"}:
+            base = mensalidade * 0.30
+            metade = base * 0.5
+            _adicionar_comissao_original(comissoes_mensais, "Pedro Fernandes", metade)
+            _adicionar_comissao_original(comissoes_mensais, "Ana Rodrigues", metade)
+            continue
+
+        if carteira == tecnico:
+            perc = 0.30
+        else:
+            perc = 0.20
+
+        _adicionar_comissao_original(comissoes_mensais, carteira, mensalidade * perc)
+
+    nomes = sorted(comissoes_mensais.keys(), key=lambda s: s.lower())
+
+    linhas = []
+    totais_mensais = [0.0] * 12
+    total_ano_geral = 0.0
+
+    for idx, nome in enumerate(nomes):
+        valor_mensal = float(comissoes_mensais.get(nome, 0.0))
+        meses = [valor_mensal] * 12
+        total_linha = valor_mensal * 12
+
+        for i in range(12):
+            totais_mensais[i] += valor_mensal
+        total_ano_geral += total_linha
+
+        linhas.append(
+            {
+                "codigo": f"com_{idx + 1}",
+                "nome": nome,
+                "auto": True,
+                "meses": meses,
+                "total_ano": total_linha,
+            }
+        )
+
+    return linhas, totais_mensais, total_ano_geral
+
+
+def calcular_comissoes_clientes_original():
+    clientes = estado.get("clientes", []) or []
+    detalhes = []
+    total_mensal = 0.0
+    comissoes_por_carteira = {}
+
+    for cli in clientes:
+        base = float(cli.get("mensalidade", 0) or 0)
+        if base <= 0:
+            continue
+
+        nif = str(cli.get("nif", "")).strip()
+        nome = (cli.get("nome") or "").strip()
+        carteira = (cli.get("carteira") or "").strip()
+        tecnico = (cli.get("tecnico") or "").strip()
+
+        if nif in ("505123185", "516253980"):
+            perc = 0.30
+        else:
+            if carteira and tecnico and carteira != tecnico:
+                perc = 0.20
+            else:
+                perc = 0.30
+
+        comissao_mensal = base * perc
+        comissao_anual = comissao_mensal * 12
+        total_mensal += comissao_mensal
+
+        detalhes.append(
+            {
+                "nome": nome,
+                "nif": nif,
+                "mensalidade": base,
+                "percentagem": perc * 100,
+                "comissao_mensal": comissao_mensal,
+                "comissao_anual": comissao_anual,
+            }
+        )
+
+        detentor = carteira or tecnico or "Sem carteira"
+        comissoes_por_carteira.setdefault(detentor, 0.0)
+        comissoes_por_carteira[detentor] += comissao_mensal
+
+    total_anual = total_mensal * 12
+    return total_mensal, total_anual, detalhes, comissoes_por_carteira
+
+
+def get_clientes_filtrados_original() -> List[dict]:
+    clientes = estado.get("clientes", []) or []
+    linhas: List[dict] = []
+
+    for cliente in clientes:
+        if not isinstance(cliente, dict):
+            continue
+        nif = str(comissoes._get_field(cliente, "nif", "NIF", "vat", default="")).strip()
+        nome = str(comissoes._get_field(cliente, "nome", "Nome", "cliente", default="")).strip()
+
+        carteira_raw = comissoes._extract_carteira_raw(cliente)
+        carteira = comissoes._canonical_carteira(carteira_raw)
+
+        if carteira not in comissoes.ALLOWED_CARTEIRAS:
+            continue
+
+        tecnico_raw = comissoes._get_field(cliente, *comissoes.TECNICO_FIELD_CANDIDATES, default="")
+        tecnico_canonical = comissoes._canonical_carteira(tecnico_raw)
+        tecnico = tecnico_canonical if tecnico_canonical else comissoes._norm_nome(tecnico_raw)
+
+        mensalidade = comissoes._parse_euro(comissoes._get_field(cliente, "mensalidade", "Mensalidade", default=0))
+        grh = comissoes._parse_euro(comissoes._get_field(cliente, "grh", "GRH", default=0))
+
+        taxa = Decimal("0.30") if carteira and tecnico_canonical == carteira else Decimal("0.20")
+
+        linhas.append(
+            {
+                "nif": nif,
+                "nome": nome,
+                "carteira": carteira,
+                "tecnico": tecnico,
+                "mensalidade": mensalidade,
+                "grh": grh,
+                "taxa": taxa,
+            }
+        )
+
+    linhas.sort(key=comissoes._cliente_sort_key)
+    return linhas
+
+
+# ===== Dados de teste =====
+
+def _resultado(funcao) -> Tuple[str, Any]:
+    try:
+        return "ok", funcao()
+    except Exception as exc:
+        return "erro", type(exc).__name__
+
+
+def _linhas_mes(clientes: List[dict], guardados: Dict[str, dict]) -> List[Any]:
+    """Linhas de um mês (só leitura) a partir dos registos guardados."""
+    linhas = [comissoes._compose_row(cliente, guardados.get(cliente["nif"]))[0] for cliente in clientes]
+    return [linhas, comissoes._calc_totais(linhas)]
+
+
+def _sintetico(clientes: List[Any], escala: int) -> List[Any]:
+    """Cópias dos clientes com valores e campos alterados (inclui casos que rebentavam)."""
+    rnd = random.Random(1234)
+    base = [c for c in clientes if isinstance(c, dict)] or [{"nome": "Cliente", "mensalidade": 100, "carteira": "Ana Rodrigues"}]
+    valores = [None, "", 0, -5, 12.5, "80", "1.234,50 €", "abc", True, 150]
+    pessoas = ["", "Ana Rodrigues", "ana rodrigues", "Pedro Fernandes", "Armando Dias", "Celine Santos", "Outro Técnico"]
+
+    resultado: List[Any] = []
+    for i in range(escala):
+        for cli in base:
+            novo = dict(cli)
+            if rnd.random() < 0.3:
+                novo["mensalidade"] = rnd.choice(valores)
+            if rnd.random() < 0.3:
+                novo["carteira"] = rnd.choice(pessoas)
+            if rnd.random() < 0.3:
+                novo["tecnico"] = rnd.choice(pessoas)
+            if rnd.random() < 0.05:
+                novo["nif"] = rnd.choice(sorted(comissoes_motor.NIFS_REPARTIDOS))
+            novo["nome"] = f"{cli.get('nome') or 'Cliente'} {i}"
+            resultado.append(novo)
+    rnd.shuffle(resultado)
+    return resultado
+
+
+_ORIGINAIS = list(estado.get("clientes") or [])
+
+# Casos pequenos, um por regra dos cálculos antigos
+_CASOS = {
+    "carteira igual ao técnico (30%)": [
+        {"nif": "111111111", "nome": "A", "mensalidade": 100, "carteira": "Ana Rodrigues", "tecnico": "Ana Rodrigues"},
+    ],
+    "carteira diferente do técnico (20%)": [
+        {"nif": "222222222", "nome": "B", "mensalidade": 100, "carteira": "Ana Rodrigues", "tecnico": "Armando Dias"},
+    ],
+    "sem carteira (usa o técnico)": [
+        {"nif": "333333333", "nome": "C", "mensalidade": 80, "carteira": "", "tecnico": "Pedro Fernandes"},
+    ],
+    "NIFs repartidos": [
+        {"nif": nif, "nome": nif, "mensalidade": 200, "carteira": "Celine Santos", "tecnico": "Celine Santos"}
+        for nif in sorted(comissoes_motor.NIFS_REPARTIDOS)
+    ],
+    "mensalidade vazia, zero ou negativa": [
+        {"nif": "444444444", "nome": "D", "mensalidade": valor, "carteira": "Ana Rodrigues", "tecnico": "Ana Rodrigues"}
+        for valor in (None, "", 0, -5)
+    ],
+    "mensalidade em texto": [
+        {"nif": "555555555", "nome": "E", "mensalidade": "1.234,50 €", "carteira": "Armando Dias", "tecnico": "Armando Dias"},
+    ],
+    "aliases de carteira": [
+        {"nif": "666666666", "nome": "F", "mensalidade": 50, "carteira": "ana rodrigues", "tecnico": "ANA RODRIGUES"},
+    ],
+}
+
+
+def _conjuntos() -> Dict[str, List[Any]]:
+    sintetico = _sintetico(_ORIGINAIS, 10)
+    return {
+        "dados.json": _ORIGINAIS,
+        # Só valores numéricos: o cálculo do Orçamento rebentava com textos
+        "sintético": [
+            c for c in sintetico
+            if not isinstance(c.get("mensalidade"), str) or c.get("mensalidade") in ("", "80")
+        ],
+        "sintético (com textos)": sintetico,
+        **_CASOS,
+    }
+
+
+_CONJUNTOS = _conjuntos()
+
+_REGRAS = {
+    "despesa.calcular_comissoes": (calcular_comissoes_original, lambda: despesa.calcular_comissoes()),
+    "orcamento._calcular_comissoes_clientes": (
+        calcular_comissoes_clientes_original,
+        lambda: orcamento._calcular_comissoes_clientes(),
+    ),
+    "comissoes._get_clientes_filtrados": (get_clientes_filtrados_original, lambda: comissoes._get_clientes_filtrados()),
+}
+
+
+@pytest.fixture
+def clientes():
+    """Troca estado["clientes"] pelo conjunto pedido e repõe os originais no fim."""
+    originais = estado.get("clientes", [])
+
+    def _usar(lista: List[Any]) -> None:
+        estado["clientes"] = lista
+        registar_alteracao()
+
+    yield _usar
+    estado["clientes"] = originais
+    registar_alteracao()
+
+
+# ===== Testes =====
+
+@pytest.mark.parametrize("conjunto", list(_CONJUNTOS))
+@pytest.mark.parametrize("regra", list(_REGRAS))
+def test_regra_igual_ao_calculo_antigo(clientes, conjunto, regra):
+    clientes(_CONJUNTOS[conjunto])
+    original, motor = _REGRAS[regra]
+    assert _resultado(motor) == _resultado(original)
+
+
+@pytest.mark.parametrize("regra", list(_REGRAS))
+def test_regra_em_cache_igual(clientes, regra):
+    clientes(_CONJUNTOS["sintético"])
+    original, motor = _REGRAS[regra]
+    comissoes_motor.invalidar()
+    primeira = _resultado(motor)
+    assert _resultado(motor) == primeira == _resultado(original)
+
+
+@pytest.mark.parametrize("conjunto", ["dados.json", "sintético", "sintético (com textos)"])
+@pytest.mark.parametrize("mes", comissoes._meses_guardados())
+def test_linhas_do_mes_iguais(clientes, conjunto, mes):
+    clientes(_CONJUNTOS[conjunto])
+    filtrados = _resultado(get_clientes_filtrados_original)
+    if filtrados[0] != "ok":
+        pytest.skip("o cálculo antigo rebenta com este conjunto")
+    guardados = (comissoes._ler_mes(mes) or {}).get("rows") or {}
+    assert _linhas_mes(comissoes._get_clientes_filtrados(), guardados) == _linhas_mes(filtrados[1], guardados)
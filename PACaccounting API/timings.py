@@ -1,26 +1,63 @@
-from fastapi import APIRouter, Request, UploadFile, File, Form, HTTPException
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi import APIRouter, Request, UploadFile, File, Form, HTTPException, Query, Response
+from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse
 from fastapi.templating import Jinja2Templates
 
-from io import BytesIO
+import copy
+import hashlib
 import re
 import json
 import os
 import shutil
+import uuid
 from datetime import datetime
+from itertools import islice
 import unicodedata
-from typing import List, Dict, Optional, Any, Tuple
+from typing import List, Dict, Optional, Any, Tuple, Iterable
 from urllib.parse import urlencode
 
-import openpyxl  # pip install openpyxl
-
 # fallback: se timings_dados.json estiver vazio, vamos buscar aos dados gerais
-from dados import estado, guardar_dados
+from dados import (
+    ARRANQUE_DIFERIDO,
+    ao_gravar,
+    checkpoint,
+    espelho_desatualizado,
+    estado,
+    guardar_dados,
+    indice_clientes,
+    ler_json_cache,
+    registar_alteracao,
+    registar_espelho,
+    revisao,
+    texto_secao_persistida,
+)
+import correspondencias
+import timings_excel
+import timings_matriz
+import timings_snapshot
+from normalizacao import memoizar
+from timings_excel import (  # leitura do Excel (sem estado, usada também pelo pool de importação)
+    ALIASES_CANONICOS,
+    ARMANDO_NORMS,
+    EMPRESA_HEADER_NAMES,
+    LEGAL_SUFFIX_PATTERN,
+    TECNICO_HEADER_NAMES,
+    TEMPO_HEADER_NAMES,
+    _is_linha_total,
+    _norm_empresa_forte,
+    _norm_nome_forte,
+    _normalize_header,
+    _parse_duracao_para_minutos,
+    _parse_tempo_para_minutos,
+    _resolver_tecnico,
+)
+from timings_matriz import _extra_mes
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 # Ficheiro próprio de timings (independente de dados.json)
 TIMINGS_FILE = os.path.join(BASE_DIR, "timings_dados.json")
 TIMINGS_IMPORT_REPORT = os.path.join(BASE_DIR, "timings_import_report.json")
+# Snapshot binário já normalizado (ver timings_snapshot.py)
+TIMINGS_SNAPSHOT_FILE = os.path.join(BASE_DIR, "timings_dados.snap")
 
 print("[TIMINGS][PATH] cwd=", os.getcwd())
 print("[TIMINGS][PATH] __file__ dir=", BASE_DIR)
@@ -37,6 +74,7 @@ templates = Jinja2Templates(directory="templates")
 
 # ========= HELPERS DE NOME / CONFIG =========
 
+@memoizar("timings._normalize_nome")
 def _normalize_nome(s: str) -> str:
     """
     Normaliza um nome:
@@ -56,151 +94,12 @@ def _normalize_nome(s: str) -> str:
     return s
 
 
-LEGAL_SUFFIX_PATTERN = re.compile(
-    r"\b(?:lda|ltda|unipessoal|sociedade|por|quotas?|sa|s\s+a)\b",
-    re.IGNORECASE,
-)
-
-
-def _norm_empresa_forte(s: Optional[str]) -> str:
-    """Normaliza fortemente nomes de empresas para facilitar matching."""
-    if not s:
-        return ""
-
-    txt = unicodedata.normalize("NFD", str(s).strip())
-    txt = "".join(ch for ch in txt if unicodedata.category(ch) != "Mn")
-    txt = txt.casefold()
-    if not txt:
-        return ""
-
-    txt = re.sub(r"[\.,;:\-_/()\[\]{}&'\"+]", " ", txt)
-    txt = re.sub(r"\s+", " ", txt).strip()
-    if not txt:
-        return ""
-
-    original_txt = txt
-    txt = LEGAL_SUFFIX_PATTERN.sub(" ", txt)
-    txt = re.sub(r"\s+", " ", txt).strip()
-    return txt if txt else original_txt
-
-
 def _normalize_nome_empresa(s: str) -> str:
     """Compat: manter assinatura antiga."""
     return _norm_empresa_forte(s)
 
 
-def _normalize_header(value: Optional[str]) -> str:
-    """Normaliza cabeçalhos de Excel para comparação case-insensitive sem acentos."""
-    if value is None:
-        return ""
-    s = str(value).strip()
-    if not s:
-        return ""
-    s = unicodedata.normalize("NFD", s)
-    s = "".join(ch for ch in s if unicodedata.category(ch) != "Mn")
-    s = s.lower()
-    s = s.replace("/", " ")
-    s = re.sub(r"[^a-z0-9]+", " ", s)
-    return s.strip()
-
-
-def _norm_nome_forte(s: Optional[str]) -> str:
-    """Normaliza fortemente nomes: maiúsculas, sem acentos, sem partículas comuns."""
-    if not s:
-        return ""
-    s = unicodedata.normalize("NFD", str(s).strip())
-    s = "".join(ch for ch in s if unicodedata.category(ch) != "Mn")
-    s = s.upper()
-    tokens = re.split(r"\s+", s)
-    stopwords = {"DE", "DA", "DO", "DOS", "DAS", "E"}
-    tokens = [t for t in tokens if t and t not in stopwords]
-    return " ".join(tokens)
-
-
-def _build_aliases_canonicos() -> Dict[str, str]:
-    """Constrói o mapa de aliases fortemente normalizados -> nome canónico."""
-    alias_map: Dict[str, str] = {}
-
-    def registrar(canonico: str, *variantes: str) -> None:
-        nomes = (canonico, *variantes)
-        for nome in nomes:
-            norm = _norm_nome_forte(nome)
-            if norm:
-                alias_map[norm] = canonico
-
-    registrar(
-        "Pedro Fernandes",
-        "Pedro Miguel da Silva Fernandes",
-        "Pedro Fernandes",
-    )
-    registrar(
-        "Ana Rodrigues",
-        "Ana Catarina Lourenço Rodrigues",
-        "Ana Catarina Lorenco Rodrigues",
-        "Ana Rodrigues",
-    )
-    registrar(
-        "Daniela Fernandes",
-        "Marta Daniela Francisco Fernandes",
-        "Daniela Francisco Fernandes",
-    )
-    registrar(
-        "Celine Santos",
-        "Celine",
-        "Celine Rodrigues dos Santos",
-        "Celine Santos",
-        "ANTONIO CANDIDO GONÇALVES DIAS",
-        "ANTONIO CANDIDO GONCALVES DIAS",
-    )
-    registrar(
-        "M Albertina Alves",
-        "Maria Albertina Pereira Alves",
-        "M Albertina Alves",
-    )
-    registrar(
-        "M Luzia Moreira",
-        "Luzia Maria Gonçalves Moreira",
-        "Luzia Maria Goncalves Moreira",
-        "M Luzia Moreira",
-    )
-    registrar(
-        "João Pedro Alves",
-        "João Pedro Gonçalves Alves",
-        "Joao Pedro Goncalves Alves",
-        "João Pedro Alves",
-        "Joao Pedro Alves",
-    )
-
-    return alias_map
-
-
-ALIASES_CANONICOS = _build_aliases_canonicos()
-ARMANDO_NORMS = {
-    _norm_nome_forte("Armando Palhão Dias"),
-    _norm_nome_forte("Armando Palhao Dias"),
-    _norm_nome_forte("Armando Dias"),
-}
-
-
-def _resolver_tecnico(nome_excel: Optional[str]) -> tuple[str, Optional[str]]:
-    """Classifica um nome proveniente do Excel."""
-    if not nome_excel:
-        return "desconhecido", None
-
-    norm_forte = _norm_nome_forte(nome_excel)
-    if not norm_forte:
-        return "desconhecido", None
-
-    if norm_forte in ARMANDO_NORMS:
-        return "armando", None
-
-    canonico = ALIASES_CANONICOS.get(norm_forte)
-    if canonico:
-        return "canonico", canonico
-
-    return "desconhecido", None
-
-
+@memoizar("timings._canonical_tecnico_nome", tabelas=("ALIASES_CANONICOS",))
 def _canonical_tecnico_nome(s: Optional[str]) -> str:
     """Converte qualquer nome para a forma canónica conhecida."""
     if not s:
@@ -214,40 +113,6 @@ def _canonical_tecnico_nome(s: Optional[str]) -> str:
     s = str(s).strip()
     return s or "Sem técnico"
 
-EMPRESA_HEADER_NAMES = {
-    "empresa",
-    "cliente",
-    "cliente empresa",
-    "empresa cliente",
-    "designacao",
-    "designacao social",
-    "nome cliente",
-    "cliente nome",
-}
-
-TECNICO_HEADER_NAMES = {
-    "tecnico",
-    "tecnico responsavel",
-    "responsavel",
-    "responsavel tecnico",
-    "colaborador",
-    "tecnica",
-}
-
-TEMPO_HEADER_NAMES = {
-    "tempo",
-    "horas",
-    "horas totais",
-    "tempo m",
-    "tempo min",
-    "tempo minutos",
-    "minutos",
-    "total minutos",
-    "duracao",
-    "duracao minutos",
-    "duracao m",
-}
-
 MESES_LABELS = [
     (1, "Jan"),
     (2, "Fev"),
@@ -264,14 +129,6 @@ MESES_LABELS = [
 ]
 
 
-def _is_linha_total(texto: Optional[str]) -> bool:
-    if not texto:
-        return False
-    norm = _normalize_header(texto)
-    if not norm:
-        return False
-    return any(kw in norm for kw in {"total", "subtotal", "grand total", "soma", "sum"})
-
 # Estrutura em memória (formato novo):
 # {
 #   "2025": {
@@ -289,6 +146,33 @@ timings_dados: dict = {}
 _PRECISA_BACKUP_TIMINGS = False
 _PRECISA_REGRAVAR_TIMINGS = False
 
+# Total de minutos da última versão persistida (proteção contra gravações que
+# apagam mais de metade dos minutos). None = sem referência. Só muda quando a
+# gravação chega ao disco (_timings_gravados); até lá, o total aceite fica em
+# _TOTAL_A_GRAVAR.
+_TOTAL_PERSISTIDO: Optional[int] = None
+_TOTAL_A_GRAVAR: Optional[int] = None
+
+# Alterações a timings_dados em memória (ver _persistir_timings e _versao_timings)
+_ALTERACOES_TIMINGS = 0
+
+# timings_dados.json passa a ser o ficheiro próprio da secção "timings_dados"
+# de dados.py: as gravações vão para o journal e o ficheiro é reescrito em
+# checkpoint.
+registar_espelho("timings_dados", TIMINGS_FILE)
+
+
+def _timings_gravados(ok: bool) -> None:
+    """Aviso de dados.py depois de cada tentativa de gravar timings_dados."""
+    global _TOTAL_PERSISTIDO
+    if not ok:
+        print("[TIMINGS] ERRO ao gravar timings no journal.")
+    elif _TOTAL_A_GRAVAR is not None:
+        _TOTAL_PERSISTIDO = _TOTAL_A_GRAVAR
+
+
+ao_gravar("timings_dados", _timings_gravados)
+
 
 # ========= HELPERS DE TEMPO =========
 
@@ -302,76 +186,8 @@ def _format_minutos(minutos: int) -> str:
     return f"{horas}h{mins:02d}m"
 
 
-def _parse_duracao_para_minutos(valor) -> int:
-    """Interpreta horas/minutos em vários formatos e devolve minutos inteiros."""
-    if valor is None:
-        return 0
-
-    s = str(valor).strip()
-    if not s:
-        return 0
-
-    s_lower = s.lower()
-    match_h = re.search(r"([0-9]+(?:[.,][0-9]+)?)\s*h", s_lower)
-    match_m = re.search(r"([0-9]+)\s*m", s_lower)
-
-    horas_float = 0.0
-    minutos_int = 0
-
-    if match_h:
-        try:
-            horas_float = float(match_h.group(1).replace(",", "."))
-        except ValueError:
-            horas_float = 0.0
-
-    if match_m:
-        try:
-            minutos_int = int(match_m.group(1))
-        except ValueError:
-            minutos_int = 0
-
-    if match_h or match_m:
-        total = int(round(horas_float * 60)) + max(0, minutos_int)
-        return max(0, total)
-
-    normalizado = s.replace(",", ".")
-
-    if "." in normalizado:
-        try:
-            horas = float(normalizado)
-        except ValueError:
-            return 0
-        if abs(horas) <= 24:
-            return max(0, int(round(horas * 60)))
-        return max(0, int(round(horas)))
-
-    try:
-        minutos = int(round(float(normalizado)))
-    except ValueError:
-        return 0
-    return max(0, minutos)
-
-
-def _parse_tempo_para_minutos(valor) -> int:
-    """Compatibilidade retroativa para código legado."""
-    return _parse_duracao_para_minutos(valor)
-
-
 # ========= HELPERS DE ESTATÍSTICA =========
 
-def _extra_mes(rec: Optional[dict]) -> int:
-    """Obtém o extra mensal médio (minutos) para um registo normalizado."""
-    if not isinstance(rec, dict):
-        return 0
-    valor = rec.get("extra_mensal", 0)
-    if isinstance(valor, (int, float)):
-        return int(valor)
-    try:
-        return _parse_duracao_para_minutos(valor)
-    except Exception:
-        return 0
-
-
 def _total_minutos_timings(data: dict) -> int:
     """Soma todos os minutos (meses + extra_mensal*12) de uma estrutura timings."""
     if not isinstance(data, dict):
@@ -490,19 +306,80 @@ def _normalizar_dados_timings_brutos(data: dict) -> dict:
 
 # ========= HELPERS DE PERSISTÊNCIA =========
 
-def _guardar_timings_para_ficheiro() -> bool:
-    """Guarda todo o dicionário timings_dados em timings_dados.json."""
-    novo_total = _total_minutos_timings(timings_dados)
+def _ler_fonte_timings() -> Optional[bytes]:
+    """
+    Bytes da última versão persistida de timings: timings_dados.json ou, se o
+    journal de dados.py tiver uma gravação mais recente que o último
+    checkpoint, essa (JSON compacto).
+    """
+    if espelho_desatualizado("timings_dados"):
+        texto = texto_secao_persistida("timings_dados")
+        return texto.encode("utf-8") if texto is not None else None
 
-    total_anterior = None
     if os.path.exists(TIMINGS_FILE):
         try:
-            with open(TIMINGS_FILE, "r", encoding="utf-8") as f:
-                antigo = json.load(f)
-            total_anterior = _total_minutos_timings(antigo)
+            with open(TIMINGS_FILE, "rb") as f:
+                return f.read()
         except Exception:
-            total_anterior = None
+            return None
+    return None
+
+
+def _ler_timings_persistidos(fonte: Optional[bytes] = None) -> Any:
+    """Última versão persistida de timings (ver _ler_fonte_timings), já interpretada."""
+    if fonte is None:
+        fonte = _ler_fonte_timings()
+    if fonte is None:
+        return None
+    try:
+        return json.loads(fonte.decode("utf-8"))
+    except Exception:
+        return None
 
+
+# Última secção do journal interpretada por timings_para_leitura: (texto, dados)
+_LEITURA_JOURNAL: Optional[Tuple[str, Any]] = None
+
+
+def timings_para_leitura() -> Dict[str, Any]:
+    """
+    timings_dados para as páginas que só leem (Relação Técnicos, Sugestão de
+    Mensalidade); o resultado é partilhado, não alterar. Depois de carregado,
+    é o próprio dicionário em memória (sem I/O); antes disso (arranque
+    diferido ou recarga de dados.py), a última versão persistida, em cache
+    por mtime/tamanho do ficheiro ou pelo texto da secção no journal.
+    """
+    global _LEITURA_JOURNAL
+
+    if estado.get("timings_dados") is timings_dados:
+        return timings_dados
+    if espelho_desatualizado("timings_dados"):
+        texto = texto_secao_persistida("timings_dados")
+        if texto is None:
+            return {}
+        if _LEITURA_JOURNAL is None or _LEITURA_JOURNAL[0] != texto:
+            try:
+                _LEITURA_JOURNAL = (texto, json.loads(texto))
+            except Exception:
+                return {}
+        data = _LEITURA_JOURNAL[1]
+    else:
+        data = ler_json_cache(TIMINGS_FILE)
+    return data if isinstance(data, dict) else {}
+
+
+def _guardar_timings_para_ficheiro() -> bool:
+    """
+    Grava todo o dicionário timings_dados (um grupo no journal de dados.py;
+    timings_dados.json é reescrito no checkpoint seguinte). A redução é
+    medida contra o último total que chegou ao disco, não contra gravações
+    ainda na fila ou que falharam.
+    """
+    global _TOTAL_A_GRAVAR
+
+    novo_total = _total_minutos_timings(timings_dados)
+
+    total_anterior = _TOTAL_PERSISTIDO
     if total_anterior and total_anterior > 0:
         if novo_total < total_anterior * 0.5:
             print(
@@ -510,22 +387,10 @@ def _guardar_timings_para_ficheiro() -> bool:
             )
             return False
 
-    tmp = TIMINGS_FILE + ".tmp"
-    destino = os.path.abspath(TIMINGS_FILE)
-    try:
-        with open(tmp, "w", encoding="utf-8") as f:
-            json.dump(timings_dados, f, ensure_ascii=False, indent=2)
-        os.replace(tmp, TIMINGS_FILE)
-        print(f"[TIMINGS] Guardado em disco: {destino}")
-        return True
-    except Exception as exc:
-        print(f"[TIMINGS] ERRO ao escrever timings_dados.json: {exc}")
-        if os.path.exists(tmp):
-            try:
-                os.remove(tmp)
-            except Exception:
-                pass
-        return False
+    estado["timings_dados"] = timings_dados
+    _TOTAL_A_GRAVAR = novo_total
+    # Só falha aqui sem escrita diferida; com ela, a falha chega a _timings_gravados
+    return guardar_dados("timings_dados")
 
 
 def _migrar_de_legacy_dict(legacy_timings: dict, legacy_extras: dict) -> dict:
@@ -614,10 +479,25 @@ def _migrar_de_legacy_dict(legacy_timings: dict, legacy_extras: dict) -> dict:
     return new
 
 
-def _persistir_timings() -> None:
-    """Grava timings_dados e sincroniza com dados.json."""
-    global _PRECISA_BACKUP_TIMINGS
+def _persistir_timings(ano: Optional[int] = None, empresas: Optional[Iterable[str]] = None) -> None:
+    """
+    Grava timings_dados (timings_dados.json e dados.json ficam coerentes via journal).
+    Com 'ano' e 'empresas' (as únicas alteradas), só essas linhas da matriz do
+    ano são relidas; senão as matrizes são todas refeitas.
+    """
+    global _PRECISA_BACKUP_TIMINGS, _ALTERACOES_TIMINGS
+
+    # timings_dados mudou em memória (mesmo que a gravação seja rejeitada)
+    _ALTERACOES_TIMINGS += 1
+    registar_alteracao()
+    if ano is not None and empresas is not None:
+        timings_matriz.atualizar_empresas(ano, timings_dados.get(str(ano), {}), empresas)
+    else:
+        timings_matriz.invalidar()
 
+    if _PRECISA_BACKUP_TIMINGS:
+        # O backup tem de refletir a última versão persistida
+        checkpoint()
     if _PRECISA_BACKUP_TIMINGS and os.path.exists(TIMINGS_FILE):
         timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
         backup_path = f"{TIMINGS_FILE}.bak.{timestamp}"
@@ -628,15 +508,9 @@ def _persistir_timings() -> None:
         except Exception as exc:
             print(f"[TIMINGS] WARNING: falha ao criar backup antes da migração: {exc}")
 
-    guardado = _guardar_timings_para_ficheiro()
-    if not guardado:
-        return
-
-    try:
-        estado["timings_dados"] = timings_dados
-        guardar_dados()
-    except Exception as exc:
-        print(f"[TIMINGS] ERRO ao atualizar dados.json: {exc}")
+    _guardar_timings_para_ficheiro()
+    if ano is not None and empresas is not None:
+        timings_matriz.confirmar_revisao(ano)
 
 
 def _persistir_timings_se_preciso() -> None:
@@ -654,22 +528,33 @@ def _carregar_timings_de_ficheiro() -> None:
       - formato novo (direto)
       - formato antigo (com 'timings'/'timings_extra')
     Se não encontrar nada válido, faz fallback a estado["timings"] / ["timings_extra"] de dados.py.
+    Se o journal de dados.py tiver uma gravação de timings mais recente que o
+    ficheiro, é essa que é lida.
     """
-    global timings_dados
-
-    data = None
+    global timings_dados, _TOTAL_PERSISTIDO, _TOTAL_A_GRAVAR
+
+    _TOTAL_A_GRAVAR = None
+    fonte = _ler_fonte_timings()
+    digest = timings_snapshot.impressao_digital(fonte) if fonte is not None else None
+
+    # 0) Snapshot binário da mesma fonte: já está normalizado, não há nada a migrar
+    if digest is not None:
+        snapshot = timings_snapshot.ler(TIMINGS_SNAPSHOT_FILE, digest)
+        if snapshot is not None:
+            timings_dados, _TOTAL_PERSISTIDO = snapshot
+            estado["timings_dados"] = timings_dados
+            return
 
-    if os.path.exists(TIMINGS_FILE):
-        try:
-            with open(TIMINGS_FILE, "r", encoding="utf-8") as f:
-                data = json.load(f)
-        except Exception:
-            data = None
+    data = _ler_timings_persistidos(fonte)
+    _TOTAL_PERSISTIDO = _total_minutos_timings(data) if isinstance(data, dict) else None
 
     # 1) Se o ficheiro já estiver no formato novo (dict de anos, sem 'timings'/'timings_extra')
     if isinstance(data, dict) and "timings" not in data and "timings_extra" not in data:
         timings_dados = _normalizar_dados_timings_brutos(data)
         estado["timings_dados"] = timings_dados
+        if not _PRECISA_REGRAVAR_TIMINGS and not _PRECISA_BACKUP_TIMINGS:
+            # Fonte já no formato final: próximos arranques usam o snapshot
+            timings_snapshot.gravar(TIMINGS_SNAPSHOT_FILE, timings_dados, digest, _TOTAL_PERSISTIDO)
         _persistir_timings_se_preciso()
         return
 
@@ -710,11 +595,15 @@ def _carregar_timings_de_ficheiro() -> None:
     _persistir_timings_se_preciso()
 
 
-_carregar_timings_de_ficheiro()
+# No arranque diferido é o lifespan da app que chama esta função
+if not ARRANQUE_DIFERIDO:
+    _carregar_timings_de_ficheiro()
 
 
 def _migrar_timings_para_minutos() -> Tuple[bool, str]:
     """Executa migração manual para converter horas decimais em minutos inteiros."""
+    # Garante que o ficheiro (e o backup abaixo) refletem a última gravação
+    checkpoint()
     if not os.path.exists(TIMINGS_FILE):
         return False, "timings_dados.json não encontrado."
 
@@ -745,6 +634,10 @@ def _migrar_timings_para_minutos() -> Tuple[bool, str]:
     return True, f"totais minutos antigos={antigo_total}, novos={novo_total}, backup={backup_path}"
 
 
+# Cache de _mapear_clientes_por_nome: (assinatura de estado["clientes"], mapa, lista)
+_CLIENTES_POR_NORMA: Optional[Tuple[Tuple[int, int, int], Dict[str, dict], List[Tuple[str, dict]]]] = None
+
+
 def _mapear_clientes_por_nome():
     """
     Cria:
@@ -752,9 +645,12 @@ def _mapear_clientes_por_nome():
       - uma lista [(chave_normalizada, cliente), ...]
     a partir de estado["clientes"], usando _norm_empresa_forte,
     para podermos fazer matches exatos e, em último caso, por inclusão.
+
+    O resultado é partilhado (não alterar) e só é recalculado quando a secção
+    "clientes" é gravada, substituída ou muda de tamanho.
     """
-    mapa = {}
-    lista_norm = []
+    global _CLIENTES_POR_NORMA
+
     try:
         clientes = estado.get("clientes", [])
     except Exception:
@@ -762,6 +658,13 @@ def _mapear_clientes_por_nome():
     if not isinstance(clientes, list):
         return {}, []
 
+    assinatura = (revisao("clientes"), id(clientes), len(clientes))
+    if _CLIENTES_POR_NORMA is not None and _CLIENTES_POR_NORMA[0] == assinatura:
+        return _CLIENTES_POR_NORMA[1], _CLIENTES_POR_NORMA[2]
+
+    mapa = {}
+    lista_norm = []
+
     for cli in clientes:
         if not isinstance(cli, dict):
             continue
@@ -780,9 +683,62 @@ def _mapear_clientes_por_nome():
         mapa[norm] = cli
         lista_norm.append((norm, cli))
 
+    _CLIENTES_POR_NORMA = (assinatura, mapa, lista_norm)
     return mapa, lista_norm
 
 
+def _calcular_correspondencias_mapas(clientes: list, ano_dict: dict) -> Dict[str, dict]:
+    """
+    Coluna "mapas" da tabela de correspondências: para cada empresa ativa do
+    ano, o cliente com a mesma norma forte (o último, como em
+    _mapear_clientes_por_nome) ou, em último caso, o primeiro cujo nome
+    normalizado contém ou está contido no da empresa.
+    """
+    por_norma: Dict[str, int] = {}
+    lista_norm: List[Tuple[str, int]] = []
+    for idx, cli in enumerate(clientes):
+        if not isinstance(cli, dict):
+            continue
+        nome = (
+            cli.get("nome")
+            or cli.get("cliente")
+            or cli.get("empresa")
+            or cli.get("designacao")
+        )
+        if not nome:
+            continue
+        norm = _norm_empresa_forte(str(nome))
+        if not norm:
+            continue
+        por_norma[norm] = idx
+        lista_norm.append((norm, idx))
+
+    coluna: Dict[str, dict] = {}
+    for empresa in correspondencias.empresas_ativas(ano_dict):
+        chave_empresa = _norm_empresa_forte(empresa)
+        idx_cli: Optional[int] = por_norma.get(chave_empresa)
+        metodo, score = "exact", 1.0
+        if idx_cli is None and chave_empresa:
+            for norm_cli, idx in lista_norm:
+                if chave_empresa in norm_cli or norm_cli in chave_empresa:
+                    idx_cli = idx
+                    metodo = "inclusao"
+                    score = min(len(norm_cli), len(chave_empresa)) / max(len(norm_cli), len(chave_empresa))
+                    break
+        if idx_cli is None:
+            coluna[empresa] = {"indice": None, "nif": "", "cliente": "", "metodo": "none", "score": 0.0}
+            continue
+        cli = clientes[idx_cli]
+        coluna[empresa] = {
+            "indice": idx_cli,
+            "nif": str(cli.get("nif") or "").strip(),
+            "cliente": str(cli.get("nome") or "").strip(),
+            "metodo": metodo,
+            "score": round(score, 4),
+        }
+    return coluna
+
+
 def _obter_tecnico_cliente(cli: dict) -> Optional[str]:
     """
     Tenta obter o nome do técnico associado a um cliente.
@@ -828,35 +784,35 @@ def _tecnico_inferido_empresa(empresa_norm: str) -> Optional[str]:
     if not isinstance(clientes, list):
         return None
 
-    for cli in clientes:
-        if not isinstance(cli, dict):
-            continue
-
-        nome_cli = (
-            cli.get("nome")
-            or cli.get("cliente")
-            or cli.get("empresa")
-            or cli.get("designacao")
-        )
-        if not nome_cli:
-            continue
+    # Primeiro cliente (pela ordem da lista) com o mesmo nome normalizado
+    posicoes = indice_clientes("timings_empresa_forte", _chave_empresa_cliente).get(alvo_norm)
+    if not posicoes:
+        return None
+    cli = clientes[posicoes[0]]
 
-        nome_norm = _norm_empresa_forte(nome_cli)
-        if nome_norm != alvo_norm:
-            continue
+    tecnico_raw = cli.get("tecnico") or cli.get("carteira")
+    if not tecnico_raw:
+        return None
 
-        tecnico_raw = cli.get("tecnico") or cli.get("carteira")
-        if not tecnico_raw:
-            return None
+    tipo, canonico = _resolver_tecnico(tecnico_raw)
+    if tipo == "canonico" and canonico:
+        return canonico
 
-        tipo, canonico = _resolver_tecnico(tecnico_raw)
-        if tipo == "canonico" and canonico:
-            return canonico
+    tecnico_str = str(tecnico_raw).strip()
+    return tecnico_str or None
 
-        tecnico_str = str(tecnico_raw).strip()
-        return tecnico_str or None
 
-    return None
+def _chave_empresa_cliente(cli: Dict[str, Any]) -> str:
+    """Chave do índice de clientes usado em _tecnico_inferido_empresa."""
+    nome_cli = (
+        cli.get("nome")
+        or cli.get("cliente")
+        or cli.get("empresa")
+        or cli.get("designacao")
+    )
+    if not nome_cli:
+        return ""
+    return _norm_empresa_forte(nome_cli)
 
 
 # ========= LÓGICA DE NEGÓCIO =========
@@ -877,10 +833,20 @@ def _adicionar_tempo_empresa(
     Soma minutos a uma empresa num dado ano/mês em timings_dados (em memória)
     e grava imediatamente no ficheiro.
     """
+    _somar_tempo(_obter_ano_dict(ano), mes, empresa, minutos, tecnico)
+
+
+def _somar_tempo(
+    ano_dict: dict,
+    mes: int,
+    empresa: str,
+    minutos: int,
+    tecnico: Optional[str] = None,
+) -> None:
+    """Soma minutos a uma empresa de ano_dict (timings_dados ou uma cópia, na pré-visualização)."""
     if minutos <= 0:
         return
 
-    ano_dict = _obter_ano_dict(ano)
     emp_dict = ano_dict.setdefault(
         empresa,
         {"meses": {}, "extra_mensal": 0, "apagado": False, "por_tecnico": {}},
@@ -900,287 +866,393 @@ def _adicionar_tempo_empresa(
         tec_registos[mes_key] = atual_tec + minutos
 
 
+class _IndiceEmpresas:
+    """
+    Índice de um ano de timings_dados: norma forte (_norm_empresa_forte) ->
+    primeiro nome de empresa com essa norma, e nome -> norma.
+
+    As empresas de um ano só são acrescentadas (excluir marca "apagado"; limpar
+    e migrações trocam o ano inteiro), por isso basta indexar as chaves novas
+    no fim do dicionário. Se o ano encolher ou a última chave mudar, o índice
+    é refeito.
+    """
+
+    def __init__(self, ano_dict: dict):
+        self.ano_dict = ano_dict
+        self._limpar()
+
+    def _limpar(self) -> None:
+        self.n = 0
+        self.ultimo: Optional[str] = None
+        self.nome_por_norma: Dict[str, str] = {}
+        self.norma_por_nome: Dict[str, str] = {}
+
+    def atualizar(self) -> "_IndiceEmpresas":
+        ano_dict = self.ano_dict
+        total = len(ano_dict)
+        if total < self.n or (total == self.n and total and next(reversed(ano_dict)) != self.ultimo):
+            self._limpar()
+        if total > self.n:
+            for nome in islice(ano_dict, self.n, None):
+                norm = _norm_empresa_forte(nome)
+                self.norma_por_nome[nome] = norm
+                if norm:
+                    self.nome_por_norma.setdefault(norm, nome)
+            self.n = total
+            self.ultimo = next(reversed(ano_dict))
+        return self
+
+    def norma(self, nome: str) -> str:
+        norm = self.norma_por_nome.get(nome)
+        return norm if norm is not None else _norm_empresa_forte(nome)
+
+
+# {id(ano_dict): índice}, só para os anos presentes em timings_dados
+_INDICES_EMPRESAS: Dict[int, _IndiceEmpresas] = {}
+
+
+def _indice_empresas(ano_dict: dict) -> _IndiceEmpresas:
+    """Índice (atualizado) das empresas de um ano; partilhado por importação, sincronização e páginas."""
+    indice = _INDICES_EMPRESAS.get(id(ano_dict))
+    if indice is not None and indice.ano_dict is ano_dict:
+        return indice.atualizar()
+
+    indice = _IndiceEmpresas(ano_dict).atualizar()
+    if any(v is ano_dict for v in timings_dados.values()):
+        # Esquece anos que já não fazem parte de timings_dados (limpar/migrar)
+        for chave in [k for k, ind in _INDICES_EMPRESAS.items() if not any(v is ind.ano_dict for v in timings_dados.values())]:
+            del _INDICES_EMPRESAS[chave]
+        _INDICES_EMPRESAS[id(ano_dict)] = indice
+    return indice
+
+
 def _encontrar_empresa_existente_por_norm(ano_dict: dict, empresa_norm: str) -> Optional[str]:
     """Procura chave de empresa existente cujo nome normalizado coincide com empresa_norm."""
-    for nome in ano_dict.keys():
-        if _norm_empresa_forte(nome) == empresa_norm:
-            return nome
-    return None
+    if not empresa_norm:
+        for nome in ano_dict.keys():
+            if _norm_empresa_forte(nome) == empresa_norm:
+                return nome
+        return None
+    return _indice_empresas(ano_dict).nome_por_norma.get(empresa_norm)
 
 
-def _processar_sheet_workload(
-    sheet,
-    invalidos: Optional[Dict[str, int]] = None,
-    ignorados_por_empresa: Optional[Dict[str, int]] = None,
-    resumos_ignorados_por_empresa: Optional[Dict[str, int]] = None,
-) -> tuple[List[tuple[str, str, Optional[str], int]], Dict[str, int]]:
-    """
-    Lê uma folha no formato legacy (empresa + técnicos indentados).
-    Devolve uma lista de registos detalhados (empresa, tipo, canónico, minutos)
-    e um dicionário com totais de fallback (quando só existe linha-resumo).
-    """
-    registos: List[tuple[str, str, Optional[str], int]] = []
-    totais_fallback: Dict[str, int] = {}
+# ========= RESUMO POR ANO (LINHAS EM CACHE) =========
 
-    empresa_atual: Optional[str] = None
-    resumo_atual_min = 0
-    registos_empresa: List[tuple[str, str, Optional[str], int]] = []
+_TECNICOS_CLIENTES: Optional[Tuple[List[Tuple[str, dict]], Dict[str, str], set]] = None
 
-    def finalizar_empresa() -> None:
-        nonlocal empresa_atual, resumo_atual_min, registos_empresa
 
-        if not empresa_atual:
-            return
+def _tecnicos_por_norma() -> Tuple[Dict[str, str], set]:
+    """
+    {norma do cliente: técnico canónico} e os técnicos dos clientes (mais
+    'Sem técnico'). Partilhado (não alterar); só é recalculado quando a lista
+    de _mapear_clientes_por_nome() muda.
+    """
+    global _TECNICOS_CLIENTES
 
-        if registos_empresa:
-            if resumo_atual_min > 0:
-                if ignorados_por_empresa is not None:
-                    ignorados_por_empresa[empresa_atual] = (
-                        ignorados_por_empresa.get(empresa_atual, 0) + resumo_atual_min
-                    )
-                if resumos_ignorados_por_empresa is not None:
-                    resumos_ignorados_por_empresa[empresa_atual] = (
-                        resumos_ignorados_por_empresa.get(empresa_atual, 0) + resumo_atual_min
-                    )
-            registos.extend(registos_empresa)
-        elif resumo_atual_min > 0:
-            totais_fallback[empresa_atual] = (
-                totais_fallback.get(empresa_atual, 0) + resumo_atual_min
-            )
+    _, clientes_norm_lista = _mapear_clientes_por_nome()
+    if _TECNICOS_CLIENTES is not None and _TECNICOS_CLIENTES[0] is clientes_norm_lista:
+        return _TECNICOS_CLIENTES[1], _TECNICOS_CLIENTES[2]
 
-        empresa_atual = None
-        resumo_atual_min = 0
-        registos_empresa = []
+    tecnico_por_norma: Dict[str, str] = {}
+    tecnicos_disponiveis_set: set[str] = set()
+    for norm, cli in clientes_norm_lista:
+        canonico = _tecnico_do_cliente(cli)
+        tecnicos_disponiveis_set.add(canonico)
+        tecnico_por_norma[norm] = canonico
+    tecnicos_disponiveis_set.add(_canonical_tecnico_nome(None))
 
-    for row in sheet.iter_rows(values_only=True):
-        if not row:
-            continue
+    _TECNICOS_CLIENTES = (clientes_norm_lista, tecnico_por_norma, tecnicos_disponiveis_set)
+    return tecnico_por_norma, tecnicos_disponiveis_set
 
-        col1 = row[0]
-        col2 = row[1] if len(row) > 1 else None
 
-        if col1 is None:
-            continue
+class _ResumoAno:
+    """
+    Linhas já calculadas de um ano para as páginas de Timings, cada uma com a
+    versão da linha da matriz (timings_matriz) de que depende. Gravar os
+    extras de uma empresa muda só a versão dessa linha: só essa linha e os
+    totais dos técnicos que a incluem voltam a ser calculados.
+    """
 
-        texto = str(col1)
-        texto_strip = texto.strip()
+    def __init__(self) -> None:
+        # (empresa, meses_para_media) -> (versão, linha da página de resumo)
+        self.linhas: Dict[Tuple[str, int], Tuple[int, Dict[str, Any]]] = {}
+        # (versão da estrutura, empresas por ordem alfabética)
+        self.ordem: Tuple[int, List[str]] = (0, [])
+        # (dependências, mapa_raw, técnicos ordenados): quem aparece em cada mapa
+        self.mapa: Optional[Tuple[Tuple[Any, ...], Dict[str, Dict[str, bool]], List[str]]] = None
+        # empresa -> (versão, conta meses, linha do mapa por cliente, minutos por mês, total ajustado)
+        self.linhas_mapa: Dict[str, Tuple[int, bool, Dict[str, Any], List[int], int]] = {}
+        # técnico -> (empresas e versões, linha do mapa global, minutos por mês, total ajustado)
+        self.totais_tecnico: Dict[str, Tuple[Tuple[Any, ...], Dict[str, Any], List[int], int]] = {}
 
-        if not texto_strip:
-            continue
-        if texto_strip.upper() in {"EMPRESA", "TOTAL"} or _is_linha_total(texto_strip):
-            continue
-        if "MAPA DE TEMPO TRABALHADO" in texto_strip.upper():
-            continue
 
-        if texto.startswith("    "):
-            if not empresa_atual:
-                continue
+_RESUMOS: Dict[str, _ResumoAno] = {}
+_ESTATISTICAS_RESUMO = {"linhas_reutilizadas": 0, "linhas_calculadas": 0, "mapas_calculados": 0}
 
-            minutos = _parse_tempo_para_minutos(col2)
-            if minutos <= 0:
-                continue
 
-            tipo, canonico = _resolver_tecnico(texto_strip)
-            if tipo == "desconhecido":
-                if invalidos is not None:
-                    chave = texto_strip
-                    invalidos[chave] = invalidos.get(chave, 0) + minutos
-                if ignorados_por_empresa is not None:
-                    ignorados_por_empresa[empresa_atual] = (
-                        ignorados_por_empresa.get(empresa_atual, 0) + minutos
-                    )
-                continue
+def _resumo_ano(ano: int, matriz: timings_matriz.MatrizAno) -> _ResumoAno:
+    resumo = _RESUMOS.setdefault(str(ano), _ResumoAno())
+    if resumo.ordem[0] != matriz.versao_estrutura:
+        resumo.ordem = (matriz.versao_estrutura, sorted(matriz.empresas, key=lambda e: e.upper()))
+        # Esquece empresas que já não estão no ano
+        resumo.linhas = {k: v for k, v in resumo.linhas.items() if k[0] in matriz.posicao}
+    return resumo
 
-            registos_empresa.append((empresa_atual, tipo, canonico, minutos))
-        else:
-            finalizar_empresa()
-            empresa_atual = texto_strip
-            resumo_atual_min = _parse_tempo_para_minutos(col2)
 
-    finalizar_empresa()
+def _linha_resumo(
+    resumo: _ResumoAno,
+    matriz: timings_matriz.MatrizAno,
+    empresa: str,
+    meses_para_media: int,
+) -> Dict[str, Any]:
+    """Linha da página de resumo (partilhada, não alterar)."""
+    i = matriz.posicao[empresa]
+    versao = matriz.versoes[i]
+    em_cache = resumo.linhas.get((empresa, meses_para_media))
+    if em_cache is not None and em_cache[0] == versao:
+        _ESTATISTICAS_RESUMO["linhas_reutilizadas"] += 1
+        return em_cache[1]
+
+    extra_mensal_min = matriz.extra[i]
+    meses_base = matriz.meses(i)
+    total_base_min = sum(meses_base)
+    minutos_por_mes = [mins + extra_mensal_min for mins in meses_base]
+    valores_por_mes = [_format_minutos(mins) if mins > 0 else "" for mins in minutos_por_mes]
+
+    total_ajustado_min = total_base_min + extra_mensal_min * 12
+
+    if total_ajustado_min > 0 and meses_para_media > 0:
+        media_min = int(round(total_ajustado_min / meses_para_media))
+    else:
+        media_min = 0
+
+    linha = {
+        "empresa": empresa,
+        "valores_por_mes": valores_por_mes,
+        "minutos_por_mes": minutos_por_mes,
+        "total_base_str": _format_minutos(total_base_min)
+        if total_base_min > 0
+        else "",
+        "extra_str": _format_minutos(extra_mensal_min) if extra_mensal_min > 0 else "",
+        "total_ajustado_str": _format_minutos(total_ajustado_min)
+        if total_ajustado_min > 0
+        else "",
+        "media_str": _format_minutos(media_min) if media_min > 0 else "",
+    }
+    resumo.linhas[(empresa, meses_para_media)] = (versao, linha)
+    _ESTATISTICAS_RESUMO["linhas_calculadas"] += 1
+    return linha
 
-    return registos, totais_fallback
 
+def _mapa_tecnicos(
+    resumo: _ResumoAno,
+    matriz: timings_matriz.MatrizAno,
+    ano: int,
+    ano_dict: dict,
+    tecnico_por_norma: Dict[str, str],
+) -> Tuple[Dict[str, Dict[str, bool]], List[str]]:
+    """
+    mapa_raw[tecnico][empresa] = conta os meses da empresa (False: cliente sem
+    timings) e os técnicos ordenados. Depende só de quem está no ano (estrutura
+    da matriz) e dos clientes, por isso não muda quando se gravam extras.
+    """
+    clientes_lista_mapas = estado.get("clientes", [])
+    if not isinstance(clientes_lista_mapas, list):
+        clientes_lista_mapas = []
+    dependencias = (
+        matriz.versao_estrutura,
+        revisao("clientes"),
+        id(clientes_lista_mapas),
+        len(clientes_lista_mapas),
+    )
+    if resumo.mapa is not None and resumo.mapa[0] == dependencias:
+        return resumo.mapa[1], resumo.mapa[2]
 
-def _processar_sheet_colunas(
-    sheet,
-    invalidos: Optional[Dict[str, int]] = None,
-    ignorados_por_empresa: Optional[Dict[str, int]] = None,
-    resumos_ignorados_por_empresa: Optional[Dict[str, int]] = None,
-) -> Optional[tuple[List[tuple[str, str, Optional[str], int]], Dict[str, int]]]:
-    """Tenta ler folha em formato tabular (empresa/cliente, técnico, tempo)."""
-    linhas = list(sheet.iter_rows(values_only=True))
-    idx_empresa = idx_tecnico = idx_tempo = None
-    header_idx = None
+    indice_ano = _indice_empresas(ano_dict)
+    mapa_raw: Dict[str, Dict[str, bool]] = {}
+    cliente_por_empresa = correspondencias.obter_coluna(
+        ano, "mapas", ano_dict, _calcular_correspondencias_mapas
+    )
 
-    for i, row in enumerate(linhas):
-        if not row:
-            continue
-        valores_norm = [_normalize_header(c) for c in row]
-        if not any(valores_norm):
+    # 1) Empresas que têm timings (e não estão apagadas)
+    for empresa, i in matriz.posicao.items():
+        if matriz.apagado[i] or not matriz.tem_positivos(i):
             continue
 
-        for idx, nome in enumerate(valores_norm):
-            if not nome:
-                continue
-            if idx_empresa is None and nome in EMPRESA_HEADER_NAMES:
-                idx_empresa = idx
-            if idx_tecnico is None and nome in TECNICO_HEADER_NAMES:
-                idx_tecnico = idx
-            if idx_tempo is None and nome in TEMPO_HEADER_NAMES:
-                idx_tempo = idx
-
-        if idx_empresa is not None and idx_tecnico is not None and idx_tempo is not None:
-            header_idx = i
-            break
-
-    if header_idx is None:
-        return None
-
-    registos_por_empresa: Dict[str, List[tuple[str, Optional[str], int]]] = {}
-    resumos_por_empresa: Dict[str, int] = {}
+        chave_empresa = indice_ano.norma(empresa)
+        tecnico_key = tecnico_por_norma.get(chave_empresa)
+        cliente_ref = None
 
-    for row in linhas[header_idx + 1 :]:
-        if not row:
-            continue
+        if tecnico_key is None:
+            corr = cliente_por_empresa.get(empresa) or {}
+            idx_cli = corr.get("indice")
+            if isinstance(idx_cli, int) and idx_cli < len(clientes_lista_mapas):
+                cliente_ref = clientes_lista_mapas[idx_cli]
+            tecnico_key = _tecnico_do_cliente(cliente_ref) if cliente_ref else _canonical_tecnico_nome(None)
 
-        if idx_empresa >= len(row) or idx_tecnico >= len(row) or idx_tempo >= len(row):
-            continue
+        if not tecnico_key:
+            tecnico_key = _canonical_tecnico_nome(None)
 
-        empresa_val = row[idx_empresa]
-        tempo_val = row[idx_tempo]
+        mapa_raw.setdefault(tecnico_key, {})[empresa] = True
 
-        if empresa_val is None:
-            continue
+    # 2) Clientes com técnico mas sem timings -> queremos que apareçam no mapa,
+    #    exceto se tiverem registo "apagado" no ano_dict (foram excluídos manualmente).
+    nome_por_norma = indice_ano.nome_por_norma
 
-        empresa = str(empresa_val).strip()
-        if not empresa:
+    clientes_sem_timings_por_tecnico: dict[str, list[str]] = {}
+    for cli in clientes_lista_mapas:
+        if not isinstance(cli, dict):
             continue
-        if _is_linha_total(empresa):
+        nome_cli = (
+            cli.get("nome")
+            or cli.get("cliente")
+            or cli.get("empresa")
+            or cli.get("designacao")
+        )
+        if not nome_cli:
             continue
 
-        minutos = _parse_tempo_para_minutos(tempo_val)
-        if minutos <= 0:
+        nome_cli_str = str(nome_cli).strip()
+        nome_cli_norm = _norm_empresa_forte(nome_cli_str)
+        empresa_display = nome_por_norma.get(nome_cli_norm, nome_cli_str)
+        rec_ano = ano_dict.get(empresa_display)
+        # se já estiver marcado como apagado neste ano, não aparece no mapa
+        if rec_ano and rec_ano.get("apagado"):
             continue
 
-        tecnico_val = row[idx_tecnico] if idx_tecnico is not None else None
-        tecnico = str(tecnico_val).strip() if tecnico_val is not None else ""
-
-        if not tecnico:
-            resumos_por_empresa[empresa] = resumos_por_empresa.get(empresa, 0) + minutos
+        tecnico_key = _tecnico_do_cliente(cli)
+        tec_dict_exist = mapa_raw.get(tecnico_key, {})
+        ja_no_mapa = isinstance(tec_dict_exist, dict) and empresa_display in tec_dict_exist
+        if ja_no_mapa:
             continue
 
-        tipo, canonico = _resolver_tecnico(tecnico)
-        if tipo == "desconhecido":
-            if not _is_linha_total(tecnico):
-                if invalidos is not None:
-                    chave = tecnico
-                    invalidos[chave] = invalidos.get(chave, 0) + minutos
-                if ignorados_por_empresa is not None:
-                    ignorados_por_empresa[empresa] = ignorados_por_empresa.get(empresa, 0) + minutos
-            continue
+        lista_cli = clientes_sem_timings_por_tecnico.setdefault(tecnico_key, [])
+        if empresa_display not in lista_cli:
+            lista_cli.append(empresa_display)
 
-        registos = registos_por_empresa.setdefault(empresa, [])
-        registos.append((tipo, canonico, minutos))
-
-    resultados: List[tuple[str, str, Optional[str], int]] = []
-    totais_fallback: Dict[str, int] = {}
-
-    for empresa, detalhes in registos_por_empresa.items():
-        tem_detalhe = any(tipo in {"canonico", "armando"} for tipo, _, _ in detalhes)
-
-        if tem_detalhe:
-            resumo_min = resumos_por_empresa.pop(empresa, 0)
-            if resumo_min > 0:
-                if ignorados_por_empresa is not None:
-                    ignorados_por_empresa[empresa] = ignorados_por_empresa.get(empresa, 0) + resumo_min
-                if resumos_ignorados_por_empresa is not None:
-                    resumos_ignorados_por_empresa[empresa] = (
-                        resumos_ignorados_por_empresa.get(empresa, 0) + resumo_min
-                    )
-            for tipo, canonico, minutos in detalhes:
-                if tipo in {"canonico", "armando"} and minutos > 0:
-                    resultados.append((empresa, tipo, canonico, minutos))
-        else:
-            total_resumo = resumos_por_empresa.pop(empresa, 0)
-            total = total_resumo + sum(minutos for _, _, minutos in detalhes)
-            if total > 0:
-                totais_fallback[empresa] = totais_fallback.get(empresa, 0) + total
+    # 3) Ordenar técnicos e integrar estes clientes sem timings no mapa_raw
+    tecnicos_mapa = sorted({*mapa_raw.keys(), *clientes_sem_timings_por_tecnico.keys()})
 
-    for empresa, minutos in resumos_por_empresa.items():
-        if minutos > 0:
-            totais_fallback[empresa] = totais_fallback.get(empresa, 0) + minutos
+    for tecnico_key, lista_clientes in clientes_sem_timings_por_tecnico.items():
+        tec_dict = mapa_raw.setdefault(tecnico_key, {})
+        for nome_cli_str in lista_clientes:
+            tec_dict.setdefault(nome_cli_str, False)  # meses vazios (sem timings)
 
-    return resultados, totais_fallback
+    resumo.mapa = (dependencias, mapa_raw, tecnicos_mapa)
+    # Linhas e totais de empresas/técnicos que saíram dos mapas já não servem
+    nos_mapas = {empresa for tec_dict in mapa_raw.values() for empresa in tec_dict}
+    resumo.linhas_mapa = {k: v for k, v in resumo.linhas_mapa.items() if k in nos_mapas}
+    resumo.totais_tecnico = {k: v for k, v in resumo.totais_tecnico.items() if k in mapa_raw}
+    _ESTATISTICAS_RESUMO["mapas_calculados"] += 1
+    return mapa_raw, tecnicos_mapa
 
 
-def _importar_excel_timings(
-    conteudo: bytes,
-    ano: int,
-    mes: int,
-) -> tuple[List[Dict[str, Any]], Dict[str, int], Dict[str, int], Dict[str, int]]:
-    """
-    Importa um Excel de workload e agrega registos normalizados para posterior deduplicação.
-    """
-    wb = openpyxl.load_workbook(BytesIO(conteudo), data_only=True)
-    folhas = [wb[nome] for nome in wb.sheetnames]
-
-    registos_validos: List[Dict[str, Any]] = []
-    invalidos: Dict[str, int] = {}
-    ignorados_por_empresa: Dict[str, int] = {}
-    resumos_ignorados_por_empresa: Dict[str, int] = {}
-
-    for sh in folhas:
-        resultado_tabular = _processar_sheet_colunas(
-            sh,
-            invalidos,
-            ignorados_por_empresa,
-            resumos_ignorados_por_empresa,
-        )
+def _linha_mapa_cliente(
+    resumo: _ResumoAno,
+    matriz: timings_matriz.MatrizAno,
+    empresa: str,
+    com_meses: bool,
+) -> Tuple[Dict[str, Any], List[int], int]:
+    """(linha do mapa por cliente, minutos por mês com extra, total ajustado)."""
+    versao = matriz.versao(empresa)
+    em_cache = resumo.linhas_mapa.get(empresa)
+    if em_cache is not None and em_cache[0] == versao and em_cache[1] == com_meses:
+        _ESTATISTICAS_RESUMO["linhas_reutilizadas"] += 1
+        return em_cache[2], em_cache[3], em_cache[4]
+
+    meses_base, extra_cli_mensal = matriz.linha_mapa(empresa, com_meses)
+    meses_efetivos = [mins + extra_cli_mensal for mins in meses_base]
+    valores_cli = [_format_minutos(mins) if mins > 0 else "" for mins in meses_efetivos]
+
+    total_cli_base_min = sum(meses_base)
+    tem_minutos_tecnico = total_cli_base_min > 0
+    tem_minutos = tem_minutos_tecnico or max(meses_efetivos) > 0
+
+    tem_extra = extra_cli_mensal > 0
+    total_cli_ajustado_min = total_cli_base_min + extra_cli_mensal * 12
+
+    if total_cli_ajustado_min > 0:
+        media_cli_min = int(round(total_cli_ajustado_min / 12))
+    else:
+        media_cli_min = 0
+
+    sem_timings = (not tem_minutos) and (not tem_extra)
+    tem_timings_outros = False
+    if not tem_minutos_tecnico:
+        i = matriz.posicao.get(empresa)
+        tem_timings_outros = (
+            i is not None and not matriz.apagado[i] and bool(matriz.com_minutos[i])
+        ) or extra_cli_mensal > 0
+
+    linha_cli = {
+        "cliente": empresa,
+        "valores_por_mes": valores_cli,
+        "total_str": _format_minutos(total_cli_base_min)
+        if total_cli_base_min > 0
+        else "",
+        "extra_str": _format_minutos(extra_cli_mensal)
+        if extra_cli_mensal > 0
+        else "",
+        "total_ajustado_str": _format_minutos(total_cli_ajustado_min)
+        if total_cli_ajustado_min > 0
+        else "",
+        "media_str": _format_minutos(media_cli_min) if media_cli_min > 0 else "",
+        "sem_timings": sem_timings,
+        "tem_timings_outros": tem_timings_outros,
+    }
+    resumo.linhas_mapa[empresa] = (versao, com_meses, linha_cli, meses_efetivos, total_cli_ajustado_min)
+    _ESTATISTICAS_RESUMO["linhas_calculadas"] += 1
+    return linha_cli, meses_efetivos, total_cli_ajustado_min
+
+
+def _linha_mapa_tecnico(
+    resumo: _ResumoAno,
+    matriz: timings_matriz.MatrizAno,
+    tecnico_nome: str,
+    empresas: Dict[str, bool],
+) -> Tuple[Dict[str, Any], List[int], int]:
+    """(linha do mapa global, minutos por mês, total ajustado); só recalcula se mudou alguma empresa do técnico."""
+    dependencias = tuple((empresa, com_meses, matriz.versao(empresa)) for empresa, com_meses in empresas.items())
+    em_cache = resumo.totais_tecnico.get(tecnico_nome)
+    if em_cache is not None and em_cache[0] == dependencias:
+        _ESTATISTICAS_RESUMO["linhas_reutilizadas"] += 1
+        return em_cache[1], em_cache[2], em_cache[3]
+
+    mins_por_mes, total_tec_base_min, total_tec_extra_mensal_min = matriz.somar_linhas(
+        matriz.linha_mapa(empresa, com_meses) for empresa, com_meses in empresas.items()
+    )
+    valores_mes = [_format_minutos(mins) if mins > 0 else "" for mins in mins_por_mes]
 
-        if resultado_tabular is not None:
-            registos_sheet, totais_sheet = resultado_tabular
-        else:
-            registos_sheet, totais_sheet = _processar_sheet_workload(
-                sh,
-                invalidos,
-                ignorados_por_empresa,
-                resumos_ignorados_por_empresa,
-            )
+    total_tec_ajustado_min = total_tec_base_min + total_tec_extra_mensal_min * 12
 
-        for empresa, tipo, canonico, minutos in registos_sheet:
-            if minutos <= 0:
-                continue
-            empresa_norm = _norm_empresa_forte(empresa)
-            if not empresa_norm:
-                continue
-            registos_validos.append(
-                {
-                    "empresa": empresa,
-                    "empresa_norm": empresa_norm,
-                    "tipo": tipo,
-                    "canonico": canonico,
-                    "minutos": minutos,
-                }
-            )
+    if total_tec_ajustado_min > 0:
+        media_tec_global_min = int(round(total_tec_ajustado_min / 12))
+    else:
+        media_tec_global_min = 0
+
+    linha_tec = {
+        "tecnico": tecnico_nome,
+        "valores_por_mes": valores_mes,
+        "total_str": _format_minutos(total_tec_base_min)
+        if total_tec_base_min > 0
+        else "",
+        "extra_str": _format_minutos(total_tec_extra_mensal_min)
+        if total_tec_extra_mensal_min > 0
+        else "",
+        "total_ajustado_str": _format_minutos(total_tec_ajustado_min)
+        if total_tec_ajustado_min > 0
+        else "",
+        "media_str": _format_minutos(media_tec_global_min)
+        if media_tec_global_min > 0
+        else "",
+    }
+    resumo.totais_tecnico[tecnico_nome] = (dependencias, linha_tec, mins_por_mes, total_tec_ajustado_min)
+    _ESTATISTICAS_RESUMO["linhas_calculadas"] += 1
+    return linha_tec, mins_por_mes, total_tec_ajustado_min
 
-        for empresa, minutos in totais_sheet.items():
-            if minutos <= 0:
-                continue
-            empresa_norm = _norm_empresa_forte(empresa)
-            if not empresa_norm:
-                continue
-            registos_validos.append(
-                {
-                    "empresa": empresa,
-                    "empresa_norm": empresa_norm,
-                    "tipo": "resumo",
-                    "canonico": None,
-                    "minutos": minutos,
-                }
-            )
 
-    return registos_validos, invalidos, ignorados_por_empresa, resumos_ignorados_por_empresa
+def estatisticas_resumo() -> Dict[str, Any]:
+    return {**_ESTATISTICAS_RESUMO, "matrizes": timings_matriz.estatisticas()}
 
 
 def _build_timings_context(
@@ -1203,16 +1275,7 @@ def _build_timings_context(
         else ""
     )
 
-    clientes_por_nome, clientes_norm_lista = _mapear_clientes_por_nome()
-    tecnico_por_norma: Dict[str, str] = {}
-    tecnicos_disponiveis_set: set[str] = set()
-
-    for norm, cli in clientes_norm_lista:
-        canonico = _tecnico_do_cliente(cli)
-        tecnicos_disponiveis_set.add(canonico)
-        tecnico_por_norma[norm] = canonico
-
-    tecnicos_disponiveis_set.add(_canonical_tecnico_nome(None))
+    tecnico_por_norma, tecnicos_disponiveis_set = _tecnicos_por_norma()
 
     # Anos disponíveis (só chaves numéricas)
     anos_disponiveis = (
@@ -1234,26 +1297,14 @@ def _build_timings_context(
         else:
             ano_efetivo = ano_sel
 
-        ano_dict_raw = timings_dados.get(str(ano_efetivo), {})
-        ano_dict_resumo = dict(ano_dict_raw)
-        ano_dict_para_mapas = dict(ano_dict_raw)
+        ano_dict_para_mapas = timings_dados.get(str(ano_efetivo), {})
+        indice_ano = _indice_empresas(ano_dict_para_mapas)
+        matriz = timings_matriz.obter(ano_efetivo, ano_dict_para_mapas)
+        resumo = _resumo_ano(ano_efetivo, matriz)
 
         # nº meses com registo (para média automática)
-        meses_com_registo = set()
-        for _empresa, rec in ano_dict_resumo.items():
-            if rec.get("apagado"):
-                continue
-            meses = rec.get("meses", {})
-            for num_mes, minutos in meses.items():
-                try:
-                    mins_int = int(minutos or 0)
-                except (TypeError, ValueError):
-                    mins_int = 0
-                if mins_int > 0:
-                    meses_com_registo.add(int(num_mes))
-
-        if meses_com_registo:
-            meses_para_media_default = len(meses_com_registo)
+        if matriz.meses_com_registo:
+            meses_para_media_default = len(matriz.meses_com_registo)
         else:
             meses_para_media_default = 12
 
@@ -1270,12 +1321,11 @@ def _build_timings_context(
             meses_para_media = m
 
         # construir linhas principais (por empresa) para a página de resumo
-        for empresa in sorted(ano_dict_resumo.keys(), key=lambda e: e.upper()):
-            rec = ano_dict_resumo[empresa]
-            if rec.get("apagado"):
+        for empresa in resumo.ordem[1]:
+            if matriz.apagado[matriz.posicao[empresa]]:
                 continue
 
-            empresa_norm = _norm_empresa_forte(empresa)
+            empresa_norm = indice_ano.norma(empresa)
             tecnico_empresa = tecnico_por_norma.get(empresa_norm)
             if not tecnico_empresa:
                 tecnico_empresa = _canonical_tecnico_nome(None)
@@ -1286,49 +1336,7 @@ def _build_timings_context(
             if tecnico_filtro_canon and tecnico_empresa != tecnico_filtro_canon:
                 continue
 
-            meses_dict = rec.get("meses", {})
-            extra_mensal_min = _extra_mes(rec)
-
-            valores_por_mes = []
-            minutos_por_mes = []
-            total_base_min = 0
-
-            for num_mes, _label in MESES_LABELS:
-                # cuidado: depois de ler do JSON, as chaves podem vir como strings
-                raw = meses_dict.get(num_mes)
-                if raw is None:
-                    raw = meses_dict.get(str(num_mes))
-                try:
-                    mins = int(raw or 0)
-                except (TypeError, ValueError):
-                    mins = 0
-
-                total_base_min += mins
-                mins_efetivos = mins + extra_mensal_min
-                minutos_por_mes.append(mins_efetivos)
-                valores_por_mes.append(_format_minutos(mins_efetivos) if mins_efetivos > 0 else "")
-
-            total_ajustado_min = total_base_min + extra_mensal_min * 12
-
-            if total_ajustado_min > 0 and meses_para_media > 0:
-                media_min = int(round(total_ajustado_min / meses_para_media))
-            else:
-                media_min = 0
-
-            linha = {
-                "empresa": empresa,
-                "valores_por_mes": valores_por_mes,
-                "minutos_por_mes": minutos_por_mes,
-                "total_base_str": _format_minutos(total_base_min)
-                if total_base_min > 0
-                else "",
-                "extra_str": _format_minutos(extra_mensal_min) if extra_mensal_min > 0 else "",
-                "total_ajustado_str": _format_minutos(total_ajustado_min)
-                if total_ajustado_min > 0
-                else "",
-                "media_str": _format_minutos(media_min) if media_min > 0 else "",
-            }
-            linhas.append(linha)
+            linhas.append(_linha_resumo(resumo, matriz, empresa, meses_para_media))
 
     if not anos_disponiveis:
         anos_disponiveis = [ano_efetivo]
@@ -1342,101 +1350,9 @@ def _build_timings_context(
     mapa_tecnico_global: Optional[Dict[str, Any]] = None
 
     if ano_dict_para_mapas:
-        # mapa_raw[tecnico][empresa][mes] = minutos
-        mapa_raw: dict = {}
-
-        # 1) Empresas que têm timings (e não estão apagadas)
-        for empresa, rec in ano_dict_para_mapas.items():
-            if rec.get("apagado"):
-                continue
-
-            meses_dict = rec.get("meses", {})
-
-            chave_empresa = _norm_empresa_forte(empresa)
-            tecnico_key = tecnico_por_norma.get(chave_empresa)
-            cliente_ref = None
-
-            if tecnico_key is None:
-                cliente_ref = clientes_por_nome.get(chave_empresa)
-                if cliente_ref is None and chave_empresa:
-                    for norm_cli, cli_cand in clientes_norm_lista:
-                        if chave_empresa in norm_cli or norm_cli in chave_empresa:
-                            cliente_ref = cli_cand
-                            break
-                tecnico_key = _tecnico_do_cliente(cliente_ref) if cliente_ref else _canonical_tecnico_nome(None)
-
-            if not tecnico_key:
-                tecnico_key = _canonical_tecnico_nome(None)
-
-            for num_mes, minutos in meses_dict.items():
-                try:
-                    mes_int = int(num_mes)
-                except (TypeError, ValueError):
-                    continue
-                if mes_int < 1 or mes_int > 12:
-                    continue
-                try:
-                    mins_int = int(minutos or 0)
-                except (TypeError, ValueError):
-                    mins_int = 0
-                if mins_int <= 0:
-                    continue
-
-                tec_dict = mapa_raw.setdefault(tecnico_key, {})
-                cli_dict = tec_dict.setdefault(empresa, {})
-                cli_dict[mes_int] = int(cli_dict.get(mes_int, 0) or 0) + mins_int
-
-        # 2) Clientes com técnico mas sem timings -> queremos que apareçam no mapa,
-        #    exceto se tiverem registo "apagado" no ano_dict (foram excluídos manualmente).
-        nome_por_norma = {}
-        for empresa_nome in ano_dict_para_mapas.keys():
-            norm = _norm_empresa_forte(empresa_nome)
-            if norm and norm not in nome_por_norma:
-                nome_por_norma[norm] = empresa_nome
-
-        clientes_sem_timings_por_tecnico: dict[str, list[str]] = {}
-        try:
-            clientes_full = estado.get("clientes", [])
-        except Exception:
-            clientes_full = []
-        if isinstance(clientes_full, list):
-            for cli in clientes_full:
-                if not isinstance(cli, dict):
-                    continue
-                nome_cli = (
-                    cli.get("nome")
-                    or cli.get("cliente")
-                    or cli.get("empresa")
-                    or cli.get("designacao")
-                )
-                if not nome_cli:
-                    continue
-
-                nome_cli_str = str(nome_cli).strip()
-                nome_cli_norm = _norm_empresa_forte(nome_cli_str)
-                empresa_display = nome_por_norma.get(nome_cli_norm, nome_cli_str)
-                rec_ano = ano_dict_para_mapas.get(empresa_display)
-                # se já estiver marcado como apagado neste ano, não aparece no mapa
-                if rec_ano and rec_ano.get("apagado"):
-                    continue
-
-                tecnico_key = _tecnico_do_cliente(cli)
-                tec_dict_exist = mapa_raw.get(tecnico_key, {})
-                ja_no_mapa = isinstance(tec_dict_exist, dict) and empresa_display in tec_dict_exist
-                if ja_no_mapa:
-                    continue
-
-                lista_cli = clientes_sem_timings_por_tecnico.setdefault(tecnico_key, [])
-                if empresa_display not in lista_cli:
-                    lista_cli.append(empresa_display)
-
-        # 3) Ordenar técnicos e integrar estes clientes sem timings no mapa_raw
-        tecnicos_mapa = sorted({*mapa_raw.keys(), *clientes_sem_timings_por_tecnico.keys()})
-
-        for tecnico_key, lista_clientes in clientes_sem_timings_por_tecnico.items():
-            tec_dict = mapa_raw.setdefault(tecnico_key, {})
-            for nome_cli_str in lista_clientes:
-                tec_dict.setdefault(nome_cli_str, {})  # meses vazios (sem timings)
+        mapa_raw, tecnicos_mapa = _mapa_tecnicos(
+            resumo, matriz, ano_efetivo, ano_dict_para_mapas, tecnico_por_norma
+        )
 
         if tecnicos_mapa:
             if tecnico_mapa_sel and tecnico_mapa_sel in tecnicos_mapa:
@@ -1447,82 +1363,18 @@ def _build_timings_context(
             # -- Mapa por cliente para o técnico selecionado --
             tec_dict_sel = mapa_raw.get(tecnico_mapa, {})
             linhas_cli = []
-            totais_mes_min = {num_mes: 0 for num_mes, _ in MESES_LABELS}
+            totais_mes_min = [0] * len(MESES_LABELS)
             total_ano_tecnico_min = 0
 
             for empresa in sorted(tec_dict_sel.keys(), key=lambda e: e.upper()):
-                meses_cli = tec_dict_sel[empresa]
-                rec_cliente = ano_dict_para_mapas.get(empresa, {})
-                if rec_cliente.get("apagado"):
-                    rec_cliente = {}
-                extra_cli_mensal = _extra_mes(rec_cliente)
-
-                valores_cli = []
-                total_cli_base_min = 0
-                tem_minutos = False
-                tem_minutos_tecnico = False
-
-                for num_mes, _label in MESES_LABELS:
-                    mins_base = int(meses_cli.get(num_mes, 0) or 0)
-                    if mins_base > 0:
-                        tem_minutos = True
-                        tem_minutos_tecnico = True
-                    total_cli_base_min += mins_base
-
-                    mins_efetivos = mins_base + extra_cli_mensal
-                    if mins_efetivos > 0:
-                        tem_minutos = True
-                    totais_mes_min[num_mes] += mins_efetivos
-                    valores_cli.append(
-                        _format_minutos(mins_efetivos) if mins_efetivos > 0 else ""
-                    )
-
-                tem_extra = extra_cli_mensal > 0
-                total_cli_ajustado_min = total_cli_base_min + extra_cli_mensal * 12
+                linha_cli, meses_efetivos, total_cli_ajustado_min = _linha_mapa_cliente(
+                    resumo, matriz, empresa, tec_dict_sel[empresa]
+                )
+                totais_mes_min = timings_matriz.somar(totais_mes_min, meses_efetivos)
                 total_ano_tecnico_min += total_cli_ajustado_min
-
-                if total_cli_ajustado_min > 0:
-                    media_cli_min = int(round(total_cli_ajustado_min / 12))
-                else:
-                    media_cli_min = 0
-
-                sem_timings = (not tem_minutos) and (not tem_extra)
-                tem_timings_outros = False
-                if not tem_minutos_tecnico and isinstance(rec_cliente, dict):
-                    meses_globais = rec_cliente.get("meses", {})
-                    if isinstance(meses_globais, dict):
-                        for valor in meses_globais.values():
-                            try:
-                                if int(valor or 0) > 0:
-                                    tem_timings_outros = True
-                                    break
-                            except (TypeError, ValueError):
-                                continue
-                    if not tem_timings_outros and extra_cli_mensal > 0:
-                        tem_timings_outros = True
-
-                linha_cli = {
-                    "cliente": empresa,
-                    "valores_por_mes": valores_cli,
-                    "total_str": _format_minutos(total_cli_base_min)
-                    if total_cli_base_min > 0
-                    else "",
-                    "extra_str": _format_minutos(extra_cli_mensal)
-                    if extra_cli_mensal > 0
-                    else "",
-                    "total_ajustado_str": _format_minutos(total_cli_ajustado_min)
-                    if total_cli_ajustado_min > 0
-                    else "",
-                    "media_str": _format_minutos(media_cli_min) if media_cli_min > 0 else "",
-                    "sem_timings": sem_timings,
-                    "tem_timings_outros": tem_timings_outros,
-                }
                 linhas_cli.append(linha_cli)
 
-            totais_mes_str = [
-                _format_minutos(totais_mes_min[num_mes]) if totais_mes_min[num_mes] > 0 else ""
-                for num_mes, _ in MESES_LABELS
-            ]
+            totais_mes_str = [_format_minutos(mins) if mins > 0 else "" for mins in totais_mes_min]
             total_ano_tecnico_str = (
                 _format_minutos(total_ano_tecnico_min) if total_ano_tecnico_min > 0 else ""
             )
@@ -1541,67 +1393,18 @@ def _build_timings_context(
 
             # -- Mapa global por técnico --
             linhas_tec = []
-            totais_mes_global_min = {num_mes: 0 for num_mes, _ in MESES_LABELS}
+            totais_mes_global_min = [0] * len(MESES_LABELS)
             total_ano_global_min = 0
 
             for tecnico_nome in tecnicos_mapa:
-                tec_dict = mapa_raw[tecnico_nome]
-                mins_por_mes = {num_mes: 0 for num_mes, _ in MESES_LABELS}
-                total_tec_base_min = 0
-                total_tec_extra_mensal_min = 0
-
-                for empresa, meses_cli in tec_dict.items():
-                    rec_cliente = ano_dict_para_mapas.get(empresa, {})
-                    if rec_cliente.get("apagado"):
-                        rec_cliente = {}
-                    extra_cli_mensal = _extra_mes(rec_cliente)
-                    total_tec_extra_mensal_min += extra_cli_mensal
-
-                    for num_mes, _label in MESES_LABELS:
-                        mins_base = int(meses_cli.get(num_mes, 0) or 0)
-                        mins_total = mins_base + extra_cli_mensal
-                        mins_por_mes[num_mes] += mins_total
-                        total_tec_base_min += mins_base
-
-                valores_mes = []
-                for num_mes, _label in MESES_LABELS:
-                    mins = mins_por_mes[num_mes]
-                    totais_mes_global_min[num_mes] += mins
-                    valores_mes.append(_format_minutos(mins) if mins > 0 else "")
-
-                total_tec_ajustado_min = total_tec_base_min + total_tec_extra_mensal_min * 12
-                total_ano_global_min += total_tec_ajustado_min
-
-                if total_tec_ajustado_min > 0:
-                    media_tec_global_min = int(round(total_tec_ajustado_min / 12))
-                else:
-                    media_tec_global_min = 0
-
-                linhas_tec.append(
-                    {
-                        "tecnico": tecnico_nome,
-                        "valores_por_mes": valores_mes,
-                        "total_str": _format_minutos(total_tec_base_min)
-                        if total_tec_base_min > 0
-                        else "",
-                        "extra_str": _format_minutos(total_tec_extra_mensal_min)
-                        if total_tec_extra_mensal_min > 0
-                        else "",
-                        "total_ajustado_str": _format_minutos(total_tec_ajustado_min)
-                        if total_tec_ajustado_min > 0
-                        else "",
-                        "media_str": _format_minutos(media_tec_global_min)
-                        if media_tec_global_min > 0
-                        else "",
-                    }
+                linha_tec, mins_por_mes, total_tec_ajustado_min = _linha_mapa_tecnico(
+                    resumo, matriz, tecnico_nome, mapa_raw[tecnico_nome]
                 )
+                totais_mes_global_min = timings_matriz.somar(totais_mes_global_min, mins_por_mes)
+                total_ano_global_min += total_tec_ajustado_min
+                linhas_tec.append(linha_tec)
 
-            totais_mes_global_str = [
-                _format_minutos(totais_mes_global_min[num_mes])
-                if totais_mes_global_min[num_mes] > 0
-                else ""
-                for num_mes, _ in MESES_LABELS
-            ]
+            totais_mes_global_str = [_format_minutos(mins) if mins > 0 else "" for mins in totais_mes_global_min]
             total_ano_global_str = (
                 _format_minutos(total_ano_global_min) if total_ano_global_min > 0 else ""
             )
@@ -1688,34 +1491,180 @@ async def ver_analise_grafica(
     return templates.TemplateResponse("timings.html", contexto)
 
 
-@router.post("/timings/importar")
-async def importar_timings(
+# ========= API JSON (RESUMO E MAPAS) =========
+
+POR_PAGINA_PADRAO = 50
+POR_PAGINA_MAXIMO = 500
+
+
+def _versao_timings() -> Tuple[int, int, int]:
+    """
+    Versão dos dados de que as páginas de Timings dependem: alterações em
+    memória feitas aqui (mesmo com a gravação rejeitada), gravações de
+    timings_dados (incluindo as feitas por clientes.py) e clientes.
+    """
+    return (_ALTERACOES_TIMINGS, revisao("timings_dados"), revisao("clientes"))
+
+
+def _etag(*partes: Any) -> str:
+    texto = json.dumps([*partes, _versao_timings()], ensure_ascii=False, default=str)
+    return '"' + hashlib.sha1(texto.encode("utf-8")).hexdigest()[:24] + '"'
+
+
+def _etag_corresponde(request: Request, etag: str) -> bool:
+    """If-None-Match (lista separada por vírgulas, W/ ignorado, '*' serve para tudo)."""
+    cabecalho = request.headers.get("if-none-match")
+    if not cabecalho:
+        return False
+    for valor in cabecalho.split(","):
+        valor = valor.strip()
+        if valor.startswith("W/"):
+            valor = valor[2:]
+        if valor == "*" or valor == etag:
+            return True
+    return False
+
+
+def _resposta_json(request: Request, etag: str, calcular) -> Response:
+    """304 se o cliente já tem esta versão; senão calcula o conteúdo e devolve-o com o ETag."""
+    cabecalhos = {"ETag": etag, "Cache-Control": "no-cache"}
+    if _etag_corresponde(request, etag):
+        return Response(status_code=304, headers=cabecalhos)
+    return JSONResponse(calcular(), headers=cabecalhos)
+
+
+def _paginar(itens: List[Any], pagina: int, por_pagina: int) -> Dict[str, Any]:
+    total = len(itens)
+    paginas = max(1, -(-total // por_pagina))
+    inicio = (pagina - 1) * por_pagina
+    return {
+        "total": total,
+        "pagina": pagina,
+        "por_pagina": por_pagina,
+        "paginas": paginas,
+        "linhas": itens[inicio:inicio + por_pagina],
+    }
+
+
+def _validar_ano(ano: int) -> None:
+    if not isinstance(timings_dados.get(str(ano)), dict):
+        raise HTTPException(status_code=404, detail=f"Sem timings para {ano}.")
+
+
+@router.get("/api/timings/{ano}/resumo")
+async def api_timings_resumo(
     request: Request,
-    ano: int = Form(...),
-    mes: int = Form(...),
-    ficheiros: List[UploadFile] = File(...),
+    ano: int,
+    media_meses: Optional[int] = None,
+    empresa_q: str = "",
+    tecnico_q: str = "",
+    pagina: int = Query(1, ge=1),
+    por_pagina: int = Query(POR_PAGINA_PADRAO, ge=1, le=POR_PAGINA_MAXIMO),
 ):
+    """Linhas da página de resumo (/timings) do ano, filtradas e paginadas."""
+    _validar_ano(ano)
+    etag = _etag("resumo", ano, media_meses, empresa_q.strip(), tecnico_q.strip(), pagina, por_pagina)
+
+    def calcular() -> Dict[str, Any]:
+        contexto = _build_timings_context(
+            None, ano, media_meses, empresa_filtro=empresa_q, tecnico_filtro=tecnico_q
+        )
+        return {
+            "ano": contexto["ano_sel"],
+            "media_meses": contexto["media_meses_sel"],
+            "meses": [label for _, label in MESES_LABELS],
+            "empresa_q": contexto["empresa_q"],
+            "tecnico_q": contexto["tecnico_q"],
+            **_paginar(contexto["linhas"], pagina, por_pagina),
+        }
+
+    return _resposta_json(request, etag, calcular)
+
+
+@router.get("/api/timings/{ano}/mapa/{tecnico}")
+async def api_timings_mapa(
+    request: Request,
+    ano: int,
+    tecnico: str,
+    empresa_q: str = "",
+    pagina: int = Query(1, ge=1),
+    por_pagina: int = Query(POR_PAGINA_PADRAO, ge=1, le=POR_PAGINA_MAXIMO),
+):
+    """
+    Mapa por cliente de um técnico (como em /timings/mapas), paginado; os
+    totais e a linha do técnico no mapa global são sempre os do mapa inteiro.
+    """
+    _validar_ano(ano)
+    etag = _etag("mapa", ano, tecnico, empresa_q.strip(), pagina, por_pagina)
+
+    def calcular() -> Dict[str, Any]:
+        contexto = _build_timings_context(None, ano, None, tecnico)
+        if contexto["tecnico_mapa"] != tecnico or not contexto["mapa_cliente_tecnico"]:
+            raise HTTPException(status_code=404, detail=f"Técnico sem mapa em {ano}: {tecnico}")
+
+        mapa = contexto["mapa_cliente_tecnico"]
+        linhas = mapa["linhas"]
+        filtro_norm = _norm_empresa_forte(empresa_q.strip()) if empresa_q.strip() else ""
+        if filtro_norm:
+            linhas = [l for l in linhas if filtro_norm in _norm_empresa_forte(l["cliente"])]
+        linha_global = next(
+            (l for l in (contexto["mapa_tecnico_global"] or {}).get("linhas", []) if l["tecnico"] == tecnico),
+            None,
+        )
+        return {
+            "ano": contexto["ano_sel"],
+            "tecnico": tecnico,
+            "tecnicos": contexto["tecnicos_mapa"],
+            "meses": [label for _, label in MESES_LABELS],
+            "totais_mes_str": mapa["totais_mes_str"],
+            "total_ano_str": mapa["total_ano_str"],
+            "media_ano_str": mapa["media_ano_str"],
+            "global": linha_global,
+            "empresa_q": empresa_q.strip(),
+            **_paginar(linhas, pagina, por_pagina),
+        }
+
+    return _resposta_json(request, etag, calcular)
+
+
+# ========= IMPORTAÇÃO: PLANO, PRÉ-VISUALIZAÇÃO E CONFIRMAÇÃO =========
+
+# Planos pré-visualizados à espera de confirmação: {token: plano}
+_PLANOS_IMPORTACAO: Dict[str, Dict[str, Any]] = {}
+PLANO_VALIDADE_S = 30 * 60
+PLANOS_MAXIMO = 20
+
+
+def _preparar_importacao(
+    ano: int,
+    mes: int,
+    lidos: List[Tuple[str, timings_excel.ResultadoWorkbook, bool]],
+) -> Optional[Dict[str, Any]]:
+    """
+    Agrega e deduplica os registos lidos dos workbooks (pela ordem do upload)
+    e decide o nome de empresa e o técnico de cada registo, sem alterar
+    timings_dados. Devolve o plano ou None se não houver nada a fazer nem a
+    reportar.
+    """
     agregados_invalidos: Dict[str, int] = {}
     agregados_ignorados_empresa: Dict[str, int] = {}
     agregados_resumos_ignorados: Dict[str, int] = {}
     duplicados_por_empresa: Dict[str, int] = {}
     armando_sem_inferido: Dict[str, int] = {}
     ficheiros_processados: List[str] = []
+    ficheiros_em_cache: List[str] = []
 
     registos_unicos: List[Dict[str, Any]] = []
     seen_registos: set[tuple[str, str, int, int]] = set()
     empresa_display_por_norm: Dict[str, str] = {}
     empresas_afetadas_norm: set[str] = set()
     total_minutos_deduplicados = 0
-    houve_alteracoes = False
-
-    for ficheiro in ficheiros:
-        conteudo = await ficheiro.read()
-        if not conteudo:
-            continue
 
-        registos, invalidos, ignorados, resumos_ignorados = _importar_excel_timings(conteudo, ano, mes)
-        ficheiros_processados.append(ficheiro.filename or "sem_nome")
+    for nome_ficheiro, resultado, em_cache in lidos:
+        registos, invalidos, ignorados, resumos_ignorados = resultado
+        ficheiros_processados.append(nome_ficheiro)
+        if em_cache:
+            ficheiros_em_cache.append(nome_ficheiro)
 
         for nome_norm, minutos in invalidos.items():
             agregados_invalidos[nome_norm] = agregados_invalidos.get(nome_norm, 0) + minutos
@@ -1767,11 +1716,13 @@ async def importar_timings(
         or agregados_ignorados_empresa
         or agregados_resumos_ignorados
         or duplicados_por_empresa
-        or armando_sem_inferido
     ):
-        return RedirectResponse(url=f"/timings?ano={ano}", status_code=303)
+        return None
 
-    ano_dict = _obter_ano_dict(ano)
+    # O ano só é criado ao aplicar; aqui basta lê-lo
+    ano_dict = timings_dados.get(str(ano))
+    if not isinstance(ano_dict, dict):
+        ano_dict = {}
     empresa_nome_para_inserir: Dict[str, str] = {}
 
     for empresa_norm in empresas_afetadas_norm:
@@ -1783,24 +1734,8 @@ async def importar_timings(
                 empresa_norm, empresa_norm
             )
 
-    for empresa_norm, empresa_nome in empresa_nome_para_inserir.items():
-        rec = ano_dict.get(empresa_nome)
-        if not isinstance(rec, dict):
-            continue
-
-        meses_dict = rec.get("meses")
-        if isinstance(meses_dict, dict):
-            meses_dict.pop(str(mes), None)
-            meses_dict.pop(mes, None)
-            meses_dict[int(mes)] = 0
-
-        por_tecnico_dict = rec.get("por_tecnico")
-        if isinstance(por_tecnico_dict, dict):
-            for tecnico_key, tempos in por_tecnico_dict.items():
-                if isinstance(tempos, dict):
-                    tempos.pop(str(mes), None)
-                    tempos.pop(mes, None)
-
+    # (empresa, minutos, técnico) pela ordem dos registos
+    lancamentos: List[Tuple[str, int, Optional[str]]] = []
     for registo in registos_unicos:
         empresa_norm = registo["empresa_norm"]
         empresa_display = registo.get("empresa") or empresa_norm
@@ -1824,76 +1759,280 @@ async def importar_timings(
         else:
             tecnico_final = None
 
-        _adicionar_tempo_empresa(ano, mes, empresa_nome, minutos, tecnico_final)
-        houve_alteracoes = True
+        lancamentos.append((empresa_nome, minutos, tecnico_final))
+
+    return {
+        "ano": ano,
+        "mes": mes,
+        "empresas": list(empresa_nome_para_inserir.values()),
+        "lancamentos": lancamentos,
+        "relatorio": {
+            "invalidos": agregados_invalidos,
+            "ignorados_por_empresa": agregados_ignorados_empresa,
+            "minutos_ignorados_resumo_por_empresa": agregados_resumos_ignorados,
+            "duplicados_por_empresa": duplicados_por_empresa,
+            "total_minutos_deduplicados": total_minutos_deduplicados,
+            "armando_sem_inferido": armando_sem_inferido,
+            "ficheiros": ficheiros_processados,
+            "ficheiros_em_cache": ficheiros_em_cache,
+        },
+        # Versões dos dados em que o plano foi calculado (ver _plano_atual)
+        "revisoes": (revisao("timings_dados"), revisao("clientes")),
+    }
+
+
+def _lancar_plano(ano_dict: dict, plano: Dict[str, Any]) -> bool:
+    """
+    Aplica o plano a ano_dict: zera o mês nas empresas afetadas que já
+    existem e soma os lançamentos. Devolve True se houve lançamentos.
+    """
+    mes = plano["mes"]
+    for empresa_nome in plano["empresas"]:
+        rec = ano_dict.get(empresa_nome)
+        if not isinstance(rec, dict):
+            continue
+
+        meses_dict = rec.get("meses")
+        if isinstance(meses_dict, dict):
+            meses_dict.pop(str(mes), None)
+            meses_dict.pop(mes, None)
+            meses_dict[int(mes)] = 0
+
+        por_tecnico_dict = rec.get("por_tecnico")
+        if isinstance(por_tecnico_dict, dict):
+            for tecnico_key, tempos in por_tecnico_dict.items():
+                if isinstance(tempos, dict):
+                    tempos.pop(str(mes), None)
+                    tempos.pop(mes, None)
+
+    for empresa_nome, minutos, tecnico_final in plano["lancamentos"]:
+        _somar_tempo(ano_dict, mes, empresa_nome, minutos, tecnico_final)
+    return bool(plano["lancamentos"])
+
 
-    if houve_alteracoes:
+def _aplicar_importacao(plano: Dict[str, Any]) -> None:
+    """Aplica o plano a timings_dados, grava e escreve o relatório (se houver avisos)."""
+    ano_dict = _obter_ano_dict(plano["ano"])
+    if _lancar_plano(ano_dict, plano):
         _persistir_timings()
+    _registar_relatorio_importacao(plano["relatorio"])
 
-    if (
+
+def _registar_relatorio_importacao(relatorio: Dict[str, Any]) -> None:
+    agregados_invalidos = relatorio["invalidos"]
+    agregados_ignorados_empresa = relatorio["ignorados_por_empresa"]
+    agregados_resumos_ignorados = relatorio["minutos_ignorados_resumo_por_empresa"]
+    duplicados_por_empresa = relatorio["duplicados_por_empresa"]
+    armando_sem_inferido = relatorio["armando_sem_inferido"]
+    ficheiros_em_cache = relatorio["ficheiros_em_cache"]
+
+    if ficheiros_em_cache:
+        print(f"[TIMINGS] Ficheiros já lidos antes (cache, sem abrir o Excel): {', '.join(ficheiros_em_cache)}")
+
+    if not (
         agregados_invalidos
         or agregados_ignorados_empresa
         or agregados_resumos_ignorados
         or duplicados_por_empresa
         or armando_sem_inferido
+        or ficheiros_em_cache
     ):
-        sorted_invalidos = sorted(
-            agregados_invalidos.items(), key=lambda kv: kv[1], reverse=True
-        )[:30]
-        sorted_empresas = sorted(
-            agregados_ignorados_empresa.items(), key=lambda kv: kv[1], reverse=True
-        )[:30]
-        sorted_resumos = sorted(
-            agregados_resumos_ignorados.items(), key=lambda kv: kv[1], reverse=True
-        )[:30]
-        sorted_duplicados = sorted(
-            duplicados_por_empresa.items(), key=lambda kv: kv[1], reverse=True
-        )[:30]
-        sorted_armando = sorted(
-            armando_sem_inferido.items(), key=lambda kv: kv[1], reverse=True
-        )[:30]
-
-        print("[TIMINGS] Técnicos inválidos (top 30):")
-        for nome, minutos in sorted_invalidos:
-            print(f"  - {nome}: {minutos} min")
-
-        print("[TIMINGS] Empresas com tempos ignorados (top 30):")
-        for empresa, minutos in sorted_empresas:
+        return
+
+    sorted_invalidos = sorted(
+        agregados_invalidos.items(), key=lambda kv: kv[1], reverse=True
+    )[:30]
+    sorted_empresas = sorted(
+        agregados_ignorados_empresa.items(), key=lambda kv: kv[1], reverse=True
+    )[:30]
+    sorted_resumos = sorted(
+        agregados_resumos_ignorados.items(), key=lambda kv: kv[1], reverse=True
+    )[:30]
+    sorted_duplicados = sorted(
+        duplicados_por_empresa.items(), key=lambda kv: kv[1], reverse=True
+    )[:30]
+    sorted_armando = sorted(
+        armando_sem_inferido.items(), key=lambda kv: kv[1], reverse=True
+    )[:30]
+
+    print("[TIMINGS] Técnicos inválidos (top 30):")
+    for nome, minutos in sorted_invalidos:
+        print(f"  - {nome}: {minutos} min")
+
+    print("[TIMINGS] Empresas com tempos ignorados (top 30):")
+    for empresa, minutos in sorted_empresas:
+        print(f"  - {empresa}: {minutos} min")
+
+    if agregados_resumos_ignorados:
+        print("[TIMINGS] Linhas-resumo ignoradas (top 30):")
+        for empresa, minutos in sorted_resumos:
             print(f"  - {empresa}: {minutos} min")
 
-        if agregados_resumos_ignorados:
-            print("[TIMINGS] Linhas-resumo ignoradas (top 30):")
-            for empresa, minutos in sorted_resumos:
-                print(f"  - {empresa}: {minutos} min")
+    if duplicados_por_empresa:
+        print("[TIMINGS] Deduplicados no lote (top 30):")
+        for empresa, minutos in sorted_duplicados:
+            print(f"  - {empresa}: {minutos} min")
 
-        if duplicados_por_empresa:
-            print("[TIMINGS] Deduplicados no lote (top 30):")
-            for empresa, minutos in sorted_duplicados:
-                print(f"  - {empresa}: {minutos} min")
+    if armando_sem_inferido:
+        print("[TIMINGS] Armando sem técnico inferido (top 30):")
+        for empresa, minutos in sorted_armando:
+            print(f"  - {empresa}: {minutos} min")
 
-        if armando_sem_inferido:
-            print("[TIMINGS] Armando sem técnico inferido (top 30):")
-            for empresa, minutos in sorted_armando:
-                print(f"  - {empresa}: {minutos} min")
+    try:
+        with open(TIMINGS_IMPORT_REPORT, "w", encoding="utf-8") as f:
+            json.dump(relatorio, f, ensure_ascii=False, indent=2)
+    except Exception as exc:
+        print(f"[TIMINGS] Erro ao guardar relatório de importação: {exc}")
+
+
+def _minutos_mes(tempos: Any, mes: int) -> int:
+    if not isinstance(tempos, dict):
+        return 0
+    valor = tempos.get(mes)
+    if valor is None:
+        valor = tempos.get(str(mes))
+    try:
+        return int(valor or 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+def _diff_importacao(plano: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Minutos do mês antes/depois por empresa e por técnico, aplicando o plano
+    a cópias só das empresas afetadas (timings_dados não é alterado).
+    """
+    mes = plano["mes"]
+    ano_dict = timings_dados.get(str(plano["ano"]))
+    if not isinstance(ano_dict, dict):
+        ano_dict = {}
+
+    nomes = list(dict.fromkeys([*plano["empresas"], *(e for e, _, _ in plano["lancamentos"])]))
+    sobreposicao = {nome: copy.deepcopy(ano_dict[nome]) for nome in nomes if nome in ano_dict}
+    _lancar_plano(sobreposicao, plano)
+
+    empresas: List[Dict[str, Any]] = []
+    for nome in nomes:
+        antes_rec = ano_dict.get(nome) if isinstance(ano_dict.get(nome), dict) else {}
+        depois_rec = sobreposicao.get(nome) if isinstance(sobreposicao.get(nome), dict) else {}
+        antes_tec = antes_rec.get("por_tecnico") if isinstance(antes_rec.get("por_tecnico"), dict) else {}
+        depois_tec = depois_rec.get("por_tecnico") if isinstance(depois_rec.get("por_tecnico"), dict) else {}
+
+        por_tecnico: Dict[str, Dict[str, int]] = {}
+        for tecnico in dict.fromkeys([*antes_tec, *depois_tec]):
+            antes = _minutos_mes(antes_tec.get(tecnico), mes)
+            depois = _minutos_mes(depois_tec.get(tecnico), mes)
+            if antes or depois:
+                por_tecnico[tecnico] = {"antes": antes, "depois": depois, "delta": depois - antes}
+
+        antes = _minutos_mes(antes_rec.get("meses"), mes)
+        depois = _minutos_mes(depois_rec.get("meses"), mes)
+        empresas.append(
+            {
+                "empresa": nome,
+                "nova": nome not in ano_dict,
+                "antes": antes,
+                "depois": depois,
+                "delta": depois - antes,
+                "por_tecnico": por_tecnico,
+            }
+        )
+    return empresas
+
+
+def _guardar_plano(plano: Dict[str, Any]) -> str:
+    agora = datetime.now().timestamp()
+    for token in [t for t, p in _PLANOS_IMPORTACAO.items() if agora - p["criado"] > PLANO_VALIDADE_S]:
+        del _PLANOS_IMPORTACAO[token]
+    while len(_PLANOS_IMPORTACAO) >= PLANOS_MAXIMO:
+        del _PLANOS_IMPORTACAO[next(iter(_PLANOS_IMPORTACAO))]
+
+    token = uuid.uuid4().hex
+    plano["criado"] = agora
+    _PLANOS_IMPORTACAO[token] = plano
+    return token
+
+
+def _plano_atual(token: str) -> Dict[str, Any]:
+    """Plano pré-visualizado ainda válido (os dados não mudaram desde a pré-visualização)."""
+    plano = _PLANOS_IMPORTACAO.get(token or "")
+    if plano is None or datetime.now().timestamp() - plano["criado"] > PLANO_VALIDADE_S:
+        _PLANOS_IMPORTACAO.pop(token or "", None)
+        raise HTTPException(status_code=404, detail="Pré-visualização inexistente ou expirada. Volte a carregar os ficheiros.")
+    if plano["revisoes"] != (revisao("timings_dados"), revisao("clientes")):
+        _PLANOS_IMPORTACAO.pop(token, None)
+        raise HTTPException(
+            status_code=409,
+            detail="Os timings ou os clientes mudaram desde a pré-visualização. Volte a pré-visualizar.",
+        )
+    return plano
+
+
+async def _ler_uploads(ficheiros: List[UploadFile]) -> List[Tuple[str, timings_excel.ResultadoWorkbook, bool]]:
+    # Leitura dos workbooks fora do event loop (vários ficheiros em paralelo,
+    # os já carregados antes vêm da cache; ver timings_excel.ler_workbooks).
+    # A agregação segue a ordem do upload.
+    lidos: List[Tuple[str, bytes]] = []
+    for ficheiro in ficheiros:
+        conteudo = await ficheiro.read()
+        if not conteudo:
+            continue
+        lidos.append((ficheiro.filename or "sem_nome", conteudo))
+    resultados = await timings_excel.ler_workbooks([conteudo for _, conteudo in lidos])
+    return [(nome, resultado, em_cache) for (nome, _), (resultado, em_cache) in zip(lidos, resultados)]
 
-        relatorio = {
-            "invalidos": agregados_invalidos,
-            "ignorados_por_empresa": agregados_ignorados_empresa,
-            "minutos_ignorados_resumo_por_empresa": agregados_resumos_ignorados,
-            "duplicados_por_empresa": duplicados_por_empresa,
-            "total_minutos_deduplicados": total_minutos_deduplicados,
-            "armando_sem_inferido": armando_sem_inferido,
-            "ficheiros": ficheiros_processados,
-        }
-        try:
-            with open(TIMINGS_IMPORT_REPORT, "w", encoding="utf-8") as f:
-                json.dump(relatorio, f, ensure_ascii=False, indent=2)
-        except Exception as exc:
-            print(f"[TIMINGS] Erro ao guardar relatório de importação: {exc}")
 
+@router.post("/timings/importar")
+async def importar_timings(
+    request: Request,
+    ano: int = Form(...),
+    mes: int = Form(...),
+    ficheiros: List[UploadFile] = File(...),
+):
+    plano = _preparar_importacao(ano, mes, await _ler_uploads(ficheiros))
+    if plano is not None:
+        _aplicar_importacao(plano)
     return RedirectResponse(url=f"/timings?ano={ano}", status_code=303)
 
 
+@router.post("/timings/importar/pre-visualizar")
+async def pre_visualizar_importacao(
+    ano: int = Form(...),
+    mes: int = Form(...),
+    ficheiros: List[UploadFile] = File(...),
+):
+    """
+    Lê e deduplica os ficheiros como /timings/importar, mas não altera nada:
+    devolve as diferenças de minutos do mês por empresa e técnico e um token
+    para aplicar exatamente este resultado em /timings/importar/confirmar.
+    """
+    plano = _preparar_importacao(ano, mes, await _ler_uploads(ficheiros))
+    if plano is None:
+        return {"ano": ano, "mes": mes, "token": None, "empresas": [], "relatorio": {}}
+
+    empresas = _diff_importacao(plano)
+    token = _guardar_plano(plano)
+    return {
+        "ano": ano,
+        "mes": mes,
+        "token": token,
+        "expira_em_s": PLANO_VALIDADE_S,
+        "total_antes": sum(e["antes"] for e in empresas),
+        "total_depois": sum(e["depois"] for e in empresas),
+        "empresas": empresas,
+        "relatorio": plano["relatorio"],
+    }
+
+
+@router.post("/timings/importar/confirmar")
+async def confirmar_importacao(token: str = Form(...)):
+    """Aplica um plano pré-visualizado (sem voltar a ler os ficheiros)."""
+    plano = _plano_atual(token)
+    del _PLANOS_IMPORTACAO[token]
+    _aplicar_importacao(plano)
+    return RedirectResponse(url=f"/timings?ano={plano['ano']}", status_code=303)
+
+
 @router.post("/timings/sincronizar-clientes")
 async def sincronizar_clientes(
     ano: int = Form(...),
@@ -1911,12 +2050,7 @@ async def sincronizar_clientes(
     ano_int = int(ano)
     ano_dict = _obter_ano_dict(ano_int)
 
-    normas_existentes: Dict[str, str] = {}
-    for empresa_existente in list(ano_dict.keys()):
-        norm = _norm_empresa_forte(empresa_existente)
-        if norm and norm not in normas_existentes:
-            normas_existentes[norm] = empresa_existente
-
+    indice_ano = _indice_empresas(ano_dict)
     adicionados = 0
 
     for cli in clientes:
@@ -1940,7 +2074,8 @@ async def sincronizar_clientes(
         if not norm_cli:
             continue
 
-        if norm_cli in normas_existentes:
+        # O índice apanha também as empresas acrescentadas neste ciclo
+        if norm_cli in indice_ano.atualizar().nome_por_norma:
             continue
 
         ano_dict[empresa_display] = {
@@ -1949,7 +2084,6 @@ async def sincronizar_clientes(
             "apagado": False,
             "por_tecnico": {},
         }
-        normas_existentes[norm_cli] = empresa_display
         adicionados += 1
 
     timings_dados[str(ano_int)] = ano_dict
@@ -2085,7 +2219,7 @@ async def guardar_timings_extras(
         }
 
     timings_dados[str(ano)] = ano_dict
-    _persistir_timings()
+    _persistir_timings(ano, [nome_emp for nome_emp in empresas if nome_emp])
 
     empresa_q = (
         request.query_params.get("empresa_q")
@@ -2146,6 +2280,7 @@ async def guardar_timings_media(
     jan_medias = form.getlist("jan_media")
 
     ano_dict = _obter_ano_dict(ano)
+    alteradas: List[str] = []
 
     for idx, nome_cli in enumerate(clientes):
         if not nome_cli:
@@ -2170,9 +2305,10 @@ async def guardar_timings_media(
             "apagado": False,  # se estava apagado, volta a ficar ativo
             "por_tecnico": {},  # ao definir média manual não há detalhe por técnico
         }
+        alteradas.append(nome_cli)
 
     timings_dados[str(ano)] = ano_dict
-    _persistir_timings()
+    _persistir_timings(ano, alteradas)
 
     redirect_params: Dict[str, Any] = {
         "ano": ano,
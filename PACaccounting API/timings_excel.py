@@ -0,0 +1,732 @@
+"""
+Leitura dos Excel de workload para /timings/importar.
+
+Este módulo não toca em dados.py nem no estado da app (só funções puras),
+para poder ser importado pelos processos do pool de importação: cada
+processo lê um workbook e devolve os registos; a agregação, a deduplicação
+e a escrita continuam em timings.py. Os processos são criados com "spawn":
+importam só este módulo (e normalizacao).
+
+Os workbooks são lidos em modo read_only (linhas em streaming, sem montar
+as células todas em memória) e cada folha é percorrida uma única vez: as
+linhas vão ao mesmo tempo para a deteção do cabeçalho tabular (empresa /
+técnico / tempo) e para o leitor do formato legacy (empresa + técnicos
+indentados). Se aparecer o cabeçalho, o formato tabular ganha e o que o
+legacy leu até aí é descartado; senão fica o resultado do legacy.
+
+O resultado de cada workbook fica guardado em cache_importacao/, com o
+SHA-256 dos bytes do ficheiro como chave: voltar a carregar o mesmo export
+não abre o openpyxl. A cache é só do processo principal (ver ler_workbooks).
+"""
+
+import asyncio
+import hashlib
+import json
+import multiprocessing
+import os
+import re
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+from typing import Any, Dict, List, Optional, Tuple
+
+from normalizacao import memoizar, tabela_alterada
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Processos para ler vários workbooks em paralelo (0/1 = sem pool, lê numa thread)
+PROCESSOS_IMPORTACAO = int(os.environ.get("PAC_IMPORT_PROCESSOS") or min(4, os.cpu_count() or 1))
+
+# Cache de uploads já lidos (PAC_IMPORT_CACHE=0 desliga)
+CACHE_IMPORTACAO_DIR = os.path.join(BASE_DIR, "cache_importacao")
+CACHE_IMPORTACAO_ATIVA = os.environ.get("PAC_IMPORT_CACHE", "1") != "0"
+CACHE_IMPORTACAO_MAXIMO = 200
+# Aumentar sempre que a leitura do Excel mudar (invalida a cache existente)
+VERSAO_LEITOR = 1
+
+Registo = Tuple[str, str, Optional[str], int]
+ResultadoWorkbook = Tuple[List[Dict[str, Any]], Dict[str, int], Dict[str, int], Dict[str, int]]
+
+
+# ========= NORMALIZAÇÃO / TÉCNICOS =========
+
+LEGAL_SUFFIX_PATTERN = re.compile(
+    r"\b(?:lda|ltda|unipessoal|sociedade|por|quotas?|sa|s\s+a)\b",
+    re.IGNORECASE,
+)
+
+
+@memoizar("timings_excel._norm_empresa_forte")
+def _norm_empresa_forte(s: Optional[str]) -> str:
+    """Normaliza fortemente nomes de empresas para facilitar matching."""
+    if not s:
+        return ""
+
+    txt = unicodedata.normalize("NFD", str(s).strip())
+    txt = "".join(ch for ch in txt if unicodedata.category(ch) != "Mn")
+    txt = txt.casefold()
+    if not txt:
+        return ""
+
+    txt = re.sub(r"[\.,;:\-_/()\[\]{}&'\"+]", " ", txt)
+    txt = re.sub(r"\s+", " ", txt).strip()
+    if not txt:
+        return ""
+
+    original_txt = txt
+    txt = LEGAL_SUFFIX_PATTERN.sub(" ", txt)
+    txt = re.sub(r"\s+", " ", txt).strip()
+    return txt if txt else original_txt
+
+
+@memoizar("timings_excel._normalize_header")
+def _normalize_header(value: Optional[str]) -> str:
+    """Normaliza cabeçalhos de Excel para comparação case-insensitive sem acentos."""
+    if value is None:
+        return ""
+    s = str(value).strip()
+    if not s:
+        return ""
+    s = unicodedata.normalize("NFD", s)
+    s = "".join(ch for ch in s if unicodedata.category(ch) != "Mn")
+    s = s.lower()
+    s = s.replace("/", " ")
+    s = re.sub(r"[^a-z0-9]+", " ", s)
+    return s.strip()
+
+
+@memoizar("timings_excel._norm_nome_forte")
+def _norm_nome_forte(s: Optional[str]) -> str:
+    """Normaliza fortemente nomes: maiúsculas, sem acentos, sem partículas comuns."""
+    if not s:
+        return ""
+    s = unicodedata.normalize("NFD", str(s).strip())
+    s = "".join(ch for ch in s if unicodedata.category(ch) != "Mn")
+    s = s.upper()
+    tokens = re.split(r"\s+", s)
+    stopwords = {"DE", "DA", "DO", "DOS", "DAS", "E"}
+    tokens = [t for t in tokens if t and t not in stopwords]
+    return " ".join(tokens)
+
+
+def _build_aliases_canonicos() -> Dict[str, str]:
+    """Constrói o mapa de aliases fortemente normalizados -> nome canónico."""
+    alias_map: Dict[str, str] = {}
+
+    def registrar(canonico: str, *variantes: str) -> None:
+        nomes = (canonico, *variantes)
+        for nome in nomes:
+            norm = _norm_nome_forte(nome)
+            if norm:
+                alias_map[norm] = canonico
+
+    registrar(
+        "Pedro Fernandes",
+        "Pedro Miguel da Silva Fernandes",
+        "Pedro Fernandes",
+    )
+    registrar(
+        "Ana Rodrigues",
+        "Ana Catarina Lourenço Rodrigues",
+        "Ana Catarina Lorenco Rodrigues",
+        "Ana Rodrigues",
+    )
+    registrar(
+        "Daniela Fernandes",
+        "Marta Daniela Francisco Fernandes",
+        "Daniela Francisco Fernandes",
+    )
+    registrar(
+        "Celine Santos",
+        "Celine",
+        "Celine Rodrigues dos Santos",
+        "Celine Santos",
+        "ANTONIO CANDIDO GONÇALVES DIAS",
+        "ANTONIO CANDIDO GONCALVES DIAS",
+    )
+    registrar(
+        "M Albertina Alves",
+        "Maria Albertina Pereira Alves",
+        "M Albertina Alves",
+    )
+    registrar(
+        "M Luzia Moreira",
+        "Luzia Maria Gonçalves Moreira",
+        "Luzia Maria Goncalves Moreira",
+        "M Luzia Moreira",
+    )
+    registrar(
+        "João Pedro Alves",
+        "João Pedro Gonçalves Alves",
+        "Joao Pedro Goncalves Alves",
+        "João Pedro Alves",
+        "Joao Pedro Alves",
+    )
+
+    return alias_map
+
+
+ALIASES_CANONICOS = _build_aliases_canonicos()
+ARMANDO_NORMS = {
+    _norm_nome_forte("Armando Palhão Dias"),
+    _norm_nome_forte("Armando Palhao Dias"),
+    _norm_nome_forte("Armando Dias"),
+}
+tabela_alterada("ALIASES_CANONICOS")
+
+
+def _resolver_tecnico(nome_excel: Optional[str]) -> tuple[str, Optional[str]]:
+    """Classifica um nome proveniente do Excel."""
+    if not nome_excel:
+        return "desconhecido", None
+
+    norm_forte = _norm_nome_forte(nome_excel)
+    if not norm_forte:
+        return "desconhecido", None
+
+    if norm_forte in ARMANDO_NORMS:
+        return "armando", None
+
+    canonico = ALIASES_CANONICOS.get(norm_forte)
+    if canonico:
+        return "canonico", canonico
+
+    return "desconhecido", None
+
+
+EMPRESA_HEADER_NAMES = {
+    "empresa",
+    "cliente",
+    "cliente empresa",
+    "empresa cliente",
+    "designacao",
+    "designacao social",
+    "nome cliente",
+    "cliente nome",
+}
+
+TECNICO_HEADER_NAMES = {
+    "tecnico",
+    "tecnico responsavel",
+    "responsavel",
+    "responsavel tecnico",
+    "colaborador",
+    "tecnica",
+}
+
+TEMPO_HEADER_NAMES = {
+    "tempo",
+    "horas",
+    "horas totais",
+    "tempo m",
+    "tempo min",
+    "tempo minutos",
+    "minutos",
+    "total minutos",
+    "duracao",
+    "duracao minutos",
+    "duracao m",
+}
+
+
+def _is_linha_total(texto: Optional[str]) -> bool:
+    if not texto:
+        return False
+    norm = _normalize_header(texto)
+    if not norm:
+        return False
+    return any(kw in norm for kw in {"total", "subtotal", "grand total", "soma", "sum"})
+
+
+def _parse_duracao_para_minutos(valor) -> int:
+    """Interpreta horas/minutos em vários formatos e devolve minutos inteiros."""
+    if valor is None:
+        return 0
+
+    s = str(valor).strip()
+    if not s:
+        return 0
+
+    s_lower = s.lower()
+    match_h = re.search(r"([0-9]+(?:[.,][0-9]+)?)\s*h", s_lower)
+    match_m = re.search(r"([0-9]+)\s*m", s_lower)
+
+    horas_float = 0.0
+    minutos_int = 0
+
+    if match_h:
+        try:
+            horas_float = float(match_h.group(1).replace(",", "."))
+        except ValueError:
+            horas_float = 0.0
+
+    if match_m:
+        try:
+            minutos_int = int(match_m.group(1))
+        except ValueError:
+            minutos_int = 0
+
+    if match_h or match_m:
+        total = int(round(horas_float * 60)) + max(0, minutos_int)
+        return max(0, total)
+
+    normalizado = s.replace(",", ".")
+
+    if "." in normalizado:
+        try:
+            horas = float(normalizado)
+        except ValueError:
+            return 0
+        if abs(horas) <= 24:
+            return max(0, int(round(horas * 60)))
+        return max(0, int(round(horas)))
+
+    try:
+        minutos = int(round(float(normalizado)))
+    except ValueError:
+        return 0
+    return max(0, minutos)
+
+
+def _parse_tempo_para_minutos(valor) -> int:
+    """Compatibilidade retroativa para código legado."""
+    return _parse_duracao_para_minutos(valor)
+
+
+# ========= LEITURA DAS FOLHAS =========
+
+class _LeitorLegacy:
+    """
+    Formato legacy (empresa + técnicos indentados), linha a linha. Acumula os
+    inválidos/ignorados em dicionários próprios, que só passam para os do
+    workbook se a folha não tiver cabeçalho tabular (ver _processar_sheet).
+    """
+
+    def __init__(self) -> None:
+        self.registos: List[Registo] = []
+        self.totais_fallback: Dict[str, int] = {}
+        self.invalidos: Dict[str, int] = {}
+        self.ignorados_por_empresa: Dict[str, int] = {}
+        self.resumos_ignorados_por_empresa: Dict[str, int] = {}
+        self.empresa_atual: Optional[str] = None
+        self.resumo_atual_min = 0
+        self.registos_empresa: List[Registo] = []
+
+    def finalizar_empresa(self) -> None:
+        empresa_atual = self.empresa_atual
+        if not empresa_atual:
+            return
+
+        if self.registos_empresa:
+            if self.resumo_atual_min > 0:
+                self.ignorados_por_empresa[empresa_atual] = (
+                    self.ignorados_por_empresa.get(empresa_atual, 0) + self.resumo_atual_min
+                )
+                self.resumos_ignorados_por_empresa[empresa_atual] = (
+                    self.resumos_ignorados_por_empresa.get(empresa_atual, 0) + self.resumo_atual_min
+                )
+            self.registos.extend(self.registos_empresa)
+        elif self.resumo_atual_min > 0:
+            self.totais_fallback[empresa_atual] = (
+                self.totais_fallback.get(empresa_atual, 0) + self.resumo_atual_min
+            )
+
+        self.empresa_atual = None
+        self.resumo_atual_min = 0
+        self.registos_empresa = []
+
+    def linha(self, row) -> None:
+        if not row:
+            return
+
+        col1 = row[0]
+        col2 = row[1] if len(row) > 1 else None
+
+        if col1 is None:
+            return
+
+        texto = str(col1)
+        texto_strip = texto.strip()
+
+        if not texto_strip:
+            return
+        if texto_strip.upper() in {"EMPRESA", "TOTAL"} or _is_linha_total(texto_strip):
+            return
+        if "MAPA DE TEMPO TRABALHADO" in texto_strip.upper():
+            return
+
+        if texto.startswith("    "):
+            if not self.empresa_atual:
+                return
+
+            minutos = _parse_tempo_para_minutos(col2)
+            if minutos <= 0:
+                return
+
+            tipo, canonico = _resolver_tecnico(texto_strip)
+            if tipo == "desconhecido":
+                self.invalidos[texto_strip] = self.invalidos.get(texto_strip, 0) + minutos
+                self.ignorados_por_empresa[self.empresa_atual] = (
+                    self.ignorados_por_empresa.get(self.empresa_atual, 0) + minutos
+                )
+                return
+
+            self.registos_empresa.append((self.empresa_atual, tipo, canonico, minutos))
+        else:
+            self.finalizar_empresa()
+            self.empresa_atual = texto_strip
+            self.resumo_atual_min = _parse_tempo_para_minutos(col2)
+
+
+def _detetar_cabecalho(row, indices: List[Optional[int]]) -> bool:
+    """
+    Atualiza indices [empresa, técnico, tempo] com as colunas reconhecidas
+    nesta linha; True quando as três já foram encontradas.
+    """
+    if not row:
+        return False
+    valores_norm = [_normalize_header(c) for c in row]
+    if not any(valores_norm):
+        return False
+
+    for idx, nome in enumerate(valores_norm):
+        if not nome:
+            continue
+        if indices[0] is None and nome in EMPRESA_HEADER_NAMES:
+            indices[0] = idx
+        if indices[1] is None and nome in TECNICO_HEADER_NAMES:
+            indices[1] = idx
+        if indices[2] is None and nome in TEMPO_HEADER_NAMES:
+            indices[2] = idx
+
+    return indices[0] is not None and indices[1] is not None and indices[2] is not None
+
+
+def _processar_sheet(
+    linhas,
+    invalidos: Dict[str, int],
+    ignorados_por_empresa: Dict[str, int],
+    resumos_ignorados_por_empresa: Dict[str, int],
+) -> Tuple[List[Registo], Dict[str, int]]:
+    """
+    Lê uma folha numa só passagem (formato tabular ou legacy). Devolve os
+    registos detalhados (empresa, tipo, canónico, minutos) e os totais de
+    fallback (empresas só com linha-resumo).
+    """
+    indices: List[Optional[int]] = [None, None, None]
+    legacy: Optional[_LeitorLegacy] = _LeitorLegacy()
+    linhas = iter(linhas)
+
+    for row in linhas:
+        if _detetar_cabecalho(row, indices):
+            legacy = None
+            break
+        legacy.linha(row)
+
+    if legacy is not None:
+        legacy.finalizar_empresa()
+        for destino, origem in (
+            (invalidos, legacy.invalidos),
+            (ignorados_por_empresa, legacy.ignorados_por_empresa),
+            (resumos_ignorados_por_empresa, legacy.resumos_ignorados_por_empresa),
+        ):
+            for chave, minutos in origem.items():
+                destino[chave] = destino.get(chave, 0) + minutos
+        return legacy.registos, legacy.totais_fallback
+
+    idx_empresa, idx_tecnico, idx_tempo = indices
+    largura = max(indices) + 1
+    registos_por_empresa: Dict[str, List[Tuple[str, Optional[str], int]]] = {}
+    resumos_por_empresa: Dict[str, int] = {}
+
+    for row in linhas:
+        if not row:
+            continue
+
+        # read_only não completa as linhas até à última coluna da folha
+        if len(row) < largura:
+            row = tuple(row) + (None,) * (largura - len(row))
+
+        empresa_val = row[idx_empresa]
+        tempo_val = row[idx_tempo]
+
+        if empresa_val is None:
+            continue
+
+        empresa = str(empresa_val).strip()
+        if not empresa:
+            continue
+        if _is_linha_total(empresa):
+            continue
+
+        minutos = _parse_tempo_para_minutos(tempo_val)
+        if minutos <= 0:
+            continue
+
+        tecnico_val = row[idx_tecnico]
+        tecnico = str(tecnico_val).strip() if tecnico_val is not None else ""
+
+        if not tecnico:
+            resumos_por_empresa[empresa] = resumos_por_empresa.get(empresa, 0) + minutos
+            continue
+
+        tipo, canonico = _resolver_tecnico(tecnico)
+        if tipo == "desconhecido":
+            if not _is_linha_total(tecnico):
+                invalidos[tecnico] = invalidos.get(tecnico, 0) + minutos
+                ignorados_por_empresa[empresa] = ignorados_por_empresa.get(empresa, 0) + minutos
+            continue
+
+        registos_por_empresa.setdefault(empresa, []).append((tipo, canonico, minutos))
+
+    resultados: List[Registo] = []
+    totais_fallback: Dict[str, int] = {}
+
+    for empresa, detalhes in registos_por_empresa.items():
+        tem_detalhe = any(tipo in {"canonico", "armando"} for tipo, _, _ in detalhes)
+
+        if tem_detalhe:
+            resumo_min = resumos_por_empresa.pop(empresa, 0)
+            if resumo_min > 0:
+                ignorados_por_empresa[empresa] = ignorados_por_empresa.get(empresa, 0) + resumo_min
+                resumos_ignorados_por_empresa[empresa] = (
+                    resumos_ignorados_por_empresa.get(empresa, 0) + resumo_min
+                )
+            for tipo, canonico, minutos in detalhes:
+                if tipo in {"canonico", "armando"} and minutos > 0:
+                    resultados.append((empresa, tipo, canonico, minutos))
+        else:
+            total_resumo = resumos_por_empresa.pop(empresa, 0)
+            total = total_resumo + sum(minutos for _, _, minutos in detalhes)
+            if total > 0:
+                totais_fallback[empresa] = totais_fallback.get(empresa, 0) + total
+
+    for empresa, minutos in resumos_por_empresa.items():
+        if minutos > 0:
+            totais_fallback[empresa] = totais_fallback.get(empresa, 0) + minutos
+
+    return resultados, totais_fallback
+
+
+def ler_workbook(conteudo: bytes) -> ResultadoWorkbook:
+    """
+    Lê um Excel de workload e devolve (registos_validos, invalidos,
+    ignorados_por_empresa, resumos_ignorados_por_empresa), com os registos
+    prontos para a deduplicação de timings.py.
+    """
+    import openpyxl  # pip install openpyxl (importado só aqui: pesa no arranque)
+
+    registos_validos: List[Dict[str, Any]] = []
+    invalidos: Dict[str, int] = {}
+    ignorados_por_empresa: Dict[str, int] = {}
+    resumos_ignorados_por_empresa: Dict[str, int] = {}
+
+    wb = openpyxl.load_workbook(BytesIO(conteudo), read_only=True, data_only=True)
+    try:
+        for nome in wb.sheetnames:
+            sh = wb[nome]
+            # A dimensão guardada no ficheiro pode estar errada: ler todas as linhas
+            sh.reset_dimensions()
+            registos_sheet, totais_sheet = _processar_sheet(
+                sh.iter_rows(values_only=True),
+                invalidos,
+                ignorados_por_empresa,
+                resumos_ignorados_por_empresa,
+            )
+
+            for empresa, tipo, canonico, minutos in registos_sheet:
+                if minutos <= 0:
+                    continue
+                empresa_norm = _norm_empresa_forte(empresa)
+                if not empresa_norm:
+                    continue
+                registos_validos.append(
+                    {
+                        "empresa": empresa,
+                        "empresa_norm": empresa_norm,
+                        "tipo": tipo,
+                        "canonico": canonico,
+                        "minutos": minutos,
+                    }
+                )
+
+            for empresa, minutos in totais_sheet.items():
+                if minutos <= 0:
+                    continue
+                empresa_norm = _norm_empresa_forte(empresa)
+                if not empresa_norm:
+                    continue
+                registos_validos.append(
+                    {
+                        "empresa": empresa,
+                        "empresa_norm": empresa_norm,
+                        "tipo": "resumo",
+                        "canonico": None,
+                        "minutos": minutos,
+                    }
+                )
+    finally:
+        wb.close()
+
+    return registos_validos, invalidos, ignorados_por_empresa, resumos_ignorados_por_empresa
+
+
+# ========= CACHE DE UPLOADS =========
+
+_assinatura_leitor: Optional[str] = None
+
+
+def _obter_assinatura_leitor() -> str:
+    """Versão do leitor + tabelas de técnicos: se mudarem, as entradas antigas deixam de servir."""
+    global _assinatura_leitor
+    if _assinatura_leitor is None:
+        texto = json.dumps(
+            [VERSAO_LEITOR, sorted(ALIASES_CANONICOS.items()), sorted(ARMANDO_NORMS)],
+            ensure_ascii=False,
+        )
+        _assinatura_leitor = hashlib.sha1(texto.encode("utf-8")).hexdigest()
+    return _assinatura_leitor
+
+
+def _caminho_cache(chave: str) -> str:
+    return os.path.join(CACHE_IMPORTACAO_DIR, f"{chave}.json")
+
+
+def _ler_cache(chave: str) -> Optional[ResultadoWorkbook]:
+    caminho = _caminho_cache(chave)
+    if not os.path.exists(caminho):
+        return None
+    try:
+        with open(caminho, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("leitor") != _obter_assinatura_leitor():
+            return None
+        registos, invalidos, ignorados, resumos = data["resultado"]
+        return registos, invalidos, ignorados, resumos
+    except Exception as e:
+        print(f"[TIMINGS] WARNING: entrada da cache de importação ilegível ({chave[:12]}): {e}")
+        return None
+
+
+def _gravar_cache(chave: str, resultado: ResultadoWorkbook) -> None:
+    """Grava de forma atómica (tmp + os.replace) e mantém só as entradas mais recentes."""
+    caminho = _caminho_cache(chave)
+    tmp = caminho + ".tmp"
+    try:
+        os.makedirs(CACHE_IMPORTACAO_DIR, exist_ok=True)
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(
+                {"leitor": _obter_assinatura_leitor(), "resultado": list(resultado)},
+                f,
+                ensure_ascii=False,
+                separators=(",", ":"),
+            )
+        os.replace(tmp, caminho)
+    except Exception as e:
+        print(f"[TIMINGS] WARNING: falha ao gravar cache de importação: {e}")
+        if os.path.exists(tmp):
+            try:
+                os.remove(tmp)
+            except Exception:
+                pass
+        return
+
+    try:
+        entradas = [
+            os.path.join(CACHE_IMPORTACAO_DIR, nome)
+            for nome in os.listdir(CACHE_IMPORTACAO_DIR)
+            if nome.endswith(".json")
+        ]
+        if len(entradas) > CACHE_IMPORTACAO_MAXIMO:
+            entradas.sort(key=os.path.getmtime)
+            for antiga in entradas[: len(entradas) - CACHE_IMPORTACAO_MAXIMO]:
+                os.remove(antiga)
+    except Exception as e:
+        print(f"[TIMINGS] WARNING: falha ao limpar cache de importação: {e}")
+
+
+# ========= VÁRIOS WORKBOOKS =========
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _obter_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # spawn (como em exportacao): um fork podia herdar um lock preso por
+        # outra thread da app (escritor de dados, aquecimento de fontes)
+        _pool = ProcessPoolExecutor(
+            max_workers=PROCESSOS_IMPORTACAO,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _pool
+
+
+async def _ler_sem_cache(conteudos: List[bytes]) -> List[ResultadoWorkbook]:
+    """
+    Lê vários workbooks fora do event loop e devolve os resultados pela
+    ordem de 'conteudos'. Com mais de um ficheiro usa o pool de processos;
+    se o pool falhar (ou PAC_IMPORT_PROCESSOS <= 1), lê em threads. Um
+    ficheiro que não se consegue ler levanta o seu erro e o pool fica ativo.
+    """
+    global _pool
+
+    loop = asyncio.get_running_loop()
+    if len(conteudos) > 1 and PROCESSOS_IMPORTACAO > 1:
+        try:
+            pool = _obter_pool()
+            lidos = await asyncio.gather(
+                *(loop.run_in_executor(pool, ler_workbook, c) for c in conteudos),
+                return_exceptions=True,
+            )
+            # Só um pool partido (ou sem processos) justifica repetir em threads
+            falha = next((r for r in lidos if isinstance(r, (BrokenProcessPool, OSError))), None)
+            if falha is not None:
+                raise falha
+        except (BrokenProcessPool, OSError) as e:
+            print(f"[TIMINGS] WARNING: pool de importação indisponível, a ler em threads: {e}")
+            if _pool is not None:
+                _pool.shutdown(wait=False, cancel_futures=True)
+                _pool = None
+        else:
+            erro = next((r for r in lidos if isinstance(r, BaseException)), None)
+            if erro is not None:
+                raise erro
+            return list(lidos)
+
+    resultados: List[ResultadoWorkbook] = []
+    for conteudo in conteudos:
+        resultados.append(await loop.run_in_executor(None, ler_workbook, conteudo))
+    return resultados
+
+
+async def ler_workbooks(conteudos: List[bytes]) -> List[Tuple[ResultadoWorkbook, bool]]:
+    """
+    Devolve [(resultado, veio_da_cache)] pela ordem de 'conteudos'. Os
+    ficheiros já lidos antes (mesmo SHA-256) vêm da cache; os restantes são
+    lidos (em paralelo) e guardados na cache. A leitura e a escrita da cache
+    também correm em threads, fora do event loop.
+    """
+    if not CACHE_IMPORTACAO_ATIVA:
+        return [(resultado, False) for resultado in await _ler_sem_cache(conteudos)]
+
+    loop = asyncio.get_running_loop()
+    chaves = [hashlib.sha256(conteudo).hexdigest() for conteudo in conteudos]
+    resultados: List[Optional[ResultadoWorkbook]] = list(
+        await asyncio.gather(*(loop.run_in_executor(None, _ler_cache, chave) for chave in chaves))
+    )
+    em_cache = [resultado is not None for resultado in resultados]
+
+    # O mesmo ficheiro repetido no upload só é lido uma vez
+    por_ler: Dict[str, bytes] = {}
+    for chave, conteudo, resultado in zip(chaves, conteudos, resultados):
+        if resultado is None:
+            por_ler.setdefault(chave, conteudo)
+
+    if por_ler:
+        lidos = dict(zip(por_ler, await _ler_sem_cache(list(por_ler.values()))))
+        await asyncio.gather(*(loop.run_in_executor(None, _gravar_cache, chave, resultado) for chave, resultado in lidos.items()))
+        resultados = [resultado if resultado is not None else lidos[chave] for chave, resultado in zip(chaves, resultados)]
+
+    return [(resultado, hit) for resultado, hit in zip(resultados, em_cache)]
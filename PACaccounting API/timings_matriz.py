@@ -0,0 +1,323 @@
+"""
+Matriz de minutos de um ano dos timings (empresa × mês).
+
+timings_dados guarda cada ano como dicionários aninhados
+(empresa -> {"meses": {mes: minutos}, "extra_mensal", "apagado", ...}), com
+chaves de mês int ou str conforme a origem (memória ou JSON). As páginas de
+Timings, os mapas por técnico e a Relação Técnicos fazem sempre as mesmas
+contas sobre esses dicionários (linha de 12 meses, totais, médias, meses com
+registo); aqui cada ano é convertido uma única vez para arrays de inteiros
+(array 'i', como em timings_snapshot) e as páginas trabalham sobre linhas de
+12 valores.
+
+Layout (linha = posição da empresa no dicionário do ano):
+    empresas:  nomes, pela ordem do dicionário
+    minutos:   n_empresas × 12 (mês m da linha i em i * 12 + m - 1)
+    extra:     extra_mensal (minutos) por linha
+    apagado:   1 se a empresa está apagada
+    com_minutos: 1 se a empresa tem algum mês com minutos > 0
+    versoes:   versão de cada linha (muda só quando os valores da linha mudam)
+
+As versões servem de dependência às caches de linhas das páginas: uma linha
+formatada continua válida enquanto a versão da linha da empresa for a mesma.
+versao_estrutura muda quando muda o que decide quem aparece nos mapas
+(empresas, apagadas, com minutos nos meses 1..12).
+
+A matriz de um ano fica em cache e é refeita quando o dicionário do ano é
+outro objeto, muda de tamanho ou revisao("timings_dados") muda; ao refazer,
+as linhas iguais às da matriz anterior mantêm a versão. Quem altera só
+algumas empresas chama atualizar_empresas() e só essas linhas são relidas.
+"""
+
+import threading
+from array import array
+from itertools import count
+from operator import add
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from dados import revisao
+from timings_excel import _parse_duracao_para_minutos
+
+MESES = 12
+_ZEROS = (0,) * MESES
+
+
+def _minutos(valor: Any) -> int:
+    """Leitura de um mês como nas páginas: int(valor or 0), 0 se não for número."""
+    try:
+        return int(valor or 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+def _extra_mes(rec: Optional[dict]) -> int:
+    """Obtém o extra mensal médio (minutos) para um registo normalizado."""
+    if not isinstance(rec, dict):
+        return 0
+    valor = rec.get("extra_mensal", 0)
+    if isinstance(valor, (int, float)):
+        return int(valor)
+    try:
+        return _parse_duracao_para_minutos(valor)
+    except Exception:
+        return 0
+
+
+def somar(a: Iterable[int], b: Iterable[int]) -> List[int]:
+    """Soma de duas linhas de 12 meses."""
+    return list(map(add, a, b))
+
+
+# Versões de linhas e de estrutura (únicas em todo o processo)
+_versoes = count(1)
+
+
+class MatrizAno:
+    def __init__(self, ano_dict: Dict[str, Any], anterior: Optional["MatrizAno"] = None):
+        self.empresas: List[str] = []
+        self.posicao: Dict[str, int] = {}
+        self.minutos = array("i")
+        self.extra = array("i")
+        self.apagado = bytearray()
+        self.com_minutos = bytearray()
+        self.versoes = array("q")
+        # meses (qualquer chave numérica) com minutos > 0, por linha e, em
+        # contagem, nas empresas não apagadas
+        self._meses_linha: List[Tuple[int, ...]] = []
+        self._contagem_meses: Dict[int, int] = {}
+
+        for empresa, rec in ano_dict.items():
+            if not isinstance(rec, dict):
+                continue
+            i = len(self.empresas)
+            self.posicao[empresa] = i
+            self.empresas.append(empresa)
+            self.minutos.extend(_ZEROS)
+            self.extra.append(0)
+            self.apagado.append(0)
+            self.com_minutos.append(0)
+            self.versoes.append(0)
+            self._meses_linha.append(())
+            self._ler_linha(i, rec)
+
+            j = anterior.posicao.get(empresa) if anterior is not None else None
+            if j is not None and anterior._linha_igual(j, self, i):
+                self.versoes[i] = anterior.versoes[j]
+            else:
+                self.versoes[i] = next(_versoes)
+
+        if anterior is not None and anterior._estrutura() == self._estrutura():
+            self.versao_estrutura = anterior.versao_estrutura
+        else:
+            self.versao_estrutura = next(_versoes)
+
+    def _ler_linha(self, i: int, rec: Dict[str, Any]) -> None:
+        """(Re)lê a linha i a partir do registo da empresa."""
+        meses_dict = rec.get("meses", {})
+        if not isinstance(meses_dict, dict):
+            meses_dict = {}
+        base = i * MESES
+        for num_mes in range(1, MESES + 1):
+            # depois de ler do JSON, as chaves podem vir como strings
+            raw = meses_dict.get(num_mes)
+            if raw is None:
+                raw = meses_dict.get(str(num_mes))
+            self.minutos[base + num_mes - 1] = _minutos(raw)
+
+        meses_com_valor: List[int] = []
+        tem_minutos = False
+        for num_mes, valor in meses_dict.items():
+            if _minutos(valor) <= 0:
+                continue
+            tem_minutos = True
+            try:
+                meses_com_valor.append(int(num_mes))
+            except (TypeError, ValueError):
+                pass
+
+        self._contar_meses(i, -1)
+        self.extra[i] = _extra_mes(rec)
+        self.apagado[i] = 1 if rec.get("apagado") else 0
+        self.com_minutos[i] = 1 if tem_minutos else 0
+        self._meses_linha[i] = tuple(meses_com_valor)
+        self._contar_meses(i, 1)
+
+    def _contar_meses(self, i: int, sinal: int) -> None:
+        if self.apagado[i]:
+            return
+        for mes in set(self._meses_linha[i]):
+            self._contagem_meses[mes] = self._contagem_meses.get(mes, 0) + sinal
+
+    def _valores_linha(self, i: int) -> Tuple[Any, ...]:
+        return (self.minutos[i * MESES:(i + 1) * MESES], self.extra[i], self.apagado[i], self.com_minutos[i])
+
+    def _linha_igual(self, i: int, outra: "MatrizAno", j: int) -> bool:
+        return self._valores_linha(i) == outra._valores_linha(j)
+
+    def _estrutura(self) -> Tuple[Any, ...]:
+        positivos = bytes(self.tem_positivos(i) for i in range(len(self.empresas)))
+        return (self.empresas, bytes(self.apagado), bytes(self.com_minutos), positivos)
+
+    @property
+    def meses_com_registo(self) -> Set[int]:
+        """Meses (qualquer chave numérica) com minutos > 0 em empresas não apagadas."""
+        return {mes for mes, n in self._contagem_meses.items() if n > 0}
+
+    def atualizar(self, ano_dict: Dict[str, Any], empresas: Iterable[str]) -> None:
+        """
+        Relê só as empresas indicadas (novas vão para o fim, como no
+        dicionário). Linhas que ficam iguais mantêm a versão.
+        """
+        estrutura = self._estrutura()
+        for empresa in empresas:
+            rec = ano_dict.get(empresa)
+            if not isinstance(rec, dict):
+                continue
+            i = self.posicao.get(empresa)
+            if i is None:
+                i = len(self.empresas)
+                self.posicao[empresa] = i
+                self.empresas.append(empresa)
+                self.minutos.extend(_ZEROS)
+                self.extra.append(0)
+                self.apagado.append(0)
+                self.com_minutos.append(0)
+                self.versoes.append(0)
+                self._meses_linha.append(())
+            antes = self._valores_linha(i)
+            self._ler_linha(i, rec)
+            if self._valores_linha(i) != antes or not self.versoes[i]:
+                self.versoes[i] = next(_versoes)
+        if self._estrutura() != estrutura:
+            self.versao_estrutura = next(_versoes)
+
+    def versao(self, empresa: Optional[str]) -> int:
+        """Versão da linha da empresa (0 se não estiver no ano)."""
+        i = self.posicao.get(empresa) if empresa is not None else None
+        return self.versoes[i] if i is not None else 0
+
+    def __len__(self) -> int:
+        return len(self.empresas)
+
+    def linha(self, empresa: Optional[str]) -> Optional[int]:
+        return self.posicao.get(empresa) if empresa is not None else None
+
+    def meses(self, i: Optional[int]) -> List[int]:
+        """Os 12 meses da linha i (zeros se i for None)."""
+        if i is None:
+            return list(_ZEROS)
+        return self.minutos[i * MESES:(i + 1) * MESES].tolist()
+
+    def meses_positivos(self, i: Optional[int]) -> List[int]:
+        return [v if v > 0 else 0 for v in self.meses(i)]
+
+    def tem_positivos(self, i: int) -> bool:
+        """Algum dos meses 1..12 da linha com minutos > 0."""
+        return max(self.minutos[i * MESES:(i + 1) * MESES]) > 0
+
+    def extra_ativo(self, i: Optional[int]) -> int:
+        """extra_mensal da linha (0 se não existir ou estiver apagada)."""
+        if i is None or self.apagado[i]:
+            return 0
+        return self.extra[i]
+
+    def media_mensal(self, i: int) -> int:
+        """média mensal (min) = (Σ meses/12) + extra_mensal (valores negativos contam como 0)."""
+        total = sum(v for v in self.meses(i) if v > 0)
+        return max(int(round(total / 12.0 + max(self.extra[i], 0))), 0)
+
+    def linha_mapa(self, empresa: str, com_meses: bool = True) -> Tuple[List[int], int]:
+        """
+        (meses positivos, extra_mensal) de uma empresa nos mapas por técnico.
+        Sem 'com_meses' (cliente do técnico sem timings) só conta o extra.
+        """
+        i = self.posicao.get(empresa)
+        return self.meses_positivos(i if com_meses else None), self.extra_ativo(i)
+
+    @staticmethod
+    def somar_linhas(linhas: Iterable[Tuple[List[int], int]]) -> Tuple[List[int], int, int]:
+        """
+        Totais de um grupo de linhas de linha_mapa (ex.: as empresas de um
+        técnico): (meses + extra por mês, total base, soma dos extras).
+        """
+        por_mes = list(_ZEROS)
+        total_base = 0
+        total_extra = 0
+        for base, extra in linhas:
+            total_base += sum(base)
+            total_extra += extra
+            por_mes = somar(por_mes, base)
+            if extra:
+                por_mes = [v + extra for v in por_mes]
+        return por_mes, total_base, total_extra
+
+
+_lock = threading.Lock()
+# {ano: (dicionário do ano, tamanho, revisão, matriz)}; revisão -1 = desatualizada
+_CACHE: Dict[str, Tuple[Dict[str, Any], int, int, MatrizAno]] = {}
+_estatisticas = {"hits": 0, "construcoes": 0, "atualizacoes": 0}
+
+
+def obter(ano: Any, ano_dict: Dict[str, Any]) -> MatrizAno:
+    """Matriz do ano (em cache enquanto o dicionário e a revisão de timings_dados não mudarem)."""
+    chave = str(ano)
+    versao = revisao("timings_dados")
+    with _lock:
+        entrada = _CACHE.get(chave)
+        if (
+            entrada is not None
+            and entrada[0] is ano_dict
+            and entrada[1] == len(ano_dict)
+            and entrada[2] == versao
+        ):
+            _estatisticas["hits"] += 1
+            return entrada[3]
+
+    matriz = MatrizAno(ano_dict, anterior=entrada[3] if entrada is not None else None)
+    with _lock:
+        _CACHE[chave] = (ano_dict, len(ano_dict), versao, matriz)
+        _estatisticas["construcoes"] += 1
+    return matriz
+
+
+def atualizar_empresas(ano: Any, ano_dict: Dict[str, Any], empresas: Iterable[str]) -> None:
+    """
+    As empresas indicadas do ano foram alteradas em memória: relê só essas
+    linhas. Sem matriz válida para este dicionário, marca-a para refazer.
+    """
+    chave = str(ano)
+    with _lock:
+        entrada = _CACHE.get(chave)
+        if entrada is None or entrada[0] is not ano_dict or entrada[2] != revisao("timings_dados"):
+            if entrada is not None:
+                _CACHE[chave] = (entrada[0], entrada[1], -1, entrada[3])
+            return
+        matriz = entrada[3]
+        matriz.atualizar(ano_dict, empresas)
+        if len(matriz) != len(ano_dict):
+            # Há registos que não são dicionários: relê tudo na próxima vez
+            _CACHE[chave] = (ano_dict, entrada[1], -1, matriz)
+            return
+        _CACHE[chave] = (ano_dict, len(ano_dict), entrada[2], matriz)
+        _estatisticas["atualizacoes"] += 1
+
+
+def confirmar_revisao(ano: Any) -> None:
+    """Depois de gravar uma alteração já aplicada com atualizar_empresas(): a matriz segue a nova revisão."""
+    chave = str(ano)
+    with _lock:
+        entrada = _CACHE.get(chave)
+        if entrada is not None and entrada[2] != -1:
+            _CACHE[chave] = (entrada[0], entrada[1], revisao("timings_dados"), entrada[3])
+
+
+def invalidar() -> None:
+    """timings_dados foi alterado em memória: as matrizes são refeitas (mantendo as versões das linhas iguais)."""
+    with _lock:
+        for chave, entrada in list(_CACHE.items()):
+            _CACHE[chave] = (entrada[0], entrada[1], -1, entrada[3])
+
+
+def estatisticas() -> Dict[str, Any]:
+    with _lock:
+        return {**_estatisticas, "anos": sorted(_CACHE)}
@@ -0,0 +1,185 @@
+"""
+Snapshot binário de timings_dados já normalizado (arranque rápido).
+
+Em vez de reler timings_dados.json e voltar a passar todos os meses por
+_parse_duracao_para_minutos, o arranque lê este ficheiro quando a impressão
+digital (SHA-1) da fonte persistida coincide com a guardada no snapshot.
+
+Formato (versão 1), só com struct/array da biblioteca standard:
+- cabeçalho: MAGIC, versão, ordem de bytes, SHA-1 da fonte, total de minutos
+  persistidos e número de strings;
+- tabela de strings: comprimentos (array 'q') + bytes UTF-8 concatenados;
+- cinco arrays 'q' (inteiros de 64 bits), todos pela ordem original das chaves:
+    anos:         (idx_ano, n_empresas) por ano
+    empresas:     (idx_nome, extra_mensal, apagado, n_meses, n_tecnicos)
+    meses:        (mes, minutos) por mês de cada empresa
+    tecnicos:     (idx_nome, n_meses) por técnico de cada empresa
+    tecnico_meses: (mes, minutos) por mês de cada técnico
+
+O snapshot é só uma cache: se faltar, estiver corrompido ou for de outra
+versão, a leitura devolve None e o JSON é lido como antes.
+"""
+
+import hashlib
+import os
+import struct
+import sys
+from array import array
+from typing import Any, Dict, List, Optional, Tuple
+
+MAGIC = b"PACTSNAP"
+VERSAO = 1
+
+# MAGIC, versão, ordem de bytes (0 = little, 1 = big), SHA-1, total, n_strings
+_CABECALHO = struct.Struct("<8sHB20sqI")
+_ARRAY = struct.Struct("<I")
+
+
+def impressao_digital(fonte: bytes) -> bytes:
+    """SHA-1 dos bytes da fonte persistida (ficheiro ou secção do journal)."""
+    return hashlib.sha1(fonte).digest()
+
+
+def _ordem_nativa() -> int:
+    return 0 if sys.byteorder == "little" else 1
+
+
+def _escrever_array(partes: List[bytes], valores: array) -> None:
+    partes.append(_ARRAY.pack(len(valores)))
+    partes.append(valores.tobytes())
+
+
+def _ler_array(buf: memoryview, pos: int, trocar: bool) -> Tuple[array, int]:
+    (n,) = _ARRAY.unpack_from(buf, pos)
+    pos += _ARRAY.size
+    valores = array("q")
+    fim = pos + n * valores.itemsize
+    if fim > len(buf):
+        raise ValueError("array truncado")
+    valores.frombytes(buf[pos:fim])
+    if trocar:
+        valores.byteswap()
+    return valores, fim
+
+
+def gravar(caminho: str, timings_dados: Dict[str, Dict[str, dict]], digest: bytes, total_minutos: int) -> bool:
+    """Grava o snapshot de forma atómica (tmp + os.replace). Devolve False em caso de erro."""
+    strings: List[str] = []
+    idx_strings: Dict[str, int] = {}
+
+    def idx(s: str) -> int:
+        i = idx_strings.get(s)
+        if i is None:
+            i = idx_strings[s] = len(strings)
+            strings.append(s)
+        return i
+
+    anos = array("q")
+    empresas = array("q")
+    meses = array("q")
+    tecnicos = array("q")
+    tecnico_meses = array("q")
+
+    for ano, ano_dict in timings_dados.items():
+        anos.extend((idx(ano), len(ano_dict)))
+        for nome, rec in ano_dict.items():
+            rec_meses = rec.get("meses") or {}
+            por_tecnico = rec.get("por_tecnico") or {}
+            empresas.extend(
+                (idx(nome), int(rec.get("extra_mensal", 0)), int(bool(rec.get("apagado"))), len(rec_meses), len(por_tecnico))
+            )
+            for mes, minutos in rec_meses.items():
+                meses.extend((int(mes), int(minutos)))
+            for tec, meses_tec in por_tecnico.items():
+                tecnicos.extend((idx(tec), len(meses_tec)))
+                for mes, minutos in meses_tec.items():
+                    tecnico_meses.extend((int(mes), int(minutos)))
+
+    codificadas = [s.encode("utf-8") for s in strings]
+    partes: List[bytes] = [
+        _CABECALHO.pack(MAGIC, VERSAO, _ordem_nativa(), digest, int(total_minutos), len(strings))
+    ]
+    _escrever_array(partes, array("q", (len(b) for b in codificadas)))
+    partes.append(b"".join(codificadas))
+    for valores in (anos, empresas, meses, tecnicos, tecnico_meses):
+        _escrever_array(partes, valores)
+
+    tmp = caminho + ".tmp"
+    try:
+        with open(tmp, "wb") as f:
+            f.write(b"".join(partes))
+        os.replace(tmp, caminho)
+        return True
+    except Exception as e:
+        print(f"[TIMINGS] WARNING: falha ao gravar snapshot: {e}")
+        if os.path.exists(tmp):
+            try:
+                os.remove(tmp)
+            except Exception:
+                pass
+        return False
+
+
+def ler(caminho: str, digest: bytes) -> Optional[Tuple[Dict[str, Dict[str, dict]], int]]:
+    """
+    Devolve (timings_dados normalizado, total de minutos persistidos) se o
+    snapshot existir, for válido e corresponder a 'digest'; senão None.
+    """
+    try:
+        with open(caminho, "rb") as f:
+            dados = f.read()
+    except OSError:
+        return None
+
+    try:
+        buf = memoryview(dados)
+        magic, versao, ordem, digest_snap, total, n_strings = _CABECALHO.unpack_from(buf, 0)
+        if magic != MAGIC or versao != VERSAO or digest_snap != digest:
+            return None
+        trocar = ordem != _ordem_nativa()
+        pos = _CABECALHO.size
+
+        comprimentos, pos = _ler_array(buf, pos, trocar)
+        if len(comprimentos) != n_strings:
+            return None
+        strings: List[str] = []
+        for n in comprimentos:
+            strings.append(bytes(buf[pos:pos + n]).decode("utf-8"))
+            pos += n
+
+        anos, pos = _ler_array(buf, pos, trocar)
+        empresas, pos = _ler_array(buf, pos, trocar)
+        meses, pos = _ler_array(buf, pos, trocar)
+        tecnicos, pos = _ler_array(buf, pos, trocar)
+        tecnico_meses, pos = _ler_array(buf, pos, trocar)
+
+        resultado: Dict[str, Dict[str, dict]] = {}
+        ie = im = it = itm = 0
+        for ia in range(0, len(anos), 2):
+            ano_dict: Dict[str, dict] = {}
+            resultado[strings[anos[ia]]] = ano_dict
+            for _ in range(anos[ia + 1]):
+                idx_nome, extra, apagado, n_meses, n_tecnicos = empresas[ie:ie + 5]
+                ie += 5
+                rec_meses = {meses[j]: meses[j + 1] for j in range(im, im + 2 * n_meses, 2)}
+                im += 2 * n_meses
+                por_tecnico: Dict[str, Dict[str, int]] = {}
+                for _ in range(n_tecnicos):
+                    idx_tec, n_meses_tec = tecnicos[it], tecnicos[it + 1]
+                    it += 2
+                    por_tecnico[strings[idx_tec]] = {
+                        str(tecnico_meses[j]): tecnico_meses[j + 1] for j in range(itm, itm + 2 * n_meses_tec, 2)
+                    }
+                    itm += 2 * n_meses_tec
+                ano_dict[strings[idx_nome]] = {
+                    "meses": rec_meses,
+                    "extra_mensal": extra,
+                    "apagado": bool(apagado),
+                    "por_tecnico": por_tecnico,
+                }
+        if ie != len(empresas) or im != len(meses) or it != len(tecnicos) or itm != len(tecnico_meses):
+            return None
+        return resultado, total
+    except Exception as e:
+        print(f"[TIMINGS] WARNING: snapshot inválido, a ler JSON: {e}")
+        return None